@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Fake terragrunt binary for exercising the fleet runner.
+
+Sleeps and exits with scripted codes instead of touching AWS. Point the
+runner at it with ``--terragrunt benchmarks/fake_terragrunt.py`` (or
+``TERRAGRUNT_BIN``). Behaviour comes from the JSON file named by
+FAKE_TERRAGRUNT_SCRIPT::
+
+    {
+      "default": {"sleep": 0.2, "exit": 0},
+      "tenants": {
+        "*/acme/*": [{"lock_error": true}, {"sleep": 1, "exit": 0}],
+        "*/broken/*": {"exit": 1, "output": "Error: boom"}
+      }
+    }
+
+Like the units, the fake needs CONFIG_PATH set to an absolute path (and to
+the same file as TENANT_CONFIG_PATH); without it every run fails with exit
+code 1. Tenant keys are fnmatch patterns on TENANT_CONFIG_PATH. A list scripts
+successive attempts (the last entry repeats); attempts are counted in
+FAKE_TERRAGRUNT_STATE (a directory, default: a temp dir per script file).
+``lock_error`` prints terraform's state lock message and exits 1.
+``output_bytes`` prints one line that long (terraform's JSON plan lines run
+to megabytes), and ``ignore_sigterm`` makes the fake survive SIGTERM, as a
+hung terraform would. When
+FAKE_TERRAGRUNT_TRACE names a file, one JSON line is appended per start and
+end so tests can check the concurrency limits.
+
+With ``--json-out-dir DIR`` a plan JSON is written to ``DIR/<unit>/plan.json``
+for every unit of the ``--stack`` file not excluded with
+``--queue-exclude-dir``, which, as in a real stack run, must name the
+unit's generated ``.terragrunt-stack/<path>`` directory. A step's ``changes`` lists unit names (or fnmatch
+patterns on the unit path) whose plans show an update; the others are
+clean.
+
+Usage:
+    FAKE_TERRAGRUNT_SCRIPT=script.json \\
+        scripts/select-stack.py run plan apiary/ --terragrunt benchmarks/fake_terragrunt.py
+"""
+
+import fnmatch
+import hashlib
+import json
+import os
+import signal
+import sys
+import tempfile
+import time
+
+LOCK_MESSAGE = """\
+Error: Error acquiring the state lock
+
+Error message: ConditionalCheckFailedException: The conditional request failed
+Lock Info:
+  ID:        00000000-0000-0000-0000-000000000000
+  Operation: OperationTypePlan
+"""
+
+
+def step_for(script, tenant, attempt):
+    steps = script.get("default", {})
+    for pattern, scripted in script.get("tenants", {}).items():
+        if fnmatch.fnmatch(tenant, pattern):
+            steps = scripted
+            break
+    if isinstance(steps, list):
+        return steps[min(attempt, len(steps) - 1)] if steps else {}
+    return steps
+
+
+def next_attempt(state_dir, tenant, command):
+    """Count this invocation for (tenant, command); returns the 0-based attempt."""
+    os.makedirs(state_dir, exist_ok=True)
+    key = hashlib.sha256(f"{tenant}\0{command}".encode()).hexdigest()[:16]
+    path = os.path.join(state_dir, key)
+    # O_APPEND writes are atomic, so concurrent fakes never lose a count
+    with open(path, "ab") as f:
+        f.write(b".")
+    return os.path.getsize(path) - 1
+
+
+def option_values(args, name):
+    return [args[i + 1] for i, arg in enumerate(args[:-1]) if arg == name]
+
+
+def write_plans(args, step):
+    """Write one plan file per unit of the stack, as --json-out-dir does."""
+    out_dirs = option_values(args, "--json-out-dir")
+    stacks = option_values(args, "--stack")
+    if not out_dirs or not stacks:
+        return
+    import yaml  # only plan runs need it
+
+    sys.path.insert(
+        0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts")
+    )
+    from stacktools import terragrunt
+
+    with open(stacks[0]) as f:
+        units = [
+            u["path"]
+            for u in (yaml.safe_load(f) or {}).get("units") or []
+            if u.get("path")
+        ]
+    generated = terragrunt.generated_unit_dirs(stacks[0])
+    excluded = set(option_values(args, "--queue-exclude-dir"))
+    changed = step.get("changes", [])
+    for unit in units:
+        if terragrunt.generated_unit_dir(unit, generated) in excluded:
+            continue
+        update = any(
+            fnmatch.fnmatch(unit, pattern) or unit.rsplit("/", 1)[-1] == pattern
+            for pattern in changed
+        )
+        change = {"address": "null_resource.fake", "type": "null_resource"}
+        change["change"] = {"actions": ["update"]}
+        plan = {"format_version": "1.2", "resource_changes": [change] if update else []}
+        os.makedirs(os.path.join(out_dirs[0], unit), exist_ok=True)
+        with open(os.path.join(out_dirs[0], unit, "plan.json"), "w") as f:
+            json.dump(plan, f)
+        print(
+            f"planned {unit}: {'1 to change' if update else 'no changes'}", flush=True
+        )
+
+
+def trace(event, tenant, command):
+    path = os.environ.get("FAKE_TERRAGRUNT_TRACE")
+    if not path:
+        return
+    line = json.dumps(
+        {"event": event, "tenant": tenant, "command": command, "t": time.time()}
+    )
+    with open(path, "a") as f:
+        f.write(line + "\n")
+
+
+def main():
+    args = sys.argv[1:]
+    command = args[1] if len(args) > 1 and args[0] == "stack" else " ".join(args)
+    tenant = os.environ.get("TENANT_CONFIG_PATH", "")
+    config_path = os.environ.get("CONFIG_PATH", "")
+    if not os.path.isabs(config_path) or os.path.abspath(tenant) != config_path:
+        print(
+            f"Error: CONFIG_PATH must be the absolute tenant config path, got {config_path!r}",
+            file=sys.stderr,
+            flush=True,
+        )
+        sys.exit(1)
+    script_path = os.environ.get("FAKE_TERRAGRUNT_SCRIPT")
+    script = {}
+    if script_path:
+        with open(script_path) as f:
+            script = json.load(f)
+    state_dir = os.environ.get("FAKE_TERRAGRUNT_STATE") or os.path.join(
+        tempfile.gettempdir(),
+        "fake-terragrunt-" + hashlib.sha256(str(script_path).encode()).hexdigest()[:12],
+    )
+
+    step = step_for(script, tenant, next_attempt(state_dir, tenant, command))
+    if step.get("ignore_sigterm"):
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    trace("start", tenant, command)
+    print(f"fake terragrunt {' '.join(args)} for {tenant}", flush=True)
+    if step.get("output_bytes"):
+        sys.stdout.write("x" * int(step["output_bytes"]) + "\n")
+        sys.stdout.flush()
+    time.sleep(float(step.get("sleep", 0)))
+    if step.get("output"):
+        print(step["output"], flush=True)
+    if not step.get("lock_error") and not int(step.get("exit", 0)):
+        write_plans(args, step)
+    trace("end", tenant, command)
+    if step.get("lock_error"):
+        print(LOCK_MESSAGE, file=sys.stderr, flush=True)
+        sys.exit(1)
+    sys.exit(int(step.get("exit", 0)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Stack selector benchmark over synthetic fleets.
+
+Generates deployment-type configs and tenant configs at several scales
+(10, 1k and 50k tenants by default; one deployment type per --type-ratio
+tenants, at least 3) and measures, per scale:
+
+  * cold_start_json   - fresh interpreter, "--json --no-cache" (fast path)
+  * warm_start_json   - fresh interpreter, "--json" with a warm config cache
+  * cold_start_list   - fresh interpreter, "--list --no-cache"
+  * selector_init     - StackSelector() without / with a warm config cache
+  * load_validate     - load_config + schema.validate_tenant over every tenant
+  * list_render       - rendering the --list table to an in-memory console
+  * json_output       - the click "select --json" path, in-process
+
+Everything runs against a temporary copy (STACK_SELECTOR_CONFIG_DIR and
+STACK_SELECTOR_CACHE_DIR point into it), so the repo and the user's cache are
+untouched. Results are printed as JSON; --compare fails the run when a
+median regresses by more than --max-regression percent against a previous
+results file.
+
+Usage:
+    python benchmarks/selector.py
+    python benchmarks/selector.py --scales 10,1000 --runs 3 --output bench.json
+    python benchmarks/selector.py --compare main.json --max-regression 25
+"""
+
+import argparse
+import importlib
+import io
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SELECTOR = REPO_ROOT / "scripts" / "select-stack.py"
+
+REGIONS = [
+    ("usw2", "us-west-2"),
+    ("use1", "us-east-1"),
+    ("euw1", "eu-west-1"),
+    ("euc1", "eu-central-1"),
+    ("apse2", "ap-southeast-2"),
+]
+ENVS = ["dev", "test", "stage", "prod"]
+FEATURES = [
+    "twingate",
+    "monitoring",
+    "argocd",
+    "eso",
+    "observability",
+    "backup",
+    "karpenter",
+]
+STACK_FILES = [
+    "stacks/aws/full.stack.yaml",
+    "stacks/deployment-types/control-plane.stack.yaml",
+    "stacks/deployment-types/data-plane.stack.yaml",
+]
+
+
+def generate_fleet(root: Path, tenants: int, deployment_types: int, seed: int = 42):
+    """Write synthetic deployment-type configs and tenant configs under root."""
+    rng = random.Random(seed)
+    config_dir = root / "configs"
+    config_dir.mkdir(parents=True)
+    names = [f"type_{i:05d}" for i in range(deployment_types)]
+    for i, name in enumerate(names):
+        features = rng.sample(FEATURES, rng.randint(2, len(FEATURES)))
+        (config_dir / f"{name}.yaml").write_text(
+            f"name: {name}\n"
+            f"description: Synthetic deployment type {i}\n"
+            f"stack_file: {STACK_FILES[i % len(STACK_FILES)]}\n"
+            "components:\n  - substrate\n  - hosting\n"
+            "features:\n"
+            + "".join(f"  - {f}\n" for f in features)
+            + "cluster_config:\n  node_instance_types:\n    - t3.xlarge\n"
+            f"  min_nodes: {rng.randint(1, 3)}\n  max_nodes: {rng.randint(4, 20)}\n"
+            "subnet_config:\n  count: 3\n  nat_strategy: single\n"
+        )
+
+    tenant_dir = root / "tenants"
+    paths = []
+    for i in range(tenants):
+        sregion, region = rng.choice(REGIONS)
+        org = f"org{i % max(1, tenants // 25):04d}"
+        env = rng.choice(ENVS)
+        path = tenant_dir / org / f"{sregion}-{env}-{i}" / "tenant.yaml"
+        path.parent.mkdir(parents=True)
+        path.write_text(
+            f"org: {org}\nenv: {env}\nsregion: {sregion}\nregion: {region}\n"
+            f"deployment: d{i}\ndeployment_type: {rng.choice(names)}\n"
+            f'account_id: "{100000000000 + i}"\n'
+            f"vpc_cidr: 10.{i % 256}.0.0/16\nsubnet_count: 3\nsubnet_nat_strategy: single\n"
+            "features:\n  karpenter: false\n"
+        )
+        paths.append(path)
+    return config_dir, paths
+
+
+def summarize(samples):
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "min_ms": round(min(samples), 2),
+        "max_ms": round(max(samples), 2),
+    }
+
+
+def time_subprocess(argv, env, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, str(SELECTOR)] + argv,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            env=env,
+            check=True,
+        )
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def time_call(func, runs):
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+def load_selector_module():
+    """Import the select-stack.py CLI (stacktools.cli) in-process."""
+    sys.path.insert(0, str(SELECTOR.parent))
+    return importlib.import_module("stacktools.cli")
+
+
+def bench_scale(selector, tenants, type_ratio, runs, workdir: Path):
+    from click.testing import CliRunner
+    from stacktools import configs, schema
+    from stacktools.cache import ConfigCache
+
+    deployment_types = max(3, tenants // type_ratio)
+    root = workdir / f"fleet-{tenants}"
+    start = time.perf_counter()
+    config_dir, tenant_paths = generate_fleet(root, tenants, deployment_types)
+    generate_ms = (time.perf_counter() - start) * 1000
+
+    cache_dir = root / "cache"
+    env = dict(
+        os.environ,
+        **{
+            configs.CONFIG_DIR_ENV: str(config_dir),
+            "STACK_SELECTOR_CACHE_DIR": str(cache_dir),
+        },
+    )
+    os.environ.update(
+        {k: env[k] for k in (configs.CONFIG_DIR_ENV, "STACK_SELECTOR_CACHE_DIR")}
+    )
+    configs.CONFIG_DIR = config_dir
+    selector.console.file = io.StringIO()
+    selector.console.width = 120
+    sample_tenant = str(tenant_paths[0])
+
+    results = {"tenants": tenants, "deployment_types": deployment_types}
+    results["generate_ms"] = round(generate_ms, 2)
+
+    results["cold_start_json"] = time_subprocess(
+        [sample_tenant, "--json", "--no-cache"], env, runs
+    )
+    # Populate the cache once, then measure warm starts
+    subprocess.run(
+        [sys.executable, str(SELECTOR), "--list"],
+        stdout=subprocess.DEVNULL,
+        env=env,
+        check=True,
+    )
+    results["warm_start_json"] = time_subprocess([sample_tenant, "--json"], env, runs)
+    results["cold_start_list"] = time_subprocess(["--list", "--no-cache"], env, runs)
+
+    results["selector_init_no_cache"] = time_call(
+        lambda: selector.StackSelector(cache=ConfigCache(config_dir, enabled=False)),
+        runs,
+    )
+    results["selector_init_warm_cache"] = time_call(
+        lambda: selector.StackSelector(cache=ConfigCache(config_dir)), runs
+    )
+
+    def load_validate():
+        for path in tenant_paths:
+            schema.validate_tenant(configs.load_config(str(path)))
+
+    load = time_call(load_validate, 1 if tenants > 10000 else runs)
+    load["per_tenant_us"] = round(load["median_ms"] * 1000 / tenants, 2)
+    results["load_validate"] = load
+
+    instance = selector.StackSelector(cache=ConfigCache(config_dir))
+
+    def render_list():
+        selector.console.file = io.StringIO()
+        instance.list_available_types()
+
+    results["list_render"] = time_call(render_list, runs)
+
+    runner = CliRunner()
+
+    def json_output():
+        result = runner.invoke(selector.main, [sample_tenant, "--json"])
+        if result.exit_code != 0:
+            raise RuntimeError(f"select --json failed: {result.output}")
+
+    results["json_output"] = time_call(json_output, runs)
+    return results
+
+
+def compare(results, baseline, max_regression):
+    """Return regressions of median_ms beyond max_regression percent."""
+    regressions = []
+    for scale, metrics in results["scales"].items():
+        old_metrics = baseline.get("scales", {}).get(scale, {})
+        for name, value in metrics.items():
+            old = old_metrics.get(name)
+            if not isinstance(value, dict) or not isinstance(old, dict):
+                continue
+            new_ms, old_ms = value["median_ms"], old.get("median_ms")
+            if not old_ms:
+                continue
+            change = (new_ms - old_ms) / old_ms * 100
+            value["change_pct"] = round(change, 1)
+            if change > max_regression:
+                regressions.append(
+                    f"{scale}/{name}: {old_ms:.1f}ms -> {new_ms:.1f}ms (+{change:.0f}%)"
+                )
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=REPO_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--scales", default="10,1000,50000", help="Comma-separated tenant counts"
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Runs per measurement")
+    parser.add_argument(
+        "--type-ratio",
+        type=int,
+        default=50,
+        help="Tenants per synthetic deployment type (at least 3 types)",
+    )
+    parser.add_argument("--output", help="Also write results JSON to this file")
+    parser.add_argument(
+        "--compare", help="Previous results JSON to compare medians against"
+    )
+    parser.add_argument(
+        "--max-regression",
+        type=float,
+        default=25.0,
+        help="Fail when a median is this many percent slower than --compare",
+    )
+    parser.add_argument("--keep", action="store_true", help="Keep the generated fleets")
+    args = parser.parse_args()
+
+    scales = [int(s) for s in args.scales.split(",") if s.strip()]
+    baseline = json.loads(Path(args.compare).read_text()) if args.compare else None
+    workdir = Path(tempfile.mkdtemp(prefix="selector-bench-"))
+    # Keep generated fleets out of the repo and the user's cache before the
+    # selector module reads its environment
+    os.environ["STACK_SELECTOR_CACHE_DIR"] = str(workdir / "cache")
+    selector = load_selector_module()
+
+    results = {
+        "python": sys.version.split()[0],
+        "commit": git_commit(),
+        "runs": args.runs,
+        "scales": {},
+    }
+    try:
+        for tenants in scales:
+            print(f"Benchmarking {tenants} tenants...", file=sys.stderr)
+            results["scales"][str(tenants)] = bench_scale(
+                selector, tenants, args.type_ratio, args.runs, workdir
+            )
+    finally:
+        if args.keep:
+            print(f"Fleets kept in {workdir}", file=sys.stderr)
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    failures = compare(results, baseline, args.max_regression) if baseline else []
+    results["failures"] = failures
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+    if failures:
+        for failure in failures:
+            print(f"REGRESSION: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Startup benchmark for scripts/select-stack.py.
+
+Launches the selector as a fresh interpreter for each machine-output mode and
+records wall time, plus the modules imported in that process. Results are
+printed as JSON so they can be compared across commits.
+
+Regressions fail the run:
+  * a machine-output mode imports rich, click, asyncio, concurrent.futures
+    subprocess or sqlite3
+  * the median startup exceeds --max-ms (when given)
+
+Usage:
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 20 --max-ms 150 --output startup.json
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+SELECTOR = REPO_ROOT / "scripts" / "select-stack.py"
+EXAMPLE_CONFIG = REPO_ROOT / "examples" / "configs" / "control-plane.yaml"
+
+# A local run history makes --json import sqlite3 for its ETA; measure
+# without one so results do not depend on the machine's cache
+SELECTOR_ENV = dict(
+    os.environ,
+    STACK_SELECTOR_HISTORY_DB=str(REPO_ROOT / "benchmarks" / ".no-history.sqlite"),
+)
+
+# (name, argv, must stay free of HEAVY_MODULES)
+SCENARIOS = [
+    ("json", ["--json", str(EXAMPLE_CONFIG)], True),
+    ("validate_only", ["--validate-only", str(EXAMPLE_CONFIG)], True),
+    ("show_config_dir", ["--show-config-dir"], True),
+    ("list", ["--list"], False),
+]
+
+# UI libraries, and what the fleet subcommands pull in (thread pools, asyncio,
+# child processes, the SQLite indexes)
+HEAVY_MODULES = ("rich", "click", "asyncio", "concurrent", "subprocess", "sqlite3")
+
+
+def time_run(argv):
+    """Run the selector once and return elapsed milliseconds."""
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, str(SELECTOR)] + argv,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        env=SELECTOR_ENV,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000
+
+
+def imported_modules(argv):
+    """Return the top-level modules imported by one selector run (-X importtime)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", str(SELECTOR)] + argv,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env=SELECTOR_ENV,
+        text=True,
+        check=True,
+    )
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        name = line.rsplit("|", 1)[1].strip()
+        modules.add(name.split(".")[0])
+    return modules
+
+
+def baseline_ms(runs):
+    """Median startup of a bare interpreter, for context."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10, help="Runs per scenario")
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        help="Fail when a machine-output mode's median startup exceeds this",
+    )
+    parser.add_argument("--output", help="Also write results JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "interpreter_baseline_ms": round(baseline_ms(args.runs), 2),
+        "scenarios": {},
+    }
+    failures = []
+
+    for name, argv, must_be_light in SCENARIOS:
+        time_run(argv)  # warm the page cache
+        samples = [time_run(argv) for _ in range(args.runs)]
+        heavy = sorted(set(HEAVY_MODULES) & imported_modules(argv))
+        median = statistics.median(samples)
+        results["scenarios"][name] = {
+            "argv": argv,
+            "median_ms": round(median, 2),
+            "min_ms": round(min(samples), 2),
+            "max_ms": round(max(samples), 2),
+            "heavy_imports": heavy,
+        }
+        if must_be_light and heavy:
+            failures.append(f"{name}: imports {', '.join(heavy)}")
+        if must_be_light and args.max_ms is not None and median > args.max_ms:
+            failures.append(f"{name}: median {median:.1f}ms > {args.max_ms}ms")
+
+    results["failures"] = failures
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        Path(args.output).write_text(output + "\n")
+
+    if failures:
+        for failure in failures:
+            print(f"REGRESSION: {failure}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
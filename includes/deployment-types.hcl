@@ -1,283 +1,650 @@
-# Deployment Type Definitions
-# This file defines the different deployment patterns and their characteristics
+# Deployment type definitions, generated by "select-stack.py registry" from
+# stacks/deployment-types/configs. Do not edit: change the YAML configs and
+# run "select-stack.py registry" again.
 
 locals {
-  # Define all deployment types with their features and components
   deployment_types = {
-    # Full Stack - Complete HoneyHive platform
-    full_stack = {
-      description = "Complete platform with all features"
-      features = {
-        twingate      = true  # VPN access
-        monitoring    = true  # Prometheus/Grafana
-        argocd        = true  # GitOps
-        eso           = true  # External Secrets Operator
-        observability = true  # Logs, metrics, traces
-        backup        = true  # Velero backups
-        karpenter     = true  # Auto-scaling
-        gpu_support   = false # GPU nodes (optional)
-        batch_compute = false # AWS Batch (optional)
-      }
-      components = {
-        substrate = {
-          vpc      = true
-          dns      = true
-          twingate = true
-        }
-        hosting = {
-          cluster        = true
-          karpenter      = true
-          addons         = true
-          pod_identities = true
-        }
-        application = {
-          database = true
-          s3       = true
-        }
-      }
-      # Resource sizing
-      cluster_config = {
-        node_instance_types = ["t3.xlarge", "t3.2xlarge"]
-        min_nodes           = 3
-        max_nodes           = 10
-        desired_nodes       = 3
-      }
-    }
-
-    # Control Plane - API and management services
     control_plane = {
-      description = "API, dashboard, and GitOps management"
-      features = {
-        twingate      = false # No VPN (customers use their own)
-        monitoring    = true  # Central monitoring
-        argocd        = true  # Manage data planes
-        eso           = true  # Secret management
-        observability = true  # Central observability
-        backup        = true  # Backup control plane data
-        karpenter     = false # Fixed sizing
-        gpu_support   = false # No GPU needed
-        batch_compute = false # No batch processing
-      }
-      components = {
-        substrate = {
-          vpc      = true
-          dns      = true
-          twingate = false
-        }
-        hosting = {
-          cluster        = true
-          karpenter      = false
-          addons         = true
-          pod_identities = true
-        }
-        application = {
-          database = true # Control plane state
-          s3       = true # Artifacts, configs
-        }
-      }
       cluster_config = {
         node_instance_types = ["t3.large", "t3.xlarge"]
         min_nodes           = 2
         max_nodes           = 4
         desired_nodes       = 2
       }
-    }
-
-    # Data Plane - Compute workloads
-    data_plane = {
-      description = "Compute workloads and processing"
-      features = {
-        twingate      = false # Access via control plane
-        monitoring    = false # Ships to control plane
-        argocd        = false # Managed by control plane
-        eso           = true  # Get secrets from control
-        observability = true  # Local collection
-        backup        = false # Stateless workloads
-        karpenter     = true  # Critical for scaling
-        gpu_support   = true  # ML workloads (optional)
-        batch_compute = true  # Large-scale processing (optional)
-      }
-      components = {
-        substrate = {
-          vpc      = true
-          dns      = true
-          twingate = false
+      component_units = {
+        application = {
+          argocd_apps     = false
+          database        = true
+          ecr             = false
+          iam             = false
+          s3              = true
+          secrets_configs = false
+        }
+        byoc = {
+          compliance_controls = false
+          cross_account_roles = false
+          customer_kms        = false
+          data_residency      = false
+          network_isolation   = false
+        }
+        control_plane = {
+          argocd           = true
+          external_secrets = true
+          monitoring       = true
+        }
+        data_plane = {
+          batch_compute = false
+          gpu_nodes     = false
+          observability = false
         }
         hosting = {
-          cluster        = true
-          karpenter      = true # Auto-scaling critical
-          addons         = true
-          pod_identities = true
+          addons           = true
+          argocd_apps      = false
+          cluster          = true
+          external_secrets = false
+          karpenter        = false
+          pod_identities   = true
         }
-        application = {
-          database = false # Uses control plane DB
-          s3       = true  # Temp storage
+        hybrid = {
+          api_gateway             = false
+          control_plane_connector = false
+          data_proxy              = false
+          privatelink_endpoints   = false
+          telemetry_forwarder     = false
         }
+        substrate = {
+          customer_vpn = false
+          dns          = true
+          twingate     = false
+          vpc          = true
+        }
+      }
+      components        = ["substrate", "hosting", "application"]
+      description       = "API, dashboard, and GitOps management"
+      disabled_features = ["twingate", "karpenter", "gpu_support", "batch_compute"]
+      enabled           = true
+      feature_flags = {
+        argocd              = true
+        backup              = true
+        batch_compute       = false
+        compliance_controls = false
+        customer_kms        = false
+        data_proxy          = false
+        data_residency      = false
+        edge_optimized      = false
+        eso                 = true
+        gpu_support         = false
+        hybrid_connector    = false
+        karpenter           = false
+        monitoring          = true
+        network_isolation   = false
+        observability       = true
+        offline_capable     = false
+        privatelink         = false
+        twingate            = false
       }
+      features   = ["monitoring", "argocd", "eso", "observability", "backup"]
+      name       = "control_plane"
+      stack_file = "stacks/deployment-types/control-plane.stack.yaml"
+      subnet_config = {
+        count           = 2
+        nat_strategy    = "per_az"
+        public_newbits  = 8
+        private_newbits = 4
+      }
+      tags = {
+        Purpose = "control-plane"
+        Tier    = "management"
+      }
+      vpc_endpoints = {
+        gateway   = ["s3"]
+        interface = ["ecr.dkr", "ecr.api", "logs", "ssm", "secretsmanager", "sts"]
+      }
+    }
+    data_plane = {
       cluster_config = {
         node_instance_types = ["c6i.2xlarge", "c6i.4xlarge", "g4dn.xlarge"]
         min_nodes           = 1
         max_nodes           = 100
         desired_nodes       = 2
+        spot_enabled        = true
+        spot_percentage     = 80
       }
-    }
-
-    # Federated BYOC - Customer cloud, HoneyHive managed
-    federated_byoc = {
-      description = "Deploy in customer's AWS account with HoneyHive management"
-      features = {
-        twingate            = false # Customer VPN
-        monitoring          = true  # Limited monitoring
-        argocd              = true  # GitOps in customer account
-        eso                 = true  # Customer's secrets
-        observability       = true  # Compliance requirement
-        backup              = true  # Customer data protection
-        karpenter           = true  # Optional auto-scaling
-        gpu_support         = false # Customer decides
-        batch_compute       = false # Customer decides
-        customer_kms        = true  # Use customer's keys
-        compliance_controls = true  # Audit and compliance
-        data_residency      = true  # Data stays in region
-        network_isolation   = true  # PrivateLink only
-      }
-      components = {
+      component_units = {
+        application = {
+          argocd_apps     = false
+          database        = false
+          ecr             = false
+          iam             = false
+          s3              = true
+          secrets_configs = false
+        }
+        byoc = {
+          compliance_controls = false
+          cross_account_roles = false
+          customer_kms        = false
+          data_residency      = false
+          network_isolation   = false
+        }
+        control_plane = {
+          argocd           = false
+          external_secrets = false
+          monitoring       = false
+        }
+        data_plane = {
+          batch_compute = true
+          gpu_nodes     = true
+          observability = true
+        }
+        hosting = {
+          addons           = true
+          argocd_apps      = false
+          cluster          = true
+          external_secrets = false
+          karpenter        = true
+          pod_identities   = true
+        }
+        hybrid = {
+          api_gateway             = false
+          control_plane_connector = false
+          data_proxy              = false
+          privatelink_endpoints   = false
+          telemetry_forwarder     = false
+        }
         substrate = {
-          vpc          = true
+          customer_vpn = false
           dns          = true
           twingate     = false
-          customer_vpn = true # Customer's VPN
+          vpc          = true
+        }
+      }
+      components        = ["substrate", "hosting"]
+      description       = "Compute workloads and processing"
+      disabled_features = ["twingate", "monitoring", "argocd", "backup"]
+      enabled           = true
+      feature_flags = {
+        argocd              = false
+        backup              = false
+        batch_compute       = true
+        compliance_controls = false
+        customer_kms        = false
+        data_proxy          = false
+        data_residency      = false
+        edge_optimized      = false
+        eso                 = true
+        gpu_support         = true
+        hybrid_connector    = false
+        karpenter           = true
+        monitoring          = false
+        network_isolation   = false
+        observability       = true
+        offline_capable     = false
+        privatelink         = false
+        twingate            = false
+      }
+      features = ["karpenter", "eso", "observability", "gpu_support", "batch_compute"]
+      karpenter = {
+        enabled = true
+        provisioners = [
+          {
+            name           = "compute-general"
+            instance_types = ["c6i.2xlarge", "c6i.4xlarge", "m6i.2xlarge", "m6i.4xlarge"]
+            capacity_type  = "spot"
+          },
+          {
+            name           = "compute-gpu"
+            instance_types = ["g4dn.xlarge", "g4dn.2xlarge", "g4dn.4xlarge"]
+            capacity_type  = "on-demand"
+            taints = {
+              "nvidia.com/gpu" = "true"
+            }
+          },
+        ]
+      }
+      name       = "data_plane"
+      stack_file = "stacks/deployment-types/data-plane.stack.yaml"
+      subnet_config = {
+        count           = 3
+        nat_strategy    = "single"
+        public_newbits  = 8
+        private_newbits = 2
+      }
+      tags = {
+        Purpose       = "data-plane"
+        Tier          = "compute"
+        CostOptimized = "true"
+      }
+    }
+    edge = {
+      cluster_config = {
+        node_instance_types = ["t3.small", "t3.medium", "t4g.small"]
+        min_nodes           = 1
+        max_nodes           = 3
+        desired_nodes       = 1
+      }
+      component_units = {
+        application = {
+          argocd_apps     = false
+          database        = false
+          ecr             = false
+          iam             = false
+          s3              = false
+          secrets_configs = false
+        }
+        byoc = {
+          compliance_controls = false
+          cross_account_roles = false
+          customer_kms        = false
+          data_residency      = false
+          network_isolation   = false
+        }
+        control_plane = {
+          argocd           = false
+          external_secrets = false
+          monitoring       = false
+        }
+        data_plane = {
+          batch_compute = false
+          gpu_nodes     = false
+          observability = false
         }
         hosting = {
-          cluster        = true
-          karpenter      = true
-          addons         = true
-          pod_identities = true
+          addons           = false
+          argocd_apps      = false
+          cluster          = false
+          external_secrets = false
+          karpenter        = false
+          pod_identities   = false
+        }
+        hybrid = {
+          api_gateway             = false
+          control_plane_connector = false
+          data_proxy              = false
+          privatelink_endpoints   = false
+          telemetry_forwarder     = false
+        }
+        substrate = {
+          customer_vpn = false
+          dns          = false
+          twingate     = false
+          vpc          = false
         }
+      }
+      components        = ["substrate", "hosting"]
+      description       = "Edge deployment for IoT and low-latency requirements"
+      disabled_features = ["twingate", "monitoring", "argocd", "observability", "backup", "karpenter", "gpu_support", "batch_compute"]
+      edge_config = {
+        offline_mode           = true
+        local_storage          = true
+        sync_interval          = 3600
+        compression            = true
+        bandwidth_optimization = true
+      }
+      enabled = false
+      feature_flags = {
+        argocd              = false
+        backup              = false
+        batch_compute       = false
+        compliance_controls = false
+        customer_kms        = false
+        data_proxy          = false
+        data_residency      = false
+        edge_optimized      = true
+        eso                 = true
+        gpu_support         = false
+        hybrid_connector    = false
+        karpenter           = false
+        monitoring          = false
+        network_isolation   = false
+        observability       = false
+        offline_capable     = true
+        privatelink         = false
+        twingate            = false
+      }
+      features   = ["eso", "edge_optimized", "offline_capable"]
+      name       = "edge"
+      stack_file = null
+      subnet_config = {
+        count           = 1
+        nat_strategy    = "none"
+        public_newbits  = 12
+        private_newbits = 11
+      }
+      tags = {
+        Purpose        = "edge-deployment"
+        Tier           = "edge"
+        OfflineCapable = "true"
+      }
+    }
+    federated_byoc = {
+      cluster_config = {
+        node_instance_types = ["t3.large", "t3.xlarge", "m5.xlarge"]
+        min_nodes           = 2
+        max_nodes           = 20
+        desired_nodes       = 3
+      }
+      component_units = {
         application = {
-          database = true # In customer account
-          s3       = true # In customer account
+          argocd_apps     = false
+          database        = true
+          ecr             = false
+          iam             = false
+          s3              = true
+          secrets_configs = false
         }
         byoc = {
-          cross_account_roles = true
           compliance_controls = true
-          data_residency      = true
+          cross_account_roles = true
           customer_kms        = true
+          data_residency      = true
           network_isolation   = true
         }
+        control_plane = {
+          argocd           = false
+          external_secrets = false
+          monitoring       = false
+        }
+        data_plane = {
+          batch_compute = false
+          gpu_nodes     = false
+          observability = false
+        }
+        hosting = {
+          addons           = true
+          argocd_apps      = false
+          cluster          = true
+          external_secrets = false
+          karpenter        = true
+          pod_identities   = true
+        }
+        hybrid = {
+          api_gateway             = false
+          control_plane_connector = false
+          data_proxy              = false
+          privatelink_endpoints   = false
+          telemetry_forwarder     = false
+        }
+        substrate = {
+          customer_vpn = true
+          dns          = true
+          twingate     = false
+          vpc          = true
+        }
+      }
+      components = ["substrate", "hosting", "application", "byoc"]
+      cross_account = {
+        management_role               = "HoneyHiveManagementRole"
+        external_id_required          = true
+        permissions_boundary_required = true
+      }
+      data_residency = {
+        enforce_region     = true
+        block_cross_region = true
+      }
+      description       = "Deploy in customer AWS account with HoneyHive management"
+      disabled_features = ["twingate"]
+      enabled           = true
+      feature_flags = {
+        argocd              = true
+        backup              = true
+        batch_compute       = false
+        compliance_controls = true
+        customer_kms        = true
+        data_proxy          = false
+        data_residency      = true
+        edge_optimized      = false
+        eso                 = true
+        gpu_support         = false
+        hybrid_connector    = false
+        karpenter           = false
+        monitoring          = true
+        network_isolation   = true
+        observability       = true
+        offline_capable     = false
+        privatelink         = false
+        twingate            = false
       }
+      features = ["monitoring", "argocd", "eso", "observability", "backup", "customer_kms", "compliance_controls", "data_residency", "network_isolation"]
+      name     = "federated_byoc"
+      security = {
+        encryption = "customer_managed"
+        compliance = ["cloudtrail", "config", "guardduty", "security_hub"]
+        standards  = ["cis-aws-foundations-benchmark", "aws-foundational-security-best-practices", "pci-dss", "gdpr"]
+      }
+      stack_file = "stacks/deployment-types/federated-byoc.stack.yaml"
+      subnet_config = {
+        count           = 3
+        nat_strategy    = "per_az"
+        public_newbits  = 8
+        private_newbits = 4
+      }
+      tags = {
+        Purpose         = "customer-byoc"
+        Tier            = "production"
+        DataSovereignty = "required"
+        ManagedBy       = "HoneyHive"
+      }
+      vpc_endpoints = {
+        gateway   = ["s3", "dynamodb"]
+        interface = ["ecr.dkr", "ecr.api", "logs", "ssm", "secretsmanager", "sts", "kms", "ec2"]
+      }
+    }
+    full_stack = {
       cluster_config = {
-        node_instance_types = ["t3.large", "t3.xlarge"] # Customer preference
-        min_nodes           = 2
-        max_nodes           = 20
+        node_instance_types = ["t3.xlarge", "t3.2xlarge"]
+        min_nodes           = 3
+        max_nodes           = 10
         desired_nodes       = 3
       }
-    }
-
-    # Hybrid SaaS - Control in HoneyHive, Data in customer
-    hybrid_saas = {
-      description = "Control plane in HoneyHive cloud, data plane in customer cloud"
-      features = {
-        twingate         = false # No direct access
-        monitoring       = false # Forward to control
-        argocd           = false # Managed by control
-        eso              = true  # Hybrid secrets
-        observability    = true  # Forward to control
-        backup           = false # Control plane handles
-        karpenter        = true  # Scale in customer
-        gpu_support      = true  # Customer workloads
-        batch_compute    = true  # Customer processing
-        hybrid_connector = true  # Connect to control
-        data_proxy       = true  # Secure data transfer
-        privatelink      = true  # Secure connectivity
-      }
-      components = {
-        substrate = {
-          vpc      = true
-          dns      = true
-          twingate = false
+      component_units = {
+        application = {
+          argocd_apps     = true
+          database        = true
+          ecr             = true
+          iam             = true
+          s3              = true
+          secrets_configs = true
         }
-        hosting = {
-          cluster        = true
-          karpenter      = true
-          addons         = true
-          pod_identities = true
+        byoc = {
+          compliance_controls = false
+          cross_account_roles = false
+          customer_kms        = false
+          data_residency      = false
+          network_isolation   = false
         }
-        application = {
-          database = false # In control plane
-          s3       = true  # Customer data
+        control_plane = {
+          argocd           = false
+          external_secrets = false
+          monitoring       = false
+        }
+        data_plane = {
+          batch_compute = false
+          gpu_nodes     = false
+          observability = false
+        }
+        hosting = {
+          addons           = true
+          argocd_apps      = true
+          cluster          = true
+          external_secrets = true
+          karpenter        = true
+          pod_identities   = true
         }
         hybrid = {
-          control_plane_connector = true
-          api_gateway             = true
-          data_proxy              = true
-          privatelink_endpoints   = true
-          telemetry_forwarder     = true
+          api_gateway             = false
+          control_plane_connector = false
+          data_proxy              = false
+          privatelink_endpoints   = false
+          telemetry_forwarder     = false
         }
+        substrate = {
+          customer_vpn = false
+          dns          = true
+          twingate     = true
+          vpc          = true
+        }
+      }
+      components        = ["substrate", "hosting", "application"]
+      description       = "Complete platform with all components"
+      disabled_features = []
+      enabled           = true
+      feature_flags = {
+        argocd              = true
+        backup              = true
+        batch_compute       = false
+        compliance_controls = false
+        customer_kms        = false
+        data_proxy          = false
+        data_residency      = false
+        edge_optimized      = false
+        eso                 = true
+        gpu_support         = false
+        hybrid_connector    = false
+        karpenter           = true
+        monitoring          = true
+        network_isolation   = false
+        observability       = true
+        offline_capable     = false
+        privatelink         = false
+        twingate            = true
+      }
+      features   = ["twingate", "monitoring", "argocd", "eso", "observability", "backup", "karpenter"]
+      name       = "full_stack"
+      stack_file = "stacks/aws/full.stack.yaml"
+      subnet_config = {
+        count           = 3
+        nat_strategy    = "single"
+        public_newbits  = 7
+        private_newbits = 3
       }
+      tags = {
+        Purpose = "full-platform"
+        Tier    = "production"
+      }
+    }
+    hybrid_saas = {
       cluster_config = {
-        node_instance_types = ["c6i.xlarge", "c6i.2xlarge"]
+        node_instance_types = ["c6i.xlarge", "c6i.2xlarge", "c6i.4xlarge"]
         min_nodes           = 2
         max_nodes           = 50
         desired_nodes       = 3
       }
-    }
-
-    # Edge deployment - IoT and edge computing
-    edge = {
-      description = "Edge deployment for IoT and low-latency requirements"
-      features = {
-        twingate        = false
-        monitoring      = false # Limited
-        argocd          = false
-        eso             = true
-        observability   = false # Limited bandwidth
-        backup          = false
-        karpenter       = false # Fixed resources
-        gpu_support     = false
-        batch_compute   = false
-        edge_optimized  = true # Edge-specific
-        offline_capable = true # Work offline
-      }
-      components = {
-        substrate = {
-          vpc      = true
-          dns      = true
-          twingate = false
+      component_units = {
+        application = {
+          argocd_apps     = false
+          database        = false
+          ecr             = false
+          iam             = false
+          s3              = true
+          secrets_configs = false
+        }
+        byoc = {
+          compliance_controls = false
+          cross_account_roles = false
+          customer_kms        = false
+          data_residency      = false
+          network_isolation   = false
+        }
+        control_plane = {
+          argocd           = false
+          external_secrets = false
+          monitoring       = false
+        }
+        data_plane = {
+          batch_compute = false
+          gpu_nodes     = false
+          observability = false
         }
         hosting = {
-          cluster        = true # K3s or EKS Anywhere
-          karpenter      = false
-          addons         = false # Minimal
-          pod_identities = true
+          addons           = true
+          argocd_apps      = false
+          cluster          = true
+          external_secrets = false
+          karpenter        = true
+          pod_identities   = true
         }
-        application = {
-          database = false # Local SQLite
-          s3       = false # Local storage
+        hybrid = {
+          api_gateway             = true
+          control_plane_connector = true
+          data_proxy              = true
+          privatelink_endpoints   = true
+          telemetry_forwarder     = true
+        }
+        substrate = {
+          customer_vpn = false
+          dns          = true
+          twingate     = false
+          vpc          = true
         }
       }
-      cluster_config = {
-        node_instance_types = ["t3.small", "t3.medium"]
-        min_nodes           = 1
-        max_nodes           = 3
-        desired_nodes       = 1
+      components        = ["substrate", "hosting", "hybrid"]
+      description       = "Control plane in HoneyHive cloud, data plane in customer cloud"
+      disabled_features = ["twingate", "monitoring", "argocd", "backup"]
+      enabled           = true
+      feature_flags = {
+        argocd              = false
+        backup              = false
+        batch_compute       = false
+        compliance_controls = false
+        customer_kms        = false
+        data_proxy          = true
+        data_residency      = false
+        edge_optimized      = false
+        eso                 = true
+        gpu_support         = false
+        hybrid_connector    = true
+        karpenter           = true
+        monitoring          = false
+        network_isolation   = false
+        observability       = true
+        offline_capable     = false
+        privatelink         = true
+        twingate            = false
+      }
+      features = ["karpenter", "eso", "observability", "hybrid_connector", "data_proxy", "privatelink"]
+      hybrid_config = {
+        control_plane_endpoint = "https://api.control.honeyhive.ai"
+        control_plane_region   = "us-west-2"
+        telemetry_forward      = true
+        metrics_forward        = true
+        logs_forward           = true
+      }
+      name = "hybrid_saas"
+      privatelink = {
+        enabled   = true
+        endpoints = ["api.control.honeyhive.ai", "metrics.control.honeyhive.ai", "logs.control.honeyhive.ai"]
+      }
+      stack_file = "stacks/deployment-types/hybrid-saas.stack.yaml"
+      subnet_config = {
+        count           = 3
+        nat_strategy    = "single"
+        public_newbits  = 8
+        private_newbits = 3
+      }
+      tags = {
+        Purpose      = "hybrid-data-plane"
+        Tier         = "compute"
+        ControlPlane = "external"
       }
     }
   }
 
+  default_deployment_type = "full_stack"
+
   # Get current deployment type from config
   current_deployment_type = try(
     include.tenant_config.locals.cfg.deployment_type,
-    "full_stack" # Default if not specified
+    local.default_deployment_type
   )
 
   # Get the configuration for current deployment type
   deployment_config = local.deployment_types[local.current_deployment_type]
 
-  # Export features for use in units
-  deployment_features = local.deployment_config.features
+  # Export features for use in units (feature -> enabled)
+  deployment_features = local.deployment_config.feature_flags
 
-  # Export components for conditional deployment
-  deployment_components = local.deployment_config.components
+  # Export components for conditional deployment (layer -> unit -> deployed)
+  deployment_components = local.deployment_config.component_units
 
   # Export cluster configuration
   cluster_config = local.deployment_config.cluster_config
@@ -7,9 +7,27 @@ locals {
   # This ensures the path is valid regardless of Terragrunt's working directory
   config_path = get_env("CONFIG_PATH", "")
   
+  # Effective config precomputed by "select-stack.py effective -o", with org
+  # and region layers and deployment-type defaults already merged. Only used
+  # when it was resolved from this CONFIG_PATH and the tenant file and every
+  # layer it merged still have the SHA-256 recorded in it; otherwise the
+  # YAML is decoded as usual
+  effective_config  = try(jsondecode(file(get_env("TG_EFFECTIVE_CONFIG"))), {})
+  effective_current = try(
+    local.effective_config.source == abspath(local.config_path) &&
+    local.effective_config.digests[local.effective_config.source] == filesha256(local.config_path) &&
+    alltrue([for path, digest in local.effective_config.digests : filesha256(path) == digest]),
+    false
+  )
+
   # Parse the YAML configuration
   # file() function works with absolute paths regardless of current working directory
-  cfg = yamldecode(file(local.config_path))
+  # (a one-entry map rather than a conditional, which would need both
+  # configs to have the same type)
+  cfg = try(
+    { current = local.effective_config.config }[local.effective_current ? "current" : "stale"],
+    yamldecode(file(local.config_path))
+  )
 
   # Core parameters
   org        = local.cfg.org
@@ -22,6 +40,24 @@ locals {
   # Construct name prefix
   name_prefix = "${local.org}-${local.env}-${local.sregion}-${local.deployment}"
 
+  # Upstream outputs prefetched by "select-stack.py deps prefetch", keyed by
+  # state basename. Only plan and validate read them: an apply in the same
+  # run can change the outputs of the units it applies. The file is ignored
+  # unless it was fetched for this tenant file, which has not changed since,
+  # and has not expired
+  dependency_outputs_file    = contains(["plan", "validate"], get_terraform_command()) ? get_env("TG_DEPENDENCY_OUTPUTS", "") : ""
+  dependency_outputs_doc     = try(jsondecode(file(local.dependency_outputs_file)), {})
+  dependency_outputs_current = try(
+    local.dependency_outputs_doc.config_path == abspath(local.config_path) &&
+    local.dependency_outputs_doc.config_sha256 == filesha256(local.config_path) &&
+    timecmp(timestamp(), local.dependency_outputs_doc.expires_at) < 0,
+    false
+  )
+  dependency_outputs = try(
+    { current = local.dependency_outputs_doc.outputs }[local.dependency_outputs_current ? "current" : "stale"],
+    {}
+  )
+
   # Features and configuration
   features      = try(local.cfg.features, {})
   terraform_ref = try(local.cfg.terraform_ref, get_env("TERRAFORM_REF", "v0.9.31"))
@@ -6,8 +6,24 @@ locals {
   # This is the single source of truth for all configuration
   config_path = get_env("CONFIG_PATH")
 
+  # Effective config from "select-stack.py effective -o" when it was
+  # resolved from this file and neither the file nor its layers changed
+  # since (see includes/stack-config.hcl)
+  effective_config  = try(jsondecode(file(get_env("TG_EFFECTIVE_CONFIG"))), {})
+  effective_current = try(
+    local.effective_config.source == abspath(local.config_path) &&
+    local.effective_config.digests[local.effective_config.source] == filesha256(local.config_path) &&
+    alltrue([for path, digest in local.effective_config.digests : filesha256(path) == digest]),
+    false
+  )
+
   # Parse the YAML configuration
-  cfg = yamldecode(file(local.config_path))
+  # (a one-entry map rather than a conditional, which would need both
+  # configs to have the same type)
+  cfg = try(
+    { current = local.effective_config.config }[local.effective_current ? "current" : "stale"],
+    yamldecode(file(local.config_path))
+  )
 
   # Extract commonly used values for convenience
   org        = local.cfg.org
@@ -1,6 +1,11 @@
 #!/bin/bash
 # Cleanup Karpenter-provisioned nodes before cluster destroy
 # Prevents orphaned EC2 instances and security group deletion issues
+#
+# When python3 has boto3, click, rich and PyYAML, this runs
+# "select-stack.py cleanup-nodes", which also removes leftover ENIs and
+# launch templates and accepts its extra options. Otherwise it terminates
+# the instances with the aws CLI alone, as it always has.
 
 set -euo pipefail
 
@@ -8,10 +13,24 @@ CLUSTER_NAME="${1:-}"
 REGION="${2:-us-west-2}"
 
 if [ -z "$CLUSTER_NAME" ]; then
-  echo "Usage: $0 <cluster-name> [region]"
+  echo "Usage: $0 <cluster-name> [region] [cleanup-nodes options]"
   exit 1
 fi
+shift
+[ $# -gt 0 ] && shift
 
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+if python3 -c 'import boto3, click, rich, yaml' 2>/dev/null; then
+  exec python3 "$SCRIPT_DIR/select-stack.py" cleanup-nodes "$CLUSTER_NAME@$REGION" "$@"
+fi
+
+if [ $# -gt 0 ]; then
+  echo "❌ cleanup-nodes options ($*) need python3 with boto3, click, rich and PyYAML"
+  echo "   Install them with: pip install boto3 -r $SCRIPT_DIR/requirements.txt"
+  exit 1
+fi
+
+echo "⚠️  python3 with boto3, click, rich and PyYAML not found; terminating instances only"
 echo "🧹 Cleaning up Karpenter-provisioned nodes for cluster: $CLUSTER_NAME"
 
 # Find all EC2 instances with karpenter.sh/cluster tag
@@ -41,4 +60,3 @@ aws ec2 wait instance-terminated \
   --instance-ids $INSTANCE_IDS
 
 echo "✅ All Karpenter nodes terminated successfully!"
-
@@ -0,0 +1,62 @@
+# shellcheck shell=bash
+# Deployment type lookup, generated by "select-stack.py registry" from
+# stacks/deployment-types/configs. Do not edit: change the YAML configs and
+# run "select-stack.py registry" again.
+
+DEFAULT_DEPLOYMENT_TYPE=full_stack
+DEPLOYMENT_TYPES='control_plane data_plane federated_byoc full_stack hybrid_saas'
+
+# deployment_type_lookup NAME
+# Sets DT_NAME, DT_DESCRIPTION, DT_STACK_FILE, DT_ENABLED (true/false),
+# DT_COMPONENTS and DT_FEATURES (space-separated). Returns 1 for an unknown
+# deployment type.
+deployment_type_lookup() {
+    case "$1" in
+        control_plane)
+            DT_DESCRIPTION='API, dashboard, and GitOps management'
+            DT_STACK_FILE=stacks/deployment-types/control-plane.stack.yaml
+            DT_ENABLED=true
+            DT_COMPONENTS='substrate hosting application'
+            DT_FEATURES='monitoring argocd eso observability backup'
+            ;;
+        data_plane)
+            DT_DESCRIPTION='Compute workloads and processing'
+            DT_STACK_FILE=stacks/deployment-types/data-plane.stack.yaml
+            DT_ENABLED=true
+            DT_COMPONENTS='substrate hosting'
+            DT_FEATURES='karpenter eso observability gpu_support batch_compute'
+            ;;
+        edge)
+            DT_DESCRIPTION='Edge deployment for IoT and low-latency requirements'
+            DT_STACK_FILE=''
+            DT_ENABLED=false
+            DT_COMPONENTS='substrate hosting'
+            DT_FEATURES='eso edge_optimized offline_capable'
+            ;;
+        federated_byoc)
+            DT_DESCRIPTION='Deploy in customer AWS account with HoneyHive management'
+            DT_STACK_FILE=stacks/deployment-types/federated-byoc.stack.yaml
+            DT_ENABLED=true
+            DT_COMPONENTS='substrate hosting application byoc'
+            DT_FEATURES='monitoring argocd eso observability backup customer_kms compliance_controls data_residency network_isolation'
+            ;;
+        full_stack)
+            DT_DESCRIPTION='Complete platform with all components'
+            DT_STACK_FILE=stacks/aws/full.stack.yaml
+            DT_ENABLED=true
+            DT_COMPONENTS='substrate hosting application'
+            DT_FEATURES='twingate monitoring argocd eso observability backup karpenter'
+            ;;
+        hybrid_saas)
+            DT_DESCRIPTION='Control plane in HoneyHive cloud, data plane in customer cloud'
+            DT_STACK_FILE=stacks/deployment-types/hybrid-saas.stack.yaml
+            DT_ENABLED=true
+            DT_COMPONENTS='substrate hosting hybrid'
+            DT_FEATURES='karpenter eso observability hybrid_connector data_proxy privatelink'
+            ;;
+        *)
+            return 1
+            ;;
+    esac
+    DT_NAME="$1"
+}
@@ -11,8 +11,19 @@ if [ -z "$CONFIG_FILE" ] || [ ! -f "$CONFIG_FILE" ]; then
     exit 1
 fi
 
-# Extract deployment type from config
-DEPLOYMENT_TYPE=$(yq eval '.deployment_type' "$CONFIG_FILE")
+SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+# Generated from stacks/deployment-types/configs by "select-stack.py registry"
+# shellcheck source=deployment-types.sh
+source "$SCRIPT_DIR/deployment-types.sh"
+
+# Extract deployment type from config (a top-level key, read without yq)
+DEPLOYMENT_TYPE=""
+while IFS= read -r line || [ -n "$line" ]; do
+    if [[ $line =~ ^deployment_type:[[:space:]]*[\"\']?([A-Za-z0-9_-]*) ]]; then
+        DEPLOYMENT_TYPE="${BASH_REMATCH[1]}"
+        break
+    fi
+done < "$CONFIG_FILE"
 
 if [ -z "$DEPLOYMENT_TYPE" ] || [ "$DEPLOYMENT_TYPE" == "null" ]; then
     echo "Error: deployment_type not found in configuration"
@@ -20,37 +31,17 @@ if [ -z "$DEPLOYMENT_TYPE" ] || [ "$DEPLOYMENT_TYPE" == "null" ]; then
 fi
 
 # Map deployment type to stack file
-case "$DEPLOYMENT_TYPE" in
-    full_stack)
-        STACK_FILE="stacks/aws/full.stack.yaml"
-        echo "Full Stack deployment - all components"
-        ;;
-    control_plane)
-        STACK_FILE="stacks/deployment-types/control-plane.stack.yaml"
-        echo "Control Plane deployment - API and management"
-        ;;
-    data_plane)
-        STACK_FILE="stacks/deployment-types/data-plane.stack.yaml"
-        echo "Data Plane deployment - compute workloads"
-        ;;
-    federated_byoc)
-        STACK_FILE="stacks/deployment-types/federated-byoc.stack.yaml"
-        echo "Federated BYOC deployment - customer cloud"
-        ;;
-    hybrid_saas)
-        STACK_FILE="stacks/deployment-types/hybrid-saas.stack.yaml"
-        echo "Hybrid SaaS deployment - split control/data"
-        ;;
-    edge)
-        echo "Error: Edge deployment not yet implemented"
-        exit 1
-        ;;
-    *)
-        echo "Error: Unknown deployment type: $DEPLOYMENT_TYPE"
-        echo "Valid types: full_stack, control_plane, data_plane, federated_byoc, hybrid_saas"
-        exit 1
-        ;;
-esac
+if ! deployment_type_lookup "$DEPLOYMENT_TYPE"; then
+    echo "Error: Unknown deployment type: $DEPLOYMENT_TYPE"
+    echo "Valid types: ${DEPLOYMENT_TYPES// /, }"
+    exit 1
+fi
+if [ "$DT_ENABLED" != "true" ] || [ -z "$DT_STACK_FILE" ]; then
+    echo "Error: $DEPLOYMENT_TYPE deployment not yet implemented"
+    exit 1
+fi
+STACK_FILE="$DT_STACK_FILE"
+echo "$DEPLOYMENT_TYPE deployment - $DT_DESCRIPTION"
 
 # Output the stack file path
 echo "Selected stack: $STACK_FILE"
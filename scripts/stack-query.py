@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Thin client for the selector daemon (select-stack.py daemon serve).
+
+Imports only the standard library, so a lookup costs interpreter startup
+plus one socket round trip instead of a full select-stack.py run.
+
+Usage:
+    stack-query.py resolve tenant.yaml [-t DEPLOYMENT_TYPE] [--field stack_file]
+    stack-query.py validate tenant.yaml
+    stack-query.py list
+    stack-query.py ping | stats | reload
+
+Prints the response's result as JSON (or one field with --field) and exits
+1 on errors or invalid configs, 2 when no daemon is running.
+"""
+
+import argparse
+import json
+import sys
+
+from stacktools.selectorclient import DaemonUnavailable, request
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Query the selector daemon.")
+    parser.add_argument(
+        "op", choices=("resolve", "validate", "list", "ping", "stats", "reload")
+    )
+    parser.add_argument("config_file", nargs="?")
+    parser.add_argument(
+        "-t", "--deployment-type", help="Override the config's deployment type"
+    )
+    parser.add_argument("--field", help="Print only this field of the result")
+    parser.add_argument("--socket", help="Socket path (default: STACK_SELECTOR_SOCKET)")
+    args = parser.parse_args(argv)
+    if args.op in ("resolve", "validate") and not args.config_file:
+        parser.error(f"{args.op} needs a config file")
+
+    params = {}
+    if args.config_file:
+        params["config_file"] = args.config_file
+    if args.deployment_type:
+        params["deployment_type"] = args.deployment_type
+    try:
+        response = request(args.op, args.socket, **params)
+    except DaemonUnavailable as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 2
+
+    for warning in response.get("warnings", []):
+        print(f"Warning: {warning}", file=sys.stderr)
+    if not response["ok"]:
+        print(f"Error: {response['error']}", file=sys.stderr)
+        return 1
+    result = response["result"]
+    if args.field:
+        value = result.get(args.field) if isinstance(result, dict) else None
+        print(value if isinstance(value, str) else json.dumps(value))
+    else:
+        print(json.dumps(result, indent=2))
+    if args.op == "validate" and not result["valid"]:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,8 @@
+"""
+Shared, rich-free building blocks for the stack selector tooling.
+
+Modules in this package only depend on the standard library and PyYAML so
+that machine-output code paths (JSON, validation, CI automation) can use them
+without paying for importing click or rich. The exception is the cli
+subpackage, which holds the click + rich commands of select-stack.py.
+"""
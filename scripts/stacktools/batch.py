@@ -0,0 +1,182 @@
+"""
+Batch resolution of tenant configs across a whole fleet.
+
+Tenant files are discovered lazily (directory walk or glob), resolved in a
+process pool and yielded as they complete. At most ``workers * inflight``
+chunks are queued at any time, so memory stays bounded however many tenants
+the fleet holds.
+"""
+
+import fnmatch
+import glob
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from stacktools import configs, schema, timings
+
+DEFAULT_PATTERN = configs.TENANT_FILE
+DEFAULT_CHUNK_SIZE = 64
+DEFAULT_INFLIGHT = 4
+
+# Set in each worker process by _init_worker
+_deployment_stacks: Dict[str, Dict] = {}
+
+
+def iter_tenant_files(
+    sources: Iterable[str], pattern: str = DEFAULT_PATTERN
+) -> Iterator[str]:
+    """Yield tenant config paths from files, directory trees and glob patterns.
+
+    Directories are walked recursively for files matching ``pattern``; any
+    other source that does not exist is expanded as a (recursive) glob. A
+    missing path without glob characters is yielded as is, so it is reported
+    as "Configuration file not found" like any unreadable tenant rather than
+    silently matching nothing.
+    """
+    for source in sources:
+        if os.path.isfile(source):
+            yield source
+        elif os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+                for name in sorted(files):
+                    if fnmatch.fnmatch(name, pattern):
+                        yield os.path.join(root, name)
+        elif glob.has_magic(source):
+            yield from glob.iglob(source, recursive=True)
+        else:
+            yield source
+
+
+def resolve_tenant(config_file: str, deployment_stacks: Dict[str, Dict]) -> Dict:
+    """Resolve one tenant config to its deployment type and stack file.
+
+    Never raises: every problem is reported in the record's ``errors`` list.
+    """
+    with timings.span("resolve_tenant", "tenant", file=config_file):
+        return _resolve_tenant(config_file, deployment_stacks)
+
+
+def _resolve_tenant(config_file: str, deployment_stacks: Dict[str, Dict]) -> Dict:
+    record = {
+        "config_path": str(Path(config_file).absolute()),
+        "stack_file": None,
+        "deployment_type": None,
+        "account_id": None,
+        "region": None,
+        "errors": [],
+        "warnings": [],
+    }
+
+    try:
+        config = configs.load_config(config_file)
+    except configs.ConfigError as e:
+        record["errors"].append(str(e))
+        return record
+    if not isinstance(config, dict):
+        record["errors"].append("Configuration is not a mapping")
+        return record
+
+    record["account_id"] = config.get("account_id")
+    record["region"] = config.get("region")
+
+    record["errors"].extend(schema.format_errors(schema.validate_tenant(config)))
+
+    deployment_type = config.get("deployment_type")
+    if not deployment_type:
+        record["warnings"].append(
+            "deployment_type not specified in configuration, "
+            f"defaulting to '{configs.DEFAULT_DEPLOYMENT_TYPE}'"
+        )
+        deployment_type = configs.DEFAULT_DEPLOYMENT_TYPE
+    record["deployment_type"] = deployment_type
+
+    info = deployment_stacks.get(deployment_type)
+    if info is None:
+        record["errors"].append(f"Unknown deployment type: {deployment_type}")
+        return record
+
+    record["stack_file"] = info.get("stack_file")
+    if not record["stack_file"]:
+        record["errors"].append(f"Stack file not configured for {deployment_type}")
+    return record
+
+
+def _init_worker(
+    deployment_stacks: Dict[str, Dict], trace_origin: Optional[float] = None
+):
+    global _deployment_stacks
+    _deployment_stacks = deployment_stacks
+    if trace_origin is not None:
+        timings.start(trace_origin)
+
+
+def _resolve_chunk(config_files: List[str]) -> Tuple[List[Dict], List[Dict]]:
+    """Resolve a chunk in a worker; returns the records and the worker's spans."""
+    records = [resolve_tenant(f, _deployment_stacks) for f in config_files]
+    tracer = timings.active()
+    return records, tracer.drain() if tracer else []
+
+
+def _chunk_records(future) -> List[Dict]:
+    records, spans = future.result()
+    if spans:
+        timings.active().extend(spans)
+    return records
+
+
+def _chunks(items: Iterator[str], size: int) -> Iterator[List[str]]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def resolve_fleet(
+    config_files: Iterable[str],
+    deployment_stacks: Dict[str, Dict],
+    workers: Optional[int] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    inflight: int = DEFAULT_INFLIGHT,
+) -> Iterator[Dict]:
+    """Resolve tenant configs in parallel, yielding records as they complete.
+
+    ``workers=1`` resolves in-process, which is faster for small fleets.
+    Completion order is not input order. Closing the generator early cancels
+    chunks that have not started.
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(iter(config_files), chunk_size)
+
+    if workers == 1:
+        for chunk in chunks:
+            for config_file in chunk:
+                yield resolve_tenant(config_file, deployment_stacks)
+        return
+
+    max_pending = workers * inflight
+    tracer = timings.active()
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(deployment_stacks, tracer.origin if tracer else None),
+    )
+    try:
+        pending = set()
+        for chunk in chunks:
+            pending.add(pool.submit(_resolve_chunk, chunk))
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from _chunk_records(future)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from _chunk_records(future)
+    finally:
+        # A consumer that stops early (fail-fast) must not wait for queued chunks
+        pool.shutdown(wait=True, cancel_futures=True)
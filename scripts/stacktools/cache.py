@@ -0,0 +1,189 @@
+"""
+Persistent cache of parsed deployment-type configs.
+
+Parsed configs are stored in a pickle blob per configs directory, keyed on
+each file's resolved path. A hit only costs a stat: an entry whose mtime,
+size and inode still match is used as is. When they differ the file is
+hashed, and the parse is only redone if its SHA-256 changed too. A changed
+file only invalidates its own entry; unchanged files are never re-parsed.
+
+The cache directory defaults to ``$XDG_CACHE_HOME/honeyhive-workflows`` (or
+``~/.cache/honeyhive-workflows``) and can be moved with
+``STACK_SELECTOR_CACHE_DIR``.
+"""
+
+import hashlib
+import os
+import pickle
+import tempfile
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional
+
+from stacktools import timings
+
+CACHE_VERSION = 2
+CACHE_DIR_ENV = "STACK_SELECTOR_CACHE_DIR"
+HISTORY_DB_ENV = "STACK_SELECTOR_HISTORY_DB"
+
+
+def default_cache_dir() -> Path:
+    """Return the directory holding selector cache files."""
+    if os.environ.get(CACHE_DIR_ENV):
+        return Path(os.environ[CACHE_DIR_ENV])
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg_cache) if xdg_cache else Path.home() / ".cache"
+    return base / "honeyhive-workflows"
+
+
+def history_db_path() -> Path:
+    """Return the run history database location (``STACK_SELECTOR_HISTORY_DB`` overrides)."""
+    if os.environ.get(HISTORY_DB_ENV):
+        return Path(os.environ[HISTORY_DB_ENV])
+    return default_cache_dir() / "run-history.sqlite"
+
+
+def file_digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ConfigCache:
+    """Per-file cache of parsed YAML configs backed by one pickle blob.
+
+    ``enabled=False`` turns every lookup into a parse and never touches disk;
+    ``rebuild=True`` ignores the existing blob and rewrites it from scratch.
+    """
+
+    def __init__(
+        self,
+        config_dir: Path,
+        cache_dir: Optional[Path] = None,
+        enabled: bool = True,
+        rebuild: bool = False,
+    ):
+        self.config_dir = Path(config_dir).resolve()
+        self.enabled = enabled
+        dir_key = hashlib.sha1(str(self.config_dir).encode()).hexdigest()[:12]
+        self.path = (
+            cache_dir or default_cache_dir()
+        ) / f"deployment-configs-{dir_key}.pickle"
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        self._dirty = rebuild
+        self._entries: Dict[str, Dict] = {}
+        if enabled and not rebuild:
+            with timings.span("cache_read"):
+                self._entries = self._read()
+
+    def _read(self) -> Dict[str, Dict]:
+        try:
+            with open(self.path, "rb") as f:
+                blob = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ValueError):
+            return {}
+        if not isinstance(blob, dict) or blob.get("version") != CACHE_VERSION:
+            return {}
+        return blob.get("entries", {})
+
+    def get(self, config_file: Path, parse: Callable[[Path], Optional[Dict]]):
+        """Return the parsed contents of config_file, parsing only on a miss.
+
+        ``parse`` is called with the file path and may raise; failures are
+        never cached.
+        """
+        if not self.enabled:
+            self.misses += 1
+            return parse(config_file)
+
+        key = str(Path(config_file).resolve())
+        stat = os.stat(key)
+        entry = self._entries.get(key)
+        if entry is not None and self._same_stat(entry, stat):
+            self.hits += 1
+            return entry["config"]
+
+        # Stat changed (or no entry): hash the content, which still saves the
+        # parse when the file was only touched or copied back unchanged
+        with open(key, "rb") as f:
+            digest = file_digest(f.read())
+        if entry is not None:
+            if entry["sha256"] == digest:
+                self.hits += 1
+                self._entries[key] = dict(entry, **self._stat_fields(stat))
+                self._dirty = True
+                return entry["config"]
+            self.invalidated += 1
+
+        self.misses += 1
+        config = parse(config_file)
+        self._entries[key] = {
+            **self._stat_fields(stat),
+            "sha256": digest,
+            "config": config,
+        }
+        self._dirty = True
+        return config
+
+    @staticmethod
+    def _stat_fields(stat: os.stat_result) -> Dict:
+        return {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "ino": stat.st_ino}
+
+    @staticmethod
+    def _same_stat(entry: Dict, stat: os.stat_result) -> bool:
+        return (
+            entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+            and entry["ino"] == stat.st_ino
+        )
+
+    def prune(self, live_files: Iterable[Path]):
+        """Drop entries for files that no longer exist in the configs directory."""
+        live = {str(Path(f).resolve()) for f in live_files}
+        for key in list(self._entries):
+            if key not in live:
+                del self._entries[key]
+                self._dirty = True
+
+    def save(self):
+        """Atomically write the cache blob if anything changed.
+
+        Callers save once after a batch of ``get`` calls, not per file.
+        """
+        if not self.enabled or not self._dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.path.parent, suffix=".tmp")
+        except OSError:
+            # A read-only cache dir only costs us the speedup
+            return
+        try:
+            with os.fdopen(fd, "wb") as f:
+                pickle.dump(
+                    {"version": CACHE_VERSION, "entries": self._entries},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_path, self.path)
+            self._dirty = False
+        except OSError:
+            Path(tmp_path).unlink(missing_ok=True)
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "path": str(self.path),
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "entries": len(self._entries),
+        }
+
+    def describe(self) -> str:
+        """One-line human-readable summary of the cache counters."""
+        if not self.enabled:
+            return f"Config cache disabled ({self.misses} files parsed)"
+        return (
+            f"Config cache: {self.hits} hits, {self.misses} misses "
+            f"({self.invalidated} invalidated) - {self.path}"
+        )
@@ -0,0 +1,406 @@
+"""
+Indexed overlap checks and allocation for tenant VPC CIDRs.
+
+Every block is held as an integer interval ``[start, end)`` in one list
+sorted by start address, outermost block first on ties. Two CIDR blocks are
+either disjoint or one contains the other, so a single pass over the sorted
+list finds every overlap, grouped under the outermost block that contains
+the rest: O(n log n) for the sort instead of comparing every pair.
+
+The same sorted list answers point queries by bisection. A proposed block
+conflicts with the blocks that start inside it (one bisect range) and with
+its enclosing networks (at most 32 dictionary lookups). Free space is the
+complement of the merged intervals; the next free block of a size is the
+first aligned gap in a pool, found by bisecting to the pool start.
+
+Subnet layouts are computed from exactly the inputs ``units/substrate/vpc``
+passes to the vpc module: ``network_config`` or the unit's defaults.
+Deployment-type ``subnet_config``, ``subnet_count`` and explicit subnet lists
+never reach the module, so they only produce warnings.
+
+The vpc module lives in honeyhive-terraform, outside this tree, so its
+``cidrsubnet`` indexing cannot be read from here. The layout assumes the
+module packs private and public subnets largest first from the VPC's first
+address: with private subnets the larger, private subnet ``i`` is
+``cidrsubnet(vpc_cidr, private_newbits, i)`` and public subnet ``i`` is
+``cidrsubnet(vpc_cidr, public_newbits, count * 2^(public_newbits -
+private_newbits) + i)``. Power-of-two blocks then tile the VPC without
+alignment gaps. A layout depends only on the VPC prefix length and the
+subnet settings, so it is computed once per combination as offsets and
+shifted to each tenant's VPC.
+"""
+
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+ADDRESS_BITS = 32
+DEFAULT_POOLS = ("10.0.0.0/8",)
+
+# AWS subnet sizes
+MIN_SUBNET_PREFIX = 16
+MAX_SUBNET_PREFIX = 28
+
+VPC_UNIT = "units/substrate/vpc"
+
+# Fallbacks units/substrate/vpc applies with try()
+DEFAULT_SUBNETS = {"count": 3, "public_newbits": 7, "private_newbits": 3}
+
+# The config key units/substrate/vpc reads for each subnet setting
+SUBNET_SETTINGS = {
+    "count": ("network_config", "availability_zones"),
+    "public_newbits": ("network_config", "public_subnet_bits"),
+    "private_newbits": ("network_config", "private_subnet_bits"),
+}
+
+# Keys that look like subnet settings but that the vpc unit does not read
+UNAPPLIED_SETTINGS = {
+    "count": (("subnet_count",), ("subnet_config", "count")),
+    "public_newbits": (("subnet_config", "public_newbits"),),
+    "private_newbits": (("subnet_config", "private_newbits"),),
+}
+
+# (group, start, end, prefixlen, owner)
+Block = Tuple[str, int, int, int, str]
+
+
+class CidrError(ValueError):
+    """A CIDR that cannot be parsed, or a layout that does not fit."""
+
+
+def parse_cidr(text: Any) -> Tuple[int, int]:
+    """Parse ``a.b.c.d/n`` into (start address, prefix length).
+
+    Host bits must be zero, as for ``ipaddress.IPv4Network(strict=True)``.
+    """
+    address, slash, bits = str(text).strip().partition("/")
+    octets = address.split(".")
+    if (
+        not slash
+        or len(octets) != 4
+        or not bits.isdigit()
+        or not all(o.isdigit() and len(o) <= 3 for o in octets)
+    ):
+        raise CidrError(f"'{text}' is not an IPv4 CIDR")
+    start = 0
+    for octet in octets:
+        value = int(octet)
+        if value > 255:
+            raise CidrError(f"'{text}' is not an IPv4 CIDR")
+        start = start << 8 | value
+    prefixlen = int(bits)
+    if prefixlen > ADDRESS_BITS:
+        raise CidrError(f"'{text}' has an invalid prefix length")
+    if start & (block_size(prefixlen) - 1):
+        raise CidrError(f"'{text}' has host bits set")
+    return start, prefixlen
+
+
+def block_size(prefixlen: int) -> int:
+    return 1 << (ADDRESS_BITS - prefixlen)
+
+
+def format_address(address: int) -> str:
+    return ".".join(str(address >> shift & 255) for shift in (24, 16, 8, 0))
+
+
+def format_cidr(start: int, prefixlen: int) -> str:
+    return f"{format_address(start)}/{prefixlen}"
+
+
+def parse_prefix(text: Any) -> int:
+    """Parse a block size given as ``/20`` or ``20``."""
+    value = str(text).strip().lstrip("/")
+    if not value.isdigit() or int(value) > ADDRESS_BITS:
+        raise CidrError(f"'{text}' is not a prefix length")
+    return int(value)
+
+
+def _align_up(address: int, size: int) -> int:
+    return (address + size - 1) & -size
+
+
+def _largest_block(start: int, end: int) -> Optional[int]:
+    """Prefix length of the largest aligned block inside ``[start, end)``."""
+    best = None
+    while start < end:
+        # The largest block that starts here is limited by the alignment of
+        # start and by the space left
+        size = start & -start if start else 1 << ADDRESS_BITS
+        while size > end - start:
+            size >>= 1
+        prefixlen = ADDRESS_BITS - size.bit_length() + 1
+        if best is None or prefixlen < best:
+            best = prefixlen
+        start += size
+    return best
+
+
+class CidrIndex:
+    """Sorted interval index over named CIDR blocks."""
+
+    def __init__(self, entries: Iterable[Tuple[Any, str]] = (), group=None):
+        """Index ``(cidr, owner)`` pairs.
+
+        ``group`` maps an owner to its overlap domain; blocks only overlap
+        within one domain. Unparseable CIDRs are kept in ``invalid``.
+        """
+        self.invalid: List[Dict[str, str]] = []
+        blocks: List[Block] = []
+        for cidr, owner in entries:
+            try:
+                start, prefixlen = parse_cidr(cidr)
+            except CidrError as e:
+                self.invalid.append(
+                    {"owner": owner, "cidr": str(cidr), "error": str(e)}
+                )
+                continue
+            domain = "" if group is None else str(group(owner) or "")
+            blocks.append(
+                (domain, start, start + block_size(prefixlen), prefixlen, owner)
+            )
+        blocks.sort(key=lambda b: (b[0], b[1], -b[2], b[4]))
+        self._blocks = blocks
+        # Point queries ignore groups, so they use their own ordering
+        self._by_start = sorted(blocks, key=lambda b: (b[1], -b[2], b[4]))
+        self._starts = [b[1] for b in self._by_start]
+        self._networks: Dict[Tuple[int, int], List[Block]] = {}
+        for block in blocks:
+            self._networks.setdefault((block[1], block[3]), []).append(block)
+        self._merged: Optional[Tuple[List[int], List[int]]] = None
+
+    def __len__(self) -> int:
+        return len(self._blocks)
+
+    @staticmethod
+    def _describe(block: Block) -> Dict[str, str]:
+        return {"cidr": format_cidr(block[1], block[3]), "owner": block[4]}
+
+    def overlaps(self) -> List[Dict[str, Any]]:
+        """Groups of overlapping blocks, each under its outermost block."""
+        found = []
+        current: List[Block] = []
+        for block in self._blocks:
+            if current and block[0] == current[0][0] and block[1] < current[0][2]:
+                current.append(block)
+                continue
+            if len(current) > 1:
+                found.append(current)
+            current = [block]
+        if len(current) > 1:
+            found.append(current)
+        return [
+            {
+                "group": blocks[0][0],
+                "cidr": format_cidr(blocks[0][1], blocks[0][3]),
+                "blocks": [self._describe(block) for block in blocks],
+            }
+            for blocks in found
+        ]
+
+    def conflicts(self, cidr: Any) -> List[Dict[str, str]]:
+        """Indexed blocks that overlap ``cidr``, outermost first."""
+        start, prefixlen = parse_cidr(cidr)
+        end = start + block_size(prefixlen)
+        found = []
+        for parent in range(prefixlen):
+            network = start & -block_size(parent)
+            found.extend(self._networks.get((network, parent), ()))
+        low = bisect_left(self._starts, start)
+        high = bisect_left(self._starts, end)
+        found.extend(b for b in self._by_start[low:high] if b[2] <= end)
+        return [self._describe(block) for block in found]
+
+    def _merged_intervals(self) -> Tuple[List[int], List[int]]:
+        if self._merged is None:
+            starts: List[int] = []
+            ends: List[int] = []
+            for _, start, end, _, _ in self._by_start:
+                if ends and start <= ends[-1]:
+                    ends[-1] = max(ends[-1], end)
+                else:
+                    starts.append(start)
+                    ends.append(end)
+            self._merged = (starts, ends)
+        return self._merged
+
+    def _gaps(self, pool_start: int, pool_end: int):
+        """Yield the free ``[start, end)`` ranges of a pool, in order."""
+        starts, ends = self._merged_intervals()
+        cursor = pool_start
+        index = bisect_right(ends, cursor)
+        while cursor < pool_end:
+            if index < len(starts) and starts[index] < pool_end:
+                if starts[index] > cursor:
+                    yield cursor, starts[index]
+                cursor = max(cursor, ends[index])
+                index += 1
+            else:
+                yield cursor, pool_end
+                return
+
+    def next_free(
+        self, prefixlen: int, pools: Sequence[Any], count: int = 1
+    ) -> List[str]:
+        """The first ``count`` free blocks of ``/prefixlen``, in pool order."""
+        size = block_size(prefixlen)
+        found: List[str] = []
+        for pool in pools:
+            pool_start, pool_prefix = parse_cidr(pool)
+            if pool_prefix > prefixlen:
+                continue
+            for gap_start, gap_end in self._gaps(
+                pool_start, pool_start + block_size(pool_prefix)
+            ):
+                candidate = _align_up(gap_start, size)
+                while candidate + size <= gap_end:
+                    found.append(format_cidr(candidate, prefixlen))
+                    if len(found) == count:
+                        return found
+                    candidate += size
+        return found
+
+    def usage(self, pools: Sequence[Any]) -> List[Dict[str, Any]]:
+        """Addresses used and free in each pool, and its largest free block."""
+        report = []
+        for pool in pools:
+            pool_start, pool_prefix = parse_cidr(pool)
+            pool_end = pool_start + block_size(pool_prefix)
+            free = 0
+            largest = None
+            for gap_start, gap_end in self._gaps(pool_start, pool_end):
+                free += gap_end - gap_start
+                prefixlen = _largest_block(gap_start, gap_end)
+                if largest is None or prefixlen < largest:
+                    largest = prefixlen
+            low = bisect_left(self._starts, pool_start)
+            high = bisect_left(self._starts, pool_end)
+            report.append(
+                {
+                    "pool": format_cidr(pool_start, pool_prefix),
+                    "blocks": sum(
+                        1 for b in self._by_start[low:high] if b[2] <= pool_end
+                    ),
+                    "used": block_size(pool_prefix) - free,
+                    "free": free,
+                    "largest_free": None if largest is None else f"/{largest}",
+                }
+            )
+        return report
+
+
+def _lookup(config: Dict[str, Any], path: Tuple[str, ...]):
+    value: Any = config
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def subnet_settings(config: Dict[str, Any]) -> Tuple[Dict[str, int], Dict[str, str]]:
+    """Subnet count and newbits the vpc unit deploys, and where each came from."""
+    settings: Dict[str, int] = {}
+    sources: Dict[str, str] = {}
+    for name, path in SUBNET_SETTINGS.items():
+        value = _lookup(config, path)
+        if value is None:
+            settings[name] = DEFAULT_SUBNETS[name]
+            sources[name] = "default"
+        elif type(value) is not int:
+            raise CidrError(f"{'.'.join(path)} must be an integer, got {value!r}")
+        else:
+            settings[name] = value
+            sources[name] = ".".join(path)
+    return settings, sources
+
+
+def unapplied_settings(config: Dict[str, Any], settings: Dict[str, int]) -> List[str]:
+    """Warnings for subnet keys the vpc unit ignores that disagree with what it deploys."""
+    warnings = []
+    for name, paths in UNAPPLIED_SETTINGS.items():
+        for path in paths:
+            value = _lookup(config, path)
+            if value is not None and value != settings[name]:
+                warnings.append(
+                    f"{'.'.join(path)}={value!r} is not read by {VPC_UNIT}, "
+                    f"which deploys {name}={settings[name]}"
+                )
+    for kind in ("private", "public"):
+        if config.get(f"subnet_{kind}_cidrs"):
+            warnings.append(
+                f"subnet_{kind}_cidrs is not read by {VPC_UNIT}; "
+                f"its subnets are computed from the newbits"
+            )
+    return warnings
+
+
+@lru_cache(maxsize=None)
+def _relative_layout(
+    vpc_prefix: int, count: int, public_newbits: int, private_newbits: int
+) -> Tuple[Tuple[Tuple[int, int], ...], Tuple[Tuple[int, int], ...], int]:
+    """(private, public, free) for a VPC at address 0, as (offset, prefixlen)."""
+    if count < 1:
+        raise CidrError(f"subnet count must be at least 1, got {count}")
+    requests = []
+    for kind, newbits in (("private", private_newbits), ("public", public_newbits)):
+        prefixlen = vpc_prefix + newbits
+        if newbits < 1 or not MIN_SUBNET_PREFIX <= prefixlen <= MAX_SUBNET_PREFIX:
+            raise CidrError(
+                f"{kind} newbits {newbits} on a /{vpc_prefix} give /{prefixlen} subnets "
+                f"(AWS allows /{MIN_SUBNET_PREFIX} to /{MAX_SUBNET_PREFIX})"
+            )
+        requests.append((prefixlen, kind))
+
+    vpc_size = block_size(vpc_prefix)
+    offset = 0
+    placed: Dict[str, List[Tuple[int, int]]] = {"private": [], "public": []}
+    # Largest first, as the vpc module is assumed to index its cidrsubnet()
+    # calls (see the module docstring): every block then starts aligned right
+    # after the last one
+    for prefixlen, kind in sorted(requests):
+        for _ in range(count):
+            placed[kind].append((offset, prefixlen))
+            offset += block_size(prefixlen)
+    if offset > vpc_size:
+        raise CidrError(
+            f"{count} private /{vpc_prefix + private_newbits} and {count} public "
+            f"/{vpc_prefix + public_newbits} subnets do not fit in a /{vpc_prefix}"
+        )
+    return tuple(placed["private"]), tuple(placed["public"]), vpc_size - offset
+
+
+def subnet_layout(
+    vpc_cidr: Any, count: int, public_newbits: int, private_newbits: int
+) -> Dict:
+    """Private and public subnet CIDRs for one VPC."""
+    start, prefixlen = parse_cidr(vpc_cidr)
+    private, public, free = _relative_layout(
+        prefixlen, count, public_newbits, private_newbits
+    )
+    return {
+        "private": [format_cidr(start + offset, bits) for offset, bits in private],
+        "public": [format_cidr(start + offset, bits) for offset, bits in public],
+        "free": free,
+    }
+
+
+def tenant_layout(config: Dict[str, Any]) -> Dict[str, Any]:
+    """A tenant's subnet layout as ``units/substrate/vpc`` deploys it.
+
+    Subnet keys the unit does not read are reported under ``warnings``;
+    problems with the layout itself under ``error``.
+    """
+    vpc_cidr = config.get("vpc_cidr")
+    layout: Dict[str, Any] = {"vpc_cidr": vpc_cidr}
+    try:
+        if vpc_cidr is None:
+            raise CidrError("no vpc_cidr")
+        settings, sources = subnet_settings(config)
+        layout.update(settings)
+        layout["source"] = sources
+        layout["warnings"] = unapplied_settings(config, settings)
+        layout.update(subnet_layout(vpc_cidr, **settings))
+    except CidrError as e:
+        layout["error"] = str(e)
+    return layout
@@ -0,0 +1,23 @@
+"""
+The click + rich CLI behind scripts/select-stack.py.
+
+Importing this package imports click, rich and every subcommand module, so
+select-stack.py only does it after the fast path (stacktools/fastpath.py)
+has declined the invocation. Subcommands live in one module per area and
+register themselves with ``main`` from stacktools/cli/app.py.
+"""
+
+from stacktools.cli.app import console, main
+from stacktools.cli import caches, fleet, network, planning, selection
+from stacktools.cli.selection import StackSelector
+
+__all__ = [
+    "StackSelector",
+    "caches",
+    "console",
+    "fleet",
+    "main",
+    "network",
+    "planning",
+    "selection",
+]
@@ -0,0 +1,174 @@
+"""
+Shared pieces of the select-stack.py CLI: the rich console, the top-level
+click group every subcommand module registers with, and helpers used by more
+than one of them.
+"""
+
+import json
+import sqlite3
+import sys
+from typing import Dict, Optional, Tuple
+
+try:
+    import click
+except ImportError:
+    print("Error: 'click' library is not installed")
+    print("Install with: pip install click")
+    sys.exit(1)
+
+try:
+    from rich.console import Console
+    from rich.panel import Panel
+except ImportError:
+    print("Error: 'rich' library is not installed")
+    print("Install with: pip install rich")
+    print("Or: pip install pyyaml rich click")
+    sys.exit(1)
+
+from stacktools import configs
+from stacktools.cache import ConfigCache
+from stacktools import batch as batch_mod
+from stacktools import dag as dag_mod
+from stacktools import fleetindex as fleetindex_mod
+from stacktools import history as history_mod
+
+# The entry point, re-run by commands that spawn background workers
+SELECTOR_SCRIPT = configs.REPO_ROOT / "scripts" / "select-stack.py"
+
+# Initialize rich console
+console = Console()
+
+
+def load_config(config_file: str) -> Dict:
+    """Load and parse YAML configuration file."""
+    try:
+        return configs.load_config(config_file)
+    except configs.ConfigError as e:
+        console.print(f"[red]❌ Error: {e}[/red]")
+        raise click.ClickException(str(e).splitlines()[0])
+
+
+class SelectorGroup(click.Group):
+    """Command group that falls back to ``select`` when no subcommand is given.
+
+    Keeps the original ``select-stack.py CONFIG_FILE [OPTIONS]`` usage working
+    alongside fleet-level subcommands.
+    """
+
+    default_command = "select"
+
+    def parse_args(self, ctx, args):
+        if not args or (
+            args[0] not in self.commands
+            and args[0] not in ctx.help_option_names
+            and args[0] != "--version"
+        ):
+            args = [self.default_command] + list(args)
+        return super().parse_args(ctx, args)
+
+
+@click.group(
+    cls=SelectorGroup, context_settings=dict(help_option_names=["-h", "--help"])
+)
+@click.version_option(version="1.0.0", prog_name="Stack Selector")
+def main():
+    """
+    Stack Selector - Choose the right Terragrunt stack based on deployment type.
+
+    Without a subcommand the arguments are passed to the select command, so
+    'select-stack.py CONFIG_FILE' keeps working. Run
+    'select-stack.py select --help' for its options.
+    """
+
+
+def parse_env_overrides(ctx, param, values) -> Dict[str, str]:
+    """Click callback turning repeated KEY=VALUE options into a dict."""
+    overrides = {}
+    for value in values:
+        if "=" not in value:
+            raise click.BadParameter(f"expected KEY=VALUE, got '{value}'")
+        key, _, val = value.partition("=")
+        overrides[key] = val
+    return overrides
+
+
+def load_tenant_stack(config_file: str) -> Tuple[Dict, "dag_mod.StackSpec"]:
+    """Load a tenant config and its deployment type's stack, without status output."""
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR, cache=ConfigCache(configs.CONFIG_DIR)
+        )
+        record = batch_mod.resolve_tenant(config_file, deployment_stacks)
+        if record["errors"]:
+            raise configs.ConfigError("; ".join(record["errors"]))
+        config = configs.load_config(config_file)
+    except configs.ConfigError as e:
+        raise click.ClickException(f"{config_file}: {e}")
+    return config, dag_mod.load_stack(configs.REPO_ROOT / record["stack_file"])
+
+
+def load_durations(path: Optional[str]) -> Optional[Dict[str, float]]:
+    """Load a durations JSON file (see ``dag_mod.split_durations`` for formats)."""
+    if not path:
+        return None
+    try:
+        with open(path, "r") as f:
+            durations = json.load(f)
+    except (OSError, ValueError) as e:
+        raise click.ClickException(f"Could not read durations from {path}: {e}")
+    if not isinstance(durations, dict):
+        raise click.ClickException(f"Durations file must contain a JSON object: {path}")
+    return durations
+
+
+def open_fleet_index(
+    db: Optional[str], no_cache: bool = False
+) -> "fleetindex_mod.FleetIndex":
+    """Open the fleet index, loading deployment configs through the config cache."""
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR,
+            cache=ConfigCache(configs.CONFIG_DIR, enabled=not no_cache),
+        )
+        return fleetindex_mod.FleetIndex(db, deployment_stacks=deployment_stacks)
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+    except sqlite3.Error as e:
+        raise click.ClickException(f"Could not open fleet index: {e}")
+
+
+def describe_refresh(stats: Dict) -> str:
+    return (
+        f"Indexed {stats['scanned']} tenant configs: {stats['added']} added, "
+        f"{stats['updated']} updated, {stats['unchanged']} unchanged, "
+        f"{stats['removed']} removed"
+        + (f", {stats['missing']} not found" if stats["missing"] else "")
+    )
+
+
+def display_eta(predictions: Dict[str, Dict]):
+    """Display predicted run times from the run history using rich."""
+    lines = []
+    for command, prediction in predictions.items():
+        critical = " → ".join(u.rsplit("/", 1)[-1] for u in prediction["critical_path"])
+        lines.append(
+            f"[bold cyan]{command}[/bold cyan]: ETA [bold]"
+            f"{history_mod.format_seconds(prediction['eta_seconds'])}[/bold] at parallelism "
+            f"{prediction['parallelism']} (critical path "
+            f"{history_mod.format_seconds(prediction['critical_path_seconds'])}, "
+            f"recommended parallelism {prediction['recommended_parallelism']})"
+        )
+        lines.append(f"   [dim]{critical}[/dim]")
+        if prediction["units_with_history"] < prediction["units"]:
+            lines.append(
+                f"   [yellow]history for {prediction['units_with_history']} of "
+                f"{prediction['units']} units; others count as 1s[/yellow]"
+            )
+    console.print(
+        Panel(
+            "\n".join(lines),
+            title="⏱️  Predicted Run Time",
+            border_style="cyan",
+            expand=False,
+        )
+    )
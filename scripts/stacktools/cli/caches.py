@@ -0,0 +1,557 @@
+"""
+Cache commands: deps (dependency outputs), tg-store (provider cache) and
+daemon (the resident selector).
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+import click
+from rich.table import Table
+
+from stacktools import configs
+from stacktools import dag as dag_mod
+from stacktools import depcache as depcache_mod
+from stacktools import selectorclient as selectorclient_mod
+from stacktools import selectord as selectord_mod
+from stacktools import tgcache as tgcache_mod
+from stacktools.cli.app import (
+    SELECTOR_SCRIPT,
+    console,
+    load_tenant_stack,
+    main,
+    parse_env_overrides,
+)
+
+
+def display_prefetch(result: Dict, output: str):
+    """Display a dependency-output prefetch using rich."""
+    table = Table(
+        title="Dependency Outputs", show_header=True, header_style="bold magenta"
+    )
+    table.add_column("Upstream", style="cyan")
+    table.add_column("Status")
+    table.add_column("Outputs", justify="right")
+    table.add_column("Readers", justify="right")
+    table.add_column("Time", justify="right")
+    styles = {
+        "fresh": "green",
+        "revalidated": "green",
+        "unchanged": "green",
+        "fetched": "cyan",
+    }
+    for item in result["upstreams"]:
+        style = styles.get(item["status"], "yellow")
+        status = f"[{style}]{item['status']}[/{style}]"
+        if item["error"]:
+            status += f" [dim]{item['error']}[/dim]"
+        table.add_row(
+            item["upstream"],
+            status,
+            str(item["outputs"]),
+            str(len(item["readers"])),
+            f"{item['seconds']:.2f}s",
+        )
+    console.print(table)
+    summary = result["summary"]
+    console.print(
+        f"{summary['served_blocks']} of {summary['dependency_blocks']} dependency blocks "
+        f"served by {len(result['document']['outputs'])} upstream states "
+        f"({summary['state_reads']} state requests)"
+    )
+    console.print(
+        f"[dim]export {depcache_mod.OUTPUTS_ENV}={Path(output).absolute()}[/dim]"
+    )
+
+
+@main.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def deps():
+    """
+    Prefetch the outputs that unit dependency blocks read.
+
+    "deps prefetch" reads each upstream unit's state once and writes an
+    outputs file. With TG_DEPENDENCY_OUTPUTS pointing at it, plan and
+    validate take dependency outputs from the file instead of reading
+    remote state once per dependency block.
+    """
+
+
+@deps.command("prefetch", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("config_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--stack",
+    "stack_file",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Stack file (default: the tenant's deployment type stack)",
+)
+@click.option(
+    "-o",
+    "--output",
+    default="dependency-outputs.json",
+    show_default=True,
+    type=click.Path(dir_okay=False),
+    help="Outputs file to write",
+)
+@click.option(
+    "--ttl",
+    type=click.FloatRange(min=0),
+    default=depcache_mod.DEFAULT_TTL,
+    show_default=True,
+    help="Seconds a cached state is used without asking S3",
+)
+@click.option("--refresh", is_flag=True, help="Revalidate every cached state")
+@click.option(
+    "--max-age",
+    type=click.FloatRange(min=0),
+    default=depcache_mod.DEFAULT_OUTPUTS_MAX_AGE,
+    show_default=True,
+    help="Seconds terragrunt accepts the outputs file after it is written",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=depcache_mod.DEFAULT_WORKERS,
+    show_default=True,
+    help="Parallel state reads",
+)
+@click.option(
+    "--state-dir",
+    type=click.Path(exists=True, file_okay=False),
+    help="Read state from <DIR>/<bucket>/<key> instead of S3",
+)
+@click.option(
+    "--endpoint-url", help="S3-compatible endpoint (e.g. a local moto server)"
+)
+@click.option(
+    "--cache-dir", type=click.Path(file_okay=False), help="Output cache directory"
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def deps_prefetch(
+    config_file,
+    stack_file,
+    output,
+    ttl,
+    refresh,
+    max_age,
+    workers,
+    state_dir,
+    endpoint_url,
+    cache_dir,
+    env,
+    output_json,
+):
+    """
+    Read every upstream state of a tenant's stack once and cache it.
+
+    Walks the stack's units, collects the state files their dependency
+    blocks read and fetches each one once, in parallel. States fetched
+    within --ttl seconds come from the local cache; older ones are
+    revalidated with their ETag. Upstreams without state are left out,
+    so their blocks fall back to terragrunt's own read and mocks. The file
+    is only used with CONFIG_PATH set to this tenant file, unchanged, and
+    within --max-age seconds.
+
+    Examples:
+
+        \b
+        # Before a plan
+        select-stack.py deps prefetch apiary/acme/usw2/tenant.yaml -o /tmp/deps.json
+        TG_DEPENDENCY_OUTPUTS=/tmp/deps.json terragrunt stack run plan
+
+        \b
+        # Against a local S3 stand-in
+        select-stack.py deps prefetch tenant.yaml --state-dir ./state
+    """
+    config, stack = load_tenant_stack(config_file)
+    if stack_file:
+        stack = dag_mod.load_stack(stack_file)
+    try:
+        if state_dir:
+            store = depcache_mod.LocalStateStore(Path(state_dir))
+        else:
+            store = depcache_mod.S3StateStore(config.get("region"), endpoint_url)
+    except depcache_mod.StateStoreError as e:
+        raise click.ClickException(str(e))
+
+    cache = depcache_mod.OutputCache(Path(cache_dir) if cache_dir else None, ttl=ttl)
+    result = depcache_mod.prefetch(
+        config,
+        config_file,
+        stack,
+        store,
+        cache,
+        env=env,
+        workers=workers,
+        refresh=refresh,
+        max_age=max_age,
+    )
+    depcache_mod.write_outputs(result["document"], Path(output))
+
+    if output_json:
+        report = {k: v for k, v in result.items() if k != "document"}
+        click.echo(
+            json.dumps(dict(report, output=str(Path(output).absolute())), indent=2)
+        )
+    else:
+        display_prefetch(result, output)
+    if any(item["status"] == "error" for item in result["upstreams"]):
+        sys.exit(1)
+
+
+@deps.command("prune", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--max-age",
+    type=click.FloatRange(min=0),
+    default=depcache_mod.DEFAULT_MAX_AGE,
+    show_default=True,
+    help="Evict states not revalidated within this many seconds",
+)
+@click.option(
+    "--cache-dir", type=click.Path(file_okay=False), help="Output cache directory"
+)
+def deps_prune(max_age, cache_dir):
+    """Evict stale cached states and the outputs nothing references."""
+    cache = depcache_mod.OutputCache(Path(cache_dir) if cache_dir else None)
+    click.echo(json.dumps(cache.prune(max_age), indent=2))
+
+
+@deps.command("stats", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--cache-dir", type=click.Path(file_okay=False), help="Output cache directory"
+)
+@click.option(
+    "--ttl",
+    type=click.FloatRange(min=0),
+    default=depcache_mod.DEFAULT_TTL,
+    show_default=True,
+)
+def deps_stats(cache_dir, ttl):
+    """Show how many states and outputs the cache holds."""
+    cache = depcache_mod.OutputCache(Path(cache_dir) if cache_dir else None, ttl=ttl)
+    click.echo(json.dumps(cache.stats(), indent=2))
+
+
+def parse_size_option(ctx, param, value):
+    """Click callback turning sizes such as 20G into bytes."""
+    if value is None:
+        return None
+    try:
+        return tgcache_mod.parse_size(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def display_store_report(report: Dict, evicted: Optional[Dict]):
+    """Display a provider/module dedupe run using rich."""
+    table = Table(
+        title="Provider and Module Store", show_header=True, header_style="bold magenta"
+    )
+    table.add_column("Kind", style="cyan")
+    table.add_column("Files", justify="right")
+    table.add_column("Hit Rate", justify="right")
+    table.add_column("Size", justify="right")
+    for kind, counts in sorted(report["kinds"].items()):
+        table.add_row(
+            kind,
+            str(counts["files"]),
+            f"{counts['hits'] / counts['files']:.0%}",
+            tgcache_mod.format_size(counts["bytes"]),
+        )
+    console.print(table)
+    console.print(
+        f"{report['files']} files: {report['hits']} hits ({report['already_linked']} already "
+        f"linked), {report['misses']} stored, hit rate {report['hit_rate']:.0%}; "
+        f"[green]{tgcache_mod.format_size(report['saved_bytes'])} saved[/green] "
+        f"in {report['seconds']:.1f}s"
+    )
+    if report["cross_device"]:
+        console.print(
+            f"[yellow]⚠️  {report['cross_device']} files are on another filesystem "
+            f"than the store and were not linked[/yellow]"
+        )
+    if report["corrupt"]:
+        console.print(
+            f"[red]❌ {report['corrupt']} store objects had been modified in place and "
+            f"were replaced; units linked to them before hold the modified copy[/red]"
+        )
+    if evicted and evicted["evicted"]:
+        console.print(
+            f"Evicted {evicted['evicted']} objects, freed "
+            f"{tgcache_mod.format_size(evicted['freed_bytes'])}"
+        )
+
+
+@main.group("tg-store", context_settings=dict(help_option_names=["-h", "--help"]))
+def tg_store():
+    """
+    Share terraform providers, modules and sources across units.
+
+    `env` turns on terragrunt's provider cache in the store, so init
+    reuses provider binaries. `dedupe` replaces identical provider,
+    module and terraform.source files in every unit with reflinks, or
+    read-only hardlinks, to one copy in a content-addressed store
+    (STACK_SELECTOR_TG_STORE overrides its location). The store must be
+    on the same filesystem as the units.
+    """
+
+
+@tg_store.command("env", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--store", "store_path", type=click.Path(file_okay=False), help="Store directory"
+)
+def tg_store_env(store_path):
+    """
+    Print the environment turning on terragrunt's provider cache.
+
+    Examples:
+
+        \b
+        # Before running terragrunt in a workflow
+        select-stack.py tg-store env >> "$GITHUB_ENV"
+    """
+    env = tgcache_mod.provider_cache_env(Path(store_path) if store_path else None)
+    for key, value in env.items():
+        click.echo(f"{key}={value}")
+
+
+@tg_store.command("dedupe", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("roots", nargs=-1, type=click.Path(exists=True, file_okay=False))
+@click.option(
+    "--store", "store_path", type=click.Path(file_okay=False), help="Store directory"
+)
+@click.option(
+    "--max-size",
+    callback=parse_size_option,
+    help="Evict least recently used objects beyond this size afterwards (e.g. 20G)",
+)
+@click.option(
+    "-j",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=tgcache_mod.DEFAULT_WORKERS,
+    show_default=True,
+    help="Files hashed in parallel",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def tg_store_dedupe(roots, store_path, max_size, workers, output_json):
+    """
+    Link provider, module and source files under ROOTS to the store.
+
+    ROOTS (default: the current directory) are searched for .terraform
+    directories and terraform.source copies, in .terragrunt-cache,
+    .terragrunt-stack or anywhere else. Files under .terraform/providers,
+    .terraform/modules and the downloaded source already in the store
+    become links to it; new ones are added.
+
+    Examples:
+
+        \b
+        # After each job on a self-hosted runner
+        select-stack.py tg-store dedupe "$RUNNER_WORKSPACE" --max-size 40G
+    """
+    with tgcache_mod.ModuleStore(Path(store_path) if store_path else None) as store:
+        report = store.dedupe(roots or ["."], workers=workers)
+        evicted = store.evict(max_size) if max_size is not None else None
+    if output_json:
+        click.echo(json.dumps(dict(report, eviction=evicted), indent=2))
+    else:
+        display_store_report(report, evicted)
+
+
+@tg_store.command("evict", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--max-size",
+    required=True,
+    callback=parse_size_option,
+    help="Size the store is reduced to (e.g. 20G)",
+)
+@click.option(
+    "--store", "store_path", type=click.Path(file_okay=False), help="Store directory"
+)
+def tg_store_evict(max_size, store_path):
+    """Evict least recently used objects, unlinked ones first, down to --max-size."""
+    with tgcache_mod.ModuleStore(Path(store_path) if store_path else None) as store:
+        click.echo(json.dumps(store.evict(max_size), indent=2))
+
+
+@tg_store.command("stats", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--store", "store_path", type=click.Path(file_okay=False), help="Store directory"
+)
+def tg_store_stats(store_path):
+    """Show store size, links and hit rates over all dedupe runs."""
+    with tgcache_mod.ModuleStore(Path(store_path) if store_path else None) as store:
+        click.echo(json.dumps(store.stats(), indent=2))
+
+
+@main.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def daemon():
+    """
+    Run the selector as a daemon on a Unix socket.
+
+    The daemon keeps deployment types and tenant configs in memory and
+    answers resolve, validate and list requests in well under a
+    millisecond. Query it with scripts/stack-query.py or any client
+    speaking the one-line JSON protocol (see stacktools/selectorclient.py).
+    The socket defaults to $XDG_RUNTIME_DIR/honeyhive-stack-selector.sock;
+    STACK_SELECTOR_SOCKET overrides it.
+    """
+
+
+def _socket_option(func):
+    return click.option(
+        "--socket",
+        "socket_path",
+        type=click.Path(dir_okay=False),
+        help="Socket path (default: STACK_SELECTOR_SOCKET or the runtime dir)",
+    )(func)
+
+
+@daemon.command("serve", context_settings=dict(help_option_names=["-h", "--help"]))
+@_socket_option
+@click.option(
+    "--poll", is_flag=True, help="Poll the config directory instead of using inotify"
+)
+@click.option(
+    "--poll-interval",
+    type=click.FloatRange(min=0.05),
+    default=selectord_mod.DEFAULT_POLL_INTERVAL,
+    show_default=True,
+    help="Seconds between config directory polls",
+)
+@click.option("--no-cache", is_flag=True, help="Do not use the persistent config cache")
+def daemon_serve(socket_path, poll, poll_interval, no_cache):
+    """
+    Serve selector requests in the foreground until stopped.
+
+    Examples:
+
+        \b
+        select-stack.py daemon serve &
+        scripts/stack-query.py resolve apiary/acme/usw2/tenant.yaml
+    """
+    try:
+        state = selectord_mod.SelectorState(configs.CONFIG_DIR, use_cache=not no_cache)
+        server = selectord_mod.SelectorDaemon(
+            state,
+            Path(socket_path) if socket_path else None,
+            polling=poll,
+            poll_interval=poll_interval,
+            log=lambda message: click.echo(message, err=True),
+        )
+        server.serve_forever()
+    except (configs.ConfigError, RuntimeError, OSError) as e:
+        raise click.ClickException(str(e))
+
+
+@daemon.command("start", context_settings=dict(help_option_names=["-h", "--help"]))
+@_socket_option
+@click.option(
+    "--poll", is_flag=True, help="Poll the config directory instead of using inotify"
+)
+@click.option(
+    "--log-file",
+    type=click.Path(dir_okay=False),
+    help="Daemon log (default: next to the socket)",
+)
+@click.option(
+    "--wait",
+    type=click.FloatRange(min=0),
+    default=10.0,
+    show_default=True,
+    help="Seconds to wait for the daemon to answer",
+)
+def daemon_start(socket_path, poll, log_file, wait):
+    """Start the daemon in the background and wait until it answers."""
+    path = (
+        Path(socket_path) if socket_path else selectorclient_mod.default_socket_path()
+    )
+    try:
+        pid = selectorclient_mod.request("stats", path)["result"]["pid"]
+        console.print(
+            f"[yellow]Selector daemon already running (pid {pid}) on {path}[/yellow]"
+        )
+        return
+    except selectorclient_mod.DaemonUnavailable:
+        pass
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    log_path = Path(log_file) if log_file else path.with_suffix(".log")
+    argv = [
+        sys.executable,
+        str(SELECTOR_SCRIPT),
+        "daemon",
+        "serve",
+        "--socket",
+        str(path),
+    ]
+    if poll:
+        argv.append("--poll")
+    with open(log_path, "ab") as log:
+        process = subprocess.Popen(
+            argv,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            start_new_session=True,
+        )
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"Selector daemon exited, see {log_path}")
+        try:
+            selectorclient_mod.request("ping", path)
+        except selectorclient_mod.DaemonUnavailable:
+            time.sleep(0.05)
+            continue
+        console.print(
+            f"[green]✅ Selector daemon running (pid {process.pid}) on {path}[/green]"
+        )
+        return
+    raise click.ClickException(
+        f"Selector daemon did not answer within {wait}s, see {log_path}"
+    )
+
+
+@daemon.command("stop", context_settings=dict(help_option_names=["-h", "--help"]))
+@_socket_option
+def daemon_stop(socket_path):
+    """Ask the daemon to shut down."""
+    try:
+        selectorclient_mod.request(
+            "shutdown", Path(socket_path) if socket_path else None
+        )
+    except selectorclient_mod.DaemonUnavailable as e:
+        raise click.ClickException(str(e))
+    console.print("[green]Selector daemon stopped[/green]")
+
+
+@daemon.command("status", context_settings=dict(help_option_names=["-h", "--help"]))
+@_socket_option
+def daemon_status(socket_path):
+    """Print the daemon's counters as JSON; exits 1 if it is not running."""
+    try:
+        response = selectorclient_mod.request(
+            "stats", Path(socket_path) if socket_path else None
+        )
+    except selectorclient_mod.DaemonUnavailable as e:
+        click.echo(str(e), err=True)
+        sys.exit(1)
+    click.echo(json.dumps(response["result"], indent=2))
@@ -0,0 +1,571 @@
+"""
+Fleet inventory commands: index, query, history and snapshot.
+"""
+
+import json
+import sqlite3
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import click
+from rich.table import Table
+
+from stacktools import configs, timings
+from stacktools import batch as batch_mod
+from stacktools import dag as dag_mod
+from stacktools import history as history_mod
+from stacktools import snapshots as snapshots_mod
+from stacktools.cli.app import (
+    console,
+    describe_refresh,
+    display_eta,
+    load_tenant_stack,
+    main,
+    open_fleet_index,
+    parse_env_overrides,
+)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--db",
+    type=click.Path(dir_okay=False),
+    help="Index database (default: fleet-index.sqlite in the cache directory)",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def index(sources, pattern, db, output_json):
+    """
+    Build or refresh the SQLite fleet index from tenant configs.
+
+    SOURCES are tenant files, directory trees or glob patterns, as for
+    batch. Unchanged files (same mtime and size, or same content hash) are
+    not re-parsed, and tenants deleted under a directory source are
+    dropped from the index. Exits 1 if a named tenant file does not exist.
+    """
+    with open_fleet_index(db) as fleet:
+        stats = fleet.refresh(sources, pattern)
+        if output_json:
+            click.echo(json.dumps(dict(stats, **fleet.stats()), indent=2))
+        else:
+            console.print(f"[green]✅ {describe_refresh(stats)}[/green]")
+            console.print(f"[dim]{fleet.db_path}[/dim]")
+    if stats["missing"]:
+        click.echo(f"Error: {stats['missing']} tenant config(s) not found", err=True)
+        sys.exit(1)
+
+
+def display_fleet_query(records: List[Dict]):
+    """Display fleet query results using rich."""
+    table = Table(
+        title=f"🗂️  {len(records)} tenants",
+        show_header=True,
+        header_style="bold magenta",
+    )
+    table.add_column("Config", style="cyan", overflow="fold")
+    table.add_column("Org")
+    table.add_column("Env")
+    table.add_column("Region")
+    table.add_column("Deployment Type", style="green")
+    table.add_column("Account ID")
+    for record in records:
+        config_path = record["config_path"]
+        if record["errors"]:
+            config_path = f"[red]{config_path}[/red]"
+        table.add_row(
+            config_path,
+            record["org"] or "",
+            record["env"] or "",
+            record["sregion"] or "",
+            record["deployment_type"] or "",
+            record["account_id"] or "",
+        )
+    console.print(table)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--org", multiple=True, help="Organization (repeatable, values are OR-ed)"
+)
+@click.option("--env", "env", multiple=True, help="Environment (repeatable)")
+@click.option(
+    "--sregion", multiple=True, help="Short region code, e.g. usw2 (repeatable)"
+)
+@click.option("--region", multiple=True, help="AWS region (repeatable)")
+@click.option(
+    "--deployment-type", "-t", multiple=True, help="Deployment type (repeatable)"
+)
+@click.option("--account-id", multiple=True, help="AWS account ID (repeatable)")
+@click.option(
+    "--feature",
+    multiple=True,
+    help="Only tenants with this feature enabled (repeatable)",
+)
+@click.option(
+    "--without-feature",
+    multiple=True,
+    help="Only tenants with this feature disabled (repeatable)",
+)
+@click.option(
+    "--errors/--no-errors",
+    default=None,
+    help="Only tenants with (or without) configuration errors",
+)
+@click.option("--path", "path_glob", help="Glob on the absolute tenant config path")
+@click.option(
+    "--tenants",
+    multiple=True,
+    help="Refresh the index from these tenant sources before querying (repeatable)",
+)
+@click.option(
+    "--db",
+    type=click.Path(dir_okay=False),
+    help="Index database (default: fleet-index.sqlite in the cache directory)",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option(
+    "--paths-only", is_flag=True, help="Print only matching config paths, one per line"
+)
+def query(
+    org,
+    env,
+    sregion,
+    region,
+    deployment_type,
+    account_id,
+    feature,
+    without_feature,
+    errors,
+    path_glob,
+    tenants,
+    db,
+    output_json,
+    paths_only,
+):
+    """
+    Query the fleet index for a slice of tenants.
+
+    Filters are AND-ed; repeated values of one filter are OR-ed. Features
+    are the deployment type's defaults overridden by the tenant's own
+    features mapping. Run "select-stack.py index DIR" first, or pass
+    --tenants to refresh as part of the query.
+
+    Examples:
+
+        \b
+        # prod data_plane tenants in usw2 with karpenter enabled
+        select-stack.py query --env prod --sregion usw2 -t data_plane --feature karpenter
+
+        \b
+        # Rollout slice as a path list
+        select-stack.py query --org acme --org globex --paths-only
+    """
+    filters = {
+        "org": org,
+        "env": env,
+        "sregion": sregion,
+        "region": region,
+        "deployment_type": deployment_type,
+        "account_id": account_id,
+    }
+    with open_fleet_index(db) as fleet:
+        if tenants:
+            click.echo(describe_refresh(fleet.refresh(tenants)), err=True)
+        elif not fleet.stats()["tenants"]:
+            click.echo(
+                "Fleet index is empty; run 'select-stack.py index DIR' or pass --tenants",
+                err=True,
+            )
+        records = fleet.query(filters, feature, without_feature, errors, path_glob)
+
+    if paths_only:
+        for record in records:
+            click.echo(record["config_path"])
+    elif output_json:
+        click.echo(json.dumps(records, indent=2))
+    else:
+        display_fleet_query(records)
+
+
+@main.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def history():
+    """
+    Record terragrunt run times and predict ETAs from them.
+
+    Timings live in a local SQLite database
+    (STACK_SELECTOR_HISTORY_DB overrides its location). Once history
+    exists, the selector's output and --json include a predicted ETA and
+    critical path for the tenant's stack.
+    """
+
+
+@history.command("ingest", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("logs", nargs=-1, required=True, type=click.Path(exists=True))
+@click.option(
+    "--tenant",
+    help="Tenant the logs belong to (default: derived from --tenant-config)",
+)
+@click.option(
+    "--tenant-config",
+    type=click.Path(exists=True, dir_okay=False),
+    help="Tenant config the logs belong to",
+)
+@click.option(
+    "--command",
+    "command",
+    type=click.Choice(history_mod.COMMANDS),
+    help="Command the logs ran, when the log does not say",
+)
+@click.option("--db", type=click.Path(dir_okay=False), help="History database path")
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def history_ingest(logs, tenant, tenant_config, command, db, output_json):
+    """
+    Parse terragrunt logs into per-unit timing records.
+
+    LOGS are files or directories (*.log, *.txt). Handles single-unit
+    runs and "run --all" output, including --queue-include-external, in
+    the pretty, key=value and JSON log formats. A log that was already
+    ingested is skipped.
+
+    Examples:
+
+        \b
+        # After a CI apply
+        terragrunt run --all apply 2>&1 | tee apply.log
+        select-stack.py history ingest apply.log --tenant-config apiary/acme/usw2/tenant.yaml
+
+        \b
+        # Logs from the fleet runner
+        select-stack.py history ingest fleet-logs/ --command plan
+    """
+    if tenant is None and tenant_config:
+        tenant = configs.tenant_label(tenant_config)
+    results = []
+    with history_mod.RunHistory(Path(db) if db else None) as store:
+        for path in history_mod.iter_log_files(logs):
+            try:
+                results.append(store.ingest(path, tenant=tenant, command=command))
+            except OSError as e:
+                raise click.ClickException(f"Could not read {path}: {e}")
+
+    if output_json:
+        click.echo(json.dumps(results, indent=2))
+        return
+    for result in results:
+        if result["duplicate"]:
+            console.print(f"[dim]• {result['source']}: already ingested[/dim]")
+        elif result["records"]:
+            console.print(
+                f"[green]✅ {result['source']}[/green]: {result['records']} records "
+                f"({result['command'] or 'unknown command'}, {len(result['units'])} units)"
+            )
+        else:
+            console.print(
+                f"[yellow]⚠️  {result['source']}: no unit timings found[/yellow]"
+            )
+
+
+@history.command("durations", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--command",
+    "command",
+    type=click.Choice(history_mod.COMMANDS),
+    default="apply",
+    show_default=True,
+)
+@click.option(
+    "--stat", type=click.Choice(history_mod.STATS), default="median", show_default=True
+)
+@click.option(
+    "--window",
+    type=click.IntRange(min=1),
+    default=history_mod.DEFAULT_WINDOW,
+    show_default=True,
+    help="Most recent runs per unit to use",
+)
+@click.option("--no-init", is_flag=True, help="Do not add init time to each unit")
+@click.option("--db", type=click.Path(dir_okay=False), help="History database path")
+def history_durations(command, stat, window, no_init, db):
+    """
+    Print a durations JSON file for dag, locks and shards --durations.
+
+    Output is {"units": {unit: seconds}, "tenants": {tenant: seconds}},
+    where a tenant's seconds are the wall time of its recent runs.
+    """
+    with history_mod.RunHistory(Path(db) if db else None) as store:
+        units = history_mod.unit_durations(
+            store, command, stat=stat, window=window, with_init=not no_init
+        )
+        tenants = store.tenant_durations(command, window=window)
+    output = {
+        "units": {unit: round(seconds, 3) for unit, seconds in units.items()},
+        "tenants": {tenant: round(seconds, 3) for tenant, seconds in tenants.items()},
+    }
+    click.echo(json.dumps(output, indent=2, sort_keys=True))
+
+
+@history.command("eta", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("target", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--command",
+    "commands",
+    type=click.Choice(history_mod.COMMANDS),
+    multiple=True,
+    help="Commands to predict (default: plan and apply)",
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option("--db", type=click.Path(dir_okay=False), help="History database path")
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def history_eta(target, commands, env, db, output_json):
+    """
+    Predict a run's ETA and critical path from recorded timings.
+
+    TARGET is a tenant config or a *.stack.yaml file. Tenant-specific
+    timings are preferred over fleet-wide ones.
+    """
+    tenant = None
+    if target.endswith(".stack.yaml"):
+        stack = dag_mod.load_stack(target)
+    else:
+        _, stack = load_tenant_stack(target)
+        tenant = configs.tenant_label(target)
+
+    predictions = {}
+    with history_mod.RunHistory(Path(db) if db else None) as store:
+        for command in commands or ("plan", "apply"):
+            durations = history_mod.unit_durations(store, command, tenant=tenant)
+            prediction = history_mod.predict(stack, durations, env)
+            if prediction:
+                predictions[command] = prediction
+
+    if output_json:
+        click.echo(
+            json.dumps({"stack": stack.relative_path(), "eta": predictions}, indent=2)
+        )
+    elif predictions:
+        display_eta(predictions)
+    else:
+        console.print("[yellow]No run history for this stack's units yet[/yellow]")
+
+
+@history.command("stats", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--db", type=click.Path(dir_okay=False), help="History database path")
+def history_stats(db):
+    """Show how many runs and records the history holds."""
+    with history_mod.RunHistory(Path(db) if db else None) as store:
+        click.echo(json.dumps(store.stats(), indent=2))
+
+
+@main.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def snapshot():
+    """
+    Snapshot the fleet's effective configs and diff snapshots.
+
+    A snapshot is a Merkle tree over the config repo's directories, each
+    tenant's effective config and every mapping inside it, stored by hash
+    so snapshots share unchanged subtrees. Diffs only descend where hashes
+    differ.
+
+    Examples:
+
+        \b
+        # Which tenants does this branch change, and how?
+        select-stack.py snapshot take base apiary/ --ref origin/main
+        select-stack.py snapshot take head apiary/
+        select-stack.py snapshot diff base head
+
+        \b
+        # Plan only tenants whose cluster or subnet config changed
+        select-stack.py snapshot diff base head --key cluster_config \\
+            --key subnet_config --paths-only | xargs select-stack.py run plan
+    """
+
+
+def _snapshot_db_option(func):
+    return click.option(
+        "--db",
+        type=click.Path(dir_okay=False),
+        help=f"Snapshot database (env: {snapshots_mod.DB_ENV})",
+    )(func)
+
+
+def open_snapshot_store(db: Optional[str]) -> "snapshots_mod.SnapshotStore":
+    try:
+        return snapshots_mod.SnapshotStore(Path(db) if db else None)
+    except sqlite3.Error as e:
+        raise click.ClickException(f"Could not open snapshot store: {e}")
+
+
+@snapshot.command("take", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("name")
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--ref", help="Read the sources at this git commit instead of the working tree"
+)
+@click.option(
+    "--repo-root",
+    type=click.Path(exists=True, file_okay=False),
+    help="Directory tenant paths are relative to (default: the sources' git toplevel)",
+)
+@_snapshot_db_option
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def snapshot_take(name, sources, pattern, ref, repo_root, db, output_json):
+    """
+    Snapshot the effective configs of the tenants in SOURCES as NAME.
+
+    Tenants are resolved through their layers, as by "effective". With
+    --ref, the tenant files, their layers and the deployment-type configs
+    are read from that commit. Taking a snapshot under an existing name
+    replaces it.
+    """
+    with open_snapshot_store(db) as store:
+        try:
+            with timings.span("snapshot"):
+                result = snapshots_mod.take_snapshot(
+                    store,
+                    name,
+                    sources,
+                    pattern,
+                    ref=ref,
+                    repo_root=Path(repo_root) if repo_root else None,
+                )
+        except snapshots_mod.SnapshotError as e:
+            raise click.ClickException(str(e))
+    if output_json:
+        click.echo(json.dumps(result, indent=2))
+    else:
+        at = f" at {result['ref'][:12]}" if result["ref"] else ""
+        console.print(
+            f"[green]✅ Snapshot {name}{at}: {result['tenants']} tenants "
+            f"({result['errors']} unresolved), {result['written']} of "
+            f"{result['nodes']} nodes new[/green]"
+        )
+        console.print(f"[dim]{result['root_hash']}[/dim]")
+
+
+def display_snapshot_diff(report: Dict):
+    """Display a snapshot diff using rich."""
+    summary = report["summary"]
+    console.print(
+        f"[bold]{report['old']['name']} → {report['new']['name']}[/bold]: "
+        f"{summary['changed']} changed, {summary['added']} added, "
+        f"{summary['removed']} removed, {summary['unchanged']} unchanged"
+    )
+    for path in report["added"]:
+        console.print(f"[green]+ {path}[/green]")
+    for path in report["removed"]:
+        console.print(f"[red]- {path}[/red]")
+    for path, entry in report["changed"].items():
+        console.print(f"[yellow]~ {path}[/yellow]")
+        if "error" in entry:
+            error = entry["error"]
+            console.print(f"    [red]error: {error['old']} → {error['new']}[/red]")
+        for change in entry["changes"]:
+            if change["op"] == "added":
+                detail = f"[green]+ {json.dumps(change['new'])}[/green]"
+            elif change["op"] == "removed":
+                detail = f"[red]- {json.dumps(change['old'])}[/red]"
+            else:
+                detail = f"{json.dumps(change['old'])} → {json.dumps(change['new'])}"
+            console.print(
+                f"    [cyan]{change['path']}[/cyan]: {detail}", highlight=False
+            )
+
+
+@snapshot.command("diff", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("old")
+@click.argument("new")
+@click.option(
+    "--key",
+    "keys",
+    multiple=True,
+    help="Only tenants changed under this top-level key, e.g. cluster_config (repeatable)",
+)
+@click.option(
+    "--paths-only",
+    is_flag=True,
+    help="Print the config paths of added and changed tenants, one per line",
+)
+@click.option(
+    "--exit-code", is_flag=True, help="Exit with status 1 when anything changed"
+)
+@_snapshot_db_option
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def snapshot_diff(old, new, keys, paths_only, exit_code, db, output_json):
+    """
+    Show which tenants' effective configs differ between OLD and NEW.
+
+    Each changed tenant lists its changes by dotted key path
+    (cluster_config.min_nodes) with the old and new values, plus the
+    top-level keys they touch. Lists are compared as whole values.
+    """
+    with open_snapshot_store(db) as store:
+        try:
+            with timings.span("diff"):
+                report = snapshots_mod.diff_snapshots(store, old, new, keys)
+        except snapshots_mod.SnapshotError as e:
+            raise click.ClickException(str(e))
+
+    if paths_only:
+        root = Path(report["new"]["repo_root"])
+        for path in report["added"] + list(report["changed"]):
+            click.echo(root / path)
+    elif output_json:
+        click.echo(json.dumps(report, indent=2, default=str))
+    else:
+        display_snapshot_diff(report)
+    summary = report["summary"]
+    if exit_code and (summary["added"] or summary["removed"] or summary["changed"]):
+        sys.exit(1)
+
+
+@snapshot.command("list", context_settings=dict(help_option_names=["-h", "--help"]))
+@_snapshot_db_option
+def snapshot_list(db):
+    """List stored snapshots."""
+    with open_snapshot_store(db) as store:
+        click.echo(json.dumps(store.snapshots(), indent=2))
+
+
+@snapshot.command("delete", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("names", nargs=-1, required=True)
+@_snapshot_db_option
+def snapshot_delete(names, db):
+    """Delete snapshots and the nodes no other snapshot shares."""
+    with open_snapshot_store(db) as store:
+        try:
+            click.echo(json.dumps(store.delete(names), indent=2))
+        except snapshots_mod.SnapshotError as e:
+            raise click.ClickException(str(e))
@@ -0,0 +1,581 @@
+"""
+Network commands: cidrs and cleanup-nodes.
+"""
+
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import click
+from rich.table import Table
+
+from stacktools import configs, timings
+from stacktools.cache import ConfigCache
+from stacktools import batch as batch_mod
+from stacktools import cidrs as cidrs_mod
+from stacktools import fleetindex as fleetindex_mod
+from stacktools import layers as layers_mod
+from stacktools import nodecleanup as nodecleanup_mod
+from stacktools.cli.app import console, describe_refresh, main, open_fleet_index
+
+
+def display_cleanup(result: Dict):
+    """Display a Karpenter node cleanup using rich."""
+    dry_run = any(report.get("dry_run") for report in result["targets"])
+    table = Table(
+        title="Karpenter Cleanup" + (" (dry run)" if dry_run else ""),
+        show_header=True,
+        header_style="bold magenta",
+    )
+    table.add_column("Cluster", style="cyan")
+    table.add_column("Region")
+    table.add_column("Status")
+    table.add_column("Instances", justify="right")
+    table.add_column("ENIs", justify="right")
+    table.add_column("Launch Templates", justify="right")
+    table.add_column("Polls", justify="right")
+    table.add_column("Time", justify="right")
+    styles = {"clean": "green", "cleaned": "green", "dry-run": "cyan"}
+    for report in result["targets"]:
+        style = styles.get(report["status"], "red")
+        found = report.get("found", {})
+        if report["dry_run"]:
+            counts = [
+                str(len(found.get(kind, [])))
+                for kind in ("instances", "network_interfaces", "launch_templates")
+            ]
+        else:
+            deleted = report.get("deleted", {})
+            counts = [
+                f"{report.get('terminated', 0)}/{len(found.get('instances', []))}",
+                f"{deleted.get('network_interfaces', 0)}/{len(found.get('network_interfaces', []))}",
+                f"{deleted.get('launch_templates', 0)}/{len(found.get('launch_templates', []))}",
+            ]
+        table.add_row(
+            report["cluster"],
+            report["region"],
+            f"[{style}]{report['status']}[/{style}]",
+            *counts,
+            str(report.get("polls", 0)),
+            f"{report.get('seconds', 0):.1f}s",
+        )
+    console.print(table)
+    for report in result["targets"]:
+        if report.get("remaining"):
+            console.print(
+                f"[red]{report['cluster']} ({report['region']}): {len(report['remaining'])} "
+                f"instances still terminating[/red]"
+            )
+        for error in report.get("errors", []):
+            console.print(
+                f"[red]{report['cluster']} ({report['region']}): {error}[/red]"
+            )
+    summary = result["summary"]
+    instances = f"{summary['found']} instances found"
+    if not dry_run:
+        instances += f", {summary['terminated']} terminated"
+    console.print(
+        f"{summary['targets']} targets: {instances}, {summary['api_calls']} EC2 calls"
+    )
+
+
+@main.command(
+    "cleanup-nodes", context_settings=dict(help_option_names=["-h", "--help"])
+)
+@click.argument("targets", nargs=-1, required=True)
+@click.option(
+    "-r",
+    "--region",
+    default=nodecleanup_mod.DEFAULT_REGION,
+    show_default=True,
+    help="Region of targets given without @REGION",
+)
+@click.option(
+    "--dry-run", is_flag=True, help="List what would be removed without removing it"
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(1, nodecleanup_mod.MAX_BATCH_SIZE),
+    default=nodecleanup_mod.DEFAULT_BATCH_SIZE,
+    show_default=True,
+    help="Instances per terminate call",
+)
+@click.option(
+    "--page-size",
+    type=click.IntRange(min=1),
+    default=nodecleanup_mod.DEFAULT_PAGE_SIZE,
+    show_default=True,
+    help="Results per describe call (clamped to each call's limit)",
+)
+@click.option(
+    "--timeout",
+    type=click.FloatRange(min=0),
+    default=nodecleanup_mod.DEFAULT_TIMEOUT,
+    show_default=True,
+    help="Seconds to wait for instances to terminate",
+)
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1),
+    default=nodecleanup_mod.DEFAULT_JOBS,
+    show_default=True,
+    help="Targets cleaned in parallel",
+)
+@click.option(
+    "--endpoint-url", help="EC2-compatible endpoint (e.g. a local moto server)"
+)
+@click.option(
+    "--ec2-state",
+    type=click.Path(dir_okay=False),
+    help="Use a JSON file standing in for EC2 (tests) instead of AWS",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def cleanup_nodes(
+    targets,
+    region,
+    dry_run,
+    batch_size,
+    page_size,
+    timeout,
+    jobs,
+    endpoint_url,
+    ec2_state,
+    output_json,
+):
+    """
+    Remove Karpenter-provisioned EC2 resources before a cluster destroy.
+
+    TARGETS are cluster names, optionally as CLUSTER@REGION. For each one
+    the cluster's Karpenter instances are terminated in batches and polled
+    with backoff until gone, then the network interfaces they left
+    available and Karpenter's launch templates are deleted. Targets are
+    cleaned in parallel. Exits 1 when a target fails or times out.
+
+    Examples:
+
+        \b
+        # Before destroying a cluster
+        select-stack.py cleanup-nodes acme-prod-usw2 --region us-west-2
+
+        \b
+        # Several clusters and regions, listing only
+        select-stack.py cleanup-nodes acme@us-west-2 acme@eu-west-1 --dry-run
+
+        \b
+        # Against the local stand-in
+        select-stack.py cleanup-nodes acme --ec2-state ./ec2.json
+    """
+    try:
+        parsed = [nodecleanup_mod.parse_target(target, region) for target in targets]
+        world = nodecleanup_mod.LocalEc2(Path(ec2_state)) if ec2_state else None
+        factory = world.client if world else nodecleanup_mod.boto3_clients(endpoint_url)
+    except nodecleanup_mod.CleanupError as e:
+        raise click.ClickException(str(e))
+
+    options = {}
+    if world:
+        options.update(sleep=world.sleep, clock=world.monotonic)
+    result = nodecleanup_mod.cleanup(
+        parsed,
+        factory,
+        dry_run=dry_run,
+        jobs=jobs,
+        batch_size=batch_size,
+        page_size=page_size,
+        timeout=timeout,
+        **options,
+    )
+    if world:
+        world.save()
+
+    if output_json:
+        click.echo(json.dumps(result, indent=2))
+    else:
+        display_cleanup(result)
+    if any(report["status"] in ("error", "timeout") for report in result["targets"]):
+        sys.exit(1)
+
+
+@main.group(context_settings=dict(help_option_names=["-h", "--help"]))
+def cidrs():
+    """
+    Check and allocate tenant VPC CIDRs across the fleet.
+
+    Tenants come from the fleet index (see "select-stack.py index"); pass
+    --tenants to refresh it first. Overlaps are found with one pass over
+    the sorted CIDRs, so checking tens of thousands of tenants takes about
+    as long as reading them from the index.
+    """
+
+
+def _cidr_scope_options(func):
+    options = [
+        click.option(
+            "--tenants",
+            multiple=True,
+            help="Refresh the fleet index from these tenant sources first (repeatable)",
+        ),
+        click.option(
+            "--pattern",
+            default=batch_mod.DEFAULT_PATTERN,
+            show_default=True,
+            help="Tenant file name to match when walking --tenants directories",
+        ),
+        click.option(
+            "--db", type=click.Path(dir_okay=False), help="Fleet index database"
+        ),
+        click.option(
+            "--org", multiple=True, help="Only this organization (repeatable)"
+        ),
+        click.option(
+            "--env", "env", multiple=True, help="Only this environment (repeatable)"
+        ),
+        click.option(
+            "--sregion", multiple=True, help="Only this short region (repeatable)"
+        ),
+        click.option(
+            "--feature",
+            multiple=True,
+            help="Only tenants with this feature enabled, e.g. twingate (repeatable)",
+        ),
+        click.option(
+            "--pool",
+            "pools",
+            multiple=True,
+            default=cidrs_mod.DEFAULT_POOLS,
+            show_default=True,
+            help="Address pool VPC CIDRs are allocated from (repeatable)",
+        ),
+        click.option(
+            "--reserve",
+            multiple=True,
+            help="CIDR in use outside the fleet, e.g. an on-prem network (repeatable)",
+        ),
+    ]
+    for option in reversed(options):
+        func = option(func)
+    return func
+
+
+def load_cidr_scope(
+    tenants, pattern, db, org, env, sregion, feature, with_config=False
+) -> Tuple[List[Dict], Dict[str, Dict]]:
+    """Tenants in scope of a cidrs command, and the deployment-type configs."""
+    filters = {"org": org, "env": env, "sregion": sregion}
+    with open_fleet_index(db) as fleet:
+        if tenants:
+            click.echo(describe_refresh(fleet.refresh(tenants, pattern)), err=True)
+        elif not fleet.stats()["tenants"]:
+            raise click.ClickException(
+                "Fleet index is empty; run 'select-stack.py index DIR' or pass --tenants"
+            )
+        return (
+            fleet.query(filters, feature, with_config=with_config),
+            fleet.deployment_stacks,
+        )
+
+
+def check_cidr_args(pools, reserve):
+    for cidr in tuple(pools) + tuple(reserve):
+        try:
+            cidrs_mod.parse_cidr(cidr)
+        except cidrs_mod.CidrError as e:
+            raise click.UsageError(str(e))
+
+
+def display_cidr_check(report: Dict):
+    """Display a fleet CIDR check using rich."""
+    console.print(
+        f"🌐 {report['indexed']} VPC CIDRs checked "
+        f"({report['without_cidr']} tenants without vpc_cidr)"
+    )
+    for group in report["overlaps"]:
+        scope = f" [dim]({group['group']})[/dim]" if group["group"] else ""
+        console.print(f"[red]❌ Overlap under {group['cidr']}{scope}[/red]")
+        for block in group["blocks"]:
+            console.print(f"   [red]• {block['cidr']}[/red]  {block['owner']}")
+    for conflict in report["reserved_conflicts"]:
+        console.print(f"[red]❌ Reserved {conflict['cidr']} is in use[/red]")
+        for block in conflict["blocks"]:
+            console.print(f"   [red]• {block['cidr']}[/red]  {block['owner']}")
+    for invalid in report["invalid"]:
+        console.print(f"[red]❌ {invalid['owner']}: {invalid['error']}[/red]")
+    for error in report.get("layout_errors", []):
+        console.print(f"[red]❌ {error['config_path']}: {error['error']}[/red]")
+
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Pool", style="cyan")
+    table.add_column("VPCs", justify="right")
+    table.add_column("Used", justify="right")
+    table.add_column("Free", justify="right")
+    table.add_column("Largest Free", justify="right", style="green")
+    for pool in report["pools"]:
+        total = pool["used"] + pool["free"]
+        table.add_row(
+            pool["pool"],
+            str(pool["blocks"]),
+            f"{pool['used'] / total:.1%}",
+            f"{pool['free']:,}",
+            pool["largest_free"] or "-",
+        )
+    console.print(table)
+    if report["ok"]:
+        console.print("[green]✅ No overlapping VPC CIDRs[/green]")
+
+
+@cidrs.command("check", context_settings=dict(help_option_names=["-h", "--help"]))
+@_cidr_scope_options
+@click.option(
+    "--group-by",
+    type=click.Choice(fleetindex_mod.TENANT_FIELDS),
+    help="Only tenants with the same value of this field can overlap (e.g. account_id)",
+)
+@click.option(
+    "--layouts",
+    is_flag=True,
+    help="Also lay out every tenant's subnets and report the ones that do not fit",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def cidrs_check(
+    tenants,
+    pattern,
+    db,
+    org,
+    env,
+    sregion,
+    feature,
+    pools,
+    reserve,
+    group_by,
+    layouts,
+    output_json,
+):
+    """
+    Find overlapping VPC CIDRs and report free space per pool.
+
+    Overlaps are grouped under the outermost CIDR involved. By default any
+    two tenants in scope must not overlap; use the filters to check one
+    connectivity domain (--feature twingate), or --group-by when only
+    tenants sharing an account or region are ever connected. Exits with
+    status 1 on overlaps, invalid CIDRs, reserved ranges in use, or (with
+    --layouts) subnets that do not fit.
+
+    Examples:
+
+        \b
+        select-stack.py cidrs check --tenants apiary/ --reserve 10.0.0.0/16
+        select-stack.py cidrs check --group-by account_id --layouts --json
+    """
+    check_cidr_args(pools, reserve)
+    records, deployment_stacks = load_cidr_scope(
+        tenants, pattern, db, org, env, sregion, feature, with_config=layouts
+    )
+    with timings.span("index"):
+        groups = {r["config_path"]: r[group_by] for r in records} if group_by else None
+        index = cidrs_mod.CidrIndex(
+            ((r["vpc_cidr"], r["config_path"]) for r in records if r["vpc_cidr"]),
+            group=groups.get if groups else None,
+        )
+    with timings.span("overlaps"):
+        report = {
+            "tenants": len(records),
+            "indexed": len(index),
+            "without_cidr": sum(1 for r in records if not r["vpc_cidr"]),
+            "invalid": index.invalid,
+            "overlaps": index.overlaps(),
+            "reserved_conflicts": [
+                {"cidr": cidr, "blocks": blocks}
+                for cidr in reserve
+                for blocks in [index.conflicts(cidr)]
+                if blocks
+            ],
+            "pools": index.usage(pools),
+        }
+    if layouts:
+        resolver = layers_mod.LayerResolver(deployment_stacks)
+        errors = []
+        with timings.span("layouts"):
+            for record in records:
+                if not record["vpc_cidr"] or record["config"] is None:
+                    continue
+                try:
+                    document = resolver.resolve(record["config_path"], record["config"])
+                except configs.ConfigError as e:
+                    errors.append(
+                        {"config_path": record["config_path"], "error": str(e)}
+                    )
+                    continue
+                layout = cidrs_mod.tenant_layout(document["config"])
+                if "error" in layout:
+                    errors.append(
+                        {"config_path": record["config_path"], "error": layout["error"]}
+                    )
+        report["layout_errors"] = errors
+    report["ok"] = not (
+        report["invalid"]
+        or report["overlaps"]
+        or report["reserved_conflicts"]
+        or report.get("layout_errors")
+    )
+
+    if output_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        display_cidr_check(report)
+    if not report["ok"]:
+        sys.exit(1)
+
+
+@cidrs.command("next", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("prefix")
+@_cidr_scope_options
+@click.option(
+    "--count",
+    "-n",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="How many free blocks to suggest",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def cidrs_next(
+    prefix,
+    tenants,
+    pattern,
+    db,
+    org,
+    env,
+    sregion,
+    feature,
+    pools,
+    reserve,
+    count,
+    output_json,
+):
+    """
+    Suggest the next free VPC CIDR of size PREFIX (e.g. /16).
+
+    Blocks are the lowest aligned ones in the first pool with room that do
+    not overlap any tenant in scope or any --reserve range. Without
+    filters every tenant in the index counts as in use.
+
+    Examples:
+
+        \b
+        select-stack.py cidrs next /16
+        select-stack.py cidrs next 20 --pool 10.128.0.0/9 -n 3
+    """
+    check_cidr_args(pools, reserve)
+    try:
+        prefixlen = cidrs_mod.parse_prefix(prefix)
+    except cidrs_mod.CidrError as e:
+        raise click.UsageError(str(e))
+    records, _ = load_cidr_scope(tenants, pattern, db, org, env, sregion, feature)
+    entries = [(r["vpc_cidr"], r["config_path"]) for r in records if r["vpc_cidr"]]
+    entries.extend((cidr, "reserved") for cidr in reserve)
+    index = cidrs_mod.CidrIndex(entries)
+    blocks = index.next_free(prefixlen, pools, count)
+    if not blocks:
+        raise click.ClickException(f"No free /{prefixlen} in {', '.join(pools)}")
+
+    if output_json:
+        click.echo(json.dumps({"prefix": prefixlen, "blocks": blocks}, indent=2))
+    else:
+        for block in blocks:
+            click.echo(block)
+    if len(blocks) < count:
+        click.echo(f"Only {len(blocks)} free /{prefixlen} blocks left", err=True)
+
+
+def display_subnet_layout(source: str, layout: Dict):
+    """Display one tenant's subnet layout using rich."""
+    if "error" in layout:
+        console.print(f"[red]❌ {source}: {layout['error']}[/red]")
+        return
+    console.print(f"[bold cyan]{source}[/bold cyan] ({layout['vpc_cidr']})")
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Subnet", style="cyan")
+    table.add_column("CIDR", style="green")
+    for kind in ("private", "public"):
+        for number, cidr in enumerate(layout[kind], 1):
+            table.add_row(f"{kind} {number}", cidr)
+    console.print(table)
+    settings = ", ".join(
+        f"{name}={layout[name]} ({layout['source'][name]})"
+        for name in cidrs_mod.SUBNET_SETTINGS
+    )
+    console.print(f"[dim]{settings}[/dim]")
+    console.print(f"[dim]{layout['free']:,} addresses unallocated[/dim]")
+    for warning in layout["warnings"]:
+        console.print(f"[yellow]⚠️  {warning}[/yellow]")
+
+
+@cidrs.command("layout", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option("--vpc-cidr", help="Lay out this VPC CIDR instead of the tenant's own")
+@click.option(
+    "--json",
+    "output_json",
+    is_flag=True,
+    help="One JSON layout per line (for automation)",
+)
+@click.option("--no-cache", is_flag=True, help="Disable the parsed config cache")
+def cidrs_layout(sources, pattern, vpc_cidr, output_json, no_cache):
+    """
+    Show the subnets each tenant's VPC is split into.
+
+    Tenants are resolved through their layers (see "effective"). Subnet
+    count and newbits are what units/substrate/vpc passes to the vpc
+    module: network_config, else the unit's defaults (3 subnets, newbits
+    7 and 3). subnet_config, subnet_count and subnet_*_cidrs are not read
+    by the unit and only produce warnings when they disagree. Subnets are
+    packed largest first from the start of the VPC.
+
+    Examples:
+
+        \b
+        select-stack.py cidrs layout apiary/acme/usw2/tenant.yaml
+        select-stack.py cidrs layout new-tenant.yaml --vpc-cidr 10.43.0.0/16
+    """
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR,
+            cache=ConfigCache(configs.CONFIG_DIR, enabled=not no_cache),
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    resolver = layers_mod.LayerResolver(deployment_stacks)
+    total = failed = 0
+    for config_file in batch_mod.iter_tenant_files(sources, pattern):
+        total += 1
+        source = str(Path(config_file).absolute())
+        try:
+            config = resolver.resolve(config_file)["config"]
+        except configs.ConfigError as e:
+            layout = {"vpc_cidr": None, "error": str(e)}
+        else:
+            if vpc_cidr:
+                config = dict(config, vpc_cidr=vpc_cidr)
+            layout = cidrs_mod.tenant_layout(config)
+        failed += "error" in layout
+        if output_json:
+            click.echo(json.dumps(dict(layout, config_path=source)))
+        else:
+            display_subnet_layout(config_file, layout)
+    if failed or not total:
+        sys.exit(1)
@@ -0,0 +1,1140 @@
+"""
+Plan-time commands: dag, impact, plan-summary, locks, run, shards and
+plan-memo.
+"""
+
+import json
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import click
+from rich.panel import Panel
+from rich.table import Table
+
+from stacktools import configs
+from stacktools.cache import ConfigCache
+from stacktools import batch as batch_mod
+from stacktools import dag as dag_mod
+from stacktools import fleetrun as fleetrun_mod
+from stacktools import impact as impact_mod
+from stacktools import planmemo as planmemo_mod
+from stacktools import plansummary as plansummary_mod
+from stacktools import shards as shards_mod
+from stacktools import statelocks as statelocks_mod
+from stacktools import terragrunt as terragrunt_mod
+from stacktools.cli.app import console, load_durations, main, parse_env_overrides
+
+
+def display_dag_report(report: Dict):
+    """Display a stack DAG analysis using rich."""
+    unit_label = "s" if report["duration_source"] == "durations" else " units"
+    configured = report["configured_parallelism"]
+    recommended = report["recommended_parallelism"]
+
+    summary = [
+        f"Units: [bold]{report['active_units']}[/bold] active of {report['units']}",
+        f"Waves: [bold]{len(report['waves'])}[/bold] (widest: {report['max_wave_width']})",
+        f"Critical path: [bold]{report['critical_path']['length']:g}{unit_label}[/bold]"
+        f" of {report['total_work']:g}{unit_label} total work",
+        f"Parallelism: configured [yellow]{configured}[/yellow], "
+        f"recommended [bold green]{recommended}[/bold green]",
+    ]
+    if report["makespan_at_configured_parallelism"] is not None:
+        summary.append(
+            f"Makespan at configured parallelism: "
+            f"{report['makespan_at_configured_parallelism']:g}{unit_label}"
+        )
+    console.print(
+        Panel(
+            "\n".join(summary),
+            title=f"🕸️  {report['name']} ([dim]{report['stack']}[/dim])",
+            border_style="cyan",
+            expand=False,
+        )
+    )
+
+    critical = set(report["critical_path"]["units"])
+    table = Table(
+        title="Execution Waves", show_header=True, header_style="bold magenta"
+    )
+    table.add_column("Wave", justify="right", style="cyan", no_wrap=True)
+    table.add_column("Units", style="white")
+    for number, wave in enumerate(report["waves"], start=1):
+        units = [f"[bold red]{u}[/bold red]" if u in critical else u for u in wave]
+        table.add_row(str(number), "\n".join(units))
+    console.print(table)
+    console.print("[dim]Units on the critical path are shown in red[/dim]")
+
+    for cycle in report["cycles"]:
+        console.print(f"[red]❌ Cycle: {' → '.join(cycle)}[/red]")
+    for item in report["dangling_dependencies"]:
+        console.print(
+            f"[red]❌ {item['unit']} depends on {item['dependency']}, "
+            f"which is not a unit of this stack[/red]"
+        )
+    for item in report["collapsed_edges"]:
+        bridged = ", ".join(item["bridged_to"]) or "nothing new"
+        console.print(
+            f"[yellow]⚠️  {item['unit']} → {item['skipped_dependency']} collapsed "
+            f"(skipped), now waits on: {bridged}[/yellow]"
+        )
+    for toggle in report["skip_toggles"]:
+        if toggle["dependents"] and not toggle["skipped"]:
+            console.print(
+                f"[dim]• Skipping {toggle['unit']} ({toggle['expression']}) would "
+                f"collapse edges from: {', '.join(toggle['dependents'])}[/dim]"
+            )
+    for item in report["unevaluated_skips"]:
+        console.print(
+            f"[yellow]⚠️  Could not evaluate skip for {item['unit']}: "
+            f"{item['expression']}[/yellow]"
+        )
+    if report["missing_unit_dirs"]:
+        console.print(
+            f"[yellow]⚠️  {len(report['missing_unit_dirs'])} unit directories "
+            f"not found in repo: {', '.join(report['missing_unit_dirs'])}[/yellow]"
+        )
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("stack_files", nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--durations",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file mapping unit path or name to duration in seconds",
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def dag(stack_files, durations, env, output_json):
+    """
+    Analyze stack unit DAGs: waves, critical path and parallelism.
+
+    STACK_FILES default to every *.stack.yaml under stacks/. Skip
+    expressions are evaluated with their defaults unless overridden with
+    --env (e.g. --env SKIP_KARPENTER=true). Exits 1 if any stack has a
+    dependency cycle or depends on a path that is not one of its units.
+    """
+    paths = [Path(p) for p in stack_files] or dag_mod.stack_files()
+    unit_durations = dag_mod.split_durations(load_durations(durations))[0]
+    reports = [
+        dag_mod.analyze_stack(dag_mod.load_stack(p), durations=unit_durations, env=env)
+        for p in paths
+    ]
+
+    if output_json:
+        click.echo(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            display_dag_report(report)
+            console.print()
+
+    if any(dag_mod.has_errors(r) for r in reports):
+        sys.exit(1)
+
+
+def display_impact_report(report: Dict):
+    """Display a change impact analysis using rich."""
+    if report["global_changes"]:
+        console.print(
+            f"[yellow]⚠️  Global changes, every stack is affected: "
+            f"{', '.join(report['global_changes'])}[/yellow]"
+        )
+
+    if report["units"]:
+        table = Table(
+            title="Affected Units", show_header=True, header_style="bold magenta"
+        )
+        table.add_column("Unit", style="cyan", no_wrap=True)
+        table.add_column("Reason", style="white")
+        for unit, reasons in report["units"].items():
+            table.add_row(unit, "\n".join(reasons))
+        console.print(table)
+
+    if report["stacks"]:
+        table = Table(
+            title="Affected Stacks", show_header=True, header_style="bold magenta"
+        )
+        table.add_column("Stack", style="cyan", no_wrap=True)
+        table.add_column("Units", style="white")
+        for stack, info in report["stacks"].items():
+            units = (
+                "[bold]all units[/bold]"
+                if info["all_units"]
+                else "\n".join(info["units"])
+            )
+            table.add_row(stack, units)
+        console.print(table)
+    else:
+        console.print("[green]✅ No stacks affected[/green]")
+
+    if report["deployment_types"]:
+        console.print(
+            f"Deployment types: [bold]{', '.join(report['deployment_types'])}[/bold]"
+        )
+    tenants = report["matrix"]["include"]
+    if tenants:
+        console.print(f"Tenants to plan: [bold]{len(tenants)}[/bold]")
+        for entry in tenants:
+            console.print(
+                f"  • {entry['stack_path']} [dim]({entry['deployment_type']})[/dim]"
+            )
+    for path in report["unreferenced_files"]:
+        console.print(f"[dim]• {path} is not included by any unit[/dim]")
+    if report["ignored_files"]:
+        console.print(
+            f"[dim]• {len(report['ignored_files'])} changed files do not affect plans[/dim]"
+        )
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("paths", nargs=-1, type=click.Path())
+@click.option("--base", help="Diff against this git ref (merge base with --head)")
+@click.option("--head", default="HEAD", show_default=True, help="Git ref to diff to")
+@click.option(
+    "--tenants",
+    multiple=True,
+    help="Tenant files, directories or globs to build the plan matrix from (repeatable)",
+)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option(
+    "--matrix-only",
+    is_flag=True,
+    help="Print only the GitHub Actions matrix JSON for the affected tenants",
+)
+def impact(paths, base, head, tenants, pattern, output_json, matrix_only):
+    """
+    Map changed files to the units, stacks and tenants they affect.
+
+    Changes are taken from PATHS and/or "git diff --name-only BASE...HEAD".
+    Include files are followed to every unit that includes them, and unit
+    changes propagate to units reading their outputs through dependency
+    blocks. With --tenants, the result includes a minimal plan matrix of
+    the tenants whose stack is affected, or whose tenant file changed.
+
+    Examples:
+
+        \b
+        # What does this PR touch?
+        select-stack.py impact --base origin/main
+
+        \b
+        # Plan matrix for an apiary checkout
+        select-stack.py impact --base origin/main --tenants apiary/ --matrix-only
+    """
+    if not paths and not base:
+        raise click.UsageError("Give changed PATHS or --base")
+
+    changed = [Path(p) for p in paths]
+    if base:
+        try:
+            changed += impact_mod.git_changed_files(base, head)
+        except subprocess.CalledProcessError as e:
+            raise click.ClickException(f"git diff failed: {(e.stderr or '').strip()}")
+
+    try:
+        report = impact_mod.analyze_changes(
+            changed, tenants, pattern, cache=ConfigCache(configs.CONFIG_DIR)
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    if matrix_only:
+        click.echo(json.dumps(report["matrix"]))
+    elif output_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        display_impact_report(report)
+
+
+def display_plan_summary(report: Dict):
+    """Display a plan summary using rich."""
+    table = Table(title="Plan Summary", show_header=True, header_style="bold magenta")
+    table.add_column("Unit", style="cyan", no_wrap=True)
+    for action in plansummary_mod.CHANGE_ACTIONS:
+        table.add_column(action.capitalize(), justify="right")
+    table.add_column("Drift", justify="right", style="yellow")
+    for unit in report["units"]:
+        if unit["error"]:
+            table.add_row(unit["unit"], f"[red]{unit['error']}[/red]", "", "", "", "")
+            continue
+        counts = [
+            str(unit["actions"].get(a, 0) or "") for a in plansummary_mod.CHANGE_ACTIONS
+        ]
+        table.add_row(unit["unit"], *counts, str(unit["drift"] or ""))
+    console.print(table)
+
+    if report["has_changes"]:
+        console.print(f"[yellow]⚠️  {report['changes']} resource changes[/yellow]")
+    else:
+        console.print("[green]✅ No resource changes[/green]")
+    if report["drift"]:
+        console.print(
+            f"[yellow]🔀 {report['drift']} resources changed outside of Terraform[/yellow]"
+        )
+
+
+@main.command("plan-summary", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default="*.json",
+    show_default=True,
+    help="Plan file name to match when walking directories",
+)
+@click.option(
+    "--max-addresses",
+    type=click.IntRange(min=0),
+    default=plansummary_mod.DEFAULT_MAX_ADDRESSES,
+    show_default=True,
+    help="Changed resource addresses listed per unit",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option("--markdown", is_flag=True, help="Output GitHub-flavoured markdown")
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("w"),
+    help="Also write the JSON report to this file",
+)
+@click.option(
+    "--title", default="Plan Summary", show_default=True, help="Markdown heading"
+)
+@click.option(
+    "--detailed-exitcode",
+    is_flag=True,
+    help="Exit 2 when there are changes, like terraform plan -detailed-exitcode",
+)
+def plan_summary(
+    sources,
+    pattern,
+    max_addresses,
+    output_json,
+    markdown,
+    output,
+    title,
+    detailed_exitcode,
+):
+    """
+    Summarize "terraform show -json" plans per unit without loading them whole.
+
+    SOURCES are plan JSON files, directories written by
+    "terragrunt run --all plan --json-out-dir DIR" (the unit is each plan
+    file's directory relative to DIR) or "-" for stdin. Resource changes
+    and drift are counted by unit, action and resource type while the plan
+    is streamed. Exits 1 if a plan cannot be read.
+
+    Examples:
+
+        \b
+        # Drift report for the step summary
+        select-stack.py plan-summary plans/ --markdown >> "$GITHUB_STEP_SUMMARY"
+
+        \b
+        # Single plan from stdin
+        terraform show -json tfplan | select-stack.py plan-summary - --json
+    """
+    report = plansummary_mod.summarize_plans(sources, pattern, max_addresses)
+
+    if output:
+        json.dump(report, output, indent=2)
+        output.write("\n")
+    if output_json:
+        click.echo(json.dumps(report, indent=2))
+    elif markdown:
+        click.echo(plansummary_mod.render_markdown(report, title), nl=False)
+    else:
+        display_plan_summary(report)
+
+    if report["errors"]:
+        sys.exit(1)
+    if detailed_exitcode and report["has_changes"]:
+        sys.exit(2)
+
+
+def display_lock_report(report: Dict):
+    """Display a state-key collision and lock schedule report using rich."""
+    schedule = report["schedule"]
+    summary = [
+        f"Tenants: [bold]{len(report['tenants'])}[/bold], "
+        f"jobs: [bold]{schedule['jobs']}[/bold], max parallel: {schedule['max_parallel']}",
+        f"Makespan: [bold]{schedule['makespan']:g}[/bold] "
+        f"(without locks: {report['makespan_without_locks']:g}, "
+        f"critical path: {schedule['critical_path']:g})",
+        f"Jobs held back for a lock: [bold]{len(schedule['lock_waits'])}[/bold]",
+    ]
+    stacks = sorted({e["stack"] for t in report["tenants"] for e in t["state"]})
+    console.print(
+        Panel(
+            "\n".join(summary),
+            title=f"🔒 {', '.join(stacks)}",
+            border_style="cyan",
+            expand=False,
+        )
+    )
+
+    if report["collisions"]:
+        table = Table(
+            title="State Key Collisions", show_header=True, header_style="bold magenta"
+        )
+        table.add_column("Tenant", style="cyan")
+        table.add_column("Scope", style="yellow", no_wrap=True)
+        table.add_column("Lock ID", style="white")
+        table.add_column("Units", style="white")
+        for group in report["collisions"]:
+            members = group["members"]
+            if group["scope"] == "stack":
+                members = [m.split(":", 1)[1] for m in members]
+            table.add_row(
+                group["tenant"], group["scope"], group["lock_id"], "\n".join(members)
+            )
+        console.print(table)
+    else:
+        console.print("[green]✅ No state key collisions within a tenant[/green]")
+
+    for group in report["fleet_collisions"]:
+        console.print(
+            f"[red]❌ Tenants share state {group['lock_id']}: "
+            f"{', '.join(group['members'])}[/red]"
+        )
+    for group in report["collisions"]:
+        keys = group["proposed_keys"]
+        if len(keys) == 1:
+            # The same unit in several stacks: one state, run from two places
+            continue
+        console.print(
+            f"[yellow]⚠️  {group['tenant']}: {len(keys)} units write one state file. "
+            "Give each its own key, e.g. with the layer in it:[/yellow]"
+        )
+        for unit, key in keys.items():
+            console.print(f"   {unit} → {key}")
+
+
+def display_lock_schedule(timeline: List[Dict]):
+    """Display a lock-aware job timeline using rich."""
+    table = Table(title="Schedule", show_header=True, header_style="bold magenta")
+    table.add_column("Start", justify="right", style="cyan")
+    table.add_column("End", justify="right", style="cyan")
+    table.add_column("Job", style="white")
+    for item in timeline:
+        table.add_row(f"{item['start']:g}", f"{item['end']:g}", item["job"])
+    console.print(table)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("tenants", nargs=-1)
+@click.option(
+    "--stack",
+    "extra_stacks",
+    multiple=True,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Additional stack file every tenant runs (repeatable)",
+)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--max-parallel",
+    type=click.IntRange(min=1),
+    help="Concurrent jobs (default: largest configured stack parallelism)",
+)
+@click.option(
+    "--durations",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file mapping unit path or name to duration in seconds",
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option(
+    "--schedule", "show_schedule", is_flag=True, help="Print the job timeline"
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def locks(
+    tenants,
+    extra_stacks,
+    pattern,
+    max_parallel,
+    durations,
+    env,
+    show_schedule,
+    output_json,
+):
+    """
+    Map remote-state keys and plan runs around DynamoDB lock contention.
+
+    The state key uses only the unit directory's basename, so units such as
+    units/hosting/s3 and units/application/s3 share a state file and lock
+    for the same tenant. TENANTS are tenant configs or directories; each
+    runs the stack of its deployment type plus any --stack. Without
+    TENANTS each stack is checked on its own for a template tenant, or the
+    --stack files together. The schedule never runs two jobs holding the
+    same lock. Exits 1 on collisions.
+
+    Examples:
+
+        \b
+        # Collisions within every stack
+        select-stack.py locks
+
+        \b
+        # Layered deploys that run both stacks for a tenant
+        select-stack.py locks --stack stacks/aws/hosting.stack.yaml \\
+            --stack stacks/aws/application.stack.yaml
+
+        \b
+        # Fleet schedule with 20 concurrent applies
+        select-stack.py locks apiary/ --max-parallel 20 --durations durations.json
+    """
+    unit_durations = dag_mod.split_durations(load_durations(durations))[0]
+    extra = [dag_mod.load_stack(p) for p in extra_stacks]
+    stack_cache = {}
+
+    def stack_for(stack_file):
+        if stack_file not in stack_cache:
+            stack_cache[stack_file] = dag_mod.load_stack(configs.REPO_ROOT / stack_file)
+        return stack_cache[stack_file]
+
+    entries = []
+    if tenants:
+        try:
+            deployment_stacks = configs.load_deployment_configs(
+                configs.CONFIG_DIR, cache=ConfigCache(configs.CONFIG_DIR)
+            )
+        except configs.ConfigError as e:
+            raise click.ClickException(str(e))
+        for config_file in batch_mod.iter_tenant_files(tenants, pattern):
+            record = batch_mod.resolve_tenant(config_file, deployment_stacks)
+            if record["errors"]:
+                click.echo(
+                    f"Skipping {config_file}: {'; '.join(record['errors'])}", err=True
+                )
+                continue
+            try:
+                stack = stack_for(record["stack_file"])
+            except OSError as e:
+                click.echo(f"Skipping {config_file}: {e}", err=True)
+                continue
+            config = configs.load_config(config_file)
+            entries.append((record["config_path"], config, [stack] + extra))
+        if not entries:
+            raise click.ClickException("No valid tenant configs found")
+    runs = [entries] if entries else []
+    if not tenants:
+        if extra:
+            runs.append([("template", statelocks_mod.TEMPLATE_TENANT, extra)])
+        else:
+            runs.extend(
+                [("template", statelocks_mod.TEMPLATE_TENANT, [dag_mod.load_stack(p)])]
+                for p in dag_mod.stack_files()
+            )
+
+    unit_paths = list(terragrunt_mod.scan_units())
+    reports = []
+    for run in runs:
+        parallel = max_parallel
+        if parallel is None:
+            configured = [
+                s.parallelism for _, _, stacks in run for s in stacks if s.parallelism
+            ]
+            parallel = max(configured, default=1)
+        try:
+            report = statelocks_mod.analyze_locks(
+                run, parallel, env=env, durations=unit_durations, unit_paths=unit_paths
+            )
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        if not show_schedule:
+            report["schedule"].pop("timeline")
+        reports.append(report)
+
+    if output_json:
+        click.echo(json.dumps(reports, indent=2))
+    else:
+        for report in reports:
+            display_lock_report(report)
+            if show_schedule:
+                display_lock_schedule(report["schedule"]["timeline"])
+            console.print()
+        for item in reports[0]["latent_collisions"] if reports else []:
+            console.print(
+                f"[dim]• Units sharing a state key basename '{item['basename']}': "
+                f"{', '.join(item['units'])}[/dim]"
+            )
+
+    if any(r["collisions"] or r["fleet_collisions"] for r in reports):
+        sys.exit(1)
+
+
+def display_memo_report(report: Dict, command: str):
+    """Display which units a memoized fleet run skipped, and why the rest ran."""
+    if command == "apply":
+        console.print(
+            f"[dim]Plan memo: {report['forgotten']} clean plans forgotten[/dim]"
+        )
+        return
+    reasons = ", ".join(f"{n} {code}" for code, n in report["reasons"].items())
+    console.print(
+        f"Plan memo: {report['skipped']} of {report['units']} units skipped "
+        f"({len(report['tenants_skipped'])} tenants not run) - {reasons}; "
+        f"{report['recorded_clean']} clean plans recorded, {report['forgotten']} forgotten"
+    )
+    changed = [d for d in report["decisions"] if d["code"] == "changed"]
+    for decision in changed[:20]:
+        console.print(
+            f"[dim]• {decision['tenant']} {decision['unit']}: {decision['reason']}[/dim]"
+        )
+    if len(changed) > 20:
+        console.print(f"[dim]• ... {len(changed) - 20} more (see --json)[/dim]")
+
+
+@main.command("run", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("command", type=click.Choice(fleetrun_mod.COMMANDS))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--concurrency",
+    "-j",
+    type=click.IntRange(min=1),
+    default=fleetrun_mod.DEFAULT_CONCURRENCY,
+    show_default=True,
+    help="Concurrent terragrunt processes",
+)
+@click.option(
+    "--per-account",
+    type=click.IntRange(min=1),
+    default=fleetrun_mod.DEFAULT_PER_ACCOUNT,
+    show_default=True,
+    help="Concurrent runs per AWS account",
+)
+@click.option(
+    "--retries",
+    type=click.IntRange(min=0),
+    default=fleetrun_mod.DEFAULT_RETRIES,
+    show_default=True,
+    help="Retries after a state lock error",
+)
+@click.option(
+    "--backoff",
+    type=click.FloatRange(min=0),
+    default=fleetrun_mod.DEFAULT_BACKOFF,
+    show_default=True,
+    help="Base backoff in seconds, doubled per retry (with jitter)",
+)
+@click.option(
+    "--timeout", type=click.FloatRange(min=0), help="Kill a run after this many seconds"
+)
+@click.option(
+    "--kill-grace",
+    type=click.FloatRange(min=0),
+    default=fleetrun_mod.KILL_GRACE,
+    show_default=True,
+    help="Seconds between SIGTERM and SIGKILL when a run is stopped",
+)
+@click.option(
+    "--terragrunt",
+    envvar=fleetrun_mod.TERRAGRUNT_ENV,
+    default=fleetrun_mod.DEFAULT_TERRAGRUNT,
+    show_default=True,
+    help=f"terragrunt binary (env: {fleetrun_mod.TERRAGRUNT_ENV})",
+)
+@click.option(
+    "--tg-arg",
+    "tg_args",
+    multiple=True,
+    help="Extra argument appended to every terragrunt command (repeatable)",
+)
+@click.option(
+    "--log-dir",
+    type=click.Path(file_okay=False),
+    default="fleet-logs",
+    show_default=True,
+    help="Directory for one log file per tenant",
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option(
+    "--memo",
+    is_flag=True,
+    help="Skip units whose inputs match a recent clean plan (apply: forget the tenants' plans)",
+)
+@click.option(
+    "--memo-ttl",
+    type=click.FloatRange(min=0),
+    default=planmemo_mod.DEFAULT_TTL,
+    show_default=True,
+    help="Seconds a clean plan is trusted",
+)
+@click.option(
+    "--memo-db",
+    type=click.Path(dir_okay=False),
+    help=f"Plan memo database (env: {planmemo_mod.DB_ENV})",
+)
+@click.option(
+    "--drift-check",
+    is_flag=True,
+    help="With --memo: refresh-only plan of every unit, forgetting units that drifted",
+)
+@click.option(
+    "--ref",
+    "ref_pins",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="REF=SHA",
+    help="Commit a moving terraform_ref points at, so its units can be memoized (repeatable)",
+)
+@click.option(
+    "--dry-run", is_flag=True, help="List the jobs and their limits without running"
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def run_fleet(
+    command,
+    sources,
+    pattern,
+    concurrency,
+    per_account,
+    retries,
+    backoff,
+    timeout,
+    kill_grace,
+    terragrunt,
+    tg_args,
+    log_dir,
+    env,
+    memo,
+    memo_ttl,
+    memo_db,
+    drift_check,
+    ref_pins,
+    dry_run,
+    output_json,
+):
+    """
+    Run a terragrunt stack command across many tenants.
+
+    Runs "terragrunt stack COMMAND --stack <stack>" for each tenant with
+    CONFIG_PATH and TENANT_CONFIG_PATH set to its absolute path, starting each run as soon as it fits under the
+    global cap (-j), the per-account cap and the remote-state locks its
+    units use. Each tenant's output goes to its own file in --log-dir. Runs
+    that fail on a state lock are retried with backoff. Exits 1 if any run
+    fails.
+
+    Examples:
+
+        \b
+        # Nightly fleet plan
+        select-stack.py run plan apiary/ -j 32 --per-account 4
+
+        \b
+        # Exercise the runner without AWS
+        FAKE_TERRAGRUNT_SCRIPT=script.json select-stack.py run plan apiary/ \\
+            --terragrunt benchmarks/fake_terragrunt.py --backoff 0.1
+
+        \b
+        # Nightly plan skipping unchanged units, plus a cheaper drift check
+        select-stack.py run plan apiary/ --memo
+        select-stack.py run plan apiary/ --memo --drift-check
+    """
+    if drift_check and not memo:
+        raise click.UsageError("--drift-check requires --memo")
+    if memo and command not in ("plan", "apply"):
+        raise click.UsageError("--memo applies to plan and apply")
+    if drift_check and command != "plan":
+        raise click.UsageError("--drift-check applies to plan")
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR, cache=ConfigCache(configs.CONFIG_DIR)
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    jobs, skipped = fleetrun_mod.plan_jobs(
+        batch_mod.iter_tenant_files(sources, pattern),
+        deployment_stacks,
+        log_dir=Path(log_dir),
+        env=env,
+    )
+    for record in skipped:
+        click.echo(
+            f"Skipping {record['config_path']}: {'; '.join(record['errors'])}", err=True
+        )
+    if not jobs:
+        raise click.ClickException("No valid tenant configs found")
+
+    plan_memo = prepared = None
+    if memo:
+        plan_memo = planmemo_mod.PlanMemo(Path(memo_db) if memo_db else None)
+    if memo and command == "plan":
+        try:
+            prepared = planmemo_mod.memoize_jobs(
+                plan_memo,
+                jobs,
+                planmemo_mod.Fingerprinter(ref_pins=ref_pins),
+                Path(log_dir) / "plans",
+                env=env,
+                ttl=memo_ttl,
+                drift_check=drift_check,
+            )
+        except (OSError, configs.ConfigError) as e:
+            raise click.ClickException(str(e))
+        jobs = prepared["run"]
+
+    if dry_run:
+        plan = [
+            {
+                "tenant": job.tenant,
+                "stack_file": job.stack_file,
+                "account_id": job.account_id,
+                "locks": len(job.lock_ids),
+                "log_file": str(job.log_file),
+            }
+            for job in jobs
+        ]
+        if prepared:
+            for item in plan:
+                decisions = prepared["tenants"][item["tenant"]]["decisions"]
+                item["memoized_units"] = [d["unit"] for d in decisions if d["skip"]]
+            plan.extend(
+                {"tenant": tenant, "memoized": True} for tenant in prepared["memoized"]
+            )
+        if output_json:
+            click.echo(json.dumps(plan, indent=2))
+        else:
+            table = Table(
+                title=f"Fleet {command}", show_header=True, header_style="bold magenta"
+            )
+            table.add_column("Tenant", style="cyan")
+            table.add_column("Stack", style="white")
+            table.add_column("Account", style="yellow")
+            table.add_column("Locks", justify="right")
+            if prepared:
+                table.add_column("Memoized", justify="right")
+            for item in plan:
+                if item.get("memoized"):
+                    continue
+                row = [
+                    item["tenant"],
+                    item["stack_file"],
+                    str(item["account_id"]),
+                    str(item["locks"]),
+                ]
+                if prepared:
+                    row.append(str(len(item["memoized_units"])))
+                table.add_row(*row)
+            console.print(table)
+            if prepared and prepared["memoized"]:
+                console.print(
+                    f"{len(prepared['memoized'])} tenants fully memoized, not run"
+                )
+        return
+
+    counts = {"running": 0, "done": 0, "failed": 0, "retrying": 0}
+    status = None
+
+    def on_event(event, job, info):
+        if event == "started":
+            counts["running"] += 1
+            if info["attempts"] > 1:
+                counts["retrying"] -= 1
+        elif event == "retrying":
+            counts["running"] -= 1
+            counts["retrying"] += 1
+            if not output_json:
+                console.print(
+                    f"[yellow]🔒 {job.tenant}: state lock busy, retry "
+                    f"{info['lock_retries']}/{retries}[/yellow]"
+                )
+        elif event == "finished":
+            counts["running"] -= 1
+            counts["done"] += 1
+            ok = info["status"] == "succeeded"
+            if not ok:
+                counts["failed"] += 1
+            if not output_json:
+                mark = "[green]✅" if ok else "[red]❌"
+                console.print(
+                    f"{mark} {job.tenant}[/] {info['status']} in {info['duration']:.1f}s "
+                    f"[dim]({info['log_file']})[/dim]"
+                )
+        if status is not None:
+            status.update(
+                f"{command}: {counts['done']}/{len(jobs)} done, {counts['running']} running, "
+                f"{counts['retrying']} backing off, {counts['failed']} failed"
+            )
+
+    runner = fleetrun_mod.FleetRunner(
+        command,
+        concurrency=concurrency,
+        per_account=per_account,
+        retries=retries,
+        backoff=backoff,
+        timeout=timeout,
+        kill_grace=kill_grace,
+        terragrunt=terragrunt,
+        extra_args=tg_args,
+        cwd=configs.REPO_ROOT,
+        on_event=on_event,
+    )
+    started = time.monotonic()
+    if output_json:
+        results = runner.run(jobs)
+    else:
+        with console.status(f"{command}: starting {len(jobs)} runs") as status:
+            results = runner.run(jobs)
+    summary = fleetrun_mod.summarize(results)
+    summary["wall_seconds"] = round(time.monotonic() - started, 3)
+    summary["skipped"] = [r["config_path"] for r in skipped]
+
+    memo_report = None
+    if plan_memo:
+        memo_report = planmemo_mod.record_results(
+            plan_memo,
+            command,
+            results,
+            prepared or {"tenants": {}, "memoized": []},
+            drift_check,
+        )
+        plan_memo.close()
+
+    if output_json:
+        report = {"summary": summary, "results": results}
+        if memo_report:
+            report["memo"] = memo_report
+        click.echo(json.dumps(report, indent=2))
+    else:
+        statuses = ", ".join(f"{n} {s}" for s, n in sorted(summary["statuses"].items()))
+        console.print(
+            f"\n{command}: {summary['jobs']} runs in {summary['wall_seconds']:.1f}s "
+            f"({summary['busy_seconds']:.1f}s busy) - {statuses}, "
+            f"{summary['lock_retries']} lock retries"
+        )
+        if memo_report:
+            display_memo_report(memo_report, command)
+
+    if summary["failed"]:
+        sys.exit(1)
+
+
+def display_shard_plan(plan: Dict):
+    """Display a shard plan using rich."""
+    lpt, naive = plan["lpt"], plan["round_robin"]
+    console.print(
+        Panel(
+            f"Items: [bold]{plan['items']}[/bold] in [bold]{plan['shards']}[/bold] shards, "
+            f"{plan['total_seconds']:g}s total work\n"
+            f"Longest shard: [bold green]{lpt['max']:g}s[/bold green] "
+            f"(lower bound {plan['lower_bound_seconds']:g}s, "
+            f"round-robin {naive['max']:g}s)\n"
+            f"p95 shard: [bold]{lpt['p95']:g}s[/bold] (round-robin {naive['p95']:g}s), "
+            f"imbalance {lpt['imbalance']:g}x",
+            title="🧮 Shard Plan",
+            border_style="cyan",
+            expand=False,
+        )
+    )
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Shard", justify="right", style="cyan", no_wrap=True)
+    table.add_column("Estimate", justify="right", style="green", no_wrap=True)
+    table.add_column("Items", justify="right")
+    table.add_column("Tenants", style="white")
+    for entry in plan["matrix"]["include"]:
+        tenants = entry["stack_paths"].split()
+        shown = ", ".join(tenants[:3]) + (
+            f" (+{len(tenants) - 3} more)" if len(tenants) > 3 else ""
+        )
+        table.add_row(
+            str(entry["shard"]),
+            f"{entry['estimated_seconds']:g}s",
+            str(len(entry["items"])),
+            shown,
+        )
+    console.print(table)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--shards",
+    "-n",
+    "shard_count",
+    type=click.IntRange(min=1),
+    required=True,
+    help="Number of matrix jobs to plan",
+)
+@click.option(
+    "--durations",
+    type=click.Path(exists=True, dir_okay=False),
+    help="JSON file of unit (and optionally tenant) durations in seconds",
+)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--env",
+    "env",
+    multiple=True,
+    callback=parse_env_overrides,
+    metavar="KEY=VALUE",
+    help="Environment value used to evaluate unit skip expressions (repeatable)",
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option(
+    "--matrix-only",
+    is_flag=True,
+    help="Print only the GitHub Actions matrix JSON (compact)",
+)
+def shards(sources, shard_count, durations, pattern, env, output_json, matrix_only):
+    """
+    Balance tenants' stack runs into N shards for a plan or drift matrix.
+
+    Each tenant's stack is split into the connected parts of its unit
+    DAG, weighted by their makespan under --durations (1s per unit
+    without). Parts are packed longest first onto the least loaded shard,
+    so units joined by a dependency always share a shard. The matrix
+    include has one entry per shard with its items and estimated seconds.
+
+    Examples:
+
+        \b
+        # Drift sweep over 8 runners
+        select-stack.py shards apiary/ -n 8 --durations durations.json
+
+        \b
+        # In a workflow
+        echo "matrix=$(select-stack.py shards apiary/ -n 8 --matrix-only)" >> $GITHUB_OUTPUT
+    """
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR, cache=ConfigCache(configs.CONFIG_DIR)
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    tenants, skipped = shards_mod.resolve_tenants(sources, deployment_stacks, pattern)
+    for record in skipped:
+        click.echo(
+            f"Skipping {record['config_path']}: {'; '.join(record['errors'])}", err=True
+        )
+    if not tenants:
+        raise click.ClickException("No valid tenant configs found")
+
+    try:
+        plan = shards_mod.plan_shards(
+            tenants, shard_count, load_durations(durations), env
+        )
+    except (OSError, ValueError) as e:
+        raise click.ClickException(str(e))
+
+    if matrix_only:
+        click.echo(json.dumps(plan["matrix"], separators=(",", ":")))
+    elif output_json:
+        click.echo(json.dumps(plan, indent=2))
+    else:
+        display_shard_plan(plan)
+
+
+@main.group("plan-memo", context_settings=dict(help_option_names=["-h", "--help"]))
+def plan_memo():
+    """
+    Inspect and evict the clean plans "run plan --memo" skips units with.
+
+    A unit is skipped when its input fingerprint (tenant config, unit and
+    include files, terraform_ref, upstream fingerprints) matches a plan
+    with no changes younger than --memo-ttl.
+    """
+
+
+def _memo_db_option(func):
+    return click.option(
+        "--db",
+        type=click.Path(dir_okay=False),
+        help=f"Plan memo database (env: {planmemo_mod.DB_ENV})",
+    )(func)
+
+
+@plan_memo.command("stats", context_settings=dict(help_option_names=["-h", "--help"]))
+@_memo_db_option
+def plan_memo_stats(db):
+    """Show how many clean plans the memo holds."""
+    with planmemo_mod.PlanMemo(Path(db) if db else None) as memo:
+        click.echo(json.dumps(memo.stats(), indent=2))
+
+
+@plan_memo.command("evict", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option(
+    "--max-age",
+    type=click.FloatRange(min=0),
+    default=planmemo_mod.DEFAULT_MAX_AGE,
+    show_default=True,
+    help="Drop clean plans older than this many seconds",
+)
+@_memo_db_option
+def plan_memo_evict(max_age, db):
+    """Drop old clean plans and compact the database."""
+    with planmemo_mod.PlanMemo(Path(db) if db else None) as memo:
+        click.echo(json.dumps(memo.evict(max_age), indent=2))
+
+
+@plan_memo.command("forget", context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("config_files", nargs=-1, required=True)
+@click.option(
+    "--unit", "units", multiple=True, help="Forget only this unit (repeatable)"
+)
+@_memo_db_option
+def plan_memo_forget(config_files, units, db):
+    """Forget tenants' clean plans so their next memoized plan runs in full."""
+    with planmemo_mod.PlanMemo(Path(db) if db else None) as memo:
+        forgotten = sum(
+            memo.forget(planmemo_mod.tenant_key(config_file), units or None)
+            for config_file in config_files
+        )
+    click.echo(json.dumps({"forgotten": forgotten}, indent=2))
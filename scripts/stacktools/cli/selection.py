@@ -0,0 +1,1006 @@
+"""
+Stack selection commands: select (the default), batch, validate, effective,
+graph and registry.
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+from typing import Dict, Optional
+
+import click
+from rich.panel import Panel
+from rich.table import Table
+from rich.tree import Tree
+
+from stacktools import configs, timings
+from stacktools.cache import ConfigCache
+from stacktools import batch as batch_mod
+from stacktools import graphs as graphs_mod
+from stacktools import history as history_mod
+from stacktools import layers as layers_mod
+from stacktools import registry as registry_mod
+from stacktools import schema as schema_mod
+from stacktools.cli.app import console, display_eta, load_config, main
+
+
+class StackSelector:
+    """Handles loading and selecting deployment stacks."""
+
+    def __init__(self, cache: Optional[ConfigCache] = None):
+        """Initialize the stack selector."""
+        self.script_dir = configs.REPO_ROOT
+        self.config_dir = configs.CONFIG_DIR
+        self.cache = cache if cache is not None else ConfigCache(self.config_dir)
+        self.deployment_stacks = {}
+        self.load_deployment_configs()
+
+    @timings.timed("parse")
+    def load_deployment_configs(self):
+        """Load all deployment type configurations from YAML files."""
+        with console.status(
+            "[bold green]Loading deployment configurations..."
+        ) as status:
+            try:
+                self.deployment_stacks = configs.load_deployment_configs(
+                    self.config_dir,
+                    on_loaded=lambda name: status.update(
+                        f"[green]Loaded {name}[/green]"
+                    ),
+                    on_skipped=lambda name: console.print(
+                        f"[yellow]⚠️  Skipping disabled config: {name}[/yellow]"
+                    ),
+                    on_error=lambda config_file, e: console.print(
+                        f"[yellow]⚠️  Warning: Failed to load {config_file}: {e}[/yellow]"
+                    ),
+                    cache=self.cache,
+                )
+            except configs.ConfigError as e:
+                console.print(f"[red]❌ Error: {e}[/red]")
+                raise click.ClickException(str(e))
+
+        console.print(
+            f"[green]✓ Loaded {len(self.deployment_stacks)} deployment configurations[/green]"
+        )
+
+    def get_deployment_type(self, config: Dict) -> str:
+        """Extract deployment type from configuration."""
+        deployment_type = config.get("deployment_type")
+
+        if not deployment_type:
+            console.print(
+                "[yellow]⚠️  Warning: deployment_type not specified in configuration[/yellow]"
+            )
+            console.print("   Defaulting to 'full_stack'")
+            return "full_stack"
+
+        if deployment_type not in self.deployment_stacks:
+            console.print(
+                f"[red]❌ Error: Unknown deployment type: {deployment_type}[/red]"
+            )
+            console.print(
+                f"   Valid types: {', '.join(sorted(self.deployment_stacks.keys()))}"
+            )
+            raise click.ClickException(f"Unknown deployment type: {deployment_type}")
+
+        return deployment_type
+
+    @timings.timed("render")
+    def display_deployment_info(self, deployment_type: str):
+        """Display information about the selected deployment type using rich."""
+        info = self.deployment_stacks[deployment_type]
+
+        # Create main panel
+        panel = Panel.fit(
+            f"[bold cyan]{info.get('description', 'N/A')}[/bold cyan]",
+            title=f"🚀 Deployment Type: [bold green]{deployment_type}[/bold green]",
+            border_style="cyan",
+        )
+        console.print(panel)
+
+        # Create a tree for components and features
+        tree = Tree("📦 [bold]Configuration[/bold]")
+
+        # Add components
+        if "components" in info:
+            comp_branch = tree.add("🔧 Components")
+            for component in info["components"]:
+                comp_branch.add(f"[green]✓[/green] {component}")
+
+        # Add enabled features
+        if "features" in info:
+            feat_branch = tree.add("✨ Enabled Features")
+            for feature in info["features"]:
+                feat_branch.add(f"[green]•[/green] {feature}")
+
+        # Add disabled features
+        if "disabled_features" in info:
+            disabled_branch = tree.add("🚫 Disabled Features")
+            for feature in info["disabled_features"]:
+                disabled_branch.add(f"[dim]✗ {feature}[/dim]")
+
+        console.print(tree)
+
+        # Create tables for detailed configurations
+        if "cluster_config" in info:
+            cluster = info["cluster_config"]
+            table = Table(
+                title="☁️ Cluster Configuration",
+                show_header=True,
+                header_style="bold magenta",
+            )
+            table.add_column("Property", style="cyan", no_wrap=True)
+            table.add_column("Value", style="white")
+
+            if "node_instance_types" in cluster:
+                table.add_row("Node Types", ", ".join(cluster["node_instance_types"]))
+            table.add_row("Min Nodes", str(cluster.get("min_nodes", "N/A")))
+            table.add_row("Max Nodes", str(cluster.get("max_nodes", "N/A")))
+            table.add_row("Desired Nodes", str(cluster.get("desired_nodes", "N/A")))
+            if cluster.get("spot_enabled"):
+                table.add_row("Spot Usage", f"{cluster.get('spot_percentage', 0)}%")
+
+            console.print(table)
+
+        # Network configuration
+        if "subnet_config" in info:
+            subnet = info["subnet_config"]
+            net_table = Table(
+                title="🌐 Network Configuration",
+                show_header=True,
+                header_style="bold blue",
+            )
+            net_table.add_column("Property", style="cyan")
+            net_table.add_column("Value", style="white")
+
+            net_table.add_row("Availability Zones", str(subnet.get("count", "N/A")))
+            net_table.add_row("NAT Strategy", subnet.get("nat_strategy", "N/A"))
+            net_table.add_row(
+                "Public Subnet Bits", str(subnet.get("public_newbits", "N/A"))
+            )
+            net_table.add_row(
+                "Private Subnet Bits", str(subnet.get("private_newbits", "N/A"))
+            )
+
+            console.print(net_table)
+
+        # Special configurations
+        if "security" in info:
+            security = info["security"]
+            sec_panel = Panel(
+                f"Encryption: [yellow]{security.get('encryption', 'N/A')}[/yellow]\n"
+                f"Compliance: [green]{', '.join(security.get('compliance', []))}[/green]",
+                title="🔒 Security Configuration",
+                border_style="red",
+            )
+            console.print(sec_panel)
+
+        if "hybrid_config" in info:
+            hybrid = info["hybrid_config"]
+            hybrid_panel = Panel(
+                f"Control Plane: [blue]{hybrid.get('control_plane_endpoint', 'N/A')}[/blue]\n"
+                f"Telemetry Forward: [yellow]{hybrid.get('telemetry_forward', False)}[/yellow]",
+                title="🔄 Hybrid Configuration",
+                border_style="magenta",
+            )
+            console.print(hybrid_panel)
+
+    def get_stack_file(self, deployment_type: str) -> Optional[str]:
+        """Get the stack file path for the deployment type."""
+        stack_info = self.deployment_stacks[deployment_type]
+        stack_file = stack_info.get("stack_file")
+
+        if not stack_file:
+            console.print(
+                f"[red]❌ Error: Stack file not configured for {deployment_type}[/red]"
+            )
+            if not stack_info.get("enabled", True):
+                console.print(
+                    "   [dim]This deployment type is not yet implemented[/dim]"
+                )
+            return None
+
+        # Check if stack file exists
+        stack_path = self.script_dir / stack_file
+
+        if not stack_path.exists():
+            console.print(
+                f"[yellow]⚠️  Warning: Stack file not found: {stack_file}[/yellow]"
+            )
+            console.print(f"   Expected at: {stack_path}")
+            return stack_file  # Return anyway for use in commands
+
+        return stack_file
+
+    @timings.timed("render")
+    def list_available_types(self):
+        """List all available deployment types using rich table."""
+        # Create a table
+        table = Table(
+            title="🚀 Available Deployment Types",
+            show_header=True,
+            header_style="bold magenta",
+        )
+        table.add_column("Status", justify="center", style="green", no_wrap=True)
+        table.add_column("Type", style="cyan", no_wrap=True)
+        table.add_column("Description", style="white")
+        table.add_column("Key Features", style="yellow")
+
+        # Sort by name for consistent output
+        for dtype in sorted(self.deployment_stacks.keys()):
+            info = self.deployment_stacks[dtype]
+            stack_file = info.get("stack_file")
+            status = "✅" if stack_file else "⏳"
+            desc = info.get("description", "No description")
+
+            # Show key features
+            features = ""
+            if "features" in info:
+                feat_list = info["features"][:3]  # Show first 3 features
+                features = ", ".join(feat_list)
+                if len(info["features"]) > 3:
+                    features += f" [dim](+{len(info['features'])-3} more)[/dim]"
+
+            table.add_row(status, dtype, desc, features)
+
+        console.print(table)
+
+    @timings.timed("render")
+    def export_config(self, config_file: str, deployment_type: str):
+        """Display export commands for automation using rich."""
+        config_path = Path(config_file).absolute()
+        stack_info = self.deployment_stacks[deployment_type]
+        stack_file = stack_info.get("stack_file", "")
+
+        # Create deployment commands panel
+        commands = []
+
+        # Environment setup
+        commands.append("[bold cyan]1. Set environment:[/bold cyan]")
+        commands.append(f'   [green]export TENANT_CONFIG_PATH="{config_path}"[/green]')
+
+        if stack_file:
+            commands.append("")
+            commands.append("[bold cyan]2. Initialize stack:[/bold cyan]")
+            commands.append(
+                f"   [green]terragrunt stack init --stack {stack_file}[/green]"
+            )
+
+            commands.append("")
+            commands.append("[bold cyan]3. Plan deployment:[/bold cyan]")
+            commands.append(
+                f"   [green]terragrunt stack plan --stack {stack_file}[/green]"
+            )
+
+            commands.append("")
+            commands.append("[bold cyan]4. Apply deployment:[/bold cyan]")
+            commands.append(
+                f"   [green]terragrunt stack apply --stack {stack_file}[/green]"
+            )
+
+        commands_text = "\n".join(commands)
+        commands_panel = Panel(
+            commands_text,
+            title="📦 Deployment Commands",
+            border_style="green",
+            expand=False,
+        )
+        console.print(commands_panel)
+
+        # Automation exports
+        exports = []
+        exports.append(f'[blue]export SELECTED_STACK="{stack_file}"[/blue]')
+        exports.append(f'[blue]export DEPLOYMENT_TYPE="{deployment_type}"[/blue]')
+
+        # Export additional configuration
+        if "cluster_config" in stack_info:
+            cluster = stack_info["cluster_config"]
+            exports.append(
+                f"[blue]export NODE_MIN={cluster.get('min_nodes', 1)}[/blue]"
+            )
+            exports.append(
+                f"[blue]export NODE_MAX={cluster.get('max_nodes', 10)}[/blue]"
+            )
+
+        exports_text = "\n".join(exports)
+        exports_panel = Panel(
+            exports_text,
+            title="🤖 Automation Exports",
+            border_style="blue",
+            expand=False,
+        )
+        console.print(exports_panel)
+
+
+@timings.timed("render")
+def display_config_summary(config: Dict):
+    """Display summary of the configuration using rich table."""
+    # Create configuration table
+    table = Table(title="📋 Configuration Summary", show_header=False, show_edge=True)
+    table.add_column("Property", style="cyan", no_wrap=True)
+    table.add_column("Value", style="white")
+
+    table.add_row("Organization", config.get("org", "N/A"))
+    table.add_row("Environment", config.get("env", "N/A"))
+    table.add_row(
+        "Region", f"{config.get('region', 'N/A')} ({config.get('sregion', 'N/A')})"
+    )
+    table.add_row("Deployment", config.get("deployment", "N/A"))
+    table.add_row("Account ID", config.get("account_id", "N/A"))
+    table.add_row(
+        "Deployment Type",
+        f"[bold green]{config.get('deployment_type', 'full_stack')}[/bold green]",
+    )
+
+    # Optional settings
+    if "vpc_cidr" in config:
+        table.add_row("VPC CIDR", config["vpc_cidr"])
+    if "domain_name" in config:
+        table.add_row("Domain", config["domain_name"])
+
+    console.print(table)
+
+
+@main.command(
+    "select",
+    short_help="Select the stack for a tenant config (default command)",
+    context_settings=dict(help_option_names=["-h", "--help"]),
+)
+@click.argument("config_file", type=click.Path(exists=True), required=False)
+@click.option(
+    "--list", "list_types", is_flag=True, help="List all available deployment types"
+)
+@click.option("--deployment-type", "-t", help="Override deployment type in config")
+@click.option(
+    "--export", "-e", is_flag=True, help="Export environment variables for automation"
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option(
+    "--validate-only",
+    is_flag=True,
+    help="Only validate the configuration without displaying",
+)
+@click.option(
+    "--show-config-dir", is_flag=True, help="Show the deployment configs directory path"
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Parse deployment configs without the on-disk cache",
+)
+@click.option(
+    "--rebuild-cache",
+    is_flag=True,
+    help="Discard and rebuild the deployment config cache",
+)
+@click.option(
+    "--cache-stats", is_flag=True, help="Report deployment config cache hits and misses"
+)
+@click.pass_context
+def select_stack(
+    ctx,
+    config_file,
+    list_types,
+    deployment_type,
+    export,
+    output_json,
+    validate_only,
+    show_config_dir,
+    no_cache,
+    rebuild_cache,
+    cache_stats,
+):
+    """
+    Stack Selector - Choose the right Terragrunt stack based on deployment type.
+
+    This tool helps select and configure the appropriate Terragrunt stack
+    for different deployment scenarios (control plane, data plane, BYOC, etc.).
+
+    Examples:
+
+        \b
+        # Select stack for a configuration
+        select-stack.py configs/production.yaml
+
+        \b
+        # List all available deployment types
+        select-stack.py --list
+
+        \b
+        # Override deployment type
+        select-stack.py configs/test.yaml --deployment-type control_plane
+
+        \b
+        # Export environment variables
+        select-stack.py configs/prod.yaml --export
+
+        \b
+        # Validate configuration only
+        select-stack.py configs/staging.yaml --validate-only
+    """
+
+    # Initialize selector
+    cache = ConfigCache(configs.CONFIG_DIR, enabled=not no_cache, rebuild=rebuild_cache)
+    try:
+        selector = StackSelector(cache=cache)
+    except click.ClickException:
+        ctx.exit(1)
+    finally:
+        if cache_stats:
+            console.print(f"[dim]{cache.describe()}[/dim]")
+
+    # Handle special options first
+    if show_config_dir:
+        console.print(f"[cyan]Configuration directory: {selector.config_dir}[/cyan]")
+        ctx.exit(0)
+
+    if list_types:
+        selector.list_available_types()
+        console.print(
+            f"\n[cyan]Configuration files loaded from: {selector.config_dir}[/cyan]"
+        )
+        console.print(
+            f"\n💡 [green]To add or modify deployment types, edit files in:[/green]"
+        )
+        console.print(f"   {selector.config_dir}")
+        ctx.exit(0)
+
+    # Require config file for other operations
+    if not config_file:
+        console.print(
+            "[red]Error: CONFIG_FILE is required unless using --list or --help[/red]"
+        )
+        console.print("\nUse --help for usage information")
+        ctx.exit(1)
+
+    # Load configuration
+    with console.status(
+        f"[bold green]Loading configuration: {config_file}[/bold green]"
+    ):
+        try:
+            config = load_config(config_file)
+        except click.ClickException:
+            ctx.exit(1)
+
+    # Validate configuration
+    errors = schema_mod.validate_tenant(config)
+    if errors:
+        console.print("[red]❌ Error: Invalid configuration:[/red]")
+        for line in schema_mod.format_errors(errors):
+            console.print(f"   [red]• {line}[/red]")
+        ctx.exit(1)
+
+    # Override deployment type if specified
+    if deployment_type:
+        config["deployment_type"] = deployment_type
+        console.print(
+            f"[yellow]⚠️  Overriding deployment type to: {deployment_type}[/yellow]"
+        )
+
+    # Get deployment type
+    try:
+        deployment_type = selector.get_deployment_type(config)
+    except click.ClickException:
+        ctx.exit(1)
+
+    # If validate-only, exit here
+    if validate_only:
+        console.print(f"[green]✅ Configuration is valid[/green]")
+        console.print(f"   Deployment type: {deployment_type}")
+        ctx.exit(0)
+
+    # JSON output for automation
+    if output_json:
+        stack_file = selector.get_stack_file(deployment_type)
+        output = {
+            "deployment_type": deployment_type,
+            "stack_file": stack_file,
+            "config_path": str(Path(config_file).absolute()),
+            "account_id": config.get("account_id"),
+            "region": config.get("region"),
+            "environment": config.get("env"),
+            "eta": history_mod.predict_for_stack_file(
+                stack_file, tenant=configs.tenant_label(config_file)
+            ),
+        }
+        click.echo(json.dumps(output, indent=2))
+        ctx.exit(0)
+
+    console.print()  # Add spacing
+
+    # Display configuration summary
+    display_config_summary(config)
+
+    console.print()  # Add spacing
+
+    # Display deployment type information
+    selector.display_deployment_info(deployment_type)
+
+    console.print()  # Add spacing
+
+    # Get stack file
+    stack_file = selector.get_stack_file(deployment_type)
+    if stack_file:
+        success_panel = Panel.fit(
+            f"[bold green]{stack_file}[/bold green]",
+            title="✅ Selected Stack",
+            border_style="green",
+        )
+        console.print(success_panel)
+        predictions = history_mod.predict_for_stack_file(
+            stack_file, tenant=configs.tenant_label(config_file)
+        )
+        if predictions:
+            console.print()
+            display_eta(predictions)
+    else:
+        console.print(f"[red]❌ No stack file available for {deployment_type}[/red]")
+        ctx.exit(1)
+
+    console.print()  # Add spacing
+
+    # Display commands
+    selector.export_config(config_file, deployment_type)
+
+    # If export flag is set, also print raw export commands
+    if export:
+        console.print()
+        console.print("[dim]# Copy and paste these commands:[/dim]")
+        console.print(f'export TENANT_CONFIG_PATH="{Path(config_file).absolute()}"')
+        console.print(f'export SELECTED_STACK="{stack_file}"')
+        console.print(f'export DEPLOYMENT_TYPE="{deployment_type}"')
+
+    console.print()  # Add spacing
+    console.print("[bold green]✨ Ready to deploy![/bold green]")
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--workers",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Worker processes (default: CPU count; 1 resolves in-process)",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=batch_mod.DEFAULT_CHUNK_SIZE,
+    show_default=True,
+    help="Tenant files handed to a worker at a time",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.File("w"),
+    default="-",
+    help="Write NDJSON results to this file instead of stdout",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Parse deployment configs without the on-disk cache",
+)
+def batch(sources, pattern, workers, chunk_size, output, no_cache):
+    """
+    Resolve many tenant configs in one process and stream NDJSON results.
+
+    SOURCES are tenant files, directory trees (searched recursively for
+    --pattern) or glob patterns. Each tenant is loaded, validated and mapped
+    to its deployment type; one JSON object per tenant is written as soon as
+    it is resolved, with stack_file, deployment_type, account_id, region and
+    errors. Exits 1 if any tenant has errors.
+
+    Examples:
+
+        \b
+        # Resolve every tenant.yaml in an apiary checkout
+        select-stack.py batch apiary/
+
+        \b
+        # Only production tenants, 8 workers
+        select-stack.py batch 'apiary/*/*/prod*/tenant.yaml' -j 8
+    """
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR,
+            cache=ConfigCache(configs.CONFIG_DIR, enabled=not no_cache),
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    total = failed = 0
+    records = batch_mod.resolve_fleet(
+        batch_mod.iter_tenant_files(sources, pattern),
+        deployment_stacks,
+        workers=workers,
+        chunk_size=chunk_size,
+    )
+    for record in records:
+        total += 1
+        if record["errors"]:
+            failed += 1
+        output.write(json.dumps(record) + "\n")
+        output.flush()
+
+    click.echo(f"Resolved {total} tenant configs ({failed} with errors)", err=True)
+    if failed:
+        sys.exit(1)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--workers",
+    "-j",
+    type=click.IntRange(min=1),
+    help="Worker processes (default: CPU count; 1 validates in-process)",
+)
+@click.option("--fail-fast", is_flag=True, help="Stop at the first invalid tenant")
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Parse deployment configs without the on-disk cache",
+)
+def validate(sources, pattern, workers, fail_fast, output_json, no_cache):
+    """
+    Validate tenant configs against the full schema before any terragrunt run.
+
+    Checks required fields, types, CIDRs, sregion codes and their region,
+    subnet settings, account IDs (must be quoted 12-digit strings) and the
+    deployment type. Every error is reported with its path, e.g.
+    "features.karpenter: expected boolean, got string". Exits 1 if any
+    tenant is invalid.
+
+    Examples:
+
+        \b
+        # Whole fleet on 8 workers
+        select-stack.py validate apiary/ -j 8
+
+        \b
+        # Gate a PR on the first bad tenant
+        select-stack.py validate apiary/ --fail-fast
+    """
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR,
+            cache=ConfigCache(configs.CONFIG_DIR, enabled=not no_cache),
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    checked = 0
+    invalid = []
+    records = batch_mod.resolve_fleet(
+        batch_mod.iter_tenant_files(sources, pattern),
+        deployment_stacks,
+        workers=workers,
+    )
+    try:
+        for record in records:
+            checked += 1
+            if not record["errors"]:
+                continue
+            invalid.append(record)
+            if not output_json:
+                console.print(f"[red]❌ {record['config_path']}[/red]")
+                for error in record["errors"]:
+                    console.print(f"   [red]• {error}[/red]")
+            if fail_fast:
+                break
+    finally:
+        records.close()
+
+    if output_json:
+        click.echo(
+            json.dumps(
+                {
+                    "checked": checked,
+                    "invalid": len(invalid),
+                    "stopped_early": fail_fast and bool(invalid),
+                    "tenants": [
+                        {"config_path": r["config_path"], "errors": r["errors"]}
+                        for r in invalid
+                    ],
+                },
+                indent=2,
+            )
+        )
+    elif invalid:
+        stopped = " (stopped at first failure)" if fail_fast else ""
+        console.print(
+            f"[red]{len(invalid)} of {checked} tenant configs invalid{stopped}[/red]"
+        )
+    else:
+        console.print(f"[green]✅ {checked} tenant configs valid[/green]")
+
+    if invalid:
+        sys.exit(1)
+
+
+def display_effective(document: Dict):
+    """Display an effective tenant config with the layer behind each value."""
+    console.print(
+        f"[bold cyan]{document['source']}[/bold cyan] "
+        f"([green]{document['deployment_type']}[/green])"
+    )
+    if document["layers"]:
+        console.print(f"Layers: {' → '.join(document['layers'])}")
+    table = Table(show_header=True, header_style="bold magenta")
+    table.add_column("Key", style="cyan")
+    table.add_column("Value")
+    table.add_column("Source", style="dim")
+    tenant_source = layers_mod.source_label(Path(document["source"]))
+    for key, value in layers_mod.iter_leaves(document["config"]):
+        source = document["provenance"].get(key, "")
+        style = "bold" if source == tenant_source else ""
+        table.add_row(
+            key, json.dumps(value), f"[{style}]{source}[/{style}]" if style else source
+        )
+    console.print(table)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("sources", nargs=-1, required=True)
+@click.option(
+    "--pattern",
+    default=batch_mod.DEFAULT_PATTERN,
+    show_default=True,
+    help="Tenant file name to match when walking directories",
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    help=f"Write the effective config here (one tenant only; see {layers_mod.EFFECTIVE_ENV})",
+)
+@click.option(
+    "--json",
+    "output_json",
+    is_flag=True,
+    help="Print one JSON document per tenant (NDJSON)",
+)
+@click.option(
+    "--no-provenance",
+    is_flag=True,
+    help="Leave the per-value sources out of the output",
+)
+@click.option(
+    "--no-cache",
+    is_flag=True,
+    help="Parse deployment configs without the on-disk cache",
+)
+def effective(sources, pattern, output, output_json, no_provenance, no_cache):
+    """
+    Resolve tenants through their layers into one effective config each.
+
+    Layers, lowest precedence first: the built-in defaults of
+    includes/stack-config.hcl, the deployment type (features, components,
+    cluster_config, subnet_config, tags), every defaults.yaml between the
+    repository root and the tenant (org, then region), and the tenant file.
+    Each value records the layer it came from. Shared layers are parsed
+    once however many tenants use them.
+
+    Point TG_EFFECTIVE_CONFIG at a file written with -o and
+    includes/stack-config.hcl reads it instead of decoding the tenant YAML.
+
+    Examples:
+
+        \b
+        # Where does each value come from?
+        select-stack.py effective apiary/acme/usw2/tenant.yaml
+
+        \b
+        # Precompute for terragrunt
+        select-stack.py effective apiary/acme/usw2/tenant.yaml -o effective.json
+        export TG_EFFECTIVE_CONFIG=$PWD/effective.json
+
+        \b
+        # Whole fleet
+        select-stack.py effective apiary/ --json > effective.ndjson
+    """
+    try:
+        deployment_stacks = configs.load_deployment_configs(
+            configs.CONFIG_DIR,
+            cache=ConfigCache(configs.CONFIG_DIR, enabled=not no_cache),
+        )
+    except configs.ConfigError as e:
+        raise click.ClickException(str(e))
+
+    resolver = layers_mod.LayerResolver(deployment_stacks)
+    total = failed = 0
+    written = None
+    for config_file in batch_mod.iter_tenant_files(sources, pattern):
+        total += 1
+        try:
+            digests = resolver.digests(config_file) if output else None
+            document = resolver.resolve(config_file)
+        except configs.ConfigError as e:
+            failed += 1
+            if output_json:
+                record = {"source": os.path.abspath(config_file), "errors": [str(e)]}
+                click.echo(json.dumps(record))
+            else:
+                console.print(f"[red]❌ {config_file}: {e}[/red]")
+            continue
+        if document["errors"]:
+            failed += 1
+            if not output_json:
+                console.print(f"[red]❌ {config_file}[/red]")
+                for error in document["errors"]:
+                    console.print(f"   [red]• {error}[/red]")
+                continue
+        if no_provenance:
+            del document["provenance"]
+
+        if output and not document["errors"]:
+            if written is not None:
+                raise click.ClickException("--output takes a single tenant config")
+            written = document
+            layers_mod.write_effective(dict(document, digests=digests), Path(output))
+        elif output_json:
+            click.echo(json.dumps(document))
+        elif no_provenance:
+            click.echo(json.dumps(document["config"], indent=2))
+        else:
+            display_effective(document)
+
+    stats = resolver.stats
+    click.echo(
+        f"Resolved {total} tenant configs ({failed} failed): "
+        f"{stats['layers_parsed']} layer files parsed, "
+        f"{stats['bases_built']} layer stacks merged, {stats['base_hits']} reused",
+        err=True,
+    )
+    if written is not None and not output_json:
+        console.print(f"[green]✅ Effective config written to {output}[/green]")
+    if failed or not total:
+        sys.exit(1)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.argument("targets", nargs=-1, type=click.Path(exists=True))
+@click.option(
+    "--format",
+    "-f",
+    "formats",
+    type=click.Choice(graphs_mod.FORMATS),
+    multiple=True,
+    help="Output formats (repeatable; default: dot and svg)",
+)
+@click.option(
+    "--force", is_flag=True, help="Render even graphs the manifest shows as current"
+)
+@click.option(
+    "--check", is_flag=True, help="Write nothing; exit 1 if any graph is out of date"
+)
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def graph(targets, formats, force, check, output_json):
+    """
+    Render dependency graphs of stacks and unit directories.
+
+    Graphs are built from the stack YAML units/dependencies and the units'
+    dependency blocks, with repo-relative node names. A stack graph is
+    written next to its file (full.stack.yaml -> full.graph.svg), a units
+    directory graph into the directory (units/hosting/graph.svg). Only
+    graphs whose inputs changed are rendered again; .graph-manifest.json
+    records the hashes.
+
+    Without TARGETS every stack file, units/ and each layer directory are
+    rendered, and graphs whose stack file or directory is gone are deleted.
+
+    Examples:
+
+        \b
+        # Refresh every graph after editing a stack or a unit
+        select-stack.py graph
+
+        \b
+        # One unit and its dependencies, as JSON
+        select-stack.py graph units/hosting/karpenter -f json
+
+        \b
+        # Fail CI when committed graphs are stale
+        select-stack.py graph --check
+    """
+    try:
+        report = graphs_mod.generate(
+            [str(Path(t).resolve()) for t in targets],
+            formats or graphs_mod.DEFAULT_FORMATS,
+            force=force,
+            check=check,
+        )
+    except (graphs_mod.GraphError, OSError) as e:
+        raise click.ClickException(str(e))
+
+    if output_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        for target in report["rendered"]:
+            console.print(f"[green]✓ rendered[/green] {target}")
+        for target in report["stale"]:
+            console.print(f"[red]✗ out of date[/red] {target}")
+        for path in report["removed"]:
+            console.print(f"[yellow]- removed[/yellow] {path}")
+        console.print(
+            f"[dim]{report['graphs']} graphs: {len(report['rendered'])} rendered, "
+            f"{len(report['unchanged'])} unchanged[/dim]"
+        )
+    if report["stale"]:
+        if not output_json:
+            console.print(
+                "[red]Run 'select-stack.py graph' and commit the result[/red]"
+            )
+        sys.exit(1)
+
+
+@main.command(context_settings=dict(help_option_names=["-h", "--help"]))
+@click.option("--check", is_flag=True, help="Fail when a generated file is out of date")
+@click.option(
+    "--json", "output_json", is_flag=True, help="Output in JSON format (for automation)"
+)
+def registry(check, output_json):
+    """
+    Compile the deployment-type configs into the generated registry files.
+
+    The YAML configs in stacks/deployment-types/configs are rendered as a
+    JSON lookup table (stacks/deployment-types/registry.json), as HCL
+    locals (includes/deployment-types.hcl) and as a shell lookup function
+    (scripts/deployment-types.sh, sourced by select-stack.sh). Commit all
+    three after changing a config.
+
+    Examples:
+
+        \b
+        # Regenerate after editing a deployment type
+        select-stack.py registry
+
+        \b
+        # Fail CI when the generated files and the configs diverge
+        select-stack.py registry --check
+    """
+    try:
+        report = registry_mod.build(check=check)
+    except (registry_mod.RegistryError, OSError) as e:
+        raise click.ClickException(str(e))
+
+    if output_json:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        for error in report["errors"]:
+            console.print(f"[red]❌ {error}[/red]")
+        for path in report["written"]:
+            console.print(f"[green]✓ written[/green] {path}")
+        for path in report["stale"]:
+            console.print(f"[red]✗ out of date[/red] {path}")
+        console.print(
+            f"[dim]{report['types']} deployment types ({len(report['enabled'])} enabled), "
+            f"{len(report['unchanged'])} files unchanged[/dim]"
+        )
+    if report["errors"] or report["stale"]:
+        if report["stale"] and not report["errors"] and not output_json:
+            console.print(
+                "[red]Run 'select-stack.py registry' and commit the result[/red]"
+            )
+        sys.exit(1)
@@ -0,0 +1,170 @@
+"""
+Loading and validation of deployment-type and tenant configurations.
+
+These helpers contain no terminal rendering: callers decide how to report
+warnings and errors (rich panels in the interactive CLI, plain stderr lines in
+the machine-output fast path).
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import yaml
+
+from stacktools import timings
+
+# libyaml's C loader is several times faster; fall back to pure Python
+SafeLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+REPO_ROOT = Path(__file__).resolve().parent.parent.parent
+# STACK_SELECTOR_CONFIG_DIR points the selector at another set of deployment
+# types (used by the benchmarks' synthetic fleets)
+CONFIG_DIR_ENV = "STACK_SELECTOR_CONFIG_DIR"
+CONFIG_DIR = Path(
+    os.environ.get(CONFIG_DIR_ENV)
+    or REPO_ROOT / "stacks" / "deployment-types" / "configs"
+)
+
+DEFAULT_DEPLOYMENT_TYPE = "full_stack"
+TENANT_FILE = "tenant.yaml"
+CONFIG_SUFFIXES = (".yaml", ".yml")
+
+
+class ConfigError(Exception):
+    """Raised when a configuration file cannot be loaded or resolved."""
+
+
+def load_yaml(stream):
+    """Parse YAML with the fastest available safe loader."""
+    return yaml.load(stream, Loader=SafeLoader)
+
+
+def config_files(config_dir: Path) -> List[Path]:
+    """Return all deployment-type config files in the configs directory."""
+    return list(config_dir.glob("*.yaml")) + list(config_dir.glob("*.yml"))
+
+
+def parse_deployment_config(config_file: Path) -> Optional[Dict]:
+    """Parse a single deployment-type config file.
+
+    Returns None when the file does not define a named deployment type.
+    """
+    with open(config_file, "r") as f:
+        config = load_yaml(f)
+    if config and "name" in config:
+        return config
+    return None
+
+
+def load_deployment_configs(
+    config_dir: Path,
+    on_loaded: Optional[Callable[[str], None]] = None,
+    on_skipped: Optional[Callable[[str], None]] = None,
+    on_error: Optional[Callable[[Path, Exception], None]] = None,
+    cache=None,
+) -> Dict[str, Dict]:
+    """Load every enabled deployment-type config in the configs directory.
+
+    Disabled configs and files that fail to parse are reported through the
+    optional callbacks and otherwise ignored. When a ConfigCache is given,
+    unchanged files are served from it and the cache is saved afterwards.
+    """
+    if not config_dir.exists():
+        raise ConfigError(f"Config directory not found: {config_dir}")
+
+    with timings.span("config_files", dir=str(config_dir)):
+        files = config_files(config_dir)
+    if not files:
+        raise ConfigError("No deployment configuration files found")
+
+    deployment_stacks = {}
+    for config_file in files:
+        try:
+            with timings.span("load_deployment_config", "parse", file=config_file.name):
+                if cache is not None:
+                    config = cache.get(config_file, parse_deployment_config)
+                else:
+                    config = parse_deployment_config(config_file)
+        except Exception as e:
+            if on_error:
+                on_error(config_file, e)
+            continue
+        if config is None:
+            continue
+        if config.get("enabled", True):
+            deployment_stacks[config["name"]] = config
+            if on_loaded:
+                on_loaded(config["name"])
+        elif on_skipped:
+            on_skipped(config["name"])
+
+    if cache is not None:
+        cache.prune(files)
+        with timings.span("cache_save"):
+            cache.save()
+
+    if not deployment_stacks:
+        raise ConfigError("No valid deployment configurations loaded")
+
+    return deployment_stacks
+
+
+def load_deployment_config(config_dir: Path, name: str, cache=None) -> Optional[Dict]:
+    """Load a single enabled deployment-type config by name.
+
+    Config files are conventionally named after the deployment type they
+    define, so this only parses ``<name>.yaml``/``<name>.yml`` and returns
+    None when that shortcut does not apply. Callers fall back to
+    load_deployment_configs() in that case. A given cache is not saved;
+    that is left to the caller.
+    """
+    for suffix in CONFIG_SUFFIXES:
+        config_file = config_dir / f"{name}{suffix}"
+        if not config_file.is_file():
+            continue
+        try:
+            with timings.span("load_deployment_config", "parse", file=config_file.name):
+                if cache is not None:
+                    config = cache.get(config_file, parse_deployment_config)
+                else:
+                    config = parse_deployment_config(config_file)
+        except Exception:
+            return None
+        if config and config["name"] == name and config.get("enabled", True):
+            return config
+        return None
+    return None
+
+
+def tenant_label(config_path: str) -> str:
+    """Short tenant ID, relative to the cwd when possible.
+
+    ``apiary/acme/usw2/tenant.yaml`` becomes ``apiary/acme/usw2``; other
+    file names keep their stem so configs sharing a directory stay distinct.
+    """
+    path = Path(config_path)
+    label = path.parent if path.name == TENANT_FILE else path.with_suffix("")
+    try:
+        return str(label.absolute().relative_to(Path.cwd()))
+    except ValueError:
+        return str(label)
+
+
+def load_config(config_file: str) -> Dict:
+    """Load and parse a tenant YAML configuration file."""
+    try:
+        with timings.span("load_config", "parse", file=str(config_file)), open(
+            config_file, "r"
+        ) as f:
+            config = load_yaml(f)
+    except FileNotFoundError:
+        raise ConfigError(f"Configuration file not found: {config_file}")
+    except yaml.YAMLError as e:
+        raise ConfigError(f"Invalid YAML in configuration file:\n  {e}")
+    except Exception as e:
+        raise ConfigError(f"Error loading configuration: {e}")
+
+    if not config:
+        raise ConfigError("Error loading configuration: Empty configuration file")
+    return config
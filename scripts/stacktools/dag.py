@@ -0,0 +1,434 @@
+"""
+Unit DAG analysis for ``*.stack.yaml`` files.
+
+Builds the dependency graph declared by a stack's ``units`` and reports:
+
+  * execution waves (units whose dependencies are all satisfied together)
+  * the critical path (longest dependency chain, by unit count or duration)
+  * the smallest ``parallelism`` whose schedule still reaches the
+    critical-path bound
+  * cycles, dependencies on paths that are not units of the stack, unit
+    directories missing from the repo, and units whose ``skip`` toggle
+    collapses edges (e.g. addons -> karpenter when SKIP_KARPENTER=true)
+
+Durations default to 1 per unit; a mapping of unit path (or unit basename)
+to seconds can be supplied instead.
+"""
+
+import heapq
+import re
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Set, Tuple
+
+from stacktools import configs
+
+SKIP_ENV_RE = re.compile(r'^\$\{\s*get_env\(\s*"(\w+)"\s*(?:,\s*"([^"]*)"\s*)?\)\s*\}$')
+TRUE_VALUES = {"true", "1", "yes"}
+DEFAULT_DURATION = 1.0
+
+
+class Unit:
+    """A unit entry from a stack YAML file."""
+
+    def __init__(self, path: str, description: str = "", dependencies=None, skip=None):
+        self.path = path
+        self.description = description
+        self.dependencies = list(dependencies or [])
+        self.skip = skip
+
+    @property
+    def name(self) -> str:
+        return self.path.rstrip("/").rsplit("/", 1)[-1]
+
+
+class StackSpec:
+    """A parsed ``*.stack.yaml`` file."""
+
+    def __init__(self, path: Path, data: Dict):
+        self.path = Path(path)
+        self.name = data.get("name", self.path.stem)
+        self.description = data.get("description", "")
+        self.stack_configuration = data.get("stack_configuration") or {}
+        self.units = [
+            Unit(
+                u["path"],
+                u.get("description", ""),
+                u.get("dependencies"),
+                u.get("skip"),
+            )
+            for u in data.get("units") or []
+            if u and u.get("path")
+        ]
+
+    @property
+    def parallelism(self) -> Optional[int]:
+        return self.stack_configuration.get("parallelism")
+
+    def relative_path(self) -> str:
+        try:
+            return str(self.path.resolve().relative_to(configs.REPO_ROOT))
+        except ValueError:
+            return str(self.path)
+
+
+def load_stack(path) -> StackSpec:
+    """Parse a stack YAML file."""
+    with open(path, "r") as f:
+        data = configs.load_yaml(f) or {}
+    return StackSpec(Path(path), data)
+
+
+def stack_files(repo_root: Path = configs.REPO_ROOT) -> List[Path]:
+    """Return every ``*.stack.yaml`` file under stacks/."""
+    return sorted((repo_root / "stacks").rglob("*.stack.yaml"))
+
+
+def evaluate_skip(expression, env: Mapping[str, str]) -> Optional[bool]:
+    """Evaluate a unit's ``skip`` value.
+
+    Supports booleans, "true"/"false" strings and
+    ``${get_env("NAME", "default")}``. Returns None for anything else.
+    """
+    if expression is None:
+        return False
+    if isinstance(expression, bool):
+        return expression
+    text = str(expression).strip()
+    match = SKIP_ENV_RE.match(text)
+    if match:
+        name, default = match.group(1), match.group(2) or ""
+        text = env.get(name, default)
+    if text.lower() in TRUE_VALUES:
+        return True
+    if text.lower() in {"false", "0", "no", ""}:
+        return False
+    return None
+
+
+def split_durations(
+    durations: Optional[Mapping],
+) -> Tuple[Dict[str, float], Dict[str, float]]:
+    """Return (unit durations, tenant durations) from a durations mapping.
+
+    Accepts the flat ``{unit path or name: seconds}`` format and
+    ``{"units": {...}, "tenants": {...}}`` as written by ``history durations``.
+    """
+    if not durations:
+        return {}, {}
+    if isinstance(durations.get("units"), dict) or isinstance(
+        durations.get("tenants"), dict
+    ):
+        return dict(durations.get("units") or {}), dict(durations.get("tenants") or {})
+    return dict(durations), {}
+
+
+def unit_duration(unit_path: str, durations: Optional[Mapping[str, float]]) -> float:
+    """Look up a unit's duration by full path, then by basename."""
+    if not durations:
+        return DEFAULT_DURATION
+    if unit_path in durations:
+        return float(durations[unit_path])
+    name = unit_path.rstrip("/").rsplit("/", 1)[-1]
+    return float(durations.get(name, DEFAULT_DURATION))
+
+
+def topological_waves(
+    nodes: List[str], deps: Mapping[str, Set[str]]
+) -> Tuple[List[List[str]], Set[str]]:
+    """Group nodes into waves with Kahn's algorithm.
+
+    Returns (waves, nodes_left_in_cycles).
+    """
+    indegree = {n: len(deps[n]) for n in nodes}
+    dependents: Dict[str, List[str]] = {n: [] for n in nodes}
+    for node in nodes:
+        for dep in deps[node]:
+            dependents[dep].append(node)
+
+    order = {n: i for i, n in enumerate(nodes)}
+    wave = [n for n in nodes if indegree[n] == 0]
+    waves = []
+    while wave:
+        waves.append(wave)
+        next_wave = []
+        for node in wave:
+            for child in dependents[node]:
+                indegree[child] -= 1
+                if indegree[child] == 0:
+                    next_wave.append(child)
+        wave = sorted(next_wave, key=order.get)
+
+    remaining = {n for n, d in indegree.items() if d > 0}
+    return waves, remaining
+
+
+def find_cycles(nodes: List[str], deps: Mapping[str, Set[str]]) -> List[List[str]]:
+    """Return strongly connected components that form cycles (Tarjan)."""
+    index: Dict[str, int] = {}
+    lowlink: Dict[str, int] = {}
+    on_stack: Set[str] = set()
+    stack: List[str] = []
+    cycles = []
+    counter = [0]
+
+    def visit(node):
+        index[node] = lowlink[node] = counter[0]
+        counter[0] += 1
+        stack.append(node)
+        on_stack.add(node)
+        for dep in deps[node]:
+            if dep not in index:
+                visit(dep)
+                lowlink[node] = min(lowlink[node], lowlink[dep])
+            elif dep in on_stack:
+                lowlink[node] = min(lowlink[node], index[dep])
+        if lowlink[node] == index[node]:
+            component = []
+            while True:
+                member = stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == node:
+                    break
+            if len(component) > 1 or node in deps[node]:
+                cycles.append(sorted(component))
+
+    for node in nodes:
+        if node not in index:
+            visit(node)
+    return cycles
+
+
+def critical_path(
+    waves: List[List[str]], deps: Mapping[str, Set[str]], weights: Mapping[str, float]
+) -> Tuple[float, List[str]]:
+    """Longest weighted dependency chain through an acyclic graph."""
+    finish: Dict[str, float] = {}
+    via: Dict[str, Optional[str]] = {}
+    for wave in waves:
+        for node in wave:
+            best_dep = max(sorted(deps[node]), key=lambda d: finish[d], default=None)
+            start = finish[best_dep] if best_dep else 0.0
+            finish[node] = start + weights[node]
+            via[node] = best_dep
+    if not finish:
+        return 0.0, []
+
+    node = max(finish, key=finish.get)
+    length = finish[node]
+    path = []
+    while node:
+        path.append(node)
+        node = via[node]
+    return length, list(reversed(path))
+
+
+def bottom_levels(
+    waves: List[List[str]], deps: Mapping[str, Set[str]], weights: Mapping[str, float]
+) -> Dict[str, float]:
+    """Longest path from each node to the end of the graph, including itself."""
+    dependents: Dict[str, List[str]] = {n: [] for wave in waves for n in wave}
+    for node in dependents:
+        for dep in deps[node]:
+            dependents[dep].append(node)
+    level: Dict[str, float] = {}
+    for wave in reversed(waves):
+        for node in wave:
+            level[node] = weights[node] + max(
+                (level[c] for c in dependents[node]), default=0.0
+            )
+    return level
+
+
+def schedule_makespan(
+    waves: List[List[str]],
+    deps: Mapping[str, Set[str]],
+    weights: Mapping[str, float],
+    parallelism: int,
+) -> float:
+    """Simulate list scheduling with ``parallelism`` slots.
+
+    Ready units are started in order of their bottom level (longest remaining
+    chain first), which is how a critical-path-aware queue behaves.
+    """
+    nodes = [n for wave in waves for n in wave]
+    if not nodes:
+        return 0.0
+    priority = bottom_levels(waves, deps, weights)
+    remaining = {n: len(deps[n]) for n in nodes}
+    dependents: Dict[str, List[str]] = {n: [] for n in nodes}
+    for node in nodes:
+        for dep in deps[node]:
+            dependents[dep].append(node)
+
+    ready = [(-priority[n], n) for n in nodes if remaining[n] == 0]
+    heapq.heapify(ready)
+    running: List[Tuple[float, str]] = []
+    now = 0.0
+    while ready or running:
+        while ready and len(running) < parallelism:
+            _, node = heapq.heappop(ready)
+            heapq.heappush(running, (now + weights[node], node))
+        now, node = heapq.heappop(running)
+        finished = [node]
+        while running and running[0][0] <= now:
+            finished.append(heapq.heappop(running)[1])
+        for done in finished:
+            for child in dependents[done]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    heapq.heappush(ready, (-priority[child], child))
+    return now
+
+
+def recommend_parallelism(
+    waves: List[List[str]],
+    deps: Mapping[str, Set[str]],
+    weights: Mapping[str, float],
+    bound: float,
+) -> int:
+    """Smallest parallelism whose schedule finishes at the critical-path bound."""
+    upper = max((len(w) for w in waves), default=1)
+    total = sum(len(w) for w in waves)
+    for parallelism in range(1, max(upper, 1) + 1):
+        if schedule_makespan(waves, deps, weights, parallelism) <= bound + 1e-9:
+            return parallelism
+    # List scheduling anomalies can need more slots than the widest wave
+    for parallelism in range(upper + 1, total + 1):
+        if schedule_makespan(waves, deps, weights, parallelism) <= bound + 1e-9:
+            return parallelism
+    return max(total, 1)
+
+
+def _active_dependencies(
+    stack: StackSpec, skipped: Set[str]
+) -> Tuple[Dict[str, Set[str]], List[Dict]]:
+    """Dependency sets for non-skipped units, bridging across skipped units.
+
+    A dependency on a skipped unit is replaced by that unit's own (active)
+    dependencies, so ordering through it is preserved. Returns the
+    dependency map and the list of collapsed edges.
+    """
+    declared = {u.path: set(u.dependencies) for u in stack.units}
+    collapsed = []
+
+    def resolve(dep: str, seen: Set[str]) -> Set[str]:
+        if dep not in declared:
+            return set()
+        if dep not in skipped:
+            return {dep}
+        if dep in seen:
+            return set()
+        seen.add(dep)
+        result: Set[str] = set()
+        for upstream in declared.get(dep, ()):
+            result |= resolve(upstream, seen)
+        return result
+
+    deps: Dict[str, Set[str]] = {}
+    for unit in stack.units:
+        if unit.path in skipped:
+            continue
+        resolved: Set[str] = set()
+        for dep in unit.dependencies:
+            targets = resolve(dep, set())
+            if dep in skipped:
+                collapsed.append(
+                    {
+                        "unit": unit.path,
+                        "skipped_dependency": dep,
+                        "bridged_to": sorted(targets - set(unit.dependencies)),
+                    }
+                )
+            resolved |= targets
+        deps[unit.path] = resolved
+    return deps, collapsed
+
+
+def analyze_stack(
+    stack: StackSpec,
+    durations: Optional[Mapping[str, float]] = None,
+    env: Optional[Mapping[str, str]] = None,
+    repo_root: Path = configs.REPO_ROOT,
+) -> Dict:
+    """Analyze one stack and return a JSON-serializable report."""
+    env = env or {}
+    unit_paths = [u.path for u in stack.units]
+    known = set(unit_paths)
+
+    dangling = [
+        {"unit": u.path, "dependency": dep}
+        for u in stack.units
+        for dep in u.dependencies
+        if dep not in known
+    ]
+    missing_dirs = [p for p in unit_paths if not (repo_root / p).is_dir()]
+
+    skipped: Set[str] = set()
+    skip_toggles = []
+    unevaluated = []
+    for unit in stack.units:
+        if unit.skip is None:
+            continue
+        value = evaluate_skip(unit.skip, env)
+        if value is None:
+            unevaluated.append({"unit": unit.path, "expression": str(unit.skip)})
+            continue
+        if value:
+            skipped.add(unit.path)
+        dependents = [u.path for u in stack.units if unit.path in u.dependencies]
+        skip_toggles.append(
+            {
+                "unit": unit.path,
+                "expression": str(unit.skip),
+                "skipped": value,
+                "dependents": dependents,
+            }
+        )
+
+    deps, collapsed = _active_dependencies(stack, skipped)
+    active = [p for p in unit_paths if p not in skipped]
+    weights = {p: unit_duration(p, durations) for p in active}
+
+    waves, in_cycles = topological_waves(active, deps)
+    cycles = find_cycles(active, deps) if in_cycles else []
+
+    report = {
+        "stack": stack.relative_path(),
+        "name": stack.name,
+        "duration_source": "durations" if durations else "unit-count",
+        "configured_parallelism": stack.parallelism,
+        "units": len(unit_paths),
+        "active_units": len(active),
+        "skipped_units": sorted(skipped),
+        "waves": waves,
+        "max_wave_width": max((len(w) for w in waves), default=0),
+        "total_work": sum(weights.values()),
+        "critical_path": {"length": 0.0, "units": []},
+        "recommended_parallelism": None,
+        "makespan_at_configured_parallelism": None,
+        "cycles": cycles,
+        "dangling_dependencies": dangling,
+        "missing_unit_dirs": missing_dirs,
+        "skip_toggles": skip_toggles,
+        "collapsed_edges": collapsed,
+        "unevaluated_skips": unevaluated,
+    }
+    if cycles:
+        return report
+
+    length, path = critical_path(waves, deps, weights)
+    report["critical_path"] = {"length": length, "units": path}
+    report["recommended_parallelism"] = recommend_parallelism(
+        waves, deps, weights, length
+    )
+    if stack.parallelism:
+        report["makespan_at_configured_parallelism"] = schedule_makespan(
+            waves, deps, weights, int(stack.parallelism)
+        )
+    return report
+
+
+def has_errors(report: Dict) -> bool:
+    """Cycles and dangling dependencies make a stack unrunnable."""
+    return bool(report["cycles"] or report["dangling_dependencies"])
@@ -0,0 +1,397 @@
+"""
+Prefetched outputs for unit ``dependency`` blocks.
+
+Every ``dependency`` block makes terragrunt read the upstream unit's outputs
+from remote state, and the same upstream (``cluster``, ``vpc``) is read once
+per unit that depends on it. This module walks a stack's graph once, reads
+each upstream state file a single time, in parallel, and writes one outputs
+file that ``includes/stack-config.hcl`` loads from ``TG_DEPENDENCY_OUTPUTS``.
+
+Outputs are keyed by the state file's unit basename, the same name
+``remote-state.hcl`` keys state on, so units sharing a basename share one
+entry exactly as they share one state file.
+
+Fetched outputs are kept in a local cache:
+
+  * ``objects/`` holds outputs content-addressed by SHA-256, so an unchanged
+    state read by many tenants or runs is stored once;
+  * ``index.json`` maps each state object (bucket/key) to its ETag, state
+    serial and lineage, and its outputs digest.
+
+An entry younger than the TTL is used without touching S3. An older one is
+revalidated with a conditional GET on its ETag; a changed object whose serial
+and lineage did not move keeps its digest. ``prune`` evicts entries not
+revalidated within a maximum age and deletes objects nothing references.
+
+State is read through a store: ``S3StateStore`` (boto3, optional endpoint for
+a local S3 such as moto or MinIO) or ``LocalStateStore``, a directory laid out
+as ``<root>/<bucket>/<key>`` that stands in for S3 in tests.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+from stacktools import configs, dag, statelocks, terragrunt, timings
+from stacktools.cache import default_cache_dir, file_digest
+
+OUTPUTS_ENV = "TG_DEPENDENCY_OUTPUTS"
+OUTPUTS_VERSION = 2
+INDEX_VERSION = 1
+DEFAULT_TTL = 300.0
+DEFAULT_MAX_AGE = 7 * 24 * 3600.0
+# How long stack-config.hcl accepts an outputs file after it was written
+DEFAULT_OUTPUTS_MAX_AGE = 3600.0
+DEFAULT_WORKERS = 8
+
+
+class StateStoreError(Exception):
+    """Raised when a state object cannot be read."""
+
+
+class S3StateStore:
+    """Reads state objects from S3 with boto3.
+
+    ``endpoint_url`` points the client at an S3-compatible server (moto,
+    MinIO); boto3 also honours ``AWS_ENDPOINT_URL_S3`` on its own.
+    """
+
+    def __init__(
+        self, region: Optional[str] = None, endpoint_url: Optional[str] = None
+    ):
+        try:
+            import boto3
+            from botocore.exceptions import ClientError
+        except ImportError:
+            raise StateStoreError(
+                "boto3 is required to read state from S3 (pip install boto3)"
+            )
+        self._client_error = ClientError
+        self.client = boto3.client("s3", region_name=region, endpoint_url=endpoint_url)
+
+    def get(self, bucket: str, key: str, if_none_match: Optional[str] = None):
+        """Return (etag, body); body is None if unchanged, (None, None) if missing."""
+        kwargs = {"Bucket": bucket, "Key": key}
+        if if_none_match:
+            kwargs["IfNoneMatch"] = if_none_match
+        try:
+            response = self.client.get_object(**kwargs)
+        except self._client_error as e:
+            error = e.response.get("Error", {})
+            status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+            if status == 304 or error.get("Code") in ("304", "NotModified"):
+                return if_none_match, None
+            if error.get("Code") in ("NoSuchKey", "404"):
+                return None, None
+            raise StateStoreError(f"s3://{bucket}/{key}: {error.get('Message') or e}")
+        return response["ETag"], response["Body"].read()
+
+
+class LocalStateStore:
+    """A directory standing in for S3: ``<root>/<bucket>/<key>``.
+
+    ETags are quoted MD5 digests of the content, like S3's for objects
+    uploaded in one part.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def get(self, bucket: str, key: str, if_none_match: Optional[str] = None):
+        path = self.root / bucket / key
+        try:
+            body = path.read_bytes()
+        except FileNotFoundError:
+            return None, None
+        except OSError as e:
+            raise StateStoreError(f"{path}: {e}")
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        if etag == if_none_match:
+            return etag, None
+        return etag, body
+
+
+def parse_state(body: bytes) -> Dict:
+    """Serial, lineage and output values of a terraform state file."""
+    try:
+        state = json.loads(body)
+    except ValueError as e:
+        raise StateStoreError(f"state is not valid JSON: {e}")
+    outputs = state.get("outputs") or {}
+    return {
+        "serial": state.get("serial"),
+        "lineage": state.get("lineage"),
+        "outputs": {name: output.get("value") for name, output in outputs.items()},
+    }
+
+
+def outputs_digest(outputs: Mapping) -> Tuple[str, bytes]:
+    """SHA-256 and canonical JSON of an outputs mapping."""
+    data = json.dumps(outputs, sort_keys=True, separators=(",", ":")).encode()
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def _write_atomic(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # mkstemp files are 0600: outputs can hold sensitive values
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        Path(tmp_path).unlink(missing_ok=True)
+        raise
+
+
+class OutputCache:
+    """Content-addressed outputs with an ETag/serial index and a TTL."""
+
+    def __init__(self, cache_dir: Optional[Path] = None, ttl: float = DEFAULT_TTL):
+        self.root = (
+            Path(cache_dir) if cache_dir else default_cache_dir() / "dependency-outputs"
+        )
+        self.ttl = ttl
+        self.index_path = self.root / "index.json"
+        self.entries: Dict[str, Dict] = self._read_index()
+
+    def _read_index(self) -> Dict[str, Dict]:
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(index, dict) or index.get("version") != INDEX_VERSION:
+            return {}
+        return index.get("entries", {})
+
+    def save(self):
+        data = json.dumps({"version": INDEX_VERSION, "entries": self.entries}, indent=1)
+        _write_atomic(self.index_path, data.encode())
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.json"
+
+    def load_outputs(self, digest: str) -> Optional[Dict]:
+        try:
+            with open(self.object_path(digest)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def store_outputs(self, outputs: Mapping) -> str:
+        digest, data = outputs_digest(outputs)
+        path = self.object_path(digest)
+        if not path.exists():
+            _write_atomic(path, data)
+        return digest
+
+    def fetch(self, store, bucket: str, key: str, refresh: bool = False) -> Dict:
+        """Outputs of one state object, from the cache when still valid.
+
+        ``status`` is "fresh" (within the TTL), "revalidated" (ETag
+        unchanged), "unchanged" (new ETag, same serial and lineage),
+        "fetched" or "missing" (no state object yet).
+        """
+        lock_id = f"{bucket}/{key}"
+        entry = self.entries.get(lock_id)
+        now = time.time()
+        if entry is not None:
+            outputs = self.load_outputs(entry["digest"])
+            if outputs is None:
+                entry = None
+            elif not refresh and now - entry["checked_at"] < self.ttl:
+                return {"status": "fresh", "outputs": outputs, **_meta(entry)}
+
+        etag, body = store.get(bucket, key, entry["etag"] if entry else None)
+        if etag is None:
+            self.entries.pop(lock_id, None)
+            return {"status": "missing", "outputs": None}
+        if body is None:
+            entry["checked_at"] = now
+            return {"status": "revalidated", "outputs": outputs, **_meta(entry)}
+
+        state = parse_state(body)
+        status = "fetched"
+        if (
+            entry is not None
+            and state["serial"] == entry["serial"]
+            and state["lineage"] == entry["lineage"]
+        ):
+            status = "unchanged"
+        entry = {
+            "etag": etag,
+            "serial": state["serial"],
+            "lineage": state["lineage"],
+            "digest": self.store_outputs(state["outputs"]),
+            "fetched_at": now,
+            "checked_at": now,
+        }
+        self.entries[lock_id] = entry
+        return {"status": status, "outputs": state["outputs"], **_meta(entry)}
+
+    def prune(self, max_age: float = DEFAULT_MAX_AGE) -> Dict:
+        """Evict entries not revalidated within ``max_age`` and orphaned objects."""
+        now = time.time()
+        expired = [
+            k for k, e in self.entries.items() if now - e["checked_at"] >= max_age
+        ]
+        for lock_id in expired:
+            del self.entries[lock_id]
+        live = {e["digest"] for e in self.entries.values()}
+        removed = 0
+        objects = self.root / "objects"
+        if objects.is_dir():
+            for path in objects.glob("*/*.json"):
+                if path.stem not in live:
+                    path.unlink(missing_ok=True)
+                    removed += 1
+        self.save()
+        return {
+            "evicted": len(expired),
+            "objects_removed": removed,
+            "entries": len(self.entries),
+        }
+
+    def stats(self) -> Dict:
+        now = time.time()
+        objects = self.root / "objects"
+        files = list(objects.glob("*/*.json")) if objects.is_dir() else []
+        return {
+            "path": str(self.root),
+            "entries": len(self.entries),
+            "fresh": sum(
+                1 for e in self.entries.values() if now - e["checked_at"] < self.ttl
+            ),
+            "objects": len(files),
+            "bytes": sum(p.stat().st_size for p in files),
+        }
+
+
+def _meta(entry: Mapping) -> Dict:
+    return {k: entry[k] for k in ("etag", "serial", "lineage", "digest")}
+
+
+def dependency_reads(
+    stack: dag.StackSpec,
+    units: Mapping[str, terragrunt.UnitConfig],
+    env: Optional[Mapping[str, str]] = None,
+) -> Dict[str, List[str]]:
+    """Upstream state basename -> ``unit:block`` readers, over the stack's active units."""
+    reads: Dict[str, List[str]] = {}
+    for unit in statelocks.stack_units(stack, env):
+        config = units.get(unit.path)
+        if config is None:
+            continue
+        for block, upstream in sorted(config.dependency_blocks.items()):
+            reads.setdefault(statelocks.unit_basename(upstream), []).append(
+                f"{unit.path}:{block}"
+            )
+    return reads
+
+
+def prefetch(
+    config: Mapping,
+    config_path: str,
+    stack: dag.StackSpec,
+    store,
+    cache: OutputCache,
+    env: Optional[Mapping[str, str]] = None,
+    workers: int = DEFAULT_WORKERS,
+    refresh: bool = False,
+    repo_root: Path = configs.REPO_ROOT,
+    max_age: float = DEFAULT_OUTPUTS_MAX_AGE,
+) -> Dict:
+    """Read every upstream state of ``stack`` once, in parallel.
+
+    Returns the outputs document (``outputs`` by basename, ``sources`` with
+    each state object's ETag and serial) plus per-upstream results. Upstreams
+    without state or without outputs are left out, so their dependency
+    blocks fall back to terragrunt's own read and mocks.
+
+    The document names the tenant file ``config_path`` it was fetched for,
+    with its SHA-256, and expires ``max_age`` seconds after it was
+    generated. ``stack-config.hcl`` ignores it for any other tenant file,
+    after the file changed, or once it expired.
+    """
+    reads = dependency_reads(stack, terragrunt.scan_units(repo_root), env)
+    # Any reader's unit path gives the same state key: only the basename counts
+    locations = {
+        name: statelocks.state_location(config, name) for name in sorted(reads)
+    }
+
+    def fetch(name):
+        loc = locations[name]
+        started = time.monotonic()
+        try:
+            with timings.span("state_read", "io", unit=name):
+                result = cache.fetch(store, loc["bucket"], loc["key"], refresh=refresh)
+        except StateStoreError as e:
+            result = {"status": "error", "error": str(e), "outputs": None}
+        result["seconds"] = round(time.monotonic() - started, 3)
+        return name, result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        results = dict(pool.map(fetch, locations))
+    cache.save()
+
+    outputs, sources, report = {}, {}, []
+    for name in sorted(results):
+        result = results[name]
+        if result.get("outputs"):
+            outputs[name] = result["outputs"]
+            sources[name] = {
+                "lock_id": locations[name]["lock_id"],
+                **{k: result[k] for k in ("etag", "serial", "lineage", "digest")},
+            }
+        report.append(
+            {
+                "upstream": name,
+                "lock_id": locations[name]["lock_id"],
+                "status": result["status"],
+                "readers": reads[name],
+                "outputs": len(result.get("outputs") or {}),
+                "seconds": result["seconds"],
+                "error": result.get("error"),
+            }
+        )
+
+    statuses: Dict[str, int] = {}
+    for item in report:
+        statuses[item["status"]] = statuses.get(item["status"], 0) + 1
+    with open(config_path, "rb") as f:
+        config_digest = file_digest(f.read())
+    generated_at = int(time.time())
+    return {
+        "document": {
+            "version": OUTPUTS_VERSION,
+            "stack": stack.relative_path(),
+            "config_path": os.path.abspath(config_path),
+            "config_sha256": config_digest,
+            "generated_at": generated_at,
+            "expires_at": time.strftime(
+                "%Y-%m-%dT%H:%M:%SZ", time.gmtime(generated_at + max_age)
+            ),
+            "outputs": outputs,
+            "sources": sources,
+        },
+        "upstreams": report,
+        "summary": {
+            "dependency_blocks": sum(len(r) for r in reads.values()),
+            "served_blocks": sum(len(reads[name]) for name in outputs),
+            "state_reads": sum(
+                1 for i in report if i["status"] not in ("fresh", "error")
+            ),
+            "statuses": statuses,
+        },
+    }
+
+
+def write_outputs(document: Mapping, path: Path):
+    """Write an outputs document for ``TG_DEPENDENCY_OUTPUTS``."""
+    _write_atomic(Path(path), json.dumps(document, indent=2, sort_keys=True).encode())
@@ -0,0 +1,197 @@
+"""
+Fast path for the machine-output modes of select-stack.py.
+
+CI jobs call ``select-stack.py --json``, ``--validate-only`` and
+``--show-config-dir`` thousands of times a day, where interpreter startup
+dominates wall time. This module answers those invocations using only the
+standard library and PyYAML: it never imports click or rich, loads only the
+deployment-type config it needs and writes plain output to stdout (warnings
+and errors go to stderr).
+
+Anything it does not recognise is left to the full click CLI.
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from stacktools import configs, schema
+from stacktools.cache import ConfigCache, history_db_path
+
+MACHINE_FLAGS = ("--json", "--validate-only", "--show-config-dir")
+
+
+class _NotEligible(Exception):
+    """Raised when an invocation must be handled by the full CLI."""
+
+
+class _Parser(argparse.ArgumentParser):
+    def error(self, message):
+        raise _NotEligible(message)
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = _Parser(add_help=False, allow_abbrev=False)
+    parser.add_argument("config_file", nargs="?")
+    parser.add_argument("--deployment-type", "-t")
+    parser.add_argument("--export", "-e", action="store_true")
+    parser.add_argument("--json", dest="output_json", action="store_true")
+    parser.add_argument("--validate-only", action="store_true")
+    parser.add_argument("--show-config-dir", action="store_true")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--rebuild-cache", action="store_true")
+    parser.add_argument("--cache-stats", action="store_true")
+    return parser
+
+
+def _warn(message: str):
+    print(message, file=sys.stderr)
+
+
+def _error(message: str) -> int:
+    print(f"Error: {message}", file=sys.stderr)
+    return 1
+
+
+def _resolve_deployment(
+    config_dir: Path, deployment_type: str, cache: ConfigCache
+) -> Dict:
+    """Load the config for one deployment type, scanning all files only on a miss."""
+    info = configs.load_deployment_config(config_dir, deployment_type, cache=cache)
+    if info is not None:
+        cache.save()
+        return info
+
+    deployment_stacks = configs.load_deployment_configs(config_dir, cache=cache)
+    if deployment_type not in deployment_stacks:
+        raise configs.ConfigError(
+            f"Unknown deployment type: {deployment_type}\n"
+            f"   Valid types: {', '.join(sorted(deployment_stacks.keys()))}"
+        )
+    return deployment_stacks[deployment_type]
+
+
+def _stack_file(deployment_type: str, info: Dict) -> Optional[str]:
+    stack_file = info.get("stack_file")
+    if not stack_file:
+        _warn(f"Error: Stack file not configured for {deployment_type}")
+        return None
+
+    stack_path = configs.REPO_ROOT / stack_file
+    if not stack_path.exists():
+        _warn(f"Warning: Stack file not found: {stack_file}")
+        _warn(f"   Expected at: {stack_path}")
+    return stack_file
+
+
+def _predict_eta(stack_file: Optional[str], config_file: str) -> Optional[Dict]:
+    """ETA from the run history, or None.
+
+    The history module (sqlite3 and the DAG code) is only imported when a
+    history database exists, so calls without one pay nothing for it.
+    """
+    if not stack_file or not history_db_path().exists():
+        return None
+    from stacktools import history
+
+    return history.predict_for_stack_file(
+        stack_file, tenant=configs.tenant_label(config_file)
+    )
+
+
+def run_fast_path(
+    argv: List[str], config_dir: Path = configs.CONFIG_DIR
+) -> Optional[int]:
+    """Handle a machine-output invocation.
+
+    Returns the process exit code, or None when the arguments need the full
+    click/rich CLI (help, --list, interactive display, unknown options).
+    """
+    if not any(flag in argv for flag in MACHINE_FLAGS):
+        return None
+    if argv[0] == "select":
+        argv = argv[1:]
+    try:
+        args = _build_parser().parse_args(argv)
+    except _NotEligible:
+        return None
+    if args.config_file and not Path(args.config_file).exists():
+        # Let click report the usage error with its usual formatting
+        return None
+
+    if not config_dir.exists():
+        return _error(f"Config directory not found: {config_dir}")
+
+    if args.show_config_dir:
+        print(f"Configuration directory: {config_dir}")
+        return 0
+
+    if not args.config_file:
+        return _error("CONFIG_FILE is required unless using --list or --help")
+
+    try:
+        config = configs.load_config(args.config_file)
+    except configs.ConfigError as e:
+        return _error(str(e))
+
+    errors = schema.validate_tenant(config)
+    if errors:
+        _error("Invalid configuration:")
+        for line in schema.format_errors(errors):
+            _warn(f"   • {line}")
+        return 1
+
+    if args.deployment_type:
+        config["deployment_type"] = args.deployment_type
+        _warn(f"Overriding deployment type to: {args.deployment_type}")
+
+    deployment_type = config.get("deployment_type")
+    if not deployment_type:
+        _warn("Warning: deployment_type not specified in configuration")
+        _warn(f"   Defaulting to '{configs.DEFAULT_DEPLOYMENT_TYPE}'")
+        deployment_type = configs.DEFAULT_DEPLOYMENT_TYPE
+
+    cache = ConfigCache(
+        config_dir, enabled=not args.no_cache, rebuild=args.rebuild_cache
+    )
+    try:
+        info = _resolve_deployment(config_dir, deployment_type, cache)
+    except configs.ConfigError as e:
+        return _error(str(e))
+    finally:
+        if args.cache_stats:
+            _warn(cache.describe())
+
+    config_path = str(Path(args.config_file).absolute())
+
+    if args.validate_only:
+        if args.output_json:
+            print(
+                json.dumps(
+                    {
+                        "valid": True,
+                        "deployment_type": deployment_type,
+                        "config_path": config_path,
+                    },
+                    indent=2,
+                )
+            )
+        else:
+            print("✅ Configuration is valid")
+            print(f"   Deployment type: {deployment_type}")
+        return 0
+
+    stack_file = _stack_file(deployment_type, info)
+    output = {
+        "deployment_type": deployment_type,
+        "stack_file": stack_file,
+        "config_path": config_path,
+        "account_id": config.get("account_id"),
+        "region": config.get("region"),
+        "environment": config.get("env"),
+        "eta": _predict_eta(stack_file, args.config_file),
+    }
+    print(json.dumps(output, indent=2))
+    return 0
@@ -0,0 +1,453 @@
+"""
+SQLite index of tenant configs for fast fleet queries.
+
+Each indexed ``tenant.yaml`` is one row of ``tenants`` holding the fields
+rollouts filter on (org, env, sregion, region, deployment_type, account_id,
+...) plus its resolved stack file, and one row per feature in ``features``
+with the effective on/off value: the deployment type's feature lists,
+overridden by the tenant's ``features`` mapping and component blocks.
+
+Refreshes are incremental. A file whose mtime and size match its row is not
+opened; otherwise its SHA-256 is compared before it is re-parsed. When the
+deployment-type configs or the tenant schema change, derived columns and
+validation errors are recomputed from the stored configs without re-reading
+any tenant file.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from stacktools import configs, schema
+from stacktools.batch import DEFAULT_PATTERN, iter_tenant_files
+from stacktools.cache import default_cache_dir, file_digest
+
+SCHEMA_VERSION = 3
+DB_ENV = "STACK_SELECTOR_FLEET_DB"
+
+# Columns copied verbatim from tenant.yaml and filterable by query()
+TENANT_FIELDS = (
+    "org",
+    "env",
+    "sregion",
+    "region",
+    "deployment",
+    "deployment_type",
+    "account_id",
+    "vpc_cidr",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tenants (
+    path TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    org TEXT,
+    env TEXT,
+    sregion TEXT,
+    region TEXT,
+    deployment TEXT,
+    deployment_type TEXT,
+    account_id TEXT,
+    vpc_cidr TEXT,
+    stack_file TEXT,
+    errors TEXT NOT NULL,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS features (
+    path TEXT NOT NULL REFERENCES tenants(path) ON DELETE CASCADE,
+    feature TEXT NOT NULL,
+    enabled INTEGER NOT NULL,
+    PRIMARY KEY (path, feature)
+);
+CREATE INDEX IF NOT EXISTS tenants_org ON tenants(org);
+CREATE INDEX IF NOT EXISTS tenants_env ON tenants(env);
+CREATE INDEX IF NOT EXISTS tenants_sregion ON tenants(sregion);
+CREATE INDEX IF NOT EXISTS tenants_region ON tenants(region);
+CREATE INDEX IF NOT EXISTS tenants_deployment_type ON tenants(deployment_type);
+CREATE INDEX IF NOT EXISTS tenants_account_id ON tenants(account_id);
+CREATE INDEX IF NOT EXISTS features_feature ON features(feature, enabled);
+"""
+
+
+def default_db_path() -> Path:
+    """Return the fleet index location (``STACK_SELECTOR_FLEET_DB`` overrides)."""
+    if os.environ.get(DB_ENV):
+        return Path(os.environ[DB_ENV])
+    return default_cache_dir() / "fleet-index.sqlite"
+
+
+def deployment_fingerprint(deployment_stacks: Dict[str, Dict]) -> str:
+    """Stable hash of the parsed deployment-type configs and the tenant schema.
+
+    Derived columns, features and stored validation errors depend on both.
+    """
+    blob = json.dumps(
+        {"deployment_types": deployment_stacks, "schema": schema.fingerprint()},
+        sort_keys=True,
+        default=str,
+    ).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+def known_features(deployment_stacks: Dict[str, Dict]) -> Set[str]:
+    """Every feature any deployment type enables or disables."""
+    return {
+        str(name)
+        for info in deployment_stacks.values()
+        for key in ("features", "disabled_features")
+        for name in info.get(key) or []
+    }
+
+
+def component_toggles(
+    config: Dict, known: Iterable[str], errors: Optional[List[str]] = None
+) -> Dict[str, bool]:
+    """Per-component switches in a config: ``name: {enabled: bool}`` blocks
+    and ``deploy_<name>: bool`` keys (``deploy_karpenter``).
+
+    Only names in ``known`` count, so blocks such as ``existing_vpc:
+    {enabled: false}`` are not features. A switch that is not a boolean is
+    skipped and reported to ``errors``.
+    """
+    known = set(known)
+    toggles = {}
+    for key, value in config.items():
+        if not isinstance(key, str):
+            continue
+        if key in known and isinstance(value, dict) and "enabled" in value:
+            name, enabled, where = key, value["enabled"], f"{key}.enabled"
+        elif key.startswith("deploy_") and key[len("deploy_") :] in known:
+            name, enabled, where = key[len("deploy_") :], value, key
+        else:
+            continue
+        if isinstance(enabled, bool):
+            toggles[name] = enabled
+        elif errors is not None:
+            errors.append(f"{where}: {enabled!r} is not a boolean; ignored")
+    return toggles
+
+
+def effective_features(
+    config: Dict,
+    deployment_info: Optional[Dict],
+    known: Iterable[str] = (),
+    errors: Optional[List[str]] = None,
+) -> Dict[str, bool]:
+    """Effective on/off value of every feature a tenant mentions.
+
+    Later sources win: the deployment type's ``disabled_features`` and
+    ``features`` lists, its component blocks (``karpenter: {enabled: ...}``),
+    the tenant's ``features`` map, then the tenant's own component blocks and
+    ``deploy_<name>`` keys, which are what the units read. Component blocks
+    and ``deploy_<name>`` keys only count for ``known`` features (plus the
+    type's own lists); values that are not booleans are ignored, and the
+    tenant's are reported to ``errors``.
+    """
+    info = deployment_info or {}
+    features = {str(name): False for name in info.get("disabled_features") or []}
+    features.update((str(name), True) for name in info.get("features") or [])
+    known = set(known) | set(features)
+    features.update(component_toggles(info, known))
+    overrides = config.get("features")
+    if isinstance(overrides, dict):
+        # Non-boolean values are already schema errors (features.<name>)
+        features.update(
+            (str(name), enabled)
+            for name, enabled in overrides.items()
+            if isinstance(enabled, bool)
+        )
+    features.update(component_toggles(config, known, errors))
+    return features
+
+
+class FleetIndex:
+    """SQLite-backed index of tenant configs."""
+
+    def __init__(
+        self, db_path: Optional[Path] = None, deployment_stacks: Optional[Dict] = None
+    ):
+        self.db_path = Path(db_path or default_db_path())
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self._deployment_stacks = deployment_stacks
+        self._known_features: Optional[Set[str]] = None
+        self._migrate()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _migrate(self):
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.conn:
+                self.conn.executescript(
+                    "DROP TABLE IF EXISTS features; DROP TABLE IF EXISTS tenants;"
+                    "DROP TABLE IF EXISTS meta;"
+                )
+                self.conn.executescript(_SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @property
+    def deployment_stacks(self) -> Dict[str, Dict]:
+        if self._deployment_stacks is None:
+            self._deployment_stacks = configs.load_deployment_configs(
+                configs.CONFIG_DIR
+            )
+        return self._deployment_stacks
+
+    @property
+    def known_features(self) -> Set[str]:
+        if self._known_features is None:
+            self._known_features = known_features(self.deployment_stacks)
+        return self._known_features
+
+    def _meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key: str, value: str):
+        self.conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+    def _derive(self, config: Optional[Dict], errors: List[str]):
+        """Compute (columns, stack_file, features) for a parsed config."""
+        columns = {field: None for field in TENANT_FIELDS}
+        if not isinstance(config, dict):
+            return columns, None, {}
+        for field in TENANT_FIELDS:
+            value = config.get(field)
+            columns[field] = None if value is None else str(value)
+
+        errors.extend(schema.format_errors(schema.validate_tenant(config)))
+        deployment_type = columns["deployment_type"] or configs.DEFAULT_DEPLOYMENT_TYPE
+        columns["deployment_type"] = deployment_type
+        info = self.deployment_stacks.get(deployment_type)
+        if info is None:
+            errors.append(f"Unknown deployment type: {deployment_type}")
+        features = effective_features(config, info, self.known_features, errors)
+        return columns, (info or {}).get("stack_file"), features
+
+    def _write(self, path: str, mtime_ns: int, size: int, digest: str, config, errors):
+        columns, stack_file, features = self._derive(config, errors)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tenants (path, mtime_ns, size, sha256, "
+            + ", ".join(TENANT_FIELDS)
+            + ", stack_file, errors, config) VALUES ("
+            + ", ".join("?" * (len(TENANT_FIELDS) + 7))
+            + ")",
+            (path, mtime_ns, size, digest)
+            + tuple(columns[f] for f in TENANT_FIELDS)
+            + (stack_file, json.dumps(errors), json.dumps(config, default=str)),
+        )
+        self.conn.execute("DELETE FROM features WHERE path = ?", (path,))
+        self.conn.executemany(
+            "INSERT INTO features (path, feature, enabled) VALUES (?, ?, ?)",
+            [(path, name, int(enabled)) for name, enabled in features.items()],
+        )
+
+    def _rederive_all(self):
+        """Recompute stack files, features and errors after deployment configs
+        or the schema changed."""
+        rows = self.conn.execute(
+            "SELECT path, mtime_ns, size, sha256, config, errors FROM tenants"
+        ).fetchall()
+        for row in rows:
+            config = json.loads(row["config"])
+            # Parse errors are kept; everything else is recomputed
+            errors = json.loads(row["errors"]) if config is None else []
+            self._write(
+                row["path"], row["mtime_ns"], row["size"], row["sha256"], config, errors
+            )
+
+    def refresh(
+        self, sources: Sequence[str], pattern: str = DEFAULT_PATTERN
+    ) -> Dict[str, int]:
+        """Bring the index up to date with the tenant files under ``sources``.
+
+        Rows under a directory source whose file no longer exists are removed.
+        Sources that name a file which does not exist are counted as
+        ``missing``.
+        """
+        stats = {
+            "scanned": 0,
+            "added": 0,
+            "updated": 0,
+            "unchanged": 0,
+            "removed": 0,
+            "missing": 0,
+        }
+        roots = [str(Path(s).resolve()) for s in sources if os.path.isdir(s)]
+
+        with self.conn:
+            fingerprint = deployment_fingerprint(self.deployment_stacks)
+            if self._meta("deployment_fingerprint") != fingerprint:
+                self._rederive_all()
+                self._set_meta("deployment_fingerprint", fingerprint)
+
+            known = {
+                row["path"]: row
+                for row in self.conn.execute(
+                    "SELECT path, mtime_ns, size, sha256 FROM tenants"
+                )
+            }
+            seen = set()
+            for source in sources:
+                for config_file in iter_tenant_files([source], pattern):
+                    path = str(Path(config_file).resolve())
+                    if path in seen:
+                        continue
+                    seen.add(path)
+                    stats["scanned"] += 1
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        stats["missing"] += 1
+                        continue
+                    row = known.get(path)
+                    if (
+                        row
+                        and row["mtime_ns"] == stat.st_mtime_ns
+                        and row["size"] == stat.st_size
+                    ):
+                        stats["unchanged"] += 1
+                        continue
+                    with open(path, "rb") as f:
+                        data = f.read()
+                    digest = file_digest(data)
+                    if row and row["sha256"] == digest:
+                        self.conn.execute(
+                            "UPDATE tenants SET mtime_ns = ? WHERE path = ?",
+                            (stat.st_mtime_ns, path),
+                        )
+                        stats["unchanged"] += 1
+                        continue
+
+                    errors: List[str] = []
+                    try:
+                        config = configs.load_yaml(data)
+                    except Exception as e:
+                        config = None
+                        errors.append(f"Invalid YAML in configuration file:\n  {e}")
+                    if config is not None and not isinstance(config, dict):
+                        errors.append("Configuration is not a mapping")
+                        config = None
+                    self._write(
+                        path, stat.st_mtime_ns, stat.st_size, digest, config, errors
+                    )
+                    stats["updated" if row else "added"] += 1
+
+            for root in roots:
+                prefix = root.rstrip(os.sep) + os.sep
+                stale = [
+                    path
+                    for (path,) in self.conn.execute(
+                        "SELECT path FROM tenants WHERE path >= ? AND path < ?",
+                        (prefix, prefix[:-1] + chr(ord(os.sep) + 1)),
+                    )
+                    if path not in seen
+                ]
+                for path in stale:
+                    self.conn.execute("DELETE FROM tenants WHERE path = ?", (path,))
+                stats["removed"] += len(stale)
+        return stats
+
+    def query(
+        self,
+        filters: Optional[Dict[str, Iterable[str]]] = None,
+        features: Iterable[str] = (),
+        without_features: Iterable[str] = (),
+        errors: Optional[bool] = None,
+        path_glob: Optional[str] = None,
+        with_config: bool = False,
+    ) -> List[Dict]:
+        """Return tenants matching every filter; values within a filter are OR-ed.
+
+        With ``with_config`` each record also carries the parsed tenant file.
+        """
+        clauses, params = [], []
+        for field, values in (filters or {}).items():
+            if field not in TENANT_FIELDS:
+                raise ValueError(f"Unknown filter field: {field}")
+            values = list(values)
+            if values:
+                clauses.append(f"t.{field} IN ({', '.join('?' * len(values))})")
+                params.extend(values)
+        for name in features:
+            clauses.append(
+                "EXISTS (SELECT 1 FROM features f WHERE f.path = t.path "
+                "AND f.feature = ? AND f.enabled = 1)"
+            )
+            params.append(name)
+        for name in without_features:
+            clauses.append(
+                "NOT EXISTS (SELECT 1 FROM features f WHERE f.path = t.path "
+                "AND f.feature = ? AND f.enabled = 1)"
+            )
+            params.append(name)
+        if errors is not None:
+            clauses.append("t.errors != '[]'" if errors else "t.errors = '[]'")
+        if path_glob:
+            clauses.append("t.path GLOB ?")
+            params.append(path_glob)
+
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        rows = self.conn.execute(
+            f"SELECT t.* FROM tenants t{where} ORDER BY t.path", params
+        ).fetchall()
+
+        feature_map: Dict[str, Dict[str, bool]] = {}
+        if rows:
+            for path, name, enabled in self.conn.execute(
+                "SELECT fs.path, fs.feature, fs.enabled FROM features fs "
+                f"JOIN tenants t ON t.path = fs.path{where} ORDER BY fs.feature",
+                params,
+            ):
+                feature_map.setdefault(path, {})[name] = bool(enabled)
+        return [
+            self._record(row, feature_map.get(row["path"], {}), with_config)
+            for row in rows
+        ]
+
+    @staticmethod
+    def _record(
+        row: sqlite3.Row, features: Dict[str, bool], with_config: bool = False
+    ) -> Dict:
+        record = {"config_path": row["path"]}
+        record.update({field: row[field] for field in TENANT_FIELDS})
+        record["stack_file"] = row["stack_file"]
+        record["features"] = features
+        record["errors"] = json.loads(row["errors"])
+        if with_config:
+            record["config"] = json.loads(row["config"])
+        return record
+
+    def stats(self) -> Dict:
+        tenants = self.conn.execute("SELECT COUNT(*) FROM tenants").fetchone()[0]
+        with_errors = self.conn.execute(
+            "SELECT COUNT(*) FROM tenants WHERE errors != '[]'"
+        ).fetchone()[0]
+        return {
+            "path": str(self.db_path),
+            "tenants": tenants,
+            "with_errors": with_errors,
+        }
@@ -0,0 +1,467 @@
+"""
+Asyncio fleet runner for ``terragrunt stack`` commands.
+
+Each tenant runs ``terragrunt stack <command> --stack <stack_file>`` with
+``CONFIG_PATH``, which the units read, and ``TENANT_CONFIG_PATH`` set to the
+absolute path of its config. Jobs are
+started as soon as they can run, not in matrix-sized batches. Three limits
+apply:
+
+  * a global cap on concurrent terragrunt processes,
+  * a cap per AWS account (API rate limits, assume-role sessions),
+  * one holder per remote-state lock (``statelocks``), so two runs never
+    contend for the same DynamoDB LockID.
+
+A job waits for its locks and its account slot before it takes a global slot,
+so a blocked job never holds capacity another job could use. Output is
+streamed line by line to one log file per tenant. A run that fails on a state
+lock error is retried with exponential backoff and jitter, with every slot
+released while it backs off.
+
+The terragrunt binary is configurable, so the runner can be exercised with a
+fake one (see ``benchmarks/fake_terragrunt.py``).
+"""
+
+import asyncio
+import os
+import random
+import re
+import signal
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+from stacktools import batch, configs, dag, statelocks, timings
+
+TERRAGRUNT_ENV = "TERRAGRUNT_BIN"
+DEFAULT_TERRAGRUNT = "terragrunt"
+COMMANDS = ("init", "plan", "apply", "output")
+DEFAULT_CONCURRENCY = 8
+DEFAULT_PER_ACCOUNT = 2
+DEFAULT_RETRIES = 3
+DEFAULT_BACKOFF = 10.0
+MAX_BACKOFF = 300.0
+# Output is read in chunks of this size; lines of any length are copied to
+# the log, and at most LINE_LIMIT bytes of one line are held for the state
+# lock check (plan diffs of large policies and JSON plans run long)
+READ_CHUNK = 64 * 1024
+LINE_LIMIT = 1024 * 1024
+# Seconds between SIGTERM and SIGKILL when a run is stopped
+KILL_GRACE = 30.0
+
+# Messages terraform and the S3/DynamoDB backend print when a lock is held
+LOCK_ERROR_RE = re.compile(
+    r"Error acquiring the state lock|Error locking state|ConditionalCheckFailedException"
+    r"|state blob is already locked"
+)
+
+
+class FleetJob:
+    """One tenant's terragrunt stack run."""
+
+    __slots__ = (
+        "tenant",
+        "config_path",
+        "stack_file",
+        "account_id",
+        "lock_ids",
+        "log_file",
+        "args",
+        "config",
+    )
+
+    def __init__(
+        self,
+        tenant: str,
+        config_path: str,
+        stack_file: str,
+        account_id: Optional[str] = None,
+        lock_ids: Iterable[str] = (),
+        log_file: Optional[Path] = None,
+        args: Sequence[str] = (),
+        config: Optional[Dict] = None,
+    ):
+        self.tenant = tenant
+        self.config_path = config_path
+        self.stack_file = stack_file
+        self.account_id = account_id
+        self.lock_ids = sorted(set(lock_ids))
+        self.log_file = log_file
+        # Arguments for this tenant only, after the runner's extra_args
+        self.args = list(args)
+        # The parsed tenant config, when the caller kept it
+        self.config = config
+
+
+def log_name(tenant: str) -> str:
+    """File-system safe log file name for a tenant ID."""
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", tenant).strip("_") + ".log"
+
+
+def plan_jobs(
+    config_files: Iterable[str],
+    deployment_stacks: Dict[str, Dict],
+    log_dir: Optional[Path] = None,
+    env: Optional[Mapping[str, str]] = None,
+    repo_root: Path = configs.REPO_ROOT,
+) -> Tuple[List[FleetJob], List[Dict]]:
+    """Resolve tenant configs into jobs; returns (jobs, skipped records).
+
+    A job's lock IDs are the state locks of every unit its stack runs, so
+    two tenants resolving to the same state prefix never run together.
+    """
+    stacks: Dict[str, dag.StackSpec] = {}
+    jobs, skipped = [], []
+    for config_file in config_files:
+        record = batch.resolve_tenant(config_file, deployment_stacks)
+        if record["errors"]:
+            skipped.append(record)
+            continue
+        stack_file = record["stack_file"]
+        try:
+            if stack_file not in stacks:
+                stacks[stack_file] = dag.load_stack(repo_root / stack_file)
+            config = configs.load_config(config_file)
+        except (OSError, configs.ConfigError) as e:
+            record["errors"].append(str(e))
+            skipped.append(record)
+            continue
+        tenant = configs.tenant_label(record["config_path"])
+        jobs.append(
+            FleetJob(
+                tenant,
+                record["config_path"],
+                stack_file,
+                account_id=record["account_id"],
+                lock_ids=[
+                    statelocks.state_location(config, unit.path)["lock_id"]
+                    for unit in statelocks.stack_units(stacks[stack_file], env)
+                ],
+                log_file=log_dir / log_name(tenant) if log_dir else None,
+                config=config,
+            )
+        )
+    return jobs, skipped
+
+
+def backoff_delay(attempt: int, base: float, cap: float = MAX_BACKOFF) -> float:
+    """Exponential backoff with full jitter for the given retry attempt (1-based)."""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+
+class FleetRunner:
+    """Run terragrunt for many tenants under global, account and lock limits.
+
+    ``on_event(event, job, info)`` is called for "waiting", "started",
+    "retrying" and "finished" events; ``info`` is the job's result so far.
+    """
+
+    def __init__(
+        self,
+        command: str,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        per_account: int = DEFAULT_PER_ACCOUNT,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        timeout: Optional[float] = None,
+        kill_grace: float = KILL_GRACE,
+        terragrunt: Optional[str] = None,
+        extra_args: Sequence[str] = (),
+        cwd: Optional[Path] = None,
+        env: Optional[Dict[str, str]] = None,
+        on_event: Optional[Callable[[str, FleetJob, Dict], None]] = None,
+    ):
+        self.command = command
+        self.concurrency = concurrency
+        self.per_account = per_account
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.kill_grace = kill_grace
+        self.terragrunt = terragrunt or os.environ.get(
+            TERRAGRUNT_ENV, DEFAULT_TERRAGRUNT
+        )
+        self.extra_args = list(extra_args)
+        self.cwd = cwd
+        self.env = dict(os.environ if env is None else env)
+        self.on_event = on_event or (lambda event, job, info: None)
+
+    def argv(self, job: FleetJob) -> List[str]:
+        return (
+            [self.terragrunt, "stack", self.command, "--stack", job.stack_file]
+            + self.extra_args
+            + job.args
+        )
+
+    async def _attempt(self, job: FleetJob, log, attempt: int) -> Dict:
+        """Run terragrunt once, streaming output to ``log``."""
+        # The units read CONFIG_PATH, and stack-config.hcl needs it absolute
+        config_path = os.path.abspath(job.config_path)
+        env = dict(self.env, CONFIG_PATH=config_path, TENANT_CONFIG_PATH=config_path)
+        argv = self.argv(job)
+        log.write(f"=== attempt {attempt}: {' '.join(argv)}\n".encode())
+        log.flush()
+        started = time.monotonic()
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *argv,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                stdin=asyncio.subprocess.DEVNULL,
+                cwd=self.cwd,
+                env=env,
+                start_new_session=True,
+            )
+        except OSError as e:
+            log.write(f"=== could not start {argv[0]}: {e}\n".encode())
+            return {
+                "exit_code": 127,
+                "lock_error": False,
+                "timed_out": False,
+                "error": None,
+                "duration": 0.0,
+            }
+        lock_error = False
+
+        def scan(line: bytes):
+            nonlocal lock_error
+            if not lock_error and LOCK_ERROR_RE.search(line.decode(errors="replace")):
+                lock_error = True
+
+        async def pump():
+            partial = b""
+            while True:
+                chunk = await process.stdout.read(READ_CHUNK)
+                if not chunk:
+                    break
+                log.write(chunk)
+                *lines, partial = (partial + chunk).split(b"\n")
+                for line in lines:
+                    scan(line)
+                if len(partial) > LINE_LIMIT:
+                    scan(partial)
+                    # Keep enough of the tail to match a message split across chunks
+                    partial = partial[-256:]
+            scan(partial)
+
+        timed_out = False
+        error = None
+        try:
+            await asyncio.wait_for(asyncio.gather(pump(), process.wait()), self.timeout)
+        except asyncio.TimeoutError:
+            timed_out = True
+            await _terminate(process, self.kill_grace)
+        except asyncio.CancelledError:
+            await _terminate(process, self.kill_grace)
+            raise
+        except Exception as e:
+            # Never let one tenant's failure escape and abort the fleet run
+            error = f"{type(e).__name__}: {e}"
+            await _terminate(process, self.kill_grace)
+        finally:
+            log.flush()
+
+        exit_code = process.returncode
+        if error:
+            log.write(f"=== runner error: {error}\n".encode())
+        log.write(f"=== exit {exit_code}{' (timeout)' if timed_out else ''}\n".encode())
+        return {
+            "exit_code": exit_code,
+            "lock_error": lock_error,
+            "timed_out": timed_out,
+            "error": error,
+            "duration": round(time.monotonic() - started, 3),
+        }
+
+    async def run_job(self, job: FleetJob, limits: "_Limits") -> Dict:
+        result = {
+            "tenant": job.tenant,
+            "config_path": job.config_path,
+            "stack_file": job.stack_file,
+            "account_id": job.account_id,
+            "log_file": str(job.log_file) if job.log_file else None,
+            "status": "pending",
+            "exit_code": None,
+            "attempts": 0,
+            "lock_retries": 0,
+            "duration": 0.0,
+            "waited": 0.0,
+        }
+        if job.log_file:
+            job.log_file.parent.mkdir(parents=True, exist_ok=True)
+            log = open(job.log_file, "wb")
+        else:
+            log = open(os.devnull, "wb")
+
+        try:
+            while True:
+                self.on_event("waiting", job, result)
+                queued = time.monotonic()
+                traced = time.perf_counter()
+                async with limits.acquire(job):
+                    result["waited"] = round(
+                        result["waited"] + time.monotonic() - queued, 3
+                    )
+                    result["attempts"] += 1
+                    result["status"] = "running"
+                    self.on_event("started", job, result)
+                    traced = self._trace("wait for slot", traced, job, result)
+                    outcome = await self._attempt(job, log, result["attempts"])
+                    self._trace(
+                        f"terragrunt {self.command}",
+                        traced,
+                        job,
+                        result,
+                        exit_code=outcome["exit_code"],
+                    )
+                result["exit_code"] = outcome["exit_code"]
+                result["duration"] = round(result["duration"] + outcome["duration"], 3)
+
+                if outcome["timed_out"]:
+                    result["status"] = "timeout"
+                elif outcome["error"]:
+                    result["status"] = "failed"
+                    result["error"] = outcome["error"]
+                elif outcome["exit_code"] == 0:
+                    result["status"] = "succeeded"
+                elif outcome["lock_error"] and result["lock_retries"] < self.retries:
+                    result["lock_retries"] += 1
+                    result["status"] = "retrying"
+                    delay = backoff_delay(result["lock_retries"], self.backoff)
+                    log.write(
+                        f"=== state lock busy, retrying in {delay:.1f}s\n".encode()
+                    )
+                    self.on_event("retrying", job, result)
+                    await asyncio.sleep(delay)
+                    continue
+                else:
+                    result["status"] = (
+                        "lock_contention" if outcome["lock_error"] else "failed"
+                    )
+                break
+        finally:
+            log.close()
+
+        self.on_event("finished", job, result)
+        return result
+
+    def _trace(
+        self, name: str, start: float, job: FleetJob, result: Dict, **args
+    ) -> float:
+        """Record one phase of a job attempt as an async span; returns its end."""
+        end = time.perf_counter()
+        tracer = timings.active()
+        if tracer is not None:
+            args.update(tenant=job.tenant, attempt=result["attempts"])
+            tracer.add(
+                name,
+                start,
+                end,
+                "fleet",
+                args,
+                async_id=f"{job.tenant}#{result['attempts']}",
+            )
+        return end
+
+    async def run_async(self, jobs: Iterable[FleetJob]) -> List[Dict]:
+        limits = _Limits(self.concurrency, self.per_account)
+        tasks = [asyncio.ensure_future(self.run_job(job, limits)) for job in jobs]
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def run(self, jobs: Iterable[FleetJob]) -> List[Dict]:
+        """Run every job to completion and return results in input order."""
+        return asyncio.run(self.run_async(jobs))
+
+
+class _Limits:
+    """The global, per-account and per-lock semaphores shared by all jobs."""
+
+    def __init__(self, concurrency: int, per_account: int):
+        self.slots = asyncio.Semaphore(concurrency)
+        self.per_account = per_account
+        self.accounts: Dict[str, asyncio.Semaphore] = {}
+        self.locks: Dict[str, asyncio.Lock] = {}
+
+    def acquire(self, job: FleetJob) -> "_Held":
+        semaphores = [
+            self.locks.setdefault(lock_id, asyncio.Lock()) for lock_id in job.lock_ids
+        ]
+        if job.account_id:
+            semaphores.append(
+                self.accounts.setdefault(
+                    job.account_id, asyncio.Semaphore(self.per_account)
+                )
+            )
+        # Always locks (sorted), then account, then the global slot: a fixed
+        # order cannot deadlock, and a global slot is only taken when the job
+        # can start immediately
+        semaphores.append(self.slots)
+        return _Held(semaphores)
+
+
+class _Held:
+    """Async context manager acquiring semaphores in order, releasing on exit."""
+
+    def __init__(self, semaphores):
+        self.semaphores = semaphores
+        self.acquired = []
+
+    async def __aenter__(self):
+        try:
+            for semaphore in self.semaphores:
+                await semaphore.acquire()
+                self.acquired.append(semaphore)
+        except BaseException:
+            self._release()
+            raise
+        return self
+
+    async def __aexit__(self, *exc):
+        self._release()
+
+    def _release(self):
+        while self.acquired:
+            self.acquired.pop().release()
+
+
+def _signal_group(process, sig):
+    try:
+        os.killpg(process.pid, sig)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+async def _terminate(process, grace: float = KILL_GRACE):
+    """Stop a terragrunt process and the terraform children it started.
+
+    SIGTERM lets terraform release its state lock; whatever is still running
+    after ``grace`` seconds gets SIGKILL.
+    """
+    if process.returncode is None:
+        _signal_group(process, signal.SIGTERM)
+        try:
+            await asyncio.wait_for(process.wait(), grace)
+        except asyncio.TimeoutError:
+            pass
+    # Children may outlive terragrunt itself, so the group is always swept
+    _signal_group(process, signal.SIGKILL)
+    await process.wait()
+
+
+def summarize(results: List[Dict]) -> Dict:
+    """Counts per status plus totals over a finished fleet run."""
+    counts: Dict[str, int] = {}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+    return {
+        "jobs": len(results),
+        "statuses": counts,
+        "lock_retries": sum(r["lock_retries"] for r in results),
+        "busy_seconds": round(sum(r["duration"] for r in results), 3),
+        "failed": [r["tenant"] for r in results if r["status"] != "succeeded"],
+    }
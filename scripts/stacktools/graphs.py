@@ -0,0 +1,450 @@
+"""
+Dependency graphs for stacks and unit directories, rendered without terragrunt.
+
+A graph is built straight from the repo:
+
+  * a stack graph (``stacks/**/<name>.stack.yaml``) has the stack's units as
+    nodes and its YAML ``dependencies`` as edges, plus any ``dependency``
+    block between two of its units that the YAML does not declare
+  * a unit-directory graph (``units``, ``units/hosting``, a single unit)
+    has every unit under the directory, the units they depend on through
+    ``dependency`` blocks and ``dependencies.paths``, and those edges
+
+Node IDs are repo-relative unit paths, so output is the same on every
+machine. Graphs render to DOT, to JSON (the model itself) and to SVG with a
+built-in layered layout, so neither terragrunt nor graphviz is needed.
+
+Rendering is incremental: a manifest records, per graph, a digest of the
+model and the formats, plus the hash of every file written. A graph is
+rendered again only when its digest changes or one of its files is missing
+or was edited.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from xml.sax.saxutils import escape
+
+from stacktools import configs, dag, terragrunt
+
+FORMATS = ("dot", "svg", "json")
+DEFAULT_FORMATS = ("dot", "svg")
+MANIFEST_FILE = ".graph-manifest.json"
+MANIFEST_VERSION = 1
+# Bump when rendering changes, so every graph is written again
+RENDER_VERSION = 1
+
+LAYER_COLORS = {
+    "substrate": "#e3f2fd",
+    "hosting": "#e8f5e9",
+    "application": "#fff3e0",
+}
+DEFAULT_COLOR = "#f5f5f5"
+
+
+class GraphError(Exception):
+    """Raised for targets that are neither a stack file nor a units directory."""
+
+
+def _unit_group(unit_path: str) -> str:
+    parts = unit_path.split("/")
+    return parts[1] if len(parts) > 2 and parts[0] == "units" else ""
+
+
+class Graph:
+    """Nodes (repo-relative unit paths) and dependent -> dependency edges."""
+
+    def __init__(self, target: str, kind: str, outputs: str):
+        self.target = target
+        self.kind = kind
+        # Output path prefix: "<dir>/graph" or "<dir>/<stack name>.graph"
+        self.outputs = outputs
+        self.nodes: Dict[str, Dict] = {}
+        self.edges: Dict[Tuple[str, str], Set[str]] = {}
+        self.inputs: Set[str] = set()
+
+    def add_node(self, unit: str, **attrs):
+        node = self.nodes.setdefault(
+            unit, {"label": unit.rsplit("/", 1)[-1], "group": _unit_group(unit)}
+        )
+        node.update((k, v) for k, v in attrs.items() if v)
+
+    def add_edge(self, dependent: str, dependency: str, kind: str):
+        self.edges.setdefault((dependent, dependency), set()).add(kind)
+
+    def to_dict(self) -> Dict:
+        return {
+            "version": RENDER_VERSION,
+            "target": self.target,
+            "kind": self.kind,
+            "nodes": [dict(id=unit, **self.nodes[unit]) for unit in sorted(self.nodes)],
+            "edges": [
+                {"from": a, "to": b, "kinds": sorted(kinds)}
+                for (a, b), kinds in sorted(self.edges.items())
+            ],
+        }
+
+    def digest(self, formats: Sequence[str]) -> str:
+        payload = json.dumps([self.to_dict(), sorted(formats)], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class GraphBuilder:
+    """Builds graphs for targets, sharing one scan of the unit HCL files."""
+
+    def __init__(self, repo_root: Path = configs.REPO_ROOT):
+        self.repo_root = repo_root
+        self.units = terragrunt.scan_units(repo_root)
+
+    def _rel(self, path: Path) -> str:
+        return terragrunt._relative(path, self.repo_root)
+
+    def default_targets(self) -> List[str]:
+        """Every stack file, ``units`` and each layer directory under it."""
+        targets = [self._rel(path) for path in dag.stack_files(self.repo_root)]
+        targets.append("units")
+        layers = sorted(
+            {unit.split("/")[1] for unit in self.units if unit.count("/") >= 2}
+        )
+        targets.extend(f"units/{layer}" for layer in layers)
+        return targets
+
+    def unit_dependencies(self, unit: str) -> Dict[str, str]:
+        """A unit's dependencies with the kind of reference to each."""
+        config = self.units.get(unit)
+        if config is None:
+            return {}
+        deps = {dep: "paths" for dep in config.dependencies}
+        deps.update((dep, "dependency") for dep in config.dependency_blocks.values())
+        return deps
+
+    def build(self, target: str) -> Graph:
+        path = (self.repo_root / target).resolve()
+        rel = self._rel(path)
+        if path.is_file() and path.name.endswith(".stack.yaml"):
+            return self._stack_graph(path, rel)
+        if path.is_dir() and (rel == "units" or rel.startswith("units/")):
+            return self._units_graph(rel)
+        raise GraphError(
+            f"Not a *.stack.yaml file or a directory under units/: {target}"
+        )
+
+    def _stack_graph(self, path: Path, rel: str) -> Graph:
+        stack = dag.load_stack(path)
+        name = path.name[: -len(".stack.yaml")]
+        graph = Graph(rel, "stack", f"{rel.rsplit('/', 1)[0]}/{name}.graph")
+        graph.inputs.add(rel)
+        members = {unit.path for unit in stack.units}
+        for unit in stack.units:
+            missing = unit.path not in self.units
+            skip = unit.skip if unit.skip not in (None, False) else None
+            graph.add_node(
+                unit.path, missing=missing, skip=str(skip) if skip is not None else None
+            )
+            for dep in unit.dependencies:
+                if dep not in members:
+                    graph.add_node(dep, missing=dep not in self.units, external=True)
+                graph.add_edge(unit.path, dep, "stack")
+            if not missing:
+                graph.inputs.add(self.units[unit.path].rel_path)
+                for dep, kind in self.unit_dependencies(unit.path).items():
+                    if dep in members:
+                        graph.add_edge(unit.path, dep, kind)
+        return graph
+
+    def _units_graph(self, rel: str) -> Graph:
+        prefix = rel + "/"
+        graph = Graph(rel, "units", f"{rel}/graph")
+        pending = [
+            unit for unit in self.units if unit == rel or unit.startswith(prefix)
+        ]
+        own = set(pending)
+        seen: Set[str] = set()
+        while pending:
+            unit = pending.pop()
+            if unit in seen:
+                continue
+            seen.add(unit)
+            graph.add_node(
+                unit, missing=unit not in self.units, external=unit not in own
+            )
+            if unit in self.units:
+                graph.inputs.add(self.units[unit].rel_path)
+            for dep, kind in self.unit_dependencies(unit).items():
+                graph.add_edge(unit, dep, kind)
+                pending.append(dep)
+        return graph
+
+
+def _ranks(graph: Graph) -> List[List[str]]:
+    """Rows for the layout: dependencies first, cycles in a final row."""
+    nodes = sorted(graph.nodes)
+    deps: Dict[str, Set[str]] = {node: set() for node in nodes}
+    for a, b in graph.edges:
+        deps[a].add(b)
+    waves, remaining = dag.topological_waves(nodes, deps)
+    if remaining:
+        waves.append(sorted(remaining))
+    return waves
+
+
+def render_dot(graph: Graph) -> str:
+    lines = [
+        f'digraph "{graph.target}" {{',
+        "\trankdir=BT;",
+        '\tnode [shape=box, style="rounded,filled", fontname="Helvetica"];',
+    ]
+    groups: Dict[str, List[str]] = {}
+    for unit in sorted(graph.nodes):
+        groups.setdefault(graph.nodes[unit]["group"], []).append(unit)
+    for group, units in sorted(groups.items()):
+        indent = "\t"
+        if group:
+            lines.append(f'\tsubgraph "cluster_{group}" {{')
+            lines.append(f'\t\tlabel="{group}"; style=dashed; color="#9e9e9e";')
+            indent = "\t\t"
+        for unit in units:
+            node = graph.nodes[unit]
+            attrs = [
+                f'label="{node["label"]}"',
+                f'fillcolor="{LAYER_COLORS.get(group, DEFAULT_COLOR)}"',
+            ]
+            if node.get("missing"):
+                attrs.append('color="#c62828", style="rounded,filled,dashed"')
+            elif node.get("external"):
+                attrs.append('style="rounded,filled,dashed"')
+            if node.get("skip"):
+                attrs.append(
+                    f'tooltip="skip: {node["skip"].replace(chr(34), chr(39))}"'
+                )
+            lines.append(f'{indent}"{unit}" [{", ".join(attrs)}];')
+        if group:
+            lines.append("\t}")
+    for (a, b), kinds in sorted(graph.edges.items()):
+        attrs = _edge_style(graph, kinds)
+        lines.append(
+            f'\t"{a}" -> "{b}"' + (f" [{attrs['dot']}]" if attrs["dot"] else "") + ";"
+        )
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+def _edge_style(graph: Graph, kinds: Set[str]) -> Dict[str, str]:
+    """Stack graphs flag dependency blocks the stack YAML does not declare."""
+    if graph.kind == "stack" and "stack" not in kinds:
+        return {
+            "dot": 'style=dashed, color="#ef6c00"',
+            "stroke": "#ef6c00",
+            "dash": "5,4",
+        }
+    return {"dot": "", "stroke": "#546e7a", "dash": ""}
+
+
+def render_svg(graph: Graph) -> str:
+    """A layered drawing: one row per wave, dependencies at the top."""
+    char_width, box_height, h_gap, v_gap, margin = 7, 30, 24, 70, 20
+    rows = _ranks(graph)
+    deps: Dict[str, List[str]] = {node: [] for node in graph.nodes}
+    for a, b in graph.edges:
+        deps[a].append(b)
+
+    width_of = {
+        n: max(80, len(graph.nodes[n]["label"]) * char_width + 24) for n in graph.nodes
+    }
+    center: Dict[str, float] = {}
+    row_widths = []
+    for row in rows:
+        # Order by the mean position of the node's dependencies (barycenter)
+        row.sort(
+            key=lambda n: (
+                sum(center[d] for d in deps[n] if d in center)
+                / max(1, sum(d in center for d in deps[n])),
+                n,
+            )
+        )
+        x = 0.0
+        for node in row:
+            center[node] = x + width_of[node] / 2
+            x += width_of[node] + h_gap
+        row_widths.append(x - h_gap if row else 0)
+
+    width = max(row_widths, default=0) + 2 * margin
+    height = len(rows) * (box_height + v_gap) - v_gap + 2 * margin + 24
+    pos: Dict[str, Tuple[float, float]] = {}
+    for index, row in enumerate(rows):
+        offset = margin + (width - 2 * margin - row_widths[index]) / 2
+        y = margin + 24 + index * (box_height + v_gap)
+        for node in row:
+            pos[node] = (offset + center[node], y)
+
+    out = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{width:.0f}" height="{height:.0f}" '
+        f'viewBox="0 0 {width:.0f} {height:.0f}" font-family="Helvetica, Arial, sans-serif" font-size="12">',
+        '<defs><marker id="arrow" viewBox="0 0 10 10" refX="10" refY="5" markerWidth="7" '
+        'markerHeight="7" orient="auto-start-reverse"><path d="M0,0 L10,5 L0,10 z" fill="#546e7a"/></marker></defs>',
+        '<rect width="100%" height="100%" fill="#ffffff"/>',
+        f'<text x="{margin}" y="{margin + 4}" font-size="14" font-weight="bold">{escape(graph.target)}</text>',
+    ]
+    for (a, b), kinds in sorted(graph.edges.items()):
+        (x1, y1), (x2, y2) = pos[a], pos[b]
+        y1, y2 = y1, y2 + box_height
+        style = _edge_style(graph, kinds)
+        bend = max(20.0, abs(y1 - y2) / 2)
+        dash = f' stroke-dasharray="{style["dash"]}"' if style["dash"] else ""
+        out.append(
+            f'<path d="M{x1:.1f},{y1:.1f} C{x1:.1f},{y1 - bend:.1f} {x2:.1f},{y2 + bend:.1f} {x2:.1f},{y2:.1f}" '
+            f'fill="none" stroke="{style["stroke"]}"{dash} marker-end="url(#arrow)">'
+            f"<title>{escape(a)} → {escape(b)} ({', '.join(sorted(kinds))})</title></path>"
+        )
+    for node, (x, y) in sorted(pos.items()):
+        attrs = graph.nodes[node]
+        w = width_of[node]
+        stroke, dash = "#455a64", ""
+        if attrs.get("missing"):
+            stroke, dash = "#c62828", ' stroke-dasharray="4,3"'
+        elif attrs.get("external"):
+            dash = ' stroke-dasharray="4,3"'
+        title = node + (f"\nskip: {attrs['skip']}" if attrs.get("skip") else "")
+        out.append(
+            f"<g><title>{escape(title)}</title>"
+            f'<rect x="{x - w / 2:.1f}" y="{y:.1f}" width="{w}" height="{box_height}" rx="6" '
+            f'fill="{LAYER_COLORS.get(attrs["group"], DEFAULT_COLOR)}" stroke="{stroke}"{dash}/>'
+            f'<text x="{x:.1f}" y="{y + box_height / 2 + 4:.1f}" text-anchor="middle">{escape(attrs["label"])}</text></g>'
+        )
+    out.append("</svg>")
+    return "\n".join(out) + "\n"
+
+
+RENDERERS = {
+    "dot": render_dot,
+    "svg": render_svg,
+    "json": lambda graph: json.dumps(graph.to_dict(), indent=2) + "\n",
+}
+
+
+def _sha256(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except OSError:
+        return None
+
+
+def _write_if_changed(path: Path, content: str) -> str:
+    data = content.encode()
+    digest = hashlib.sha256(data).hexdigest()
+    if _sha256(path) != digest:
+        tmp = path.with_name(f".{path.name}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    return digest
+
+
+class GraphRenderer:
+    """Renders graphs into the repo, skipping those the manifest shows as current."""
+
+    def __init__(
+        self, repo_root: Path = configs.REPO_ROOT, manifest_path: Optional[Path] = None
+    ):
+        self.repo_root = repo_root
+        self.manifest_path = manifest_path or repo_root / MANIFEST_FILE
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self) -> Dict:
+        try:
+            with open(self.manifest_path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {"version": MANIFEST_VERSION, "graphs": {}}
+        if data.get("version") != MANIFEST_VERSION:
+            return {"version": MANIFEST_VERSION, "graphs": {}}
+        return data
+
+    def save(self):
+        content = json.dumps(self.manifest, indent=2, sort_keys=True) + "\n"
+        _write_if_changed(self.manifest_path, content)
+
+    def is_current(self, graph: Graph, formats: Sequence[str]) -> bool:
+        entry = self.manifest["graphs"].get(graph.target)
+        if not entry or entry["digest"] != graph.digest(formats):
+            return False
+        return all(
+            _sha256(self.repo_root / rel) == sha
+            for rel, sha in entry["outputs"].items()
+        )
+
+    def render(self, graph: Graph, formats: Sequence[str]) -> Dict[str, str]:
+        """Write the graph in each format; returns {repo-relative path: sha256}."""
+        old = self.manifest["graphs"].get(graph.target, {}).get("outputs", {})
+        outputs = {}
+        for fmt in formats:
+            rel = f"{graph.outputs}.{fmt}"
+            outputs[rel] = _write_if_changed(
+                self.repo_root / rel, RENDERERS[fmt](graph)
+            )
+        for rel in set(old) - set(outputs):
+            (self.repo_root / rel).unlink(missing_ok=True)
+        self.manifest["graphs"][graph.target] = {
+            "digest": graph.digest(formats),
+            "inputs": sorted(graph.inputs),
+            "outputs": outputs,
+        }
+        return outputs
+
+    def prune(self, keep: Iterable[str]) -> List[str]:
+        """Forget graphs not in ``keep`` and delete their files."""
+        removed = []
+        for target in sorted(set(self.manifest["graphs"]) - set(keep)):
+            for rel in self.manifest["graphs"].pop(target)["outputs"]:
+                (self.repo_root / rel).unlink(missing_ok=True)
+                removed.append(rel)
+        return removed
+
+
+def generate(
+    targets: Optional[Sequence[str]] = None,
+    formats: Sequence[str] = DEFAULT_FORMATS,
+    repo_root: Path = configs.REPO_ROOT,
+    manifest_path: Optional[Path] = None,
+    force: bool = False,
+    check: bool = False,
+) -> Dict:
+    """Render the given targets (default: all) and report what was done.
+
+    With ``check`` nothing is written; ``stale`` lists the graphs that would
+    be rendered. Without explicit targets, graphs whose stack file or
+    directory no longer exists are deleted and dropped from the manifest.
+    """
+    builder = GraphBuilder(repo_root)
+    renderer = GraphRenderer(repo_root, manifest_path)
+    names = list(targets) if targets else builder.default_targets()
+    report = {
+        "graphs": len(names),
+        "rendered": [],
+        "unchanged": [],
+        "stale": [],
+        "removed": [],
+    }
+    for name in names:
+        graph = builder.build(name)
+        if not force and renderer.is_current(graph, formats):
+            report["unchanged"].append(graph.target)
+        elif check:
+            report["stale"].append(graph.target)
+        else:
+            renderer.render(graph, formats)
+            report["rendered"].append(graph.target)
+    if not targets:
+        # Graphs rendered for other targets stay until their target is gone
+        keep = {
+            name for name in renderer.manifest["graphs"] if (repo_root / name).exists()
+        }
+        keep.update(names)
+        if check:
+            report["stale"].extend(sorted(set(renderer.manifest["graphs"]) - keep))
+        else:
+            report["removed"] = renderer.prune(keep)
+    if not check:
+        renderer.save()
+    return report
@@ -0,0 +1,518 @@
+"""
+Run history from terragrunt logs, and ETA prediction from it.
+
+``RunHistory.ingest`` parses a terragrunt log (a single unit, or ``run --all`` with
+``--queue-include-external``) into one timing record per unit and command
+and stores them in a local SQLite database. It understands the formats
+terragrunt has shipped:
+
+  * the default pretty format: ``14:03:07.412 INFO   [units/hosting/cluster] tofu: ...``
+  * logrus key/value lines: ``time=... level=info prefix=[/abs/units/...] msg=...``
+  * ``--log-format json`` lines with ``time``, ``level``, ``prefix`` and ``msg``
+
+optionally behind a GitHub Actions timestamp. A unit's record spans its
+first to its last line. When a unit initializes before its command, the
+part up to "has been successfully initialized" is recorded as ``init``.
+
+``unit_durations`` summarizes the recent records per unit (median by
+default), and ``predict`` runs them through the stack DAG to get a
+predicted ETA, the critical path and the parallelism that reaches it.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import statistics
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from stacktools import configs, dag
+from stacktools.cache import history_db_path
+
+SCHEMA_VERSION = 1
+COMMANDS = ("init", "plan", "apply", "destroy", "output", "validate", "refresh")
+DEFAULT_WINDOW = 20
+STATS = ("median", "p90", "max", "last")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    log_sha256 TEXT NOT NULL UNIQUE,
+    source TEXT NOT NULL,
+    tenant TEXT,
+    command TEXT,
+    started REAL,
+    finished REAL,
+    ingested_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS records (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    unit TEXT NOT NULL,
+    command TEXT NOT NULL,
+    started REAL NOT NULL,
+    duration REAL NOT NULL,
+    failed INTEGER NOT NULL,
+    PRIMARY KEY (run_id, unit, command)
+);
+CREATE INDEX IF NOT EXISTS records_unit ON records(unit, command, started);
+CREATE INDEX IF NOT EXISTS runs_tenant ON runs(tenant);
+"""
+
+_GHA_PREFIX = re.compile(r"^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(?:\.\d+)?Z)\s")
+_PRETTY = re.compile(
+    r"^(?P<time>\d{2}:\d{2}:\d{2}(?:\.\d+)?)\s+(?P<level>[A-Z]+)\s+"
+    r"(?:\[(?P<prefix>[^\]]+)\]\s*)?(?P<msg>.*)$"
+)
+_KV = re.compile(r'(\w[\w-]*)=("(?:[^"\\]|\\.)*"|\[[^\]]*\]|\S+)')
+# An unquoted msg runs until the next key=value pair
+_BARE_MSG = re.compile(r'\bmsg=(?!")(.*?)(?=\s[\w-]+=|$)')
+_COMMAND = re.compile(r"\b(?:terraform|tofu)\s+(" + "|".join(COMMANDS) + r")\b")
+_INIT_DONE = re.compile(r"has been successfully initialized")
+_ANSI = re.compile(r"\x1b\[[0-9;]*m")
+
+
+def normalize_unit(prefix: str, repo_root: Path = configs.REPO_ROOT) -> Optional[str]:
+    """Map a log prefix (absolute, relative or generated stack path) to a unit path."""
+    path = prefix.strip().strip("[]").rstrip("/").replace("\\", "/")
+    if "/units/" in f"/{path}":
+        return "units/" + f"/{path}".split("/units/", 1)[1]
+    if ".terragrunt-stack/" in path:
+        generated = path.split(".terragrunt-stack/", 1)[1]
+        if (repo_root / "units" / generated).is_dir():
+            return f"units/{generated}"
+        return generated
+    return None
+
+
+def _parse_clock(text: str, previous: Optional[float]) -> float:
+    """Seconds for an HH:MM:SS(.fff) time, rolling over midnight."""
+    hours, minutes, seconds = text.split(":")
+    value = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    if previous is not None:
+        day = 86400.0
+        value += (previous // day) * day
+        if value < previous - day / 2:
+            value += day
+    return value
+
+
+def _parse_iso(text: str) -> float:
+    text = text.replace("Z", "+00:00")
+    # Python < 3.11 rejects more than 6 fractional digits (Actions writes 7)
+    text = re.sub(r"(\.\d{6})\d+", r"\1", text)
+    return datetime.fromisoformat(text).timestamp()
+
+
+def parse_line(
+    line: str, previous: Optional[float]
+) -> Optional[Tuple[float, str, Optional[str], str]]:
+    """Parse one log line into (timestamp, level, prefix, message), or None."""
+    line = _ANSI.sub("", line.rstrip("\n"))
+    stamp = None
+    match = _GHA_PREFIX.match(line)
+    if match:
+        stamp = _parse_iso(match.group(1))
+        line = line[match.end() :]
+
+    if line.startswith("{"):
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            entry = None
+        if isinstance(entry, dict) and "msg" in entry:
+            when = entry.get("time")
+            if when and stamp is None:
+                try:
+                    stamp = _parse_iso(str(when))
+                except ValueError:
+                    stamp = _parse_clock(str(when), previous)
+            if stamp is None:
+                return None
+            prefix = (
+                entry.get("prefix") or entry.get("working-dir") or entry.get("tf-path")
+            )
+            return stamp, str(entry.get("level", "")).upper(), prefix, str(entry["msg"])
+
+    match = _PRETTY.match(line)
+    if match:
+        if stamp is None:
+            stamp = _parse_clock(match.group("time"), previous)
+        return stamp, match.group("level"), match.group("prefix"), match.group("msg")
+
+    if "time=" in line and "msg=" in line:
+        fields = {k: v.strip('"').strip("[]") for k, v in _KV.findall(line)}
+        bare = _BARE_MSG.search(line)
+        if bare:
+            fields["msg"] = bare.group(1)
+        if stamp is None:
+            try:
+                stamp = _parse_iso(fields["time"])
+            except (KeyError, ValueError):
+                return None
+        return (
+            stamp,
+            fields.get("level", "").upper(),
+            fields.get("prefix"),
+            fields.get("msg", ""),
+        )
+
+    if stamp is not None:
+        return stamp, "", None, line
+    return None
+
+
+class _UnitTimer:
+    __slots__ = ("first", "last", "init_done", "command", "failed")
+
+    def __init__(self, stamp: float):
+        self.first = self.last = stamp
+        self.init_done: Optional[float] = None
+        self.command: Optional[str] = None
+        self.failed = False
+
+
+def parse_log(
+    lines: Iterable[str],
+    default_command: Optional[str] = None,
+    repo_root: Path = configs.REPO_ROOT,
+) -> Dict:
+    """Turn terragrunt log lines into per-unit timing records.
+
+    Returns ``{"started", "finished", "command", "records": [{"unit",
+    "command", "started", "duration", "failed"}]}``. Lines without a unit
+    prefix only extend the run's span.
+    """
+    units: Dict[str, _UnitTimer] = {}
+    run_command = default_command
+    started = finished = previous = None
+    for line in lines:
+        parsed = parse_line(line, previous)
+        if parsed is None:
+            continue
+        stamp, level, prefix, message = parsed
+        previous = stamp
+        started = stamp if started is None else min(started, stamp)
+        finished = stamp if finished is None else max(finished, stamp)
+
+        command_match = _COMMAND.search(message)
+        unit = normalize_unit(prefix, repo_root) if prefix else None
+        if unit is None:
+            if command_match and run_command is None:
+                run_command = command_match.group(1)
+            continue
+
+        timer = units.get(unit)
+        if timer is None:
+            timer = units[unit] = _UnitTimer(stamp)
+        timer.last = max(timer.last, stamp)
+        if command_match and command_match.group(1) != "init":
+            timer.command = timer.command or command_match.group(1)
+        if timer.init_done is None and _INIT_DONE.search(message):
+            timer.init_done = stamp
+        if level in ("ERROR", "FATAL") or message.lstrip().startswith("Error:"):
+            timer.failed = True
+
+    records = []
+    for unit, timer in units.items():
+        command = timer.command or run_command or "unknown"
+        main_start = timer.first
+        if timer.init_done is not None and command != "init":
+            records.append(
+                {
+                    "unit": unit,
+                    "command": "init",
+                    "started": timer.first,
+                    "duration": timer.init_done - timer.first,
+                    "failed": False,
+                }
+            )
+            main_start = timer.init_done
+        records.append(
+            {
+                "unit": unit,
+                "command": command,
+                "started": main_start,
+                "duration": timer.last - main_start,
+                "failed": timer.failed,
+            }
+        )
+    records.sort(key=lambda r: (r["started"], r["unit"]))
+    return {
+        "started": started,
+        "finished": finished,
+        "command": run_command,
+        "records": records,
+    }
+
+
+class RunHistory:
+    """SQLite store of per-unit timing records."""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or history_db_path())
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA foreign_keys = ON")
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS records")
+                self.conn.execute("DROP TABLE IF EXISTS runs")
+                self.conn.executescript(_SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def ingest(
+        self,
+        path: str,
+        tenant: Optional[str] = None,
+        command: Optional[str] = None,
+        repo_root: Path = configs.REPO_ROOT,
+    ) -> Dict:
+        """Parse and store one log file; a log already ingested is skipped."""
+        with open(path, "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        row = self.conn.execute(
+            "SELECT id FROM runs WHERE log_sha256 = ?", (digest,)
+        ).fetchone()
+        if row:
+            return {
+                "source": path,
+                "run_id": row["id"],
+                "duplicate": True,
+                "records": 0,
+            }
+
+        parsed = parse_log(
+            data.decode(errors="replace").splitlines(), command, repo_root
+        )
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO runs (log_sha256, source, tenant, command, started, finished,"
+                " ingested_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    digest,
+                    str(path),
+                    tenant,
+                    parsed["command"],
+                    parsed["started"],
+                    parsed["finished"],
+                    time.time(),
+                ),
+            )
+            run_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO records (run_id, unit, command, started, duration, failed)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        run_id,
+                        r["unit"],
+                        r["command"],
+                        r["started"],
+                        r["duration"],
+                        int(r["failed"]),
+                    )
+                    for r in parsed["records"]
+                ],
+            )
+        return {
+            "source": path,
+            "run_id": run_id,
+            "duplicate": False,
+            "records": len(parsed["records"]),
+            "command": parsed["command"],
+            "units": sorted({r["unit"] for r in parsed["records"]}),
+        }
+
+    def samples(
+        self,
+        command: str,
+        tenant: Optional[str] = None,
+        window: int = DEFAULT_WINDOW,
+        include_failed: bool = False,
+    ) -> Dict[str, List[float]]:
+        """Most recent ``window`` durations per unit for a command, newest first."""
+        query = (
+            "SELECT r.unit, r.duration FROM records r JOIN runs ON runs.id = r.run_id"
+            " WHERE r.command = ?"
+        )
+        params: List = [command]
+        if tenant is not None:
+            query += " AND runs.tenant = ?"
+            params.append(tenant)
+        if not include_failed:
+            query += " AND r.failed = 0"
+        query += " ORDER BY r.unit, r.started DESC"
+        samples: Dict[str, List[float]] = {}
+        for row in self.conn.execute(query, params):
+            values = samples.setdefault(row["unit"], [])
+            if len(values) < window:
+                values.append(row["duration"])
+        return samples
+
+    def tenant_durations(
+        self, command: str, window: int = DEFAULT_WINDOW
+    ) -> Dict[str, float]:
+        """Median wall time of recent runs per tenant, for the shard planner."""
+        rows = self.conn.execute(
+            "SELECT tenant, finished - started AS wall FROM runs"
+            " WHERE tenant IS NOT NULL AND command = ? AND finished IS NOT NULL"
+            " ORDER BY tenant, started DESC",
+            (command,),
+        )
+        walls: Dict[str, List[float]] = {}
+        for row in rows:
+            values = walls.setdefault(row["tenant"], [])
+            if len(values) < window:
+                values.append(row["wall"])
+        return {tenant: statistics.median(values) for tenant, values in walls.items()}
+
+    def stats(self) -> Dict:
+        runs = self.conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT command, COUNT(*) AS records, COUNT(DISTINCT unit) AS units"
+            " FROM records GROUP BY command ORDER BY command"
+        ).fetchall()
+        return {
+            "db_path": str(self.db_path),
+            "runs": runs,
+            "commands": {
+                r["command"]: {"records": r["records"], "units": r["units"]}
+                for r in rows
+            },
+        }
+
+
+def summarize(values: List[float], stat: str = "median") -> float:
+    """One of STATS over durations ordered newest first."""
+    if stat == "last":
+        return values[0]
+    if stat == "max":
+        return max(values)
+    if stat == "p90":
+        ordered = sorted(values)
+        return ordered[min(len(ordered) - 1, int(0.9 * len(ordered)))]
+    return statistics.median(values)
+
+
+def unit_durations(
+    history: RunHistory,
+    command: str,
+    stat: str = "median",
+    tenant: Optional[str] = None,
+    window: int = DEFAULT_WINDOW,
+    with_init: bool = True,
+) -> Dict[str, float]:
+    """Per-unit predicted seconds for ``command``, including init when recorded.
+
+    Tenant-specific samples win over fleet-wide ones for the same unit.
+    """
+
+    def collect(for_tenant):
+        samples = history.samples(command, for_tenant, window)
+        values = {unit: summarize(v, stat) for unit, v in samples.items()}
+        if with_init and command != "init":
+            for unit, init in history.samples("init", for_tenant, window).items():
+                if unit in values:
+                    values[unit] += summarize(init, stat)
+        return values
+
+    durations = collect(None)
+    if tenant is not None:
+        durations.update(collect(tenant))
+    return durations
+
+
+def predict(
+    stack: dag.StackSpec,
+    durations: Dict[str, float],
+    env: Optional[Dict[str, str]] = None,
+) -> Optional[Dict]:
+    """ETA and critical path of a stack run, or None without any matching history."""
+    covered = [
+        u.path for u in stack.units if u.path in durations or u.name in durations
+    ]
+    if not covered:
+        return None
+    report = dag.analyze_stack(stack, durations=durations, env=env)
+    if report["cycles"]:
+        return None
+    critical = report["critical_path"]
+    eta = report["makespan_at_configured_parallelism"]
+    return {
+        "eta_seconds": round(eta if eta is not None else critical["length"], 1),
+        "critical_path_seconds": round(critical["length"], 1),
+        "critical_path": critical["units"],
+        "total_work_seconds": round(report["total_work"], 1),
+        "parallelism": report["configured_parallelism"],
+        "recommended_parallelism": report["recommended_parallelism"],
+        "units_with_history": len(covered),
+        "units": report["active_units"],
+    }
+
+
+def predict_for_stack_file(
+    stack_file: str,
+    tenant: Optional[str] = None,
+    commands: Iterable[str] = ("plan", "apply"),
+    db_path: Optional[Path] = None,
+) -> Optional[Dict[str, Dict]]:
+    """Predictions per command for the selector's output, or None without history.
+
+    Cheap when no history has been recorded: the database is not opened.
+    """
+    path = Path(db_path or history_db_path())
+    if not path.exists() or not stack_file:
+        return None
+    stack_path = configs.REPO_ROOT / stack_file
+    if not stack_path.exists():
+        return None
+    stack = dag.load_stack(stack_path)
+    with RunHistory(path) as history:
+        predictions = {}
+        for command in commands:
+            prediction = predict(stack, unit_durations(history, command, tenant=tenant))
+            if prediction:
+                predictions[command] = prediction
+    return predictions or None
+
+
+def format_seconds(seconds: float) -> str:
+    """Render seconds as ``1h02m``, ``12m05s`` or ``40s``."""
+    delta = timedelta(seconds=int(round(seconds)))
+    hours, rest = divmod(delta.seconds + delta.days * 86400, 3600)
+    minutes, secs = divmod(rest, 60)
+    if hours:
+        return f"{hours}h{minutes:02d}m"
+    if minutes:
+        return f"{minutes}m{secs:02d}s"
+    return f"{secs}s"
+
+
+def iter_log_files(sources: Iterable[str]) -> Iterator[str]:
+    """Log files from file paths and directories (``*.log`` and ``*.txt``)."""
+    for source in sources:
+        if os.path.isdir(source):
+            for root, dirs, files in os.walk(source):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.endswith((".log", ".txt")):
+                        yield os.path.join(root, name)
+        else:
+            yield source
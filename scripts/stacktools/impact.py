@@ -0,0 +1,258 @@
+"""
+Change impact analysis: from changed paths to a minimal plan matrix.
+
+Changed files are mapped to units through ``include`` blocks (transitively)
+and unit directories, then propagated to downstream units that read their
+outputs through ``dependency`` blocks. Affected units are mapped to the
+stacks that list them, stacks to deployment types, and deployment types to
+the tenants using them.
+
+Ordering-only ``dependencies { paths = [...] }`` edges are not followed:
+they change when a unit runs, not what it plans.
+"""
+
+import os
+import subprocess
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set
+
+from stacktools import configs, dag, terragrunt
+from stacktools.batch import iter_tenant_files
+
+# Changes under these prefixes can alter every plan
+GLOBAL_PREFIXES = (
+    "overlays/",
+    "actions/setup-terragrunt/",
+    "actions/git-auth-github-app/",
+    ".github/workflows/rwf-tg-",
+    ".github/workflows/terragrunt-",
+)
+DEPLOYMENT_CONFIGS_PREFIX = "stacks/deployment-types/configs/"
+
+
+def git_changed_files(
+    base: str, head: str = "HEAD", cwd: Optional[Path] = None
+) -> List[Path]:
+    """Absolute paths of files changed between base and head (merge-base diff)."""
+    cwd = cwd or Path.cwd()
+    toplevel = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout.strip()
+    diff = subprocess.run(
+        ["git", "diff", "--name-only", "--no-renames", f"{base}...{head}"],
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+    return [Path(toplevel) / line for line in diff.splitlines() if line]
+
+
+class ImpactAnalyzer:
+    """Holds the parsed repo graph so many change sets can be analyzed."""
+
+    def __init__(
+        self,
+        repo_root: Path = configs.REPO_ROOT,
+        config_dir: Path = configs.CONFIG_DIR,
+        cache=None,
+    ):
+        self.repo_root = repo_root.resolve()
+        self.units = terragrunt.scan_units(self.repo_root)
+        self.stacks = {
+            s.relative_path(): s
+            for s in (dag.load_stack(p) for p in dag.stack_files(self.repo_root))
+        }
+        deployment_stacks = configs.load_deployment_configs(config_dir, cache=cache)
+        self.deployment_types_by_stack: Dict[str, List[str]] = {}
+        for name, info in deployment_stacks.items():
+            if info.get("stack_file"):
+                self.deployment_types_by_stack.setdefault(
+                    info["stack_file"], []
+                ).append(name)
+        self.stack_by_deployment_type = {
+            name: info.get("stack_file") for name, info in deployment_stacks.items()
+        }
+
+        # file -> units that include it, directly or through other includes
+        include_cache: Dict = {}
+        self.units_by_include: Dict[str, Set[str]] = {}
+        for unit, config in self.units.items():
+            direct = list(config.includes.values())
+            for included in set(direct) | terragrunt.include_closure(
+                direct, self.repo_root, include_cache
+            ):
+                self.units_by_include.setdefault(included, set()).add(unit)
+
+        # unit -> units that read its outputs
+        self.output_readers: Dict[str, Set[str]] = {}
+        for unit, config in self.units.items():
+            for upstream in config.dependency_blocks.values():
+                self.output_readers.setdefault(upstream, set()).add(unit)
+
+    def _relative(self, path: Path) -> Optional[str]:
+        try:
+            return path.resolve().relative_to(self.repo_root).as_posix()
+        except ValueError:
+            return None
+
+    def _unit_for(self, rel: str) -> Optional[str]:
+        """The unit directory containing a repo-relative file, if any."""
+        parts = rel.split("/")
+        for i in range(len(parts) - 1, 0, -1):
+            candidate = "/".join(parts[:i])
+            if candidate in self.units:
+                return candidate
+        return None
+
+    def _stack_for_hcl(self, rel: str) -> Optional[str]:
+        """Map stacks/aws/full/terragrunt.stack.hcl to stacks/aws/full.stack.yaml."""
+        stack_dir = rel.rsplit("/", 1)[0]
+        candidate = f"{stack_dir}.stack.yaml"
+        return candidate if candidate in self.stacks else None
+
+    def _deployment_type_for(self, path: Path, rel: str) -> str:
+        if path.is_file():
+            try:
+                parsed = configs.parse_deployment_config(path)
+            except Exception:
+                parsed = None
+            if parsed:
+                return parsed["name"]
+        return Path(rel).stem
+
+    def analyze(
+        self, changed: Iterable[Path], tenant_files: Iterable[str] = ()
+    ) -> Dict:
+        """Compute affected units, stacks, deployment types and the plan matrix."""
+        changed = [Path(p).absolute() for p in changed]
+        changed_abs = {os.path.normpath(str(p)) for p in changed}
+
+        unit_reasons: Dict[str, List[str]] = {}
+        whole_stacks: Dict[str, str] = {}
+        changed_deployment_types: Set[str] = set()
+        global_reasons: List[str] = []
+        ignored: List[str] = []
+        unreferenced: List[str] = []
+
+        def mark(unit: str, reason: str):
+            unit_reasons.setdefault(unit, []).append(reason)
+
+        for path in changed:
+            rel = self._relative(path)
+            if rel is None:
+                continue  # outside the catalog repo, e.g. tenant files
+            if rel.startswith(GLOBAL_PREFIXES):
+                global_reasons.append(rel)
+            elif rel in self.units_by_include:
+                for unit in self.units_by_include[rel]:
+                    mark(unit, f"includes {rel}")
+            elif self._unit_for(rel):
+                mark(self._unit_for(rel), f"changed {rel}")
+            elif rel in self.stacks:
+                whole_stacks[rel] = f"changed {rel}"
+            elif rel.endswith("terragrunt.stack.hcl") and self._stack_for_hcl(rel):
+                whole_stacks[self._stack_for_hcl(rel)] = f"changed {rel}"
+            elif rel.startswith(DEPLOYMENT_CONFIGS_PREFIX) and rel.endswith(
+                configs.CONFIG_SUFFIXES
+            ):
+                changed_deployment_types.add(self._deployment_type_for(path, rel))
+            elif rel.endswith(".hcl") and rel.startswith(("includes/", "units/")):
+                unreferenced.append(rel)
+            else:
+                ignored.append(rel)
+
+        # Propagate through dependency (output) edges
+        pending = list(unit_reasons)
+        while pending:
+            upstream = pending.pop()
+            for reader in sorted(self.output_readers.get(upstream, ())):
+                if reader not in unit_reasons:
+                    pending.append(reader)
+                mark(reader, f"reads outputs of {upstream}")
+
+        stacks: Dict[str, Dict] = {}
+        for rel, stack in self.stacks.items():
+            stack_units = [u.path for u in stack.units]
+            deployment_types = self.deployment_types_by_stack.get(rel, [])
+            if (
+                global_reasons
+                or rel in whole_stacks
+                or changed_deployment_types & set(deployment_types)
+            ):
+                stacks[rel] = {"all_units": True, "units": stack_units}
+                continue
+            affected = [u for u in stack_units if u in unit_reasons]
+            if affected:
+                stacks[rel] = {"all_units": False, "units": affected}
+
+        deployment_types = sorted(
+            name
+            for name, stack_file in self.stack_by_deployment_type.items()
+            if stack_file in stacks or name in changed_deployment_types
+        )
+
+        matrix = []
+        for config_file in tenant_files:
+            entry = self._tenant_entry(config_file, changed_abs, stacks)
+            if entry:
+                matrix.append(entry)
+
+        return {
+            "changed_files": [str(p) for p in changed],
+            "global_changes": global_reasons,
+            "ignored_files": ignored,
+            "unreferenced_files": unreferenced,
+            "units": {u: unit_reasons[u] for u in sorted(unit_reasons)},
+            "stacks": stacks,
+            "deployment_types": deployment_types,
+            "matrix": {"include": matrix},
+        }
+
+    def _tenant_entry(
+        self, config_file: str, changed_abs: Set[str], stacks: Dict
+    ) -> Optional[Dict]:
+        try:
+            config = configs.load_config(config_file)
+        except configs.ConfigError:
+            return None
+        deployment_type = (
+            config.get("deployment_type") or configs.DEFAULT_DEPLOYMENT_TYPE
+        )
+        stack_file = self.stack_by_deployment_type.get(deployment_type)
+        tenant_changed = os.path.normpath(os.path.abspath(config_file)) in changed_abs
+
+        if tenant_changed:
+            stack = self.stacks.get(stack_file)
+            units = [u.path for u in stack.units] if stack else []
+            all_units = True
+        elif stack_file in stacks:
+            units = stacks[stack_file]["units"]
+            all_units = stacks[stack_file]["all_units"]
+        else:
+            return None
+
+        return {
+            "stack_path": str(Path(config_file).parent),
+            "config_path": str(Path(config_file).absolute()),
+            "deployment_type": deployment_type,
+            "stack_file": stack_file,
+            "all_units": all_units,
+            "units": units,
+        }
+
+
+def analyze_changes(
+    changed: Iterable[Path],
+    tenant_sources: Iterable[str] = (),
+    pattern: str = "tenant.yaml",
+    cache=None,
+) -> Dict:
+    """Convenience wrapper: analyze one change set against the repo."""
+    analyzer = ImpactAnalyzer(cache=cache)
+    tenant_files = iter_tenant_files(tenant_sources, pattern) if tenant_sources else ()
+    return analyzer.analyze(changed, tenant_files)
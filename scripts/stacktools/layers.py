@@ -0,0 +1,321 @@
+"""
+Hierarchical resolution of tenant configs into one effective config.
+
+A tenant's effective config is built from layers, lowest precedence first:
+
+1. built-in defaults: the ``try(...)`` fallbacks of includes/stack-config.hcl
+2. the deployment type: features, components, cluster_config, subnet_config
+   and tags from stacks/deployment-types/configs
+3. ``defaults.yaml`` files in the tenant's ancestor directories, outermost
+   first (``apiary/defaults.yaml``, ``apiary/acme/defaults.yaml``,
+   ``apiary/acme/usw2/defaults.yaml``)
+4. the tenant file itself
+
+Mappings are merged key by key; lists and scalars replace what is below
+them. Every leaf records the layer it came from, so
+``provenance["cluster_config.min_nodes"]`` answers "why is this 3?".
+
+Layer files are parsed once per resolver and revalidated by mtime and size,
+and the merge of everything below the tenant is memoized per (deployment
+type, layer chain): resolving a whole fleet parses each shared layer once
+and merges only the tenant file on top. Resolved configs share structure
+with that memo and must be treated as read-only.
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from stacktools import configs, schema, timings
+from stacktools.cache import file_digest
+
+LAYER_FILE = "defaults.yaml"
+EFFECTIVE_ENV = "TG_EFFECTIVE_CONFIG"
+EFFECTIVE_VERSION = 2
+
+DEFAULT_SOURCE = "default"
+DERIVED_SOURCE = "derived"
+
+# Fallbacks that includes/stack-config.hcl and the units apply with try()
+BUILTIN_DEFAULTS = {
+    "deployment_type": configs.DEFAULT_DEPLOYMENT_TYPE,
+    "features": {},
+}
+
+# Deployment-type keys merged into the effective config. Units read none of
+# them directly, so tenants that do not override them resolve exactly as
+# terragrunt resolves them today
+DEPLOYMENT_TYPE_KEYS = (
+    "features",
+    "components",
+    "cluster_config",
+    "subnet_config",
+    "tags",
+)
+
+Stamp = Tuple[int, int]
+Resolved = Tuple[Dict[str, Any], Dict[str, str]]
+
+
+def _join(path: str, key) -> str:
+    return f"{path}.{key}" if path else str(key)
+
+
+def _record(value, path: str, source: str, provenance: Dict[str, str]):
+    if isinstance(value, dict) and value:
+        for key, child in value.items():
+            _record(child, _join(path, key), source, provenance)
+    else:
+        provenance[path] = source
+
+
+def iter_leaves(value, path: str = ""):
+    """Yield (path, value) for every leaf, in the form provenance keys use."""
+    if isinstance(value, dict) and value:
+        for key, child in value.items():
+            yield from iter_leaves(child, _join(path, key))
+    else:
+        yield path, value
+
+
+def _drop(path: str, provenance: Dict[str, str]):
+    prefix = path + "."
+    for key in [k for k in provenance if k == path or k.startswith(prefix)]:
+        del provenance[key]
+
+
+def merge_layer(
+    base: Dict[str, Any],
+    layer: Dict[str, Any],
+    source: str,
+    provenance: Dict[str, str],
+    path: str = "",
+) -> Dict[str, Any]:
+    """Merge ``layer`` over ``base`` and return the result.
+
+    Neither input is modified: untouched subtrees of ``base`` are shared
+    with the result. ``provenance`` is updated in place.
+    """
+    merged = dict(base)
+    for key, value in layer.items():
+        key_path = _join(path, key)
+        current = merged.get(key)
+        if isinstance(value, dict) and isinstance(current, dict):
+            if value:
+                # An empty mapping recorded as a leaf is no longer one
+                provenance.pop(key_path, None)
+            merged[key] = merge_layer(current, value, source, provenance, key_path)
+            continue
+        if isinstance(current, dict):
+            _drop(key_path, provenance)
+        merged[key] = value
+        _record(value, key_path, source, provenance)
+    return merged
+
+
+def deployment_type_layer(info: Dict[str, Any]) -> Dict[str, Any]:
+    """The defaults a deployment-type config contributes to its tenants."""
+    layer = {}
+    for key in DEPLOYMENT_TYPE_KEYS:
+        if key not in info:
+            continue
+        value = info[key]
+        if key == "features" and isinstance(value, list):
+            value = {feature: True for feature in value}
+        layer[key] = value
+    return layer
+
+
+def derive(config: Dict[str, Any], provenance: Dict[str, str]):
+    """Fill in the values stack-config.hcl computes when a tenant omits them."""
+    if "state_bucket" not in config and config.get("sregion"):
+        config["state_bucket"] = f"honeyhive-federated-{config['sregion']}-state"
+        provenance["state_bucket"] = DERIVED_SOURCE
+    if "external_id" not in config and config.get("env"):
+        config["external_id"] = f"honeyhive-deployments-{config['env']}"
+        provenance["external_id"] = DERIVED_SOURCE
+
+
+def write_effective(document: Dict[str, Any], path: Path):
+    """Write an effective config document for ``TG_EFFECTIVE_CONFIG``."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(document, f, indent=2)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def source_label(path: Path) -> str:
+    """A layer's path relative to the cwd when possible."""
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
+
+
+class LayerResolver:
+    """Resolves tenant configs through their layer chain, memoizing shared layers."""
+
+    def __init__(
+        self,
+        deployment_stacks: Dict[str, Dict],
+        layer_file: str = LAYER_FILE,
+        root: Optional[Path] = None,
+    ):
+        self.deployment_stacks = deployment_stacks
+        self.layer_file = layer_file
+        self.root = Path(root).absolute() if root is not None else None
+        self._layers: Dict[Path, Tuple[Stamp, Dict[str, Any]]] = {}
+        self._chains: Dict[Path, Tuple[Path, ...]] = {}
+        self._bases: Dict[Tuple, Resolved] = {}
+        self.stats = {
+            "tenants": 0,
+            "layers_parsed": 0,
+            "layer_hits": 0,
+            "bases_built": 0,
+            "base_hits": 0,
+        }
+
+    def _chain(self, directory: Path) -> Tuple[Path, ...]:
+        """Layer files from the outermost ancestor down to ``directory``.
+
+        The walk stops at the filesystem root, at a repository root (a
+        directory holding ``.git``) or at the resolver's ``root``, whichever
+        comes first.
+        """
+        chain = self._chains.get(directory)
+        if chain is not None:
+            return chain
+        parent = directory.parent
+        if (
+            parent == directory
+            or directory == self.root
+            or (directory / ".git").exists()
+        ):
+            chain = ()
+        else:
+            chain = self._chain(parent)
+        layer = directory / self.layer_file
+        if layer.is_file():
+            chain = chain + (layer,)
+        self._chains[directory] = chain
+        return chain
+
+    def _layer(self, path: Path) -> Tuple[Stamp, Dict[str, Any]]:
+        try:
+            st = os.stat(path)
+        except OSError as e:
+            raise configs.ConfigError(f"Cannot read layer {path}: {e}")
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._layers.get(path)
+        if cached is not None and cached[0] == stamp:
+            self.stats["layer_hits"] += 1
+            return cached
+        try:
+            with open(path, "r") as f:
+                # Unlike tenant files, an empty layer is fine
+                data = configs.load_yaml(f) or {}
+        except Exception as e:
+            raise configs.ConfigError(f"Invalid layer {path}: {e}")
+        if not isinstance(data, dict):
+            raise configs.ConfigError(f"{path}: layer is not a mapping")
+        self.stats["layers_parsed"] += 1
+        self._layers[path] = (stamp, data)
+        return self._layers[path]
+
+    def _base(
+        self, deployment_type: str, chain: Tuple[Path, ...], layers: List
+    ) -> Resolved:
+        key = (deployment_type,) + tuple(
+            (path, stamp) for path, (stamp, _) in zip(chain, layers)
+        )
+        base = self._bases.get(key)
+        if base is not None:
+            self.stats["base_hits"] += 1
+            return base
+        provenance: Dict[str, str] = {}
+        config = merge_layer({}, BUILTIN_DEFAULTS, DEFAULT_SOURCE, provenance)
+        config = merge_layer(
+            config,
+            deployment_type_layer(self.deployment_stacks[deployment_type]),
+            f"deployment_type:{deployment_type}",
+            provenance,
+        )
+        for path, (_, data) in zip(chain, layers):
+            config = merge_layer(config, data, source_label(path), provenance)
+        self.stats["bases_built"] += 1
+        self._bases[key] = (config, provenance)
+        return config, provenance
+
+    def digests(self, config_file: str) -> Dict[str, str]:
+        """SHA-256 of the tenant file and each of its layers, by absolute path.
+
+        ``stack-config.hcl`` compares these with ``filesha256()`` before it
+        uses an effective config. Take them before resolving: a file that
+        changes in between then no longer matches, and the config is not used.
+        """
+        path = Path(os.path.abspath(config_file))
+        result = {}
+        for file in self._chain(path.parent) + (path,):
+            try:
+                with open(file, "rb") as f:
+                    result[str(file)] = file_digest(f.read())
+            except OSError as e:
+                raise configs.ConfigError(f"Cannot read {file}: {e}")
+        return result
+
+    @timings.timed("tenant")
+    def resolve(
+        self, config_file: str, tenant: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Resolve one tenant file to its effective config document.
+
+        ``tenant`` is the file's already parsed content, when the caller has
+        it (from the fleet index, say); otherwise the file is loaded. The
+        effective config is checked against the tenant schema, with
+        problems listed under ``errors``. Raises ConfigError when the tenant
+        or one of its layers cannot be loaded, or names an unknown
+        deployment type.
+        """
+        path = Path(os.path.abspath(config_file))
+        if tenant is None:
+            tenant = configs.load_config(config_file)
+        if not isinstance(tenant, dict):
+            raise configs.ConfigError("Configuration is not a mapping")
+
+        chain = self._chain(path.parent)
+        layers = [self._layer(layer) for layer in chain]
+        deployment_type = tenant.get("deployment_type")
+        for _, data in reversed(layers):
+            if deployment_type:
+                break
+            deployment_type = data.get("deployment_type")
+        deployment_type = deployment_type or configs.DEFAULT_DEPLOYMENT_TYPE
+        if deployment_type not in self.deployment_stacks:
+            valid = ", ".join(sorted(self.deployment_stacks))
+            raise configs.ConfigError(
+                f"Unknown deployment type: {deployment_type} (valid types: {valid})"
+            )
+
+        config, provenance = self._base(deployment_type, chain, layers)
+        provenance = dict(provenance)
+        config = merge_layer(config, tenant, source_label(path), provenance)
+        derive(config, provenance)
+        self.stats["tenants"] += 1
+        return {
+            "version": EFFECTIVE_VERSION,
+            "source": str(path),
+            "deployment_type": deployment_type,
+            "layers": [source_label(layer) for layer in chain],
+            "config": config,
+            "provenance": dict(sorted(provenance.items())),
+            "errors": schema.format_errors(
+                schema.validate_tenant(config, self.deployment_stacks)
+            ),
+        }
@@ -0,0 +1,659 @@
+"""
+Removal of Karpenter-provisioned EC2 resources before a cluster destroy.
+
+Instances Karpenter launches are not in terraform state: left running they
+hold the cluster's security groups and subnets, and the destroy stalls.
+For each (cluster, region) target ``cleanup`` removes:
+
+1. instances tagged ``karpenter.sh/cluster=<cluster>`` that are not yet
+   terminated. They are listed page by page, terminated in capped batches
+   and polled with exponential backoff until none is left. An instance
+   launched while the cleanup runs (a controller still scaling) shows up
+   in the next poll and is terminated too.
+2. network interfaces the VPC CNI left ``available`` for the cluster
+   (``cluster.k8s.amazonaws.com/name=<cluster>``). They are listed once the
+   instances are gone, when their attachments have been released.
+3. launch templates Karpenter created for the cluster
+   (``karpenter.k8s.aws/cluster=<cluster>``).
+
+Targets are cleaned concurrently, one thread each. A dry run only lists.
+
+EC2 is reached through boto3-shaped clients: ``boto3_clients`` (optionally
+pointed at a moto server) or ``LocalEc2``, a JSON file standing in for EC2
+in tests. The stand-in runs on a virtual clock, so polling costs no real
+time.
+"""
+
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from stacktools import timings
+
+INSTANCE_TAG = "karpenter.sh/cluster"
+NETWORK_INTERFACE_TAG = "cluster.k8s.amazonaws.com/name"
+LAUNCH_TEMPLATE_TAG = "karpenter.k8s.aws/cluster"
+
+# Every state except terminated: shutting-down instances are still polled
+LIVE_STATES = ("pending", "running", "stopping", "stopped", "shutting-down")
+
+DEFAULT_REGION = "us-west-2"
+DEFAULT_BATCH_SIZE = 500
+MAX_BATCH_SIZE = 1000
+DEFAULT_PAGE_SIZE = 1000
+DEFAULT_TIMEOUT = 900.0
+DEFAULT_JOBS = 8
+DELETE_WORKERS = 8
+
+# Poll delays: 2s, 3.2s, 5.1s, ... capped at 30s, each with up to 20% jitter
+BACKOFF_INITIAL = 2.0
+BACKOFF_FACTOR = 1.6
+BACKOFF_MAX = 30.0
+
+# Page size limits of the EC2 describe calls
+PAGE_LIMITS = {
+    "describe_instances": (5, 1000),
+    "describe_network_interfaces": (5, 1000),
+    "describe_launch_templates": (1, 200),
+}
+
+
+class CleanupError(Exception):
+    """Raised when EC2 cannot be reached or a target is malformed."""
+
+
+def parse_target(text: str, default_region: str = DEFAULT_REGION) -> Tuple[str, str]:
+    """``cluster`` or ``cluster@region`` to (cluster, region)."""
+    cluster, _, region = text.partition("@")
+    if not cluster or (_ and not region):
+        raise CleanupError(
+            f"Invalid target {text!r} (expected CLUSTER or CLUSTER@REGION)"
+        )
+    return cluster, region or default_region
+
+
+def backoff(
+    initial: float = BACKOFF_INITIAL,
+    factor: float = BACKOFF_FACTOR,
+    maximum: float = BACKOFF_MAX,
+    jitter: float = 0.2,
+) -> Iterator[float]:
+    """Endless exponential poll delays with proportional jitter."""
+    delay = initial
+    while True:
+        yield delay * (1 + random.uniform(-jitter, jitter))
+        delay = min(delay * factor, maximum)
+
+
+def _chunks(items: Sequence, size: int) -> Iterator[Sequence]:
+    for i in range(0, len(items), size):
+        yield items[i : i + size]
+
+
+def boto3_clients(
+    endpoint_url: Optional[str] = None, max_attempts: int = 10
+) -> Callable:
+    """A factory of boto3 EC2 clients by region.
+
+    Throttled calls are retried by botocore's adaptive mode, which also
+    rate-limits the client when EC2 pushes back.
+    """
+    try:
+        import boto3
+        from botocore.config import Config
+    except ImportError:
+        raise CleanupError(
+            "boto3 is required to clean up EC2 resources (pip install boto3)"
+        )
+    config = Config(retries={"max_attempts": max_attempts, "mode": "adaptive"})
+
+    def client(region: str):
+        # Sessions are not thread-safe: one per target thread
+        return boto3.session.Session().client(
+            "ec2", region_name=region, endpoint_url=endpoint_url, config=config
+        )
+
+    return client
+
+
+class TargetCleanup:
+    """Cleans one cluster in one region through a boto3-shaped EC2 client."""
+
+    def __init__(
+        self,
+        client,
+        cluster: str,
+        region: str,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        sleep: Callable[[float], None] = time.sleep,
+        clock: Callable[[], float] = time.monotonic,
+        delays: Optional[Iterator[float]] = None,
+    ):
+        self.client = client
+        self.cluster = cluster
+        self.region = region
+        self.batch_size = min(max(1, batch_size), MAX_BATCH_SIZE)
+        self.page_size = page_size
+        self.timeout = timeout
+        self.sleep = sleep
+        self.clock = clock
+        self.delays = delays if delays is not None else backoff()
+        self.api_calls: Dict[str, int] = {}
+        self.errors: List[str] = []
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str, **kwargs) -> Dict:
+        with self._lock:
+            self.api_calls[operation] = self.api_calls.get(operation, 0) + 1
+        return getattr(self.client, operation)(**kwargs)
+
+    def _pages(
+        self, operation: str, key: str, filters: List[Dict]
+    ) -> Iterator[List[Dict]]:
+        low, high = PAGE_LIMITS[operation]
+        kwargs = {"Filters": filters, "MaxResults": min(max(self.page_size, low), high)}
+        while True:
+            response = self._call(operation, **kwargs)
+            yield response.get(key, [])
+            token = response.get("NextToken")
+            if not token:
+                return
+            kwargs["NextToken"] = token
+
+    def list_instances(self) -> Dict[str, str]:
+        """The cluster's live instances: {instance id: state name}."""
+        filters = [
+            {"Name": f"tag:{INSTANCE_TAG}", "Values": [self.cluster]},
+            {"Name": "instance-state-name", "Values": list(LIVE_STATES)},
+        ]
+        instances = {}
+        with timings.span(
+            "list_instances", "io", cluster=self.cluster, region=self.region
+        ):
+            for reservations in self._pages(
+                "describe_instances", "Reservations", filters
+            ):
+                for reservation in reservations:
+                    for instance in reservation.get("Instances", []):
+                        instances[instance["InstanceId"]] = instance["State"]["Name"]
+        return instances
+
+    def list_network_interfaces(self) -> List[str]:
+        filters = [
+            {"Name": f"tag:{NETWORK_INTERFACE_TAG}", "Values": [self.cluster]},
+            {"Name": "status", "Values": ["available"]},
+        ]
+        return [
+            eni["NetworkInterfaceId"]
+            for page in self._pages(
+                "describe_network_interfaces", "NetworkInterfaces", filters
+            )
+            for eni in page
+        ]
+
+    def list_launch_templates(self) -> List[str]:
+        filters = [{"Name": f"tag:{LAUNCH_TEMPLATE_TAG}", "Values": [self.cluster]}]
+        return [
+            template["LaunchTemplateId"]
+            for page in self._pages(
+                "describe_launch_templates", "LaunchTemplates", filters
+            )
+            for template in page
+        ]
+
+    def terminate(self, instance_ids: Sequence[str]) -> List[str]:
+        """Terminate in batches of at most ``batch_size``; returns the ids requested."""
+        requested = []
+        for batch in _chunks(sorted(instance_ids), self.batch_size):
+            try:
+                with timings.span("terminate_instances", "io", count=len(batch)):
+                    self._call("terminate_instances", InstanceIds=list(batch))
+            except Exception as e:  # botocore's ClientError, without importing botocore
+                self.errors.append(f"terminate_instances ({len(batch)} instances): {e}")
+                continue
+            requested.extend(batch)
+        return requested
+
+    def wait_terminated(
+        self, instances: Dict[str, str], requested: set
+    ) -> Tuple[Dict[str, str], int]:
+        """Poll with backoff until no live instance is left or the timeout passes.
+
+        Live instances not yet requested (new launches, or a batch that
+        failed) are terminated on each poll. Returns what is still live and
+        the number of polls.
+        """
+        deadline = self.clock() + self.timeout
+        polls = 0
+        while instances:
+            remaining = deadline - self.clock()
+            if remaining <= 0:
+                break
+            self.sleep(min(next(self.delays), remaining))
+            polls += 1
+            instances = self.list_instances()
+            fresh = [
+                i
+                for i, state in instances.items()
+                if i not in requested and state != "shutting-down"
+            ]
+            requested.update(self.terminate(fresh))
+        return instances, polls
+
+    def _delete_each(
+        self, operation: str, id_key: str, ids: Sequence[str]
+    ) -> List[str]:
+        def delete(resource_id):
+            try:
+                self._call(operation, **{id_key: resource_id})
+            except Exception as e:
+                self.errors.append(f"{operation} {resource_id}: {e}")
+                return None
+            return resource_id
+
+        if not ids:
+            return []
+        with ThreadPoolExecutor(max_workers=min(DELETE_WORKERS, len(ids))) as pool:
+            return [resource_id for resource_id in pool.map(delete, ids) if resource_id]
+
+    def run(self, dry_run: bool = False) -> Dict:
+        started = self.clock()
+        report = {
+            "cluster": self.cluster,
+            "region": self.region,
+            "dry_run": dry_run,
+            "found": {},
+            "terminated": 0,
+            "remaining": [],
+            "deleted": {"network_interfaces": 0, "launch_templates": 0},
+            "polls": 0,
+        }
+        try:
+            instances = self.list_instances()
+            report["found"]["instances"] = sorted(instances)
+            if not dry_run:
+                requested = set(
+                    self.terminate(
+                        [
+                            i
+                            for i, state in instances.items()
+                            if state != "shutting-down"
+                        ]
+                    )
+                )
+                remaining, report["polls"] = self.wait_terminated(instances, requested)
+                report["terminated"] = len(requested)
+                report["remaining"] = sorted(remaining)
+
+            # Listed after the instances are gone so released ENIs are included
+            enis = self.list_network_interfaces()
+            templates = self.list_launch_templates()
+            report["found"]["network_interfaces"] = enis
+            report["found"]["launch_templates"] = templates
+            if not dry_run:
+                report["deleted"]["network_interfaces"] = len(
+                    self._delete_each(
+                        "delete_network_interface", "NetworkInterfaceId", enis
+                    )
+                )
+                report["deleted"]["launch_templates"] = len(
+                    self._delete_each(
+                        "delete_launch_template", "LaunchTemplateId", templates
+                    )
+                )
+        except Exception as e:
+            self.errors.append(str(e))
+
+        found = sum(len(ids) for ids in report["found"].values())
+        if self.errors:
+            status = "error"
+        elif report["remaining"]:
+            status = "timeout"
+        elif dry_run:
+            status = "dry-run"
+        else:
+            status = "cleaned" if found else "clean"
+        report.update(
+            status=status,
+            errors=self.errors,
+            api_calls=dict(sorted(self.api_calls.items())),
+            seconds=round(self.clock() - started, 3),
+        )
+        return report
+
+
+def cleanup(
+    targets: Sequence[Tuple[str, str]],
+    client_factory: Callable,
+    dry_run: bool = False,
+    jobs: int = DEFAULT_JOBS,
+    **options,
+) -> Dict:
+    """Clean every (cluster, region) target concurrently.
+
+    ``client_factory(region)`` returns an EC2 client; ``options`` are passed
+    to ``TargetCleanup`` (batch_size, page_size, timeout, sleep, clock).
+    Returns the per-target reports in target order and a summary.
+    """
+    targets = list(dict.fromkeys(targets))
+
+    def clean(target):
+        cluster, region = target
+        with timings.span("cleanup", "cleanup", cluster=cluster, region=region):
+            try:
+                client = client_factory(region)
+            except Exception as e:
+                return {
+                    "cluster": cluster,
+                    "region": region,
+                    "dry_run": dry_run,
+                    "status": "error",
+                    "errors": [str(e)],
+                }
+            return TargetCleanup(client, cluster, region, **options).run(dry_run)
+
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(targets) or 1))) as pool:
+        reports = list(pool.map(clean, targets))
+
+    statuses: Dict[str, int] = {}
+    for report in reports:
+        statuses[report["status"]] = statuses.get(report["status"], 0) + 1
+    return {
+        "targets": reports,
+        "summary": {
+            "targets": len(reports),
+            "statuses": statuses,
+            "found": sum(len(r.get("found", {}).get("instances", [])) for r in reports),
+            "terminated": sum(r.get("terminated", 0) for r in reports),
+            "remaining": sum(len(r.get("remaining", [])) for r in reports),
+            "api_calls": sum(sum(r.get("api_calls", {}).values()) for r in reports),
+        },
+    }
+
+
+class LocalEc2:
+    """A JSON file standing in for EC2 in tests, on a virtual clock.
+
+    Layout::
+
+        {"clock": 0, "shutdown_seconds": 10,
+         "regions": {"us-west-2": {
+            "instances": [{"InstanceId": "i-1", "State": "running", "Tags": {...}}],
+            "network_interfaces": [{"NetworkInterfaceId": "eni-1", "Status": "in-use",
+                                    "InstanceId": "i-1", "Tags": {...}}],
+            "launch_templates": [{"LaunchTemplateId": "lt-1", "Tags": {...}}]}}}
+
+    Terminated instances stay shutting-down for ``shutdown_seconds`` of
+    virtual time, then release their network interfaces. Page sizes and
+    the terminate batch size are checked against EC2's limits, and every
+    call is counted under ``calls``. ``sleep`` advances the clock instead
+    of sleeping.
+    """
+
+    def __init__(self, path: Optional[Path] = None):
+        self.path = Path(path) if path else None
+        self.lock = threading.Lock()
+        self.state = {
+            "clock": 0.0,
+            "shutdown_seconds": 10.0,
+            "regions": {},
+            "calls": {},
+        }
+        if self.path and self.path.exists():
+            try:
+                self.state.update(json.loads(self.path.read_text()))
+            except (OSError, ValueError) as e:
+                raise CleanupError(f"Cannot read EC2 stand-in {self.path}: {e}")
+
+    def seed(
+        self,
+        cluster: str,
+        region: str = DEFAULT_REGION,
+        instances: int = 0,
+        network_interfaces: int = 0,
+        launch_templates: int = 0,
+    ):
+        """Add Karpenter resources for a cluster; each ENI is attached to an instance."""
+        resources = self._region(region)
+        prefix = f"{cluster}-{region}-{len(resources['instances'])}"
+        ids = [f"i-{prefix}-{n}" for n in range(instances)]
+        for instance_id in ids:
+            resources["instances"].append(
+                {
+                    "InstanceId": instance_id,
+                    "State": "running",
+                    "Tags": {INSTANCE_TAG: cluster},
+                }
+            )
+        for n in range(network_interfaces):
+            eni = {
+                "NetworkInterfaceId": f"eni-{prefix}-{n}",
+                "Status": "available",
+                "Tags": {NETWORK_INTERFACE_TAG: cluster},
+            }
+            if ids:
+                eni.update(Status="in-use", InstanceId=ids[n % len(ids)])
+            resources["network_interfaces"].append(eni)
+        for n in range(launch_templates):
+            resources["launch_templates"].append(
+                {
+                    "LaunchTemplateId": f"lt-{prefix}-{n}",
+                    "Tags": {LAUNCH_TEMPLATE_TAG: cluster},
+                }
+            )
+
+    def save(self):
+        fd, tmp = tempfile.mkstemp(dir=self.path.parent, prefix=f".{self.path.name}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.state, f)
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def monotonic(self) -> float:
+        return self.state["clock"]
+
+    def sleep(self, seconds: float):
+        with self.lock:
+            self.state["clock"] += seconds
+
+    def client(self, region: str) -> "_LocalEc2Client":
+        return _LocalEc2Client(self, region)
+
+    def _region(self, region: str) -> Dict[str, List[Dict]]:
+        resources = self.state["regions"].setdefault(region, {})
+        for kind in ("instances", "network_interfaces", "launch_templates"):
+            resources.setdefault(kind, [])
+        return resources
+
+
+def _boto_tags(tags: Dict[str, str]) -> List[Dict[str, str]]:
+    return [{"Key": key, "Value": value} for key, value in tags.items()]
+
+
+def _matches(item: Dict, filters: Sequence[Dict], fields: Dict[str, str]) -> bool:
+    for f in filters:
+        name, values = f["Name"], f["Values"]
+        if name.startswith("tag:"):
+            value = item.get("Tags", {}).get(name[4:])
+        elif name in fields:
+            value = item.get(fields[name])
+        else:
+            raise CleanupError(f"Unsupported filter: {name}")
+        if value not in values:
+            return False
+    return True
+
+
+class _LocalEc2Client:
+    """The subset of the boto3 EC2 client that ``TargetCleanup`` calls."""
+
+    def __init__(self, world: LocalEc2, region: str):
+        self.world = world
+        self.region = region
+
+    def _count(self, operation: str):
+        calls = self.world.state["calls"]
+        calls[operation] = calls.get(operation, 0) + 1
+
+    def _advance(self, resources: Dict):
+        now = self.world.state["clock"]
+        gone = set()
+        for instance in resources["instances"]:
+            if (
+                instance["State"] == "shutting-down"
+                and instance.get("TerminatedAt", 0) <= now
+            ):
+                instance["State"] = "terminated"
+            if instance["State"] == "terminated":
+                gone.add(instance["InstanceId"])
+        for eni in resources["network_interfaces"]:
+            if eni["Status"] == "in-use" and eni.get("InstanceId") in gone:
+                eni["Status"] = "available"
+
+    def _page(
+        self,
+        operation: str,
+        kind: str,
+        Filters=(),
+        MaxResults=None,
+        NextToken=None,
+        fields=None,
+    ):
+        low, high = PAGE_LIMITS[operation]
+        if MaxResults is not None and not low <= MaxResults <= high:
+            raise CleanupError(
+                f"{operation}: MaxResults must be between {low} and {high}"
+            )
+        with self.world.lock:
+            self._count(operation)
+            resources = self.world._region(self.region)
+            self._advance(resources)
+            items = [
+                dict(i) for i in resources[kind] if _matches(i, Filters, fields or {})
+            ]
+        start = int(NextToken or 0)
+        end = start + (MaxResults or high)
+        return items[start:end], (str(end) if end < len(items) else None)
+
+    @staticmethod
+    def _response(key: str, items: List[Dict], token: Optional[str]) -> Dict:
+        response = {key: items}
+        if token:
+            response["NextToken"] = token
+        return response
+
+    def describe_instances(self, **kwargs):
+        items, token = self._page(
+            "describe_instances",
+            "instances",
+            fields={"instance-state-name": "State"},
+            **kwargs,
+        )
+        instances = [
+            {
+                "InstanceId": i["InstanceId"],
+                "State": {"Name": i["State"]},
+                "Tags": _boto_tags(i["Tags"]),
+            }
+            for i in items
+        ]
+        reservations = [{"Instances": instances}] if instances else []
+        return self._response("Reservations", reservations, token)
+
+    def describe_network_interfaces(self, **kwargs):
+        items, token = self._page(
+            "describe_network_interfaces",
+            "network_interfaces",
+            fields={"status": "Status"},
+            **kwargs,
+        )
+        for eni in items:
+            eni["TagSet"] = _boto_tags(eni.pop("Tags"))
+        return self._response("NetworkInterfaces", items, token)
+
+    def describe_launch_templates(self, **kwargs):
+        items, token = self._page(
+            "describe_launch_templates", "launch_templates", **kwargs
+        )
+        for template in items:
+            template["Tags"] = _boto_tags(template["Tags"])
+        return self._response("LaunchTemplates", items, token)
+
+    def terminate_instances(self, InstanceIds):
+        if len(InstanceIds) > MAX_BATCH_SIZE:
+            raise CleanupError(
+                f"terminate_instances: at most {MAX_BATCH_SIZE} instance ids"
+            )
+        with self.world.lock:
+            self._count("terminate_instances")
+            instances = {
+                i["InstanceId"]: i for i in self.world._region(self.region)["instances"]
+            }
+            missing = [i for i in InstanceIds if i not in instances]
+            if missing:
+                raise CleanupError(f"InvalidInstanceID.NotFound: {', '.join(missing)}")
+            shutdown_at = (
+                self.world.state["clock"] + self.world.state["shutdown_seconds"]
+            )
+            changes = []
+            for instance_id in InstanceIds:
+                instance = instances[instance_id]
+                previous = instance["State"]
+                if previous not in ("shutting-down", "terminated"):
+                    instance.update(State="shutting-down", TerminatedAt=shutdown_at)
+                changes.append(
+                    {
+                        "InstanceId": instance_id,
+                        "PreviousState": {"Name": previous},
+                        "CurrentState": {"Name": instance["State"]},
+                    }
+                )
+        return {"TerminatingInstances": changes}
+
+    def _delete(
+        self, operation: str, kind: str, id_key: str, resource_id: str, check=None
+    ):
+        with self.world.lock:
+            self._count(operation)
+            items = self.world._region(self.region)[kind]
+            for n, item in enumerate(items):
+                if item[id_key] == resource_id:
+                    if check:
+                        check(item)
+                    del items[n]
+                    return {}
+        raise CleanupError(f"{operation}: {resource_id} not found")
+
+    def delete_network_interface(self, NetworkInterfaceId):
+        def check(eni):
+            if eni["Status"] != "available":
+                raise CleanupError(
+                    f"InvalidNetworkInterface.InUse: {NetworkInterfaceId}"
+                )
+
+        return self._delete(
+            "delete_network_interface",
+            "network_interfaces",
+            "NetworkInterfaceId",
+            NetworkInterfaceId,
+            check,
+        )
+
+    def delete_launch_template(self, LaunchTemplateId):
+        return self._delete(
+            "delete_launch_template",
+            "launch_templates",
+            "LaunchTemplateId",
+            LaunchTemplateId,
+        )
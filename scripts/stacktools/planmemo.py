@@ -0,0 +1,575 @@
+"""
+Plan memoization by input fingerprint.
+
+Most of a nightly fleet plan re-plans units whose inputs have not changed.
+A unit's fingerprint for one tenant is a SHA-256 over:
+
+  * the tenant config, as parsed (comments and formatting do not count)
+  * the unit's ``terragrunt.hcl`` and every file it includes
+    (``stack-config.hcl``, ``tenant-config.hcl``, ``remote-state.hcl``,
+    ``aws-provider.hcl``, ...), with comments and blank lines stripped
+  * the ``terraform_ref`` its module source is pinned to: the tenant's,
+    else ``TERRAFORM_REF``, else the fallback in ``stack-config.hcl``
+  * the fingerprints of the units it depends on, so any upstream change
+    changes every downstream fingerprint
+
+``PlanMemo`` keeps, per tenant and unit, the fingerprint of the last plan
+that showed no changes and no drift. ``run plan --memo`` skips a unit whose
+current fingerprint has a clean plan younger than the TTL, and records the
+per-unit plans it produces.
+
+What fingerprints cannot see:
+
+  * changes made outside terraform. ``run plan --memo --drift-check`` runs
+    a refresh-only plan of every unit and forgets the units that drifted;
+    the TTL bounds how long any result is trusted.
+  * upstream outputs changed by an apply. ``run apply --memo`` forgets
+    every unit of the tenants it applied.
+  * a moving ``terraform_ref`` (a branch rather than a version tag or a
+    commit SHA). Such units always plan unless the ref is pinned to a
+    commit with ``--ref REF=SHA``.
+"""
+
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from stacktools import configs, dag, plansummary, statelocks, terragrunt
+from stacktools.cache import default_cache_dir
+
+DB_ENV = "STACK_SELECTOR_PLAN_MEMO_DB"
+SCHEMA_VERSION = 1
+DEFAULT_TTL = 24 * 3600.0
+DEFAULT_MAX_AGE = 7 * 24 * 3600.0
+
+# Exclusion flag passed to terragrunt for each skipped unit, with the
+# directory the unit is generated into under .terragrunt-stack
+EXCLUDE_FLAG = "--queue-exclude-dir"
+# Extra arguments of a drift check run
+REFRESH_ONLY_ARGS = ("-refresh-only",)
+
+# The include every unit reads terraform_ref from, and the environment
+# variable it falls back to when a tenant sets none
+STACK_CONFIG_HCL = "includes/stack-config.hcl"
+REF_ENV = "TERRAFORM_REF"
+_DEFAULT_REF_RE = re.compile(
+    r"terraform_ref\s*=\s*try\(\s*local\.cfg\.terraform_ref\s*,\s*"
+    r'get_env\(\s*"TERRAFORM_REF"\s*,\s*"([^"]+)"\s*\)'
+)
+# Version tags and commit SHAs; anything else may move under the same name
+_IMMUTABLE_REF_RE = re.compile(r"v?\d+(\.\d+)*([-+][0-9A-Za-z.-]+)?|[0-9a-f]{40}")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS clean_plans (
+    tenant TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    fingerprint TEXT NOT NULL,
+    components TEXT NOT NULL,
+    planned_at REAL NOT NULL,
+    PRIMARY KEY (tenant, unit)
+);
+CREATE INDEX IF NOT EXISTS clean_plans_planned_at ON clean_plans(planned_at);
+"""
+
+
+def default_db_path() -> Path:
+    """Return the plan memo location (``STACK_SELECTOR_PLAN_MEMO_DB`` overrides)."""
+    if os.environ.get(DB_ENV):
+        return Path(os.environ[DB_ENV])
+    return default_cache_dir() / "plan-memo.sqlite"
+
+
+def _digest(value) -> str:
+    data = json.dumps(
+        value, sort_keys=True, separators=(",", ":"), default=str
+    ).encode()
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_immutable_ref(ref: str) -> bool:
+    return bool(_IMMUTABLE_REF_RE.fullmatch(ref))
+
+
+def tenant_key(config_path: str, repo_root: Path = configs.REPO_ROOT) -> str:
+    """A tenant's memo key: its config path, repo-relative when inside the repo."""
+    path = Path(config_path).absolute()
+    try:
+        return path.relative_to(repo_root).as_posix()
+    except ValueError:
+        return path.as_posix()
+
+
+class Fingerprinter:
+    """Computes unit fingerprints; file digests are shared across tenants."""
+
+    def __init__(
+        self,
+        units: Optional[Dict[str, terragrunt.UnitConfig]] = None,
+        ref_pins: Optional[Mapping[str, str]] = None,
+        repo_root: Path = configs.REPO_ROOT,
+    ):
+        self.repo_root = repo_root
+        self.units = units if units is not None else terragrunt.scan_units(repo_root)
+        self.ref_pins = dict(ref_pins or {})
+        self._files: Dict[str, str] = {}
+        self._closures: Dict = {}
+        self._inputs: Dict[str, List[str]] = {}
+        self._unit_files: Dict[str, Tuple[Dict[str, str], str]] = {}
+        self.default_ref = os.environ.get(REF_ENV) or self._default_ref()
+
+    def _default_ref(self) -> Optional[str]:
+        """The ref stack-config.hcl falls back to without TERRAFORM_REF."""
+        try:
+            text = terragrunt.strip_comments(
+                (self.repo_root / STACK_CONFIG_HCL).read_text()
+            )
+        except OSError:
+            return None
+        match = _DEFAULT_REF_RE.search(text)
+        return match.group(1) if match else None
+
+    def file_digest(self, rel: str) -> str:
+        digest = self._files.get(rel)
+        if digest is None:
+            try:
+                text = terragrunt.strip_comments((self.repo_root / rel).read_text())
+                # Blank lines and trailing whitespace left by comments do not count
+                lines = [line.rstrip() for line in text.splitlines() if line.strip()]
+                digest = hashlib.sha256("\n".join(lines).encode()).hexdigest()
+            except OSError:
+                digest = "missing"
+            self._files[rel] = digest
+        return digest
+
+    def unit_inputs(self, unit_path: str) -> List[str]:
+        """The unit's terragrunt.hcl and everything it includes, repo-relative."""
+        inputs = self._inputs.get(unit_path)
+        if inputs is None:
+            unit = self.units.get(unit_path)
+            if unit is None:
+                inputs = [f"{unit_path}/{terragrunt.UNIT_FILE}"]
+            else:
+                closure = terragrunt.include_closure(
+                    [unit.rel_path], self.repo_root, self._closures
+                )
+                inputs = [unit.rel_path] + sorted(closure)
+            self._inputs[unit_path] = inputs
+        return inputs
+
+    def unit_files(self, unit_path: str) -> Tuple[Dict[str, str], str]:
+        """{file: digest} over the unit's inputs, and a digest of that mapping."""
+        cached = self._unit_files.get(unit_path)
+        if cached is None:
+            files = {rel: self.file_digest(rel) for rel in self.unit_inputs(unit_path)}
+            cached = self._unit_files[unit_path] = (files, _digest(files))
+        return cached
+
+    def upstreams(
+        self, unit_path: str, stack_unit: Optional[dag.Unit] = None
+    ) -> List[str]:
+        unit = self.units.get(unit_path)
+        paths = set(stack_unit.dependencies if stack_unit else ())
+        if unit is not None:
+            paths.update(unit.dependency_blocks.values())
+            paths.update(unit.dependencies)
+        paths.discard(unit_path)
+        return sorted(paths)
+
+    def fingerprints(
+        self,
+        config: Mapping,
+        stack: dag.StackSpec,
+        env: Optional[Mapping[str, str]] = None,
+    ) -> Dict[str, Dict]:
+        """Fingerprint every unit a tenant runs in ``stack``.
+
+        Returns {unit path: {fingerprint, components, memoizable, reason}}.
+        A unit on a moving, unpinned terraform_ref is not memoizable.
+        """
+        tenant_digest = _digest(config)
+        ref = str(config.get("terraform_ref") or self.default_ref or "")
+        pinned = self.ref_pins.get(ref)
+        moving = bool(ref) and not pinned and not is_immutable_ref(ref)
+        stack_units = {u.path: u for u in statelocks.stack_units(stack, env)}
+        results: Dict[str, Dict] = {}
+
+        def visit(unit_path: str, active: tuple) -> str:
+            if unit_path in results:
+                return results[unit_path]["fingerprint"]
+            if unit_path in active:
+                # A dependency cycle: terragrunt rejects it, the fingerprint just stops
+                return "cycle"
+            upstream = {
+                path: visit(path, active + (unit_path,))
+                for path in self.upstreams(unit_path, stack_units.get(unit_path))
+            }
+            files, files_digest = self.unit_files(unit_path)
+            components = {
+                "tenant": tenant_digest,
+                "files": files,
+                "terraform_ref": f"{ref}@{pinned}" if pinned else ref,
+                "upstream": upstream,
+            }
+            results[unit_path] = {
+                # The file digests are hashed once per unit, not once per tenant
+                "fingerprint": _digest(dict(components, files=files_digest)),
+                "components": components,
+                "memoizable": not moving,
+                "reason": (
+                    f"moving terraform_ref {ref} (pin it with --ref)"
+                    if moving
+                    else None
+                ),
+            }
+            return results[unit_path]["fingerprint"]
+
+        for unit_path in stack_units:
+            visit(unit_path, ())
+        return {path: results[path] for path in stack_units}
+
+
+def changed_inputs(old: Mapping, new: Mapping) -> List[str]:
+    """Human-readable list of the components that differ between two fingerprints."""
+    changes = []
+    if old.get("tenant") != new.get("tenant"):
+        changes.append("tenant config")
+    if old.get("terraform_ref") != new.get("terraform_ref"):
+        changes.append(
+            f"terraform_ref {old.get('terraform_ref')} -> {new.get('terraform_ref')}"
+        )
+    old_files, new_files = old.get("files", {}), new.get("files", {})
+    for rel in sorted(set(old_files) | set(new_files)):
+        if old_files.get(rel) != new_files.get(rel):
+            changes.append(rel)
+    old_up, new_up = old.get("upstream", {}), new.get("upstream", {})
+    for path in sorted(set(old_up) | set(new_up)):
+        if old_up.get(path) != new_up.get(path):
+            changes.append(f"upstream {path}")
+    return changes
+
+
+def _age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{seconds / 60:.0f}m"
+    if seconds < 2 * 86400:
+        return f"{seconds / 3600:.1f}h"
+    return f"{seconds / 86400:.1f}d"
+
+
+def _decision(unit: str, current: Mapping) -> Dict:
+    return {"unit": unit, "fingerprint": current["fingerprint"], "skip": False}
+
+
+class PlanMemo:
+    """SQLite store of the last clean plan per tenant and unit."""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or default_db_path())
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS clean_plans")
+                self.conn.executescript(_SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def decide(
+        self,
+        tenant: str,
+        fingerprints: Mapping[str, Dict],
+        ttl: float = DEFAULT_TTL,
+        now: Optional[float] = None,
+    ) -> List[Dict]:
+        """Skip or plan each unit, with the reason, in stack order."""
+        now = time.time() if now is None else now
+        rows = {
+            row["unit"]: row
+            for row in self.conn.execute(
+                "SELECT * FROM clean_plans WHERE tenant = ?", (tenant,)
+            )
+        }
+        decisions = []
+        for unit, current in fingerprints.items():
+            row = rows.get(unit)
+            decision = _decision(unit, current)
+            if not current["memoizable"]:
+                decision.update(code="moving_ref", reason=current["reason"])
+            elif row is None:
+                decision.update(code="new", reason="no clean plan recorded")
+            elif row["fingerprint"] != current["fingerprint"]:
+                changed = changed_inputs(
+                    json.loads(row["components"]), current["components"]
+                )
+                decision.update(
+                    code="changed", reason="inputs changed: " + ", ".join(changed)
+                )
+            elif now - row["planned_at"] > ttl:
+                age = _age(now - row["planned_at"])
+                decision.update(
+                    code="expired", reason=f"clean plan expired ({age} old)"
+                )
+            else:
+                age = _age(now - row["planned_at"])
+                decision.update(
+                    code="memoized",
+                    skip=True,
+                    reason=f"clean plan {age} ago, same inputs",
+                )
+            decisions.append(decision)
+        return decisions
+
+    def record_clean(
+        self, tenant: str, unit: str, fingerprint: Dict, now: Optional[float] = None
+    ):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO clean_plans (tenant, unit, fingerprint, components,"
+                " planned_at) VALUES (?, ?, ?, ?, ?)",
+                (
+                    tenant,
+                    unit,
+                    fingerprint["fingerprint"],
+                    json.dumps(fingerprint["components"], sort_keys=True),
+                    time.time() if now is None else now,
+                ),
+            )
+
+    def forget(self, tenant: str, units: Optional[Iterable[str]] = None) -> int:
+        """Drop a tenant's clean plans (all units, or the given ones)."""
+        with self.conn:
+            if units is None:
+                return self.conn.execute(
+                    "DELETE FROM clean_plans WHERE tenant = ?", (tenant,)
+                ).rowcount
+            return self.conn.executemany(
+                "DELETE FROM clean_plans WHERE tenant = ? AND unit = ?",
+                [(tenant, unit) for unit in units],
+            ).rowcount
+
+    def evict(
+        self, max_age: float = DEFAULT_MAX_AGE, now: Optional[float] = None
+    ) -> Dict:
+        """Drop clean plans older than ``max_age`` seconds and compact the database."""
+        cutoff = (time.time() if now is None else now) - max_age
+        with self.conn:
+            evicted = self.conn.execute(
+                "DELETE FROM clean_plans WHERE planned_at < ?", (cutoff,)
+            ).rowcount
+        self.conn.execute("VACUUM")
+        return {"evicted": evicted, **self.stats()}
+
+    def stats(self) -> Dict:
+        row = self.conn.execute(
+            "SELECT COUNT(*) AS plans, COUNT(DISTINCT tenant) AS tenants,"
+            " MIN(planned_at) AS oldest FROM clean_plans"
+        ).fetchone()
+        return {
+            "db_path": str(self.db_path),
+            "clean_plans": row["plans"],
+            "tenants": row["tenants"],
+            "oldest_age": (
+                round(time.time() - row["oldest"], 1) if row["oldest"] else None
+            ),
+        }
+
+
+def match_unit(plan_unit: str, units: Iterable[str]) -> Optional[str]:
+    """The stack unit a plan file's directory belongs to.
+
+    Plan directories mirror the unit layout under ``--json-out-dir``, but
+    terragrunt may root them differently (``.terragrunt-stack/cluster``,
+    ``units/hosting/cluster``), so the unit whose trailing path components
+    match the most wins; a tie is ambiguous and returns None.
+    """
+    parts = plan_unit.strip("/").split("/")
+    best, best_len, tie = None, 0, False
+    for unit in units:
+        unit_parts = unit.strip("/").split("/")
+        n = 0
+        while (
+            n < min(len(parts), len(unit_parts)) and parts[-1 - n] == unit_parts[-1 - n]
+        ):
+            n += 1
+        if n > best_len:
+            best, best_len, tie = unit, n, False
+        elif n and n == best_len:
+            tie = True
+    return None if tie else best
+
+
+def record_plans(
+    memo: PlanMemo,
+    tenant: str,
+    fingerprints: Mapping[str, Dict],
+    plan_dir: Path,
+    refresh_only: bool = False,
+) -> Dict:
+    """Store a tenant's per-unit plan results from ``--json-out-dir`` output.
+
+    A full plan with no changes and no drift is recorded as clean; any other
+    plan forgets the unit. A refresh-only plan never records, and forgets
+    the units that drifted.
+    """
+    report = {"clean": [], "changed": [], "unmatched": []}
+    if not plan_dir.is_dir():
+        return report
+    for plan_unit, path in plansummary.iter_plan_files([str(plan_dir)]):
+        unit = match_unit(plan_unit, fingerprints)
+        if unit is None:
+            report["unmatched"].append(plan_unit)
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            summary = plansummary.summarize_stream(f, unit, max_addresses=0)
+        if summary.error is None and summary.changes == 0 and summary.drift == 0:
+            if not refresh_only and fingerprints[unit]["memoizable"]:
+                memo.record_clean(tenant, unit, fingerprints[unit])
+            report["clean"].append(unit)
+        else:
+            memo.forget(tenant, [unit])
+            report["changed"].append(unit)
+    return report
+
+
+def memoize_jobs(
+    memo: PlanMemo,
+    jobs: List,
+    fingerprinter: Fingerprinter,
+    plan_root: Path,
+    env: Optional[Mapping[str, str]] = None,
+    ttl: float = DEFAULT_TTL,
+    drift_check: bool = False,
+    repo_root: Path = configs.REPO_ROOT,
+) -> Dict:
+    """Decide which units of each fleet plan job to skip, and set up the rest.
+
+    Returns {"run": jobs to start, "memoized": tenants with every unit
+    skipped, "tenants": per-tenant decisions and fingerprints}. Jobs that
+    run get one ``EXCLUDE_FLAG`` per skipped unit, naming the directory
+    ``terragrunt stack`` generates it into, and a fresh
+    ``--json-out-dir`` under ``plan_root`` for ``record_results``. A drift
+    check skips nothing and runs refresh-only plans.
+    """
+    stacks: Dict[str, dag.StackSpec] = {}
+    generated: Dict[str, Dict[str, str]] = {}
+    run, memoized, tenants = [], [], {}
+    for job in jobs:
+        if job.stack_file not in stacks:
+            stacks[job.stack_file] = dag.load_stack(repo_root / job.stack_file)
+            generated[job.stack_file] = terragrunt.generated_unit_dirs(
+                job.stack_file, repo_root
+            )
+        config = (
+            job.config
+            if job.config is not None
+            else configs.load_config(job.config_path)
+        )
+        fingerprints = fingerprinter.fingerprints(config, stacks[job.stack_file], env)
+        key = tenant_key(job.config_path, repo_root)
+        if drift_check:
+            decisions = [
+                dict(
+                    _decision(unit, current),
+                    code="drift_check",
+                    reason="refresh-only drift check",
+                )
+                for unit, current in fingerprints.items()
+            ]
+        else:
+            decisions = memo.decide(key, fingerprints, ttl)
+        plan_dir = plan_root / Path(job.log_file.name if job.log_file else key).stem
+        tenants[job.tenant] = {
+            "key": key,
+            "plan_dir": plan_dir,
+            "fingerprints": fingerprints,
+            "decisions": decisions,
+        }
+        skipped = [d["unit"] for d in decisions if d["skip"]]
+        if decisions and len(skipped) == len(decisions):
+            memoized.append(job.tenant)
+            continue
+        shutil.rmtree(plan_dir, ignore_errors=True)
+        for unit in skipped:
+            job.args.extend(
+                [
+                    EXCLUDE_FLAG,
+                    terragrunt.generated_unit_dir(unit, generated[job.stack_file]),
+                ]
+            )
+        job.args.extend(["--json-out-dir", str(plan_dir)])
+        if drift_check:
+            job.args.extend(REFRESH_ONLY_ARGS)
+        run.append(job)
+    return {"run": run, "memoized": memoized, "tenants": tenants}
+
+
+def record_results(
+    memo: PlanMemo,
+    command: str,
+    results: Iterable[Dict],
+    prepared: Mapping,
+    drift_check: bool = False,
+) -> Dict:
+    """Update the memo after a fleet run and build the skip report.
+
+    ``prepared`` is what ``memoize_jobs`` returned for the run. Successful
+    plans record their clean units. An apply forgets every unit of the
+    tenants it ran, whatever its outcome, since it may have changed outputs
+    downstream units read.
+    """
+    units = []
+    recorded = forgotten = 0
+    for result in results:
+        if command == "apply":
+            forgotten += memo.forget(tenant_key(result["config_path"]))
+            continue
+        tenant = prepared["tenants"].get(result["tenant"])
+        if tenant is None or result["status"] != "succeeded":
+            continue
+        outcome = record_plans(
+            memo, tenant["key"], tenant["fingerprints"], tenant["plan_dir"], drift_check
+        )
+        tenant["plans"] = outcome
+        if not drift_check:
+            recorded += len(outcome["clean"])
+        forgotten += len(outcome["changed"])
+
+    codes: Dict[str, int] = {}
+    for name, tenant in prepared["tenants"].items():
+        for decision in tenant["decisions"]:
+            codes[decision["code"]] = codes.get(decision["code"], 0) + 1
+            units.append(
+                {
+                    "tenant": name,
+                    "unit": decision["unit"],
+                    "skipped": decision["skip"],
+                    "code": decision["code"],
+                    "reason": decision["reason"],
+                }
+            )
+    return {
+        "units": len(units),
+        "skipped": sum(1 for u in units if u["skipped"]),
+        "tenants_skipped": list(prepared["memoized"]),
+        "reasons": dict(sorted(codes.items())),
+        "recorded_clean": recorded,
+        "forgotten": forgotten,
+        "decisions": units,
+    }
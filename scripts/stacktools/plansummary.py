@@ -0,0 +1,449 @@
+"""
+Streaming summaries of ``terraform show -json`` plan output.
+
+Plans for full-stack tenants (helm values for addons and argocd_apps are
+embedded in ``before``/``after``) reach hundreds of megabytes, so the plan is
+never loaded whole. A small pull tokenizer walks the document in fixed-size
+chunks: ``resource_changes`` and ``resource_drift`` entries are read one at a
+time, only their address, type and actions are kept, and everything else is
+skipped without being decoded. Skipped strings are scanned once and not
+kept, however many chunks they span, so memory is bounded by the chunk size
+plus the largest string that is read (an address or action).
+
+Per-unit plans come from ``terragrunt run --all plan --json-out-dir DIR``,
+which writes one JSON file per unit under DIR.
+"""
+
+import json
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, IO, Iterable, Iterator, List, Optional, Tuple
+
+CHUNK_SIZE = 1 << 20
+DEFAULT_MAX_ADDRESSES = 20
+
+# Actions that change infrastructure, in report column order
+CHANGE_ACTIONS = ("create", "update", "replace", "delete")
+
+_STRING_TAIL = r'[^"\\]*(?:\\.[^"\\]*)*(?P<close>")?'
+_STRING = r'(?P<string>"' + _STRING_TAIL + r")"
+_TOKEN_RE = re.compile(
+    r"\s*(?:" + _STRING + r'|(?P<punct>[{}\[\]:,])|(?P<bare>[^\s{}\[\]:,"]+))'
+)
+_SKIP_RE = re.compile(_STRING + r"|(?P<bracket>[{}\[\]])")
+_STRING_TAIL_RE = re.compile(_STRING_TAIL)
+_SPACE_RE = re.compile(r"\s*")
+
+
+class PlanParseError(ValueError):
+    """The plan is not valid JSON or not a ``terraform show -json`` document."""
+
+
+class _Tokenizer:
+    """Pull tokenizer over a text stream, holding at most a chunk or two."""
+
+    def __init__(self, stream: IO[str], chunk_size: int = CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.consumed = 0
+
+    def _fill(self) -> bool:
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.consumed += self.pos
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        if not chunk:
+            self.eof = True
+        return bool(chunk)
+
+    def next(self) -> str:
+        """Return the next raw token: punctuation, a quoted string or a bare literal."""
+        while True:
+            m = _TOKEN_RE.match(self.buf, self.pos)
+            if m:
+                if m.group("string") is not None:
+                    if m.group("close") is None:
+                        return self._scan_string(m.start("string"), keep=True)
+                    self.pos = m.end()
+                    return m.group("string")
+                if m.end() < len(self.buf) or self.eof:
+                    self.pos = m.end()
+                    return m.group(0).lstrip()
+            elif self.eof:
+                if self.buf[self.pos :].strip():
+                    raise PlanParseError(
+                        f"invalid JSON near offset {self.consumed + self.pos}"
+                    )
+                raise PlanParseError("unexpected end of plan JSON")
+            self._fill()
+
+    def _scan_string(self, start: int, keep: bool = False) -> Optional[str]:
+        """Read on from the opening quote at ``start`` to the closing quote.
+
+        A string longer than the buffer is scanned once: the scanned part is
+        dropped at each refill (and, with ``keep``, collected for the caller)
+        rather than rescanned from the opening quote.
+        """
+        pieces = ['"'] if keep else None
+        self.pos = start + 1
+        while True:
+            m = _STRING_TAIL_RE.match(self.buf, self.pos)
+            if pieces is not None:
+                pieces.append(m.group(0))
+            self.pos = m.end()
+            if m.group("close") is not None:
+                return "".join(pieces) if pieces is not None else None
+            # Cut by the chunk boundary, possibly between a backslash and the
+            # character it escapes, which is left in the buffer
+            if not self._fill():
+                raise PlanParseError("unterminated string in plan JSON")
+
+    def expect(self, token: str):
+        got = self.next()
+        if got != token:
+            raise PlanParseError(
+                f"expected '{token}' but found '{got[:40]}' near offset {self.consumed + self.pos}"
+            )
+
+    def skip_container(self):
+        """Skip to the end of the object/array whose opening bracket was just read."""
+        depth = 1
+        while True:
+            m = _SKIP_RE.search(self.buf, self.pos)
+            if m is None:
+                self.pos = len(self.buf)
+                if not self._fill():
+                    raise PlanParseError("unexpected end of plan JSON")
+                continue
+            if m.group("string") is not None:
+                if m.group("close") is None:
+                    self._scan_string(m.start("string"))
+                else:
+                    self.pos = m.end()
+                continue
+            self.pos = m.end()
+            if m.group("bracket") in ("{", "["):
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return
+
+    def skip_value(self, first: Optional[str] = None):
+        if first is None:
+            # Skip a string value without building it
+            while True:
+                self.pos = _SPACE_RE.match(self.buf, self.pos).end()
+                if self.pos < len(self.buf) or not self._fill():
+                    break
+            if self.buf.startswith('"', self.pos):
+                self._scan_string(self.pos)
+                return
+        token = first if first is not None else self.next()
+        if token in ("{", "["):
+            self.skip_container()
+
+    def read_value(self, first: Optional[str] = None):
+        """Decode a (small) value fully."""
+        token = first if first is not None else self.next()
+        if token == "{":
+            result = {}
+            for key in self.iter_object(opened=True):
+                result[key] = self.read_value()
+            return result
+        if token == "[":
+            return list(self.iter_array(opened=True, decode=True))
+        try:
+            return json.loads(token)
+        except ValueError:
+            raise PlanParseError(f"invalid JSON value '{token[:40]}'")
+
+    def iter_object(self, opened: bool = False) -> Iterator[str]:
+        """Yield keys of an object; the caller must consume each key's value."""
+        if not opened:
+            self.expect("{")
+        token = self.next()
+        if token == "}":
+            return
+        while True:
+            if not token.startswith('"'):
+                raise PlanParseError(f"expected object key, found '{token[:40]}'")
+            self.expect(":")
+            yield json.loads(token)
+            token = self.next()
+            if token == "}":
+                return
+            if token != ",":
+                raise PlanParseError(f"expected ',' or '}}', found '{token[:40]}'")
+            token = self.next()
+
+    def iter_array(self, opened: bool = False, decode: bool = False) -> Iterator:
+        """Yield each element's first token (or its decoded value with decode=True)."""
+        if not opened:
+            self.expect("[")
+        token = self.next()
+        if token == "]":
+            return
+        while True:
+            yield self.read_value(token) if decode else token
+            token = self.next()
+            if token == "]":
+                return
+            if token != ",":
+                raise PlanParseError(f"expected ',' or ']', found '{token[:40]}'")
+            token = self.next()
+
+
+def normalize_actions(actions: List[str]) -> str:
+    """Collapse terraform's action lists into a single label."""
+    if len(actions) == 2 and set(actions) == {"create", "delete"}:
+        return "replace"
+    if len(actions) == 1:
+        return actions[0]
+    return "-".join(actions) or "no-op"
+
+
+def _read_change(tok: _Tokenizer, first: str) -> Dict:
+    """Read one resource_changes/resource_drift entry, keeping only small fields."""
+    if first != "{":
+        tok.skip_value(first)
+        return {}
+    entry: Dict = {}
+    for key in tok.iter_object(opened=True):
+        if key in ("address", "type", "mode", "provider_name", "action_reason"):
+            entry[key] = tok.read_value()
+        elif key == "change":
+            token = tok.next()
+            if token != "{":
+                tok.skip_value(token)
+                continue
+            for change_key in tok.iter_object(opened=True):
+                if change_key == "actions":
+                    entry["actions"] = tok.read_value()
+                else:
+                    tok.skip_value()
+        else:
+            tok.skip_value()
+    return entry
+
+
+def iter_plan_changes(
+    stream: IO[str], chunk_size: int = CHUNK_SIZE
+) -> Iterator[Tuple[str, Dict]]:
+    """Yield ("change"|"drift", entry) for every resource change in a plan stream."""
+    tok = _Tokenizer(stream, chunk_size)
+    sections = {"resource_changes": "change", "resource_drift": "drift"}
+    for key in tok.iter_object():
+        kind = sections.get(key)
+        token = tok.next()
+        if kind is None or token != "[":
+            tok.skip_value(token)
+            continue
+        for first in tok.iter_array(opened=True):
+            entry = _read_change(tok, first)
+            if entry:
+                yield kind, entry
+
+
+class UnitSummary:
+    """Counters for one unit; addresses are capped so memory stays bounded."""
+
+    def __init__(self, unit: str, max_addresses: int = DEFAULT_MAX_ADDRESSES):
+        self.unit = unit
+        self.max_addresses = max_addresses
+        self.actions: Dict[str, int] = {}
+        self.by_type: Dict[str, Dict[str, int]] = {}
+        self.drift = 0
+        self.drift_by_type: Dict[str, int] = {}
+        self.addresses: List[Dict[str, str]] = []
+        self.omitted_addresses = 0
+        self.error: Optional[str] = None
+
+    def add(self, kind: str, entry: Dict):
+        action = normalize_actions(entry.get("actions") or [])
+        resource_type = entry.get("type") or "unknown"
+        if kind == "drift":
+            if action == "no-op":
+                return
+            self.drift += 1
+            self.drift_by_type[resource_type] = (
+                self.drift_by_type.get(resource_type, 0) + 1
+            )
+            return
+
+        self.actions[action] = self.actions.get(action, 0) + 1
+        if action in ("no-op", "read"):
+            return
+        counts = self.by_type.setdefault(resource_type, {})
+        counts[action] = counts.get(action, 0) + 1
+        if len(self.addresses) < self.max_addresses:
+            self.addresses.append(
+                {"address": entry.get("address", "?"), "action": action}
+            )
+        else:
+            self.omitted_addresses += 1
+
+    @property
+    def changes(self) -> int:
+        return sum(self.actions.get(a, 0) for a in CHANGE_ACTIONS)
+
+    def to_dict(self) -> Dict:
+        return {
+            "unit": self.unit,
+            "changes": self.changes,
+            "actions": self.actions,
+            "by_type": self.by_type,
+            "drift": self.drift,
+            "drift_by_type": self.drift_by_type,
+            "addresses": self.addresses,
+            "omitted_addresses": self.omitted_addresses,
+            "error": self.error,
+        }
+
+
+def summarize_stream(
+    stream: IO[str],
+    unit: str,
+    max_addresses: int = DEFAULT_MAX_ADDRESSES,
+    chunk_size: int = CHUNK_SIZE,
+) -> UnitSummary:
+    """Summarize one plan stream. Parse errors are recorded, not raised."""
+    summary = UnitSummary(unit, max_addresses)
+    try:
+        for kind, entry in iter_plan_changes(stream, chunk_size):
+            summary.add(kind, entry)
+    except PlanParseError as e:
+        summary.error = str(e)
+    return summary
+
+
+def iter_plan_files(
+    sources: Iterable[str], pattern: str = "*.json"
+) -> Iterator[Tuple[str, str]]:
+    """Yield (unit, path) pairs from plan files and --json-out-dir trees.
+
+    For directories, the unit is the plan file's directory relative to the
+    source; for files it is the file's directory as given. ``-`` is stdin.
+    """
+    for source in sources:
+        if source == "-":
+            yield "stdin", "-"
+        elif os.path.isdir(source):
+            root = Path(source)
+            for path in sorted(root.rglob(pattern)):
+                if ".terragrunt-cache" in path.parts or not path.is_file():
+                    continue
+                unit = path.parent.relative_to(root).as_posix()
+                yield (unit if unit != "." else root.name), str(path)
+        else:
+            yield str(Path(source).parent), source
+
+
+def summarize_plans(
+    sources: Iterable[str],
+    pattern: str = "*.json",
+    max_addresses: int = DEFAULT_MAX_ADDRESSES,
+    chunk_size: int = CHUNK_SIZE,
+) -> Dict:
+    """Summarize every plan under ``sources`` into one drift report."""
+    units = []
+    totals: Dict[str, int] = {}
+    by_type: Dict[str, Dict[str, int]] = {}
+    drift = 0
+    for unit, path in iter_plan_files(sources, pattern):
+        try:
+            if path == "-":
+                summary = summarize_stream(sys.stdin, unit, max_addresses, chunk_size)
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    summary = summarize_stream(f, unit, max_addresses, chunk_size)
+        except (OSError, UnicodeDecodeError) as e:
+            summary = UnitSummary(unit, max_addresses)
+            summary.error = str(e)
+
+        for action, count in summary.actions.items():
+            totals[action] = totals.get(action, 0) + count
+        for resource_type, counts in summary.by_type.items():
+            merged = by_type.setdefault(resource_type, {})
+            for action, count in counts.items():
+                merged[action] = merged.get(action, 0) + count
+        drift += summary.drift
+        units.append(summary.to_dict())
+
+    changes = sum(totals.get(a, 0) for a in CHANGE_ACTIONS)
+    return {
+        "units": units,
+        "totals": totals,
+        "by_type": {t: by_type[t] for t in sorted(by_type)},
+        "changes": changes,
+        "drift": drift,
+        "has_changes": changes > 0,
+        "errors": [
+            {"unit": u["unit"], "error": u["error"]} for u in units if u["error"]
+        ],
+    }
+
+
+def _action_counts(counts: Dict[str, int]) -> str:
+    return ", ".join(f"{counts[a]} {a}" for a in CHANGE_ACTIONS if counts.get(a))
+
+
+def render_markdown(report: Dict, title: str = "Plan Summary") -> str:
+    """Render a drift report as GitHub-flavoured markdown for $GITHUB_STEP_SUMMARY."""
+    lines = [f"### {title}", ""]
+    if report["errors"]:
+        lines.append(f"❌ {len(report['errors'])} plan(s) could not be read")
+    if report["has_changes"]:
+        lines.append(
+            f"⚠️ **{report['changes']}** resource changes "
+            f"({_action_counts(report['totals'])}) across "
+            f"{sum(1 for u in report['units'] if u['changes'])} unit(s)"
+        )
+    else:
+        lines.append("✅ No resource changes")
+    if report["drift"]:
+        lines.append(f"🔀 {report['drift']} resource(s) changed outside of Terraform")
+    lines.append("")
+
+    lines += [
+        "| Unit | Create | Update | Replace | Delete | Drift |",
+        "|---|---:|---:|---:|---:|---:|",
+    ]
+    for unit in report["units"]:
+        if unit["error"]:
+            lines.append(f"| `{unit['unit']}` | ❌ {unit['error']} | | | | |")
+            continue
+        counts = [str(unit["actions"].get(a, 0) or "") for a in CHANGE_ACTIONS]
+        lines.append(
+            f"| `{unit['unit']}` | "
+            + " | ".join(counts)
+            + f" | {unit['drift'] or ''} |"
+        )
+
+    if report["by_type"]:
+        lines += ["", "<details><summary>Changes by resource type</summary>", ""]
+        lines += ["| Resource type | Changes |", "|---|---|"]
+        for resource_type, counts in report["by_type"].items():
+            lines.append(f"| `{resource_type}` | {_action_counts(counts)} |")
+        lines += ["", "</details>"]
+
+    changed = [u for u in report["units"] if u["addresses"]]
+    if changed:
+        lines += ["", "<details><summary>Changed resources</summary>", ""]
+        for unit in changed:
+            lines.append(f"**{unit['unit']}**")
+            lines.append("")
+            for item in unit["addresses"]:
+                lines.append(f"- `{item['action']}` {item['address']}")
+            if unit["omitted_addresses"]:
+                lines.append(f"- … and {unit['omitted_addresses']} more")
+            lines.append("")
+        lines.append("</details>")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,353 @@
+"""
+Compiled deployment-type registry.
+
+The deployment-type YAML configs are the source of truth. Bash and
+terragrunt used to carry their own copies of the same facts (a ``case``
+statement that ran ``yq`` on every call, and a hand-written HCL map). This
+module compiles the configs into one registry and renders it three ways:
+
+  * ``stacks/deployment-types/registry.json``: the lookup table itself
+  * ``includes/deployment-types.hcl``: the same table as HCL locals
+  * ``scripts/deployment-types.sh``: a sourceable ``deployment_type_lookup``
+    function, a ``case`` over literal values
+
+All three are generated and committed. ``check`` renders them again from
+the YAML and reports any file that differs, so CI fails as soon as one of
+them diverges from the configs or from the others.
+"""
+
+import json
+import os
+import re
+import shlex
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from stacktools import configs, dag
+
+REGISTRY_VERSION = 1
+
+ARTIFACTS = {
+    "json": "stacks/deployment-types/registry.json",
+    "hcl": "includes/deployment-types.hcl",
+    "shell": "scripts/deployment-types.sh",
+}
+
+# Keys every registry entry has, whatever its YAML sets
+ENTRY_DEFAULTS = {
+    "description": "",
+    "stack_file": None,
+    "enabled": True,
+    "components": [],
+    "features": [],
+    "disabled_features": [],
+    "cluster_config": {},
+}
+
+_HCL_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_-]*$")
+_NEXT_SUFFIX = re.compile(r"-next$")
+_INDENT = "  "
+
+
+class RegistryError(Exception):
+    """Raised when the deployment-type configs cannot be compiled."""
+
+
+def _entry(config: Dict[str, Any]) -> Dict[str, Any]:
+    entry = dict(ENTRY_DEFAULTS)
+    entry.update(config)
+    entry["feature_flags"] = dict(
+        sorted(
+            [(str(feature), False) for feature in entry["disabled_features"] or []]
+            + [(str(feature), True) for feature in entry["features"] or []]
+        )
+    )
+    return dict(sorted(entry.items()))
+
+
+def _component_key(name: str) -> str:
+    """HCL key for a layer or unit directory, e.g. pod-identities-next -> pod_identities."""
+    return _NEXT_SUFFIX.sub("", name).replace("-", "_")
+
+
+def _stack_components(repo_root: Path, stack_file: Optional[str]) -> Dict[str, set]:
+    """Units of a stack file by layer, as component keys."""
+    layers: Dict[str, set] = {}
+    if not stack_file or not (repo_root / stack_file).is_file():
+        return layers
+    for unit in dag.load_stack(repo_root / stack_file).units:
+        parts = unit.path.strip("/").split("/")
+        if len(parts) >= 3 and parts[0] == "units":
+            layers.setdefault(_component_key(parts[1]), set()).add(
+                _component_key(parts[-1])
+            )
+    return layers
+
+
+def compile_registry(
+    config_dir: Path = configs.CONFIG_DIR, repo_root: Path = configs.REPO_ROOT
+) -> Dict[str, Any]:
+    """Compile every deployment-type config, enabled or not, into a registry.
+
+    Entries keep all their YAML keys, with the keys in ``ENTRY_DEFAULTS``
+    filled in and two maps precomputed: ``feature_flags`` (enabled
+    features true, all others false) and ``component_units`` (layer to unit
+    to whether the type's stack file deploys it). Both maps have every
+    feature, layer and unit any type uses, so lookups such as
+    ``components.hosting.karpenter`` work for all types.
+    Problems that do not stop compilation, such as a missing stack file,
+    are listed under ``errors``.
+    """
+    if not config_dir.exists():
+        raise RegistryError(f"Config directory not found: {config_dir}")
+    types: Dict[str, Dict[str, Any]] = {}
+    files: Dict[str, str] = {}
+    for config_file in sorted(configs.config_files(config_dir)):
+        try:
+            config = configs.parse_deployment_config(config_file)
+        except Exception as e:
+            raise RegistryError(f"Invalid deployment config {config_file.name}: {e}")
+        if config is None:
+            continue
+        name = str(config["name"])
+        if name in types:
+            raise RegistryError(
+                f"Deployment type {name} is defined by both {files[name]} and {config_file.name}"
+            )
+        files[name] = config_file.name
+        types[name] = _entry(config)
+
+    stacks = {
+        name: _stack_components(repo_root, entry["stack_file"])
+        for name, entry in types.items()
+    }
+    catalogue: Dict[str, set] = {}
+    for layers in stacks.values():
+        for layer, units in layers.items():
+            catalogue.setdefault(layer, set()).update(units)
+    features = {
+        feature for entry in types.values() for feature in entry["feature_flags"]
+    }
+    for name, entry in types.items():
+        entry["feature_flags"] = {
+            feature: entry["feature_flags"].get(feature, False)
+            for feature in sorted(features)
+        }
+        deployed = stacks[name]
+        entry["component_units"] = {
+            layer: {unit: unit in deployed.get(layer, ()) for unit in sorted(units)}
+            for layer, units in sorted(catalogue.items())
+        }
+        types[name] = dict(sorted(entry.items()))
+
+    errors: List[str] = []
+    for name, entry in sorted(types.items()):
+        both = set(entry["features"] or []) & set(entry["disabled_features"] or [])
+        if both:
+            errors.append(
+                f"{name}: features both enabled and disabled: {', '.join(sorted(both))}"
+            )
+        if not entry["enabled"]:
+            continue
+        if not entry["stack_file"]:
+            errors.append(f"{name}: enabled without a stack_file")
+        elif not (repo_root / entry["stack_file"]).is_file():
+            errors.append(f"{name}: stack file {entry['stack_file']} does not exist")
+    default = types.get(configs.DEFAULT_DEPLOYMENT_TYPE)
+    if default is None or not default["enabled"]:
+        errors.append(
+            f"default deployment type {configs.DEFAULT_DEPLOYMENT_TYPE} is not enabled"
+        )
+
+    return {
+        "version": REGISTRY_VERSION,
+        "default": configs.DEFAULT_DEPLOYMENT_TYPE,
+        "enabled": sorted(name for name, entry in types.items() if entry["enabled"]),
+        "types": dict(sorted(types.items())),
+        "errors": errors,
+    }
+
+
+def render_json(registry: Dict[str, Any]) -> str:
+    document = {key: value for key, value in registry.items() if key != "errors"}
+    return json.dumps(document, indent=2) + "\n"
+
+
+def _hcl_key(key: Any) -> str:
+    key = str(key)
+    return key if _HCL_IDENTIFIER.match(key) else json.dumps(key)
+
+
+def _hcl_scalar(value: Any) -> str:
+    if value is None:
+        return "null"
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = json.dumps(str(value), ensure_ascii=False)
+    # Literal ${ and %{ would start an interpolation or a template directive
+    return text.replace("${", "$${").replace("%{", "%%{")
+
+
+def _hcl_value(value: Any, depth: int) -> List[str]:
+    """Render a value as HCL lines; continuation lines are already indented."""
+    pad = _INDENT * depth
+    if isinstance(value, dict):
+        if not value:
+            return ["{}"]
+        return ["{"] + _hcl_attributes(value, depth + 1) + [f"{pad}}}"]
+    if isinstance(value, list):
+        if all(not isinstance(item, (dict, list)) for item in value):
+            return ["[" + ", ".join(_hcl_scalar(item) for item in value) + "]"]
+        lines = ["["]
+        for item in value:
+            rendered = _hcl_value(item, depth + 1)
+            lines.append(f"{pad}{_INDENT}{rendered[0]}")
+            lines.extend(rendered[1:])
+            lines[-1] += ","
+        return lines + [f"{pad}]"]
+    return [_hcl_scalar(value)]
+
+
+def _hcl_attributes(mapping: Dict[str, Any], depth: int) -> List[str]:
+    """Render ``key = value`` lines, aligning runs of one-line attributes as hclfmt does."""
+    pad = _INDENT * depth
+    rendered = [
+        (_hcl_key(key), _hcl_value(value, depth)) for key, value in mapping.items()
+    ]
+    lines: List[str] = []
+    index = 0
+    while index < len(rendered):
+        run = index
+        while run < len(rendered) and len(rendered[run][1]) == 1:
+            run += 1
+        if run == index:
+            key, value = rendered[index]
+            lines.append(f"{pad}{key} = {value[0]}")
+            lines.extend(value[1:])
+            index += 1
+            continue
+        width = max(len(key) for key, _ in rendered[index:run])
+        for key, value in rendered[index:run]:
+            lines.append(f"{pad}{key.ljust(width)} = {value[0]}")
+        index = run
+    return lines
+
+
+def render_hcl(registry: Dict[str, Any]) -> str:
+    types = "\n".join(_hcl_attributes({"deployment_types": registry["types"]}, 1))
+    default = _hcl_scalar(registry["default"])
+    return f"""\
+# Deployment type definitions, generated by "select-stack.py registry" from
+# stacks/deployment-types/configs. Do not edit: change the YAML configs and
+# run "select-stack.py registry" again.
+
+locals {{
+{types}
+
+  default_deployment_type = {default}
+
+  # Get current deployment type from config
+  current_deployment_type = try(
+    include.tenant_config.locals.cfg.deployment_type,
+    local.default_deployment_type
+  )
+
+  # Get the configuration for current deployment type
+  deployment_config = local.deployment_types[local.current_deployment_type]
+
+  # Export features for use in units (feature -> enabled)
+  deployment_features = local.deployment_config.feature_flags
+
+  # Export components for conditional deployment (layer -> unit -> deployed)
+  deployment_components = local.deployment_config.component_units
+
+  # Export cluster configuration
+  cluster_config = local.deployment_config.cluster_config
+}}
+"""
+
+
+def _shell_words(values: Optional[List[Any]]) -> str:
+    return shlex.quote(" ".join(str(value) for value in values or []))
+
+
+def render_shell(registry: Dict[str, Any]) -> str:
+    cases = []
+    for name, entry in registry["types"].items():
+        cases.append(f"""\
+        {shlex.quote(name)})
+            DT_DESCRIPTION={shlex.quote(str(entry["description"] or ""))}
+            DT_STACK_FILE={shlex.quote(str(entry["stack_file"] or ""))}
+            DT_ENABLED={"true" if entry["enabled"] else "false"}
+            DT_COMPONENTS={_shell_words(entry["components"])}
+            DT_FEATURES={_shell_words(entry["features"])}
+            ;;""")
+    case_lines = "\n".join(cases)
+    return f"""\
+# shellcheck shell=bash
+# Deployment type lookup, generated by "select-stack.py registry" from
+# stacks/deployment-types/configs. Do not edit: change the YAML configs and
+# run "select-stack.py registry" again.
+
+DEFAULT_DEPLOYMENT_TYPE={shlex.quote(registry["default"])}
+DEPLOYMENT_TYPES={_shell_words(registry["enabled"])}
+
+# deployment_type_lookup NAME
+# Sets DT_NAME, DT_DESCRIPTION, DT_STACK_FILE, DT_ENABLED (true/false),
+# DT_COMPONENTS and DT_FEATURES (space-separated). Returns 1 for an unknown
+# deployment type.
+deployment_type_lookup() {{
+    case "$1" in
+{case_lines}
+        *)
+            return 1
+            ;;
+    esac
+    DT_NAME="$1"
+}}
+"""
+
+
+RENDERERS = {"json": render_json, "hcl": render_hcl, "shell": render_shell}
+
+
+def _read(path: Path) -> Optional[str]:
+    try:
+        return path.read_text()
+    except OSError:
+        return None
+
+
+def build(
+    config_dir: Path = configs.CONFIG_DIR,
+    repo_root: Path = configs.REPO_ROOT,
+    check: bool = False,
+) -> Dict[str, Any]:
+    """Compile the registry and write (or with ``check``, compare) its artifacts.
+
+    Nothing is written while the configs have ``errors``.
+    """
+    registry = compile_registry(config_dir, repo_root)
+    report = {
+        "types": len(registry["types"]),
+        "enabled": registry["enabled"],
+        "written": [],
+        "unchanged": [],
+        "stale": [],
+        "errors": registry["errors"],
+    }
+    for kind, rel in ARTIFACTS.items():
+        content = RENDERERS[kind](registry)
+        path = repo_root / rel
+        if _read(path) == content:
+            report["unchanged"].append(rel)
+        elif check or registry["errors"]:
+            report["stale"].append(rel)
+        else:
+            tmp = path.with_name(f".{path.name}.tmp")
+            tmp.write_text(content)
+            os.replace(tmp, path)
+            report["written"].append(rel)
+    return report
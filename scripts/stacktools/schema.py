@@ -0,0 +1,337 @@
+"""
+Schema validation for tenant configs.
+
+The schema is declared as plain data (``TENANT_SCHEMA``) and compiled once
+into nested checker closures, so validating a config is a straight walk with
+no re-interpretation of the schema. Every problem is reported with the dotted
+path of the offending value (``features.karpenter``, ``subnet_azs[2]``)
+instead of stopping at the first one.
+
+Checks cover what otherwise fails deep inside a terragrunt run: CIDRs,
+short region codes and their AWS region, NAT strategy, account IDs that YAML
+turned into integers, and the deployment type.
+"""
+
+import hashlib
+import ipaddress
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional
+
+from stacktools import timings
+
+# Short region codes (overlays/aws/root.hcl valid_regions) and their regions
+SREGIONS = {
+    "use1": "us-east-1",
+    "usw2": "us-west-2",
+    "euw1": "eu-west-1",
+    "euc1": "eu-central-1",
+    "apse4": "ap-southeast-4",
+    "apse2": "ap-southeast-2",
+}
+NAT_STRATEGIES = ("none", "single", "per_az")
+
+# Bump when _cross_checks changes; TENANT_SCHEMA itself is hashed by fingerprint()
+SCHEMA_VERSION = 1
+
+_NAME = r"^[a-z0-9]([a-z0-9-]*[a-z0-9])?$"
+
+TENANT_SCHEMA: Dict[str, Any] = {
+    "type": "mapping",
+    "fields": {
+        "org": {"type": "string", "required": True, "pattern": _NAME},
+        "env": {"type": "string", "required": True, "pattern": _NAME},
+        "sregion": {"type": "string", "required": True, "enum": sorted(SREGIONS)},
+        "region": {
+            "type": "string",
+            "required": True,
+            "pattern": r"^[a-z]{2}(-gov)?-[a-z]+-\d$",
+        },
+        "deployment": {"type": "string", "required": True, "pattern": _NAME},
+        "deployment_type": {"type": "string", "deployment_type": True},
+        "account_id": {"type": "string", "required": True, "pattern": r"^\d{12}$"},
+        "vpc_cidr": {"type": "string", "cidr": (16, 28)},
+        "subnet_count": {"type": "integer", "range": (1, 6)},
+        "subnet_nat_strategy": {"type": "string", "enum": list(NAT_STRATEGIES)},
+        "subnet_azs": {
+            "type": "list",
+            "nullable": True,
+            "items": {"type": "string", "pattern": r"^[a-z]{2}(-gov)?-[a-z]+-\d[a-z]$"},
+        },
+        "subnet_public_cidrs": {
+            "type": "list",
+            "nullable": True,
+            "items": {"type": "string", "cidr": (16, 28)},
+        },
+        "subnet_private_cidrs": {
+            "type": "list",
+            "nullable": True,
+            "items": {"type": "string", "cidr": (16, 28)},
+        },
+        "features": {"type": "mapping", "values": {"type": "boolean"}},
+        "terraform_ref": {"type": "string"},
+        "state_bucket": {
+            "type": "string",
+            "pattern": r"^[a-z0-9][a-z0-9.-]{1,61}[a-z0-9]$",
+        },
+        "external_id": {"type": "string"},
+        "tags": {"type": "mapping", "values": {"type": "scalar"}},
+    },
+}
+
+Errors = List[Dict[str, str]]
+Checker = Callable[[Any, str, Errors], None]
+
+_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "boolean": (bool,),
+    "mapping": (dict,),
+    "list": (list,),
+    "scalar": (str, int, float, bool),
+}
+_TYPE_NAMES = {
+    str: "string",
+    int: "integer",
+    float: "number",
+    bool: "boolean",
+    dict: "mapping",
+    list: "list",
+    type(None): "null",
+}
+
+
+def _join(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+def _error(errors: Errors, path: str, message: str):
+    errors.append({"path": path or "<root>", "message": message})
+
+
+def _compile(
+    spec: Dict[str, Any], deployment_types: Optional[FrozenSet[str]]
+) -> Checker:
+    """Compile one schema node into a checker(value, path, errors) closure."""
+    allowed = _TYPES[spec["type"]]
+    expected = spec["type"]
+    nullable = spec.get("nullable", False)
+    checks: List[Checker] = []
+
+    if "pattern" in spec:
+        regex = re.compile(spec["pattern"])
+
+        def check_pattern(value, path, errors):
+            if not regex.match(value):
+                _error(errors, path, f"'{value}' does not match {spec['pattern']}")
+
+        checks.append(check_pattern)
+
+    if "enum" in spec:
+        choices = frozenset(spec["enum"])
+        listed = ", ".join(spec["enum"])
+
+        def check_enum(value, path, errors):
+            if value not in choices:
+                _error(errors, path, f"'{value}' is not one of: {listed}")
+
+        checks.append(check_enum)
+
+    if "range" in spec:
+        low, high = spec["range"]
+
+        def check_range(value, path, errors):
+            if not low <= value <= high:
+                _error(errors, path, f"{value} is outside {low}..{high}")
+
+        checks.append(check_range)
+
+    if "cidr" in spec:
+        shortest, longest = spec["cidr"]
+
+        def check_cidr(value, path, errors):
+            try:
+                network = ipaddress.IPv4Network(value, strict=True)
+            except ValueError as e:
+                _error(errors, path, f"'{value}' is not a valid IPv4 CIDR: {e}")
+                return
+            if not shortest <= network.prefixlen <= longest:
+                _error(
+                    errors,
+                    path,
+                    f"'{value}' prefix must be between /{shortest} and /{longest}",
+                )
+
+        checks.append(check_cidr)
+
+    if spec.get("deployment_type") and deployment_types is not None:
+        listed_types = ", ".join(sorted(deployment_types))
+
+        def check_deployment_type(value, path, errors):
+            if value not in deployment_types:
+                _error(
+                    errors,
+                    path,
+                    f"unknown deployment type '{value}' (valid: {listed_types})",
+                )
+
+        checks.append(check_deployment_type)
+
+    if "fields" in spec:
+        fields = [
+            (name, bool(sub.get("required")), _compile(sub, deployment_types))
+            for name, sub in spec["fields"].items()
+        ]
+
+        def check_fields(value, path, errors):
+            for name, required, checker in fields:
+                if name not in value or value[name] in (None, ""):
+                    if required:
+                        _error(
+                            errors,
+                            _join(path, name),
+                            "required field is missing or empty",
+                        )
+                    elif name in value and value[name] is None:
+                        checker(None, _join(path, name), errors)
+                    continue
+                checker(value[name], _join(path, name), errors)
+
+        checks.append(check_fields)
+
+    if "values" in spec:
+        value_checker = _compile(spec["values"], deployment_types)
+
+        def check_values(value, path, errors):
+            for key, item in value.items():
+                value_checker(item, _join(path, str(key)), errors)
+
+        checks.append(check_values)
+
+    if "items" in spec:
+        item_checker = _compile(spec["items"], deployment_types)
+
+        def check_items(value, path, errors):
+            for index, item in enumerate(value):
+                item_checker(item, f"{path}[{index}]", errors)
+
+        checks.append(check_items)
+
+    def checker(value, path, errors):
+        if value is None and nullable:
+            return
+        # bool is an int subclass; never accept it where a number is expected
+        if not isinstance(value, allowed) or (
+            isinstance(value, bool) and bool not in allowed
+        ):
+            got = _TYPE_NAMES.get(type(value), type(value).__name__)
+            hint = ""
+            if (
+                expected == "string"
+                and isinstance(value, int)
+                and not isinstance(value, bool)
+            ):
+                hint = " (quote it in YAML)"
+            _error(errors, path, f"expected {expected}, got {got}{hint}")
+            return
+        for check in checks:
+            check(value, path, errors)
+
+    return checker
+
+
+def _cross_checks(config: Dict, errors: Errors):
+    """Rules spanning several fields, run after the per-field checks."""
+    sregion, region = config.get("sregion"), config.get("region")
+    if sregion in SREGIONS and isinstance(region, str) and SREGIONS[sregion] != region:
+        _error(
+            errors,
+            "region",
+            f"'{region}' does not match sregion '{sregion}' (expected '{SREGIONS[sregion]}')",
+        )
+
+    count = config.get("subnet_count")
+    azs = config.get("subnet_azs")
+    if type(count) is int and isinstance(azs, list) and len(azs) != count:
+        _error(
+            errors, "subnet_azs", f"lists {len(azs)} AZs but subnet_count is {count}"
+        )
+    if isinstance(region, str) and isinstance(azs, list):
+        for index, az in enumerate(azs):
+            if isinstance(az, str) and not az.startswith(region):
+                _error(
+                    errors,
+                    f"subnet_azs[{index}]",
+                    f"'{az}' is not in region '{region}'",
+                )
+
+    try:
+        vpc = ipaddress.IPv4Network(config.get("vpc_cidr"), strict=True)
+    except (TypeError, ValueError):
+        return
+    for field in ("subnet_public_cidrs", "subnet_private_cidrs"):
+        subnets = config.get(field)
+        if not isinstance(subnets, list):
+            continue
+        for index, cidr in enumerate(subnets):
+            try:
+                subnet = ipaddress.IPv4Network(cidr, strict=True)
+            except (TypeError, ValueError):
+                continue  # already reported
+            if not subnet.subnet_of(vpc):
+                _error(
+                    errors,
+                    f"{field}[{index}]",
+                    f"'{cidr}' is not inside vpc_cidr '{vpc}'",
+                )
+
+
+class TenantValidator:
+    """A compiled tenant schema; call it with a parsed config to get errors."""
+
+    def __init__(self, deployment_types: Optional[Iterable[str]] = None):
+        types = frozenset(deployment_types) if deployment_types is not None else None
+        self._check = _compile(TENANT_SCHEMA, types)
+
+    def __call__(self, config: Any) -> Errors:
+        errors: Errors = []
+        self._check(config, "", errors)
+        if isinstance(config, dict):
+            _cross_checks(config, errors)
+        return errors
+
+
+@lru_cache(maxsize=8)
+def _validator(deployment_types: Optional[FrozenSet[str]]) -> TenantValidator:
+    return TenantValidator(deployment_types)
+
+
+def get_validator(deployment_types: Optional[Iterable[str]] = None) -> TenantValidator:
+    """Return a compiled validator, reusing one per set of deployment types.
+
+    Without ``deployment_types`` the deployment type is only type-checked;
+    callers that resolve it afterwards report unknown types themselves.
+    """
+    key = frozenset(deployment_types) if deployment_types is not None else None
+    return _validator(key)
+
+
+def validate_tenant(
+    config: Any, deployment_types: Optional[Iterable[str]] = None
+) -> Errors:
+    """Validate a parsed tenant config, returning ``[{"path", "message"}]``."""
+    with timings.span("validate_tenant"):
+        return get_validator(deployment_types)(config)
+
+
+@lru_cache(maxsize=1)
+def fingerprint() -> str:
+    """Hash of the schema, for caches that store validation results."""
+    blob = json.dumps([SCHEMA_VERSION, TENANT_SCHEMA], sort_keys=True).encode()
+    return hashlib.sha256(blob).hexdigest()
+
+
+def format_errors(errors: Errors) -> List[str]:
+    """Render errors as ``path: message`` lines."""
+    return [f"{e['path']}: {e['message']}" for e in errors]
@@ -0,0 +1,84 @@
+"""
+Client side of the selector daemon protocol.
+
+Requests and responses are single-line JSON objects over a Unix stream
+socket, one response per request, in order::
+
+    {"op": "resolve", "config_file": "/abs/tenant.yaml"}
+    {"ok": true, "result": {"deployment_type": "full_stack", ...}, "warnings": []}
+
+    {"op": "validate", "config_file": "tenant.yaml"}
+    {"ok": false, "error": "Configuration file not found: tenant.yaml"}
+
+Operations: ``resolve``, ``validate``, ``list``, ``ping``, ``stats``,
+``reload`` and ``shutdown``. Relative paths are resolved by the client, since
+the daemon's working directory can differ.
+
+Only the standard library is imported, so a thin client starts as fast as
+the interpreter does.
+"""
+
+import json
+import os
+import socket
+from pathlib import Path
+from typing import Dict, Optional
+
+SOCKET_ENV = "STACK_SELECTOR_SOCKET"
+SOCKET_NAME = "honeyhive-stack-selector.sock"
+
+
+def default_socket_path() -> Path:
+    """``STACK_SELECTOR_SOCKET``, else the runtime dir, else the cache dir."""
+    if os.environ.get(SOCKET_ENV):
+        return Path(os.environ[SOCKET_ENV])
+    if os.environ.get("XDG_RUNTIME_DIR"):
+        return Path(os.environ["XDG_RUNTIME_DIR"]) / SOCKET_NAME
+    xdg_cache = os.environ.get("XDG_CACHE_HOME")
+    base = Path(xdg_cache) if xdg_cache else Path.home() / ".cache"
+    return base / "honeyhive-workflows" / SOCKET_NAME
+
+
+class DaemonUnavailable(Exception):
+    """Raised when no daemon is listening on the socket."""
+
+
+class SelectorClient:
+    """A persistent connection to the selector daemon."""
+
+    def __init__(self, socket_path: Optional[Path] = None, timeout: float = 10.0):
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(str(self.socket_path))
+        except OSError as e:
+            self.sock.close()
+            raise DaemonUnavailable(f"No selector daemon at {self.socket_path}: {e}")
+        self._file = self.sock.makefile("rb")
+
+    def close(self):
+        self._file.close()
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def request(self, op: str, **params) -> Dict:
+        """Send one request and return the daemon's response object."""
+        if params.get("config_file"):
+            params["config_file"] = os.path.abspath(params["config_file"])
+        self.sock.sendall(json.dumps(dict(params, op=op)).encode() + b"\n")
+        line = self._file.readline()
+        if not line:
+            raise DaemonUnavailable("Selector daemon closed the connection")
+        return json.loads(line)
+
+
+def request(op: str, socket_path: Optional[Path] = None, **params) -> Dict:
+    """One-shot request on a fresh connection."""
+    with SelectorClient(socket_path) as client:
+        return client.request(op, **params)
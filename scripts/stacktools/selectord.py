@@ -0,0 +1,552 @@
+"""
+Long-lived selector daemon answering stack queries over a Unix socket.
+
+Each ``select-stack.py`` call pays for interpreter startup, imports and
+config parsing. The daemon does that once: it keeps the deployment-type
+configs and every tenant config it has seen in memory and answers
+``resolve``, ``validate`` and ``list`` requests (protocol in
+``selectorclient``) from there.
+
+Freshness:
+
+  * the deployment-type config directory is watched with inotify where the
+    platform has it, and polled every ``poll_interval`` seconds otherwise; a
+    change reloads all deployment types;
+  * a tenant config is re-parsed when its mtime or size changes, checked
+    with one ``stat`` per request.
+
+The server is a single thread on ``selectors``: requests are answered in
+arrival order and no state needs locking. A request costs a stat and a dict
+lookup, well under a millisecond. Client sockets stay non-blocking and
+responses are queued per client, so a client that stops reading never holds
+up the others; it is dropped once its queue has not moved for
+``CLIENT_TIMEOUT`` seconds or grows past ``MAX_PENDING``. A request that fails
+in any way gets an error response rather than stopping the daemon.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import selectors
+import signal
+import socket
+import struct
+import time
+import traceback
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from stacktools import configs, schema
+from stacktools.cache import ConfigCache
+from stacktools.selectorclient import default_socket_path
+
+DEFAULT_POLL_INTERVAL = 1.0
+CLIENT_TIMEOUT = 5.0
+MAX_REQUEST = 1024 * 1024
+MAX_PENDING = 16 * 1024 * 1024
+
+# inotify(7) event masks
+_IN_MODIFY = 0x002
+_IN_ATTRIB = 0x004
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_DELETE_SELF = 0x400
+_IN_MOVE_SELF = 0x800
+_WATCH_MASK = (
+    _IN_MODIFY
+    | _IN_ATTRIB
+    | _IN_CLOSE_WRITE
+    | _IN_MOVED_FROM
+    | _IN_MOVED_TO
+    | _IN_CREATE
+    | _IN_DELETE
+    | _IN_DELETE_SELF
+    | _IN_MOVE_SELF
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Stopped(Exception):
+    """Raised from the signal handler to leave a blocking select()."""
+
+
+class InotifyWatcher:
+    """inotify watch on one directory, through libc via ctypes."""
+
+    kind = "inotify"
+
+    def __init__(self, directory: Path):
+        libc_name = ctypes.util.find_library("c")
+        if not libc_name:
+            raise OSError(errno.ENOSYS, "libc not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, str(directory).encode(), _WATCH_MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def drain(self) -> bool:
+        """Consume pending events; True if any touched a YAML file or the directory."""
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return changed
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                name = (
+                    data[offset + 16 : offset + 16 + length]
+                    .rstrip(b"\0")
+                    .decode(errors="replace")
+                )
+                offset += 16 + length
+                if mask & (_IN_DELETE_SELF | _IN_MOVE_SELF) or name.endswith(
+                    (".yaml", ".yml")
+                ):
+                    changed = True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollingWatcher:
+    """Detects changes by comparing the directory's YAML files' stats."""
+
+    kind = "polling"
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.snapshot = self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Tuple[int, int]]:
+        state = {}
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if entry.name.endswith((".yaml", ".yml")):
+                        st = entry.stat()
+                        state[entry.name] = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            pass
+        return state
+
+    def fileno(self) -> Optional[int]:
+        return None
+
+    def drain(self) -> bool:
+        snapshot = self._snapshot()
+        changed = snapshot != self.snapshot
+        self.snapshot = snapshot
+        return changed
+
+    def close(self):
+        pass
+
+
+def make_watcher(directory: Path, polling: bool = False):
+    """An inotify watcher, or a polling one when asked or when inotify is missing."""
+    if not polling:
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher(directory)
+
+
+class SelectorState:
+    """Deployment types and tenant configs held in memory."""
+
+    def __init__(self, config_dir: Path = configs.CONFIG_DIR, use_cache: bool = True):
+        self.config_dir = config_dir
+        self.cache = ConfigCache(config_dir) if use_cache else None
+        self.deployment_stacks: Dict[str, Dict] = {}
+        self.load_errors: List[str] = []
+        self.tenants: Dict[str, Tuple[Tuple[int, int], object]] = {}
+        self.counters = {
+            "requests": 0,
+            "tenant_hits": 0,
+            "tenant_loads": 0,
+            "reloads": 0,
+            "internal_errors": 0,
+        }
+        self.reload()
+
+    def reload(self):
+        errors = []
+        self.deployment_stacks = configs.load_deployment_configs(
+            self.config_dir,
+            on_error=lambda config_file, e: errors.append(f"{config_file}: {e}"),
+            cache=self.cache,
+        )
+        self.load_errors = errors
+        self.counters["reloads"] += 1
+
+    def tenant(self, config_file: str):
+        """Parsed tenant config (or the ConfigError it raised), re-read when it changes."""
+        try:
+            st = os.stat(config_file)
+        except OSError:
+            self.tenants.pop(config_file, None)
+            raise configs.ConfigError(f"Configuration file not found: {config_file}")
+        key = (st.st_mtime_ns, st.st_size)
+        entry = self.tenants.get(config_file)
+        if entry is not None and entry[0] == key:
+            self.counters["tenant_hits"] += 1
+            value = entry[1]
+        else:
+            self.counters["tenant_loads"] += 1
+            try:
+                value = configs.load_config(config_file)
+                if not isinstance(value, dict):
+                    raise configs.ConfigError("Configuration is not a mapping")
+            except configs.ConfigError as e:
+                value = e
+            self.tenants[config_file] = (key, value)
+        if isinstance(value, configs.ConfigError):
+            raise value
+        return value
+
+    def _checked(self, config_file: str, deployment_type: Optional[str]):
+        """(config, deployment type, warnings, schema errors) for one tenant."""
+        config = self.tenant(config_file)
+        warnings = []
+        errors = schema.format_errors(schema.validate_tenant(config))
+        if deployment_type:
+            warnings.append(f"Overriding deployment type to: {deployment_type}")
+        else:
+            deployment_type = config.get("deployment_type")
+        if not deployment_type:
+            warnings.append(
+                "deployment_type not specified in configuration, "
+                f"defaulting to '{configs.DEFAULT_DEPLOYMENT_TYPE}'"
+            )
+            deployment_type = configs.DEFAULT_DEPLOYMENT_TYPE
+        return config, deployment_type, warnings, errors
+
+    def _deployment(self, deployment_type: str) -> Dict:
+        if deployment_type not in self.deployment_stacks:
+            raise configs.ConfigError(
+                f"Unknown deployment type: {deployment_type}\n"
+                f"   Valid types: {', '.join(sorted(self.deployment_stacks))}"
+            )
+        return self.deployment_stacks[deployment_type]
+
+    def resolve(self, config_file: str, deployment_type: Optional[str] = None) -> Dict:
+        """The same fields as ``select-stack.py --json`` (without ``eta``)."""
+        config, deployment_type, warnings, errors = self._checked(
+            config_file, deployment_type
+        )
+        if errors:
+            raise configs.ConfigError("Invalid configuration: " + "; ".join(errors))
+        info = self._deployment(deployment_type)
+        stack_file = info.get("stack_file")
+        if not stack_file:
+            warnings.append(f"Stack file not configured for {deployment_type}")
+        elif not (configs.REPO_ROOT / stack_file).exists():
+            warnings.append(f"Stack file not found: {stack_file}")
+        return {
+            "result": {
+                "deployment_type": deployment_type,
+                "stack_file": stack_file,
+                "config_path": config_file,
+                "account_id": config.get("account_id"),
+                "region": config.get("region"),
+                "environment": config.get("env"),
+            },
+            "warnings": warnings,
+        }
+
+    def validate(self, config_file: str, deployment_type: Optional[str] = None) -> Dict:
+        _, deployment_type, warnings, errors = self._checked(
+            config_file, deployment_type
+        )
+        if not errors and deployment_type not in self.deployment_stacks:
+            errors.append(f"Unknown deployment type: {deployment_type}")
+        return {
+            "result": {
+                "valid": not errors,
+                "deployment_type": deployment_type,
+                "config_path": config_file,
+                "errors": errors,
+            },
+            "warnings": warnings,
+        }
+
+    def list(self) -> Dict:
+        return {
+            "result": [
+                {
+                    "name": name,
+                    "description": info.get("description"),
+                    "stack_file": info.get("stack_file"),
+                    "components": info.get("components", []),
+                    "features": info.get("features", []),
+                }
+                for name, info in sorted(self.deployment_stacks.items())
+            ],
+            "warnings": self.load_errors,
+        }
+
+
+class SelectorDaemon:
+    """Serves a SelectorState on a Unix socket until shut down."""
+
+    def __init__(
+        self,
+        state: SelectorState,
+        socket_path: Optional[Path] = None,
+        polling: bool = False,
+        poll_interval: float = DEFAULT_POLL_INTERVAL,
+        log: Callable[[str], None] = lambda message: None,
+    ):
+        self.state = state
+        self.socket_path = Path(socket_path or default_socket_path())
+        self.watcher = make_watcher(state.config_dir, polling)
+        self.poll_interval = poll_interval
+        self.log = log
+        self.started = time.time()
+        self.running = False
+        self.selector = selectors.DefaultSelector()
+        self.buffers: Dict[socket.socket, bytearray] = {}
+        self.pending: Dict[socket.socket, bytearray] = {}
+        self.stalled: Dict[socket.socket, float] = {}
+
+    def _bind(self) -> socket.socket:
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(str(self.socket_path))
+            except OSError:
+                # Left behind by a daemon that did not shut down cleanly
+                self.socket_path.unlink()
+            else:
+                raise RuntimeError(
+                    f"A selector daemon is already listening on {self.socket_path}"
+                )
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        old_umask = os.umask(0o177)
+        try:
+            server.bind(str(self.socket_path))
+        finally:
+            os.umask(old_umask)
+        server.listen(64)
+        server.setblocking(False)
+        return server
+
+    def handle(self, request: Dict) -> Dict:
+        """Answer one decoded request; errors of any kind become error responses."""
+        self.state.counters["requests"] += 1
+        op = request.get("op")
+        config_file = request.get("config_file")
+        deployment_type = request.get("deployment_type")
+        try:
+            if op in ("resolve", "validate"):
+                if not config_file:
+                    raise configs.ConfigError("config_file is required")
+                if not isinstance(config_file, str):
+                    raise configs.ConfigError("config_file must be a string")
+                if deployment_type is not None and not isinstance(deployment_type, str):
+                    raise configs.ConfigError("deployment_type must be a string")
+                method = getattr(self.state, op)
+                response = method(config_file, deployment_type)
+            elif op == "list":
+                response = self.state.list()
+            elif op == "ping":
+                response = {"result": "pong"}
+            elif op == "stats":
+                response = {"result": self.stats()}
+            elif op == "reload":
+                self.state.reload()
+                response = {
+                    "result": {"deployment_types": len(self.state.deployment_stacks)}
+                }
+            elif op == "shutdown":
+                self.running = False
+                response = {"result": "shutting down"}
+            else:
+                raise configs.ConfigError(f"Unknown op: {op}")
+        except configs.ConfigError as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            self.state.counters["internal_errors"] += 1
+            self.log(f"Internal error answering {op!r}:\n{traceback.format_exc()}")
+            return {"ok": False, "error": f"Internal error: {type(e).__name__}: {e}"}
+        response["ok"] = True
+        return response
+
+    def stats(self) -> Dict:
+        return dict(
+            self.state.counters,
+            pid=os.getpid(),
+            uptime=round(time.time() - self.started, 3),
+            socket=str(self.socket_path),
+            watcher=self.watcher.kind,
+            deployment_types=len(self.state.deployment_stacks),
+            tenants_cached=len(self.state.tenants),
+        )
+
+    def _accept(self, server: socket.socket):
+        try:
+            conn, _ = server.accept()
+        except BlockingIOError:
+            return
+        conn.setblocking(False)
+        self.buffers[conn] = bytearray()
+        self.pending[conn] = bytearray()
+        self.selector.register(conn, selectors.EVENT_READ, "client")
+
+    def _drop(self, conn: socket.socket):
+        self.selector.unregister(conn)
+        self.buffers.pop(conn, None)
+        self.pending.pop(conn, None)
+        self.stalled.pop(conn, None)
+        conn.close()
+
+    def _send(self, conn: socket.socket, data: bytes = b"") -> bool:
+        """Queue ``data`` and write what the socket takes; False if the client was dropped."""
+        pending = self.pending[conn]
+        pending.extend(data)
+        try:
+            while pending:
+                sent = conn.send(pending)
+                del pending[:sent]
+                self.stalled.pop(conn, None)
+        except BlockingIOError:
+            pass
+        except OSError:
+            self._drop(conn)
+            return False
+        if len(pending) > MAX_PENDING:
+            self._drop(conn)
+            return False
+        events = selectors.EVENT_READ
+        if pending:
+            events |= selectors.EVENT_WRITE
+            self.stalled.setdefault(conn, time.monotonic())
+        if self.selector.get_key(conn).events != events:
+            self.selector.modify(conn, events, "client")
+        return True
+
+    def _drop_stalled(self):
+        """Drop clients whose queued responses have not moved for CLIENT_TIMEOUT."""
+        deadline = time.monotonic() - CLIENT_TIMEOUT
+        for conn, since in list(self.stalled.items()):
+            if since < deadline:
+                self.log("Dropping a client that stopped reading its responses")
+                self._drop(conn)
+
+    def _serve_client(self, conn: socket.socket, events: int):
+        if events & selectors.EVENT_WRITE and not self._send(conn):
+            return
+        if not events & selectors.EVENT_READ:
+            return
+        try:
+            data = conn.recv(64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError:
+            data = b""
+        if not data:
+            self._drop(conn)
+            return
+        buffer = self.buffers[conn]
+        buffer.extend(data)
+        if len(buffer) > MAX_REQUEST:
+            self._drop(conn)
+            return
+        while b"\n" in buffer:
+            line, _, rest = bytes(buffer).partition(b"\n")
+            buffer[:] = rest
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("request must be a JSON object")
+            except (ValueError, RecursionError) as e:
+                response = {"ok": False, "error": f"Bad request: {e}"}
+            else:
+                response = self.handle(request)
+                if "id" in request:
+                    response["id"] = request["id"]
+            if not self._send(conn, json.dumps(response).encode() + b"\n"):
+                return
+
+    def _check_configs(self):
+        if self.watcher.drain():
+            try:
+                self.state.reload()
+                self.log(
+                    f"Reloaded {len(self.state.deployment_stacks)} deployment types"
+                )
+            except configs.ConfigError as e:
+                self.log(f"Keeping previous deployment types: {e}")
+
+    def serve_forever(self):
+        server = self._bind()
+        self.selector.register(server, selectors.EVENT_READ, "server")
+        if self.watcher.fileno() is not None:
+            self.selector.register(
+                self.watcher.fileno(), selectors.EVENT_READ, "watcher"
+            )
+        previous = {
+            sig: signal.signal(sig, _raise_stopped)
+            for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        polling = self.watcher.kind == "polling"
+        next_poll = time.monotonic() + self.poll_interval
+        self.running = True
+        self.log(f"Listening on {self.socket_path} ({self.watcher.kind})")
+        try:
+            while self.running:
+                timeout = max(0.0, next_poll - time.monotonic()) if polling else None
+                if self.stalled:
+                    timeout = min(timeout or CLIENT_TIMEOUT, CLIENT_TIMEOUT)
+                for key, events in self.selector.select(timeout):
+                    if key.data == "server":
+                        self._accept(server)
+                    elif key.data == "watcher":
+                        self._check_configs()
+                    elif key.fileobj in self.buffers:
+                        self._serve_client(key.fileobj, events)
+                self._drop_stalled()
+                if polling and time.monotonic() >= next_poll:
+                    self._check_configs()
+                    next_poll = time.monotonic() + self.poll_interval
+        except _Stopped:
+            pass
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+            for conn in list(self.buffers):
+                self._drop(conn)
+            self.selector.close()
+            server.close()
+            self.watcher.close()
+            self.socket_path.unlink(missing_ok=True)
+            self.log("Stopped")
+
+    def stop(self):
+        self.running = False
+
+
+def _raise_stopped(signum, frame):
+    raise _Stopped()
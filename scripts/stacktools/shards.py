@@ -0,0 +1,238 @@
+"""
+Duration-aware shard planning for plan and drift matrices.
+
+A fleet sweep is split into work items: the units of one tenant's stack,
+divided into weakly connected components of the stack's dependency graph.
+Units joined by a ``dependencies`` edge always land in the same item, so a
+shard can run its items with ``terragrunt stack`` and every edge still holds.
+An item's weight is its makespan at the stack's ``parallelism`` under the
+known unit durations, not the sum of its units.
+
+Items are packed into N shards with greedy longest-processing-time (LPT)
+bin packing: heaviest item first, always onto the least loaded shard. LPT is
+within 4/3 of the optimal makespan, and in practice very close to the lower
+bound ``max(total / N, heaviest item)``.
+
+Durations come from a JSON file, either a flat ``{unit path or name:
+seconds}`` mapping (as for ``dag --durations``) or::
+
+    {"units": {"units/hosting/cluster": 900, "vpc": 120},
+     "tenants": {"apiary/acme/usw2": 2400}}
+
+A tenant duration is the observed wall time of the tenant's whole run; it
+rescales that tenant's items proportionally.
+"""
+
+import heapq
+import math
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from stacktools import batch, configs, dag
+
+
+def components(nodes: List[str], deps: Mapping[str, Set[str]]) -> List[List[str]]:
+    """Weakly connected components, each in the original node order."""
+    parent = {n: n for n in nodes}
+
+    def find(node):
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return node
+
+    for node in nodes:
+        for dep in deps[node]:
+            parent[find(node)] = find(dep)
+    groups: Dict[str, List[str]] = {}
+    for node in nodes:
+        groups.setdefault(find(node), []).append(node)
+    return list(groups.values())
+
+
+def stack_items(
+    stack: dag.StackSpec,
+    unit_durations: Mapping[str, float],
+    env: Optional[Mapping[str, str]] = None,
+) -> List[Dict]:
+    """Indivisible work items of one stack run and their weights.
+
+    Raises ValueError if the stack's dependencies contain a cycle.
+    """
+    env = env or {}
+    skipped = {u.path for u in stack.units if dag.evaluate_skip(u.skip, env)}
+    deps, _ = dag._active_dependencies(stack, skipped)
+    nodes = [u.path for u in stack.units if u.path not in skipped]
+    weights = {n: dag.unit_duration(n, unit_durations) for n in nodes}
+    parallelism = stack.parallelism or len(nodes) or 1
+
+    items = []
+    for group in components(nodes, deps):
+        members = set(group)
+        sub_deps = {n: deps[n] & members for n in group}
+        waves, cyclic = dag.topological_waves(group, sub_deps)
+        if cyclic:
+            raise ValueError(
+                f"{stack.relative_path()}: dependency cycle among {sorted(cyclic)}"
+            )
+        items.append(
+            {
+                "units": group,
+                "weight": dag.schedule_makespan(waves, sub_deps, weights, parallelism),
+            }
+        )
+    return items
+
+
+def plan_items(
+    tenants: Iterable[Dict],
+    durations: Optional[Mapping] = None,
+    env: Optional[Mapping[str, str]] = None,
+) -> List[Dict]:
+    """Work items for resolved tenants (``stack_path``, ``config_path``, ``stack_file``).
+
+    Items from a stack that is one connected graph carry ``all_units`` so the
+    shard can run the whole stack instead of a unit filter.
+    """
+    unit_durations, tenant_durations = dag.split_durations(durations)
+    stacks: Dict[str, dag.StackSpec] = {}
+    per_stack: Dict[str, List[Dict]] = {}
+    items = []
+    for tenant in tenants:
+        stack_file = tenant["stack_file"]
+        if stack_file not in stacks:
+            stacks[stack_file] = dag.load_stack(configs.REPO_ROOT / stack_file)
+            per_stack[stack_file] = stack_items(stacks[stack_file], unit_durations, env)
+        stack_item_list = per_stack[stack_file]
+        observed = next(
+            (
+                tenant_durations[key]
+                for key in (
+                    tenant["stack_path"],
+                    tenant["config_path"],
+                    configs.tenant_label(tenant["config_path"]),
+                )
+                if key in tenant_durations
+            ),
+            None,
+        )
+        makespan = sum(i["weight"] for i in stack_item_list)
+        scale = float(observed) / makespan if observed is not None and makespan else 1.0
+        for item in stack_item_list:
+            items.append(
+                {
+                    "stack_path": tenant["stack_path"],
+                    "config_path": tenant["config_path"],
+                    "stack_file": stack_file,
+                    "all_units": len(stack_item_list) == 1,
+                    "units": item["units"],
+                    "weight": item["weight"] * scale,
+                }
+            )
+    return items
+
+
+def _item_key(item: Dict) -> Tuple[str, str, str]:
+    # Tenants sharing a directory share a stack_path; config_path tells them apart
+    return (item["stack_path"], item["config_path"], item["units"][0])
+
+
+def lpt(items: List[Dict], shards: int) -> List[Dict]:
+    """Pack items into ``shards`` bins, longest processing time first."""
+    bins = [{"shard": i, "load": 0.0, "items": []} for i in range(shards)]
+    heap = [(0.0, i) for i in range(shards)]
+    ordered = sorted(items, key=lambda it: (-it["weight"], _item_key(it)))
+    for item in ordered:
+        load, index = heapq.heappop(heap)
+        bins[index]["items"].append(item)
+        bins[index]["load"] = load + item["weight"]
+        heapq.heappush(heap, (bins[index]["load"], index))
+    return bins
+
+
+def round_robin(items: List[Dict], shards: int) -> List[float]:
+    """Shard loads when items are dealt out in input order, for comparison."""
+    loads = [0.0] * shards
+    for index, item in enumerate(items):
+        loads[index % shards] += item["weight"]
+    return loads
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+def load_stats(loads: List[float]) -> Dict:
+    mean = sum(loads) / len(loads) if loads else 0.0
+    return {
+        "max": round(max(loads, default=0.0), 3),
+        "p95": round(percentile(loads, 95), 3),
+        "mean": round(mean, 3),
+        "imbalance": round(max(loads) / mean, 3) if mean else 1.0,
+    }
+
+
+def plan_shards(
+    tenants: Iterable[Dict],
+    shards: int,
+    durations: Optional[Mapping] = None,
+    env: Optional[Mapping[str, str]] = None,
+) -> Dict:
+    """Plan ``shards`` balanced shards and a GitHub Actions matrix."""
+    items = plan_items(tenants, durations, env)
+    shards = max(1, min(shards, len(items))) if items else 1
+    bins = lpt(items, shards)
+    total = sum(it["weight"] for it in items)
+    lower_bound = max(total / shards, max((it["weight"] for it in items), default=0.0))
+    loads = [b["load"] for b in bins]
+
+    matrix = []
+    for b in bins:
+        b["items"].sort(key=_item_key)
+        matrix.append(
+            {
+                "shard": b["shard"],
+                "estimated_seconds": round(b["load"], 3),
+                "stack_paths": " ".join(
+                    sorted({it["stack_path"] for it in b["items"]})
+                ),
+                "items": [
+                    {
+                        "stack_path": it["stack_path"],
+                        "config_path": it["config_path"],
+                        "stack_file": it["stack_file"],
+                        "all_units": it["all_units"],
+                        "units": it["units"],
+                    }
+                    for it in b["items"]
+                ],
+            }
+        )
+    return {
+        "shards": shards,
+        "items": len(items),
+        "total_seconds": round(total, 3),
+        "lower_bound_seconds": round(lower_bound, 3),
+        "lpt": load_stats(loads),
+        "round_robin": load_stats(round_robin(items, shards)),
+        "matrix": {"include": matrix},
+    }
+
+
+def resolve_tenants(
+    sources: Iterable[str], deployment_stacks: Dict[str, Dict], pattern: str
+) -> Tuple[List[Dict], List[Dict]]:
+    """Resolve tenant files to shardable records; returns (tenants, skipped)."""
+    tenants, skipped = [], []
+    for config_file in batch.iter_tenant_files(sources, pattern):
+        record = batch.resolve_tenant(config_file, deployment_stacks)
+        if record["errors"]:
+            skipped.append(record)
+            continue
+        record["stack_path"] = str(Path(config_file).parent)
+        tenants.append(record)
+    return tenants, skipped
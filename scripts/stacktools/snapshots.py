@@ -0,0 +1,533 @@
+"""
+Merkle-hashed snapshots of the fleet's effective configs.
+
+A snapshot is one hash: the root of a tree whose nodes are
+
+  * ``dir``: a directory of the config repo, its entries by name
+  * ``tenant``: a tenant's effective config (see stacktools/layers.py),
+    its top-level keys
+  * ``map``: a mapping inside a config (``cluster_config``,
+    ``subnet_config``, ``features``, ``security``, ...)
+  * ``value``: any other value, lists included
+  * ``error``: a tenant whose config could not be resolved
+
+Every node is stored once under the SHA-256 of its kind and payload, where
+the payload of a ``dir``, ``tenant`` or ``map`` node holds its children's
+hashes. Snapshots therefore share every unchanged subtree. Identical
+deployment-type defaults are one node for the whole fleet, and taking a
+snapshot after a small change writes only the new path up to the root.
+
+Two snapshots are diffed from their roots down, and only where hashes
+differ. Unchanged directories, tenants and config subtrees are skipped
+without being read, so a diff costs time in proportion to what changed,
+not to the size of the fleet.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import subprocess
+import tarfile
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from stacktools import configs, layers
+from stacktools.batch import DEFAULT_PATTERN, iter_tenant_files
+from stacktools.cache import default_cache_dir
+
+SCHEMA_VERSION = 1
+DB_ENV = "STACK_SELECTOR_SNAPSHOT_DB"
+
+TENANT_KINDS = ("tenant", "error")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    hash TEXT PRIMARY KEY,
+    node TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS snapshots (
+    name TEXT PRIMARY KEY,
+    root_hash TEXT NOT NULL,
+    repo_root TEXT NOT NULL,
+    ref TEXT,
+    sources TEXT NOT NULL,
+    tenants INTEGER NOT NULL,
+    errors INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+Node = Tuple[str, Any]
+
+
+class SnapshotError(Exception):
+    """Raised for unknown snapshots and for sources that cannot be read."""
+
+
+def default_db_path() -> Path:
+    """Return the snapshot store location (``STACK_SELECTOR_SNAPSHOT_DB`` overrides)."""
+    if os.environ.get(DB_ENV):
+        return Path(os.environ[DB_ENV])
+    return default_cache_dir() / "config-snapshots.sqlite"
+
+
+def _canonical(node: Node) -> str:
+    return json.dumps(node, sort_keys=True, separators=(",", ":"), default=str)
+
+
+class SnapshotStore:
+    """Content-addressed SQLite store of snapshot nodes and named roots."""
+
+    def __init__(self, db_path: Optional[Path] = None):
+        self.db_path = Path(db_path or default_db_path())
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.conn:
+                self.conn.executescript(
+                    "DROP TABLE IF EXISTS snapshots; DROP TABLE IF EXISTS nodes;"
+                )
+                self.conn.executescript(_SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._nodes: Dict[str, Node] = {}
+        self.reads = 0
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def node(self, digest: str) -> Node:
+        node = self._nodes.get(digest)
+        if node is None:
+            row = self.conn.execute(
+                "SELECT node FROM nodes WHERE hash = ?", (digest,)
+            ).fetchone()
+            if row is None:
+                raise SnapshotError(
+                    f"Snapshot node {digest} is missing from {self.db_path}"
+                )
+            node = tuple(json.loads(row[0]))
+            self._nodes[digest] = node
+            self.reads += 1
+        return node
+
+    def write_nodes(self, nodes: Dict[str, str]) -> int:
+        """Store serialized nodes by hash; returns how many were new."""
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO nodes (hash, node) VALUES (?, ?)", nodes.items()
+            )
+            return self.conn.total_changes - before
+
+    def save(self, name: str, root_hash: str, **meta):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO snapshots (name, root_hash, repo_root, ref, sources,"
+                " tenants, errors, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    root_hash,
+                    meta["repo_root"],
+                    meta.get("ref"),
+                    json.dumps(meta["sources"]),
+                    meta["tenants"],
+                    meta["errors"],
+                    time.time(),
+                ),
+            )
+
+    @staticmethod
+    def _record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["sources"] = json.loads(record["sources"])
+        return record
+
+    def snapshot(self, name: str) -> Dict[str, Any]:
+        row = self.conn.execute(
+            "SELECT * FROM snapshots WHERE name = ?", (name,)
+        ).fetchone()
+        if row is None:
+            raise SnapshotError(f"No snapshot named {name!r} in {self.db_path}")
+        return self._record(row)
+
+    def snapshots(self) -> List[Dict[str, Any]]:
+        rows = self.conn.execute("SELECT * FROM snapshots ORDER BY created_at")
+        return [self._record(row) for row in rows]
+
+    def delete(self, names: Iterable[str]) -> Dict[str, int]:
+        """Delete snapshots and every node no remaining snapshot reaches."""
+        with self.conn:
+            deleted = sum(
+                self.conn.execute(
+                    "DELETE FROM snapshots WHERE name = ?", (name,)
+                ).rowcount
+                for name in names
+            )
+        reachable = set()
+        stack = [row[0] for row in self.conn.execute("SELECT root_hash FROM snapshots")]
+        while stack:
+            digest = stack.pop()
+            if digest in reachable:
+                continue
+            reachable.add(digest)
+            kind, payload = self.node(digest)
+            if kind in ("dir", "tenant", "map"):
+                stack.extend(payload.values())
+        with self.conn:
+            self.conn.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS keep (hash TEXT PRIMARY KEY)"
+            )
+            self.conn.execute("DELETE FROM keep")
+            self.conn.executemany(
+                "INSERT INTO keep VALUES (?)", ((h,) for h in reachable)
+            )
+            removed = self.conn.execute(
+                "DELETE FROM nodes WHERE hash NOT IN (SELECT hash FROM keep)"
+            ).rowcount
+        self._nodes.clear()
+        self.conn.execute("VACUUM")
+        return {"deleted": deleted, "nodes_removed": removed, "nodes": len(reachable)}
+
+
+class TreeBuilder:
+    """Hashes configs into nodes, collecting the ones not written yet."""
+
+    def __init__(self):
+        self.pending: Dict[str, str] = {}
+        # Resolved configs share subtrees with the layer memo; hashing each
+        # shared mapping once keeps a fleet snapshot close to linear in the
+        # size of the tenant files. The object is kept so its id stays valid
+        self._mappings: Dict[int, Tuple[Any, str]] = {}
+
+    def _node(self, kind: str, payload: Any) -> str:
+        blob = _canonical((kind, payload))
+        digest = hashlib.sha256(blob.encode()).hexdigest()
+        self.pending.setdefault(digest, blob)
+        return digest
+
+    def value(self, value: Any) -> str:
+        if not isinstance(value, dict):
+            return self._node("value", value)
+        cached = self._mappings.get(id(value))
+        if cached is not None and cached[0] is value:
+            return cached[1]
+        digest = self._node("map", {str(k): self.value(v) for k, v in value.items()})
+        self._mappings[id(value)] = (value, digest)
+        return digest
+
+    def tenant(self, config: Dict[str, Any]) -> str:
+        return self._node("tenant", {str(k): self.value(v) for k, v in config.items()})
+
+    def error(self, message: str) -> str:
+        return self._node("error", message)
+
+    def directory(self, tree: Dict[str, Any]) -> str:
+        """Hash a nested ``{name: subtree or tenant hash}`` directory tree."""
+        return self._node(
+            "dir",
+            {
+                name: self.directory(child) if isinstance(child, dict) else child
+                for name, child in tree.items()
+            },
+        )
+
+
+def git_toplevel(path: Path) -> Optional[Path]:
+    result = subprocess.run(
+        ["git", "rev-parse", "--show-toplevel"],
+        cwd=path,
+        capture_output=True,
+        text=True,
+    )
+    return Path(result.stdout.strip()) if result.returncode == 0 else None
+
+
+def _extract(repo_root: Path, ref: str, target: Path) -> str:
+    """Write the tree of ``ref`` into ``target``; returns the commit SHA."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--verify", f"{ref}^{{commit}}"],
+            cwd=repo_root,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        archive = subprocess.Popen(
+            ["git", "archive", "--format=tar", commit],
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+        )
+        with tarfile.open(fileobj=archive.stdout, mode="r|") as tar:
+            if hasattr(tarfile, "data_filter"):
+                tar.extractall(target, filter="data")
+            else:
+                tar.extractall(target)
+        if archive.wait() != 0:
+            raise SnapshotError(f"git archive {ref} failed")
+    except subprocess.CalledProcessError as e:
+        raise SnapshotError(f"Unknown git ref {ref!r}: {e.stderr.strip()}")
+    return commit
+
+
+def _relocate(source: str, repo_root: Path, tree_root: Path) -> str:
+    """Map a working-tree source onto the same path under ``tree_root``."""
+    relative = os.path.relpath(os.path.abspath(source), repo_root)
+    if relative == ".." or relative.startswith(".." + os.sep):
+        raise SnapshotError(f"{source} is outside the repository {repo_root}")
+    return str(tree_root / relative)
+
+
+def _tenant_key(config_file: str, tree_root: Path) -> str:
+    path = os.path.abspath(config_file)
+    relative = os.path.relpath(path, tree_root)
+    if relative == ".." or relative.startswith(".." + os.sep):
+        return Path(path).as_posix()
+    return Path(relative).as_posix()
+
+
+def build_tree(
+    sources: Sequence[str],
+    pattern: str,
+    tree_root: Path,
+    deployment_stacks: Dict[str, Dict],
+    builder: TreeBuilder,
+) -> Tuple[str, int, int]:
+    """Resolve every tenant under ``sources``; returns (root hash, tenants, errors)."""
+    resolver = layers.LayerResolver(deployment_stacks, root=tree_root)
+    tree: Dict[str, Any] = {}
+    tenants = errors = 0
+    for config_file in iter_tenant_files(sources, pattern):
+        parts = _tenant_key(config_file, tree_root).split("/")
+        directory = tree
+        for part in parts[:-1]:
+            directory = directory.setdefault(part, {})
+        if parts[-1] in directory:
+            continue
+        try:
+            document = resolver.resolve(config_file)
+        except configs.ConfigError as e:
+            directory[parts[-1]] = builder.error(str(e))
+            errors += 1
+        else:
+            directory[parts[-1]] = builder.tenant(document["config"])
+        tenants += 1
+    return builder.directory(tree), tenants, errors
+
+
+def take_snapshot(
+    store: SnapshotStore,
+    name: str,
+    sources: Sequence[str],
+    pattern: str = DEFAULT_PATTERN,
+    ref: Optional[str] = None,
+    repo_root: Optional[Path] = None,
+    config_dir: Path = configs.CONFIG_DIR,
+) -> Dict[str, Any]:
+    """Snapshot the effective configs of the tenants under ``sources``.
+
+    Tenants are keyed by their path relative to ``repo_root`` (the git
+    toplevel of the first source by default), so snapshots of the working
+    tree and of any ``ref`` line up. With ``ref`` the sources, their layer
+    files and, when they live in the same repository, the deployment-type
+    configs are read from that commit instead of the working tree.
+    """
+    if repo_root is None:
+        start = Path(sources[0]).absolute() if sources else Path.cwd()
+        while not start.is_dir():
+            # A tenant file or a glob pattern
+            start = start.parent
+        repo_root = git_toplevel(start)
+    if repo_root is None:
+        if ref:
+            raise SnapshotError("--ref needs the sources to be in a git repository")
+        repo_root = Path.cwd()
+    repo_root = Path(repo_root).resolve()
+
+    builder = TreeBuilder()
+    with tempfile.TemporaryDirectory(prefix="config-snapshot-") as tmp:
+        tree_root, commit = repo_root, None
+        if ref:
+            tree_root = Path(tmp)
+            commit = _extract(repo_root, ref, tree_root)
+            sources = [_relocate(source, repo_root, tree_root) for source in sources]
+            try:
+                relocated = Path(_relocate(str(config_dir), repo_root, tree_root))
+            except SnapshotError:
+                relocated = None
+            if relocated is not None and relocated.is_dir():
+                config_dir = relocated
+        try:
+            deployment_stacks = configs.load_deployment_configs(config_dir)
+        except configs.ConfigError as e:
+            raise SnapshotError(str(e))
+        root_hash, tenants, errors = build_tree(
+            sources, pattern, tree_root, deployment_stacks, builder
+        )
+
+    written = store.write_nodes(builder.pending)
+    meta = {
+        "repo_root": str(repo_root),
+        "ref": commit,
+        "sources": [_tenant_key(source, tree_root) for source in sources],
+        "tenants": tenants,
+        "errors": errors,
+    }
+    store.save(name, root_hash, **meta)
+    return dict(
+        meta,
+        name=name,
+        root_hash=root_hash,
+        nodes=len(builder.pending),
+        written=written,
+    )
+
+
+def _join(path: str, key: str) -> str:
+    return f"{path}.{key}" if path else key
+
+
+class _Differ:
+    """Walks two snapshot trees, descending only where hashes differ."""
+
+    def __init__(self, store: SnapshotStore):
+        self.store = store
+        self.added: List[str] = []
+        self.removed: List[str] = []
+        self.changed: Dict[str, Dict[str, Any]] = {}
+
+    def materialize(self, digest: str) -> Any:
+        kind, payload = self.store.node(digest)
+        if kind in ("map", "tenant"):
+            return {key: self.materialize(child) for key, child in payload.items()}
+        return payload
+
+    def _tenants(self, digest: str, path: str) -> Iterable[str]:
+        kind, payload = self.store.node(digest)
+        if kind != "dir":
+            yield path
+            return
+        for name, child in sorted(payload.items()):
+            yield from self._tenants(child, f"{path}/{name}" if path else name)
+
+    def tree(self, old: Optional[str], new: Optional[str], path: str = ""):
+        if old == new:
+            return
+        old_node = self.store.node(old) if old else None
+        new_node = self.store.node(new) if new else None
+        if old_node and new_node and old_node[0] == new_node[0] == "dir":
+            old_children, new_children = old_node[1], new_node[1]
+            for name in sorted(set(old_children) | set(new_children)):
+                self.tree(
+                    old_children.get(name),
+                    new_children.get(name),
+                    f"{path}/{name}" if path else name,
+                )
+        elif (
+            old_node
+            and new_node
+            and old_node[0] in TENANT_KINDS
+            and new_node[0] in TENANT_KINDS
+        ):
+            self.changed[path] = self.tenant(old_node, new_node)
+        else:
+            if old:
+                self.removed.extend(self._tenants(old, path))
+            if new:
+                self.added.extend(self._tenants(new, path))
+
+    def tenant(self, old: Node, new: Node) -> Dict[str, Any]:
+        changes: List[Dict[str, Any]] = []
+        entry: Dict[str, Any] = {}
+        if old[0] == "error" or new[0] == "error":
+            entry["error"] = {
+                "old": old[1] if old[0] == "error" else None,
+                "new": new[1] if new[0] == "error" else None,
+            }
+        if old[0] == new[0] == "tenant":
+            self.mapping(old[1], new[1], "", changes)
+        entry["keys"] = sorted({change["path"].split(".")[0] for change in changes})
+        entry["changes"] = changes
+        return entry
+
+    def mapping(
+        self, old: Dict[str, str], new: Dict[str, str], path: str, changes: List
+    ):
+        for key in sorted(set(old) | set(new)):
+            key_path = _join(path, key)
+            if key not in old:
+                changes.append(
+                    {"path": key_path, "op": "added", "new": self.materialize(new[key])}
+                )
+            elif key not in new:
+                changes.append(
+                    {
+                        "path": key_path,
+                        "op": "removed",
+                        "old": self.materialize(old[key]),
+                    }
+                )
+            elif old[key] != new[key]:
+                old_kind, old_payload = self.store.node(old[key])
+                new_kind, new_payload = self.store.node(new[key])
+                if old_kind == new_kind == "map":
+                    self.mapping(old_payload, new_payload, key_path, changes)
+                else:
+                    changes.append(
+                        {
+                            "path": key_path,
+                            "op": "changed",
+                            "old": self.materialize(old[key]),
+                            "new": self.materialize(new[key]),
+                        }
+                    )
+
+
+def diff_snapshots(
+    store: SnapshotStore, old_name: str, new_name: str, keys: Sequence[str] = ()
+) -> Dict[str, Any]:
+    """Structural diff between two snapshots.
+
+    ``changed`` maps each changed tenant to its per-key changes (dotted
+    paths, as in effective-config provenance) and the top-level ``keys``
+    they touch. With ``keys``, only tenants that changed under one of those
+    top-level keys (or were added or removed) are reported.
+    """
+    old = store.snapshot(old_name)
+    new = store.snapshot(new_name)
+    reads = store.reads
+    differ = _Differ(store)
+    differ.tree(old["root_hash"], new["root_hash"])
+    changed = differ.changed
+    if keys:
+        wanted = set(keys)
+        changed = {
+            path: entry
+            for path, entry in changed.items()
+            if "error" in entry or wanted.intersection(entry["keys"])
+        }
+    return {
+        "old": old,
+        "new": new,
+        "added": differ.added,
+        "removed": differ.removed,
+        "changed": changed,
+        "summary": {
+            "added": len(differ.added),
+            "removed": len(differ.removed),
+            "changed": len(changed),
+            "unchanged": new["tenants"] - len(differ.added) - len(differ.changed),
+            "nodes_read": store.reads - reads,
+        },
+    }
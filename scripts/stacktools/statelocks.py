@@ -0,0 +1,319 @@
+"""
+Remote-state key map and lock-contention planning.
+
+``includes/remote-state.hcl`` keys state on the unit directory's basename::
+
+    {org}/{env}/{sregion}/{deployment}/{basename(unit)}/terraform.tfstate
+
+so ``units/hosting/s3`` and ``units/application/s3`` (and both
+``argocd_apps`` units) share one state file and one DynamoDB lock for the
+same tenant, and every deployment shares the
+``honeyhive-orchestration-terraform-state-lock`` table. The S3 backend's lock
+item is ``LockID = {bucket}/{key}``, so two jobs contend exactly when their
+bucket and key match.
+
+Colliding units do not just contend for a lock: they read and write the
+same state, so each would plan to destroy the other's resources. The fix is
+a distinct key per unit, such as one that also carries the layer directory
+(``LAYERED_KEY_TEMPLATE``), not an ordering between the units.
+
+This module computes the key map for tenants and stacks, reports collisions
+(within a stack, across the stacks a tenant runs, and across tenants that
+resolve to the same prefix) with the layered key each colliding unit would
+get, and simulates a schedule in which no two running jobs hold the same
+lock.
+"""
+
+import heapq
+from typing import Dict, Iterable, List, Mapping, Optional, Set, Tuple
+
+from stacktools import dag
+
+LOCK_TABLE = "honeyhive-orchestration-terraform-state-lock"
+KEY_TEMPLATE = "{org}/{env}/{sregion}/{deployment}/{unit}/terraform.tfstate"
+LAYERED_KEY_TEMPLATE = (
+    "{org}/{env}/{sregion}/{deployment}/{layer}/{unit}/terraform.tfstate"
+)
+BUCKET_TEMPLATE = "honeyhive-federated-{sregion}-state"
+
+# Placeholder tenant used when analyzing stacks without tenant configs
+TEMPLATE_TENANT = {
+    "org": "{org}",
+    "env": "{env}",
+    "sregion": "{sregion}",
+    "deployment": "{deployment}",
+}
+
+
+def unit_basename(unit_path: str) -> str:
+    """``basename(get_terragrunt_dir())`` for a unit path."""
+    return unit_path.rstrip("/").rsplit("/", 1)[-1]
+
+
+def state_location(config: Mapping, unit_path: str) -> Dict[str, str]:
+    """Bucket, key and lock ID that remote-state.hcl produces for one unit."""
+    bucket = config.get("state_bucket") or BUCKET_TEMPLATE.format(
+        sregion=config.get("sregion")
+    )
+    key = KEY_TEMPLATE.format(
+        org=config.get("org"),
+        env=config.get("env"),
+        sregion=config.get("sregion"),
+        deployment=config.get("deployment"),
+        unit=unit_basename(unit_path),
+    )
+    return {"bucket": bucket, "key": key, "lock_id": f"{bucket}/{key}"}
+
+
+def layered_key(config: Mapping, unit_path: str) -> str:
+    """Key for a unit that also carries its layer (``units/<layer>/<unit>``)."""
+    parts = unit_path.rstrip("/").rsplit("/", 2)
+    return LAYERED_KEY_TEMPLATE.format(
+        org=config.get("org"),
+        env=config.get("env"),
+        sregion=config.get("sregion"),
+        deployment=config.get("deployment"),
+        layer=parts[-2] if len(parts) > 1 else "",
+        unit=parts[-1],
+    )
+
+
+def stack_units(
+    stack: dag.StackSpec, env: Optional[Mapping[str, str]] = None
+) -> List[dag.Unit]:
+    """Units of a stack that are not skipped under ``env``."""
+    env = env or {}
+    return [u for u in stack.units if not dag.evaluate_skip(u.skip, env)]
+
+
+def collisions(entries: Iterable[Dict], member) -> List[Dict]:
+    """Group entries by lock ID and return the groups with more than one member."""
+    groups: Dict[str, List] = {}
+    for entry in entries:
+        groups.setdefault(entry["lock_id"], []).append(member(entry))
+    return [
+        {"lock_id": lock_id, "members": sorted(set(members))}
+        for lock_id, members in sorted(groups.items())
+        if len(set(members)) > 1
+    ]
+
+
+def tenant_state_map(
+    tenant_id: str,
+    config: Mapping,
+    stacks: List[dag.StackSpec],
+    env: Optional[Mapping[str, str]] = None,
+) -> Dict:
+    """State locations for every unit a tenant runs across ``stacks``."""
+    entries = []
+    for stack in stacks:
+        for unit in stack_units(stack, env):
+            entry = {
+                "tenant": tenant_id,
+                "stack": stack.relative_path(),
+                "unit": unit.path,
+            }
+            entry.update(state_location(config, unit.path))
+            entries.append(entry)
+
+    found = collisions(entries, lambda e: f"{e['stack']}:{e['unit']}")
+    for group in found:
+        stacks_involved = {m.split(":", 1)[0] for m in group["members"]}
+        group["scope"] = "stack" if len(stacks_involved) == 1 else "cross-stack"
+        units = sorted({m.split(":", 1)[1] for m in group["members"]})
+        group["proposed_keys"] = {unit: layered_key(config, unit) for unit in units}
+    return {"tenant": tenant_id, "state": entries, "collisions": found}
+
+
+def latent_collisions(unit_paths: Iterable[str]) -> List[Dict]:
+    """Unit directories anywhere in the repo that would share a state key."""
+    by_name: Dict[str, Set[str]] = {}
+    for path in unit_paths:
+        by_name.setdefault(unit_basename(path), set()).add(path)
+    return [
+        {"basename": name, "units": sorted(paths)}
+        for name, paths in sorted(by_name.items())
+        if len(paths) > 1
+    ]
+
+
+class Job:
+    """One unit run for one tenant."""
+
+    __slots__ = ("id", "tenant", "unit", "lock_id", "duration", "deps")
+
+    def __init__(
+        self, job_id: str, tenant: str, unit: str, lock_id: str, duration: float
+    ):
+        self.id = job_id
+        self.tenant = tenant
+        self.unit = unit
+        self.lock_id = lock_id
+        self.duration = duration
+        self.deps: Set[str] = set()
+
+
+def build_jobs(
+    tenants: List[Tuple[str, Mapping, dag.StackSpec]],
+    env: Optional[Mapping[str, str]] = None,
+    durations: Optional[Mapping[str, float]] = None,
+) -> Dict[str, Job]:
+    """Jobs for (tenant_id, config, stack) triples, with intra-stack dependencies.
+
+    Dependencies on skipped units are bridged the same way the DAG analyzer
+    does, so ordering through a skipped unit is kept.
+    """
+    env = env or {}
+    jobs: Dict[str, Job] = {}
+    for tenant_id, config, stack in tenants:
+        skipped = {u.path for u in stack.units if dag.evaluate_skip(u.skip, env)}
+        deps, _ = dag._active_dependencies(stack, skipped)
+        prefix = f"{tenant_id}:{stack.relative_path()}"
+        for unit in stack.units:
+            if unit.path in skipped:
+                continue
+            job_id = f"{prefix}:{unit.path}"
+            location = state_location(config, unit.path)
+            job = Job(
+                job_id,
+                tenant_id,
+                unit.path,
+                location["lock_id"],
+                dag.unit_duration(unit.path, durations),
+            )
+            job.deps = {f"{prefix}:{d}" for d in deps.get(unit.path, ())}
+            jobs[job_id] = job
+    return jobs
+
+
+def plan_schedule(jobs: Dict[str, Job], max_parallel: int) -> Dict:
+    """Simulate a lock-aware list schedule with ``max_parallel`` slots.
+
+    Ready jobs start in order of their bottom level (longest remaining chain
+    first). A ready job whose lock is held waits for that lock instead of
+    taking a slot, so no two running jobs ever share a lock. Returns the
+    timeline, the makespan, the jobs that had to wait for a lock, and the
+    order in which each contended lock is taken.
+    """
+    dependents: Dict[str, List[str]] = {j: [] for j in jobs}
+    for job in jobs.values():
+        for dep in job.deps:
+            dependents[dep].append(job.id)
+
+    # Bottom levels over the job DAG, by reverse topological order
+    remaining = {j: len(jobs[j].deps) for j in jobs}
+    order = []
+    frontier = [j for j, n in remaining.items() if n == 0]
+    while frontier:
+        node = frontier.pop()
+        order.append(node)
+        for child in dependents[node]:
+            remaining[child] -= 1
+            if remaining[child] == 0:
+                frontier.append(child)
+    if len(order) != len(jobs):
+        raise ValueError("job dependencies contain a cycle")
+    level: Dict[str, float] = {}
+    for node in reversed(order):
+        level[node] = jobs[node].duration + max(
+            (level[c] for c in dependents[node]), default=0.0
+        )
+
+    remaining = {j: len(jobs[j].deps) for j in jobs}
+    ready: List[Tuple[float, str]] = [(-level[j], j) for j in jobs if remaining[j] == 0]
+    heapq.heapify(ready)
+    waiting: Dict[str, List[Tuple[float, str]]] = {}
+    held: Set[str] = set()
+    running: List[Tuple[float, str]] = []
+    timeline = []
+    lock_waits = []
+    lock_order: Dict[str, List[str]] = {}
+    now = 0.0
+
+    while ready or running:
+        while ready and len(running) < max_parallel:
+            priority, job_id = heapq.heappop(ready)
+            job = jobs[job_id]
+            if job.lock_id in held:
+                waiting.setdefault(job.lock_id, []).append((priority, job_id))
+                lock_waits.append({"job": job_id, "lock_id": job.lock_id, "at": now})
+                continue
+            held.add(job.lock_id)
+            lock_order.setdefault(job.lock_id, []).append(job_id)
+            heapq.heappush(running, (now + job.duration, job_id))
+            timeline.append({"job": job_id, "start": now, "end": now + job.duration})
+        if not running:
+            break
+        now, job_id = heapq.heappop(running)
+        finished = [job_id]
+        while running and running[0][0] <= now:
+            finished.append(heapq.heappop(running)[1])
+        for done in finished:
+            lock_id = jobs[done].lock_id
+            held.discard(lock_id)
+            for item in waiting.pop(lock_id, []):
+                heapq.heappush(ready, item)
+            for child in dependents[done]:
+                remaining[child] -= 1
+                if remaining[child] == 0:
+                    heapq.heappush(ready, (-level[child], child))
+
+    return {
+        "max_parallel": max_parallel,
+        "jobs": len(jobs),
+        "makespan": now,
+        "critical_path": max(level.values(), default=0.0),
+        "lock_waits": lock_waits,
+        "serialized_locks": [
+            {"lock_id": lock_id, "order": order}
+            for lock_id, order in sorted(lock_order.items())
+            if len(order) > 1
+        ],
+        "timeline": timeline,
+    }
+
+
+def analyze_locks(
+    tenants: List[Tuple[str, Mapping, List[dag.StackSpec]]],
+    max_parallel: int,
+    env: Optional[Mapping[str, str]] = None,
+    durations: Optional[Mapping[str, float]] = None,
+    unit_paths: Iterable[str] = (),
+) -> Dict:
+    """Full lock report for (tenant_id, config, stacks) triples.
+
+    Each stack a tenant runs is scheduled as its own terragrunt run, so
+    cross-stack collisions contend exactly like units within one stack.
+    """
+    maps = [
+        tenant_state_map(tid, config, stacks, env) for tid, config, stacks in tenants
+    ]
+    entries = [entry for m in maps for entry in m["state"]]
+    jobs = build_jobs(
+        [(tid, config, stack) for tid, config, stacks in tenants for stack in stacks],
+        env=env,
+        durations=durations,
+    )
+    schedule = plan_schedule(jobs, max_parallel)
+    unconstrained = plan_schedule(
+        {job_id: _unlocked(job) for job_id, job in jobs.items()},
+        max_parallel,
+    )
+    return {
+        "lock_table": LOCK_TABLE,
+        "tenants": maps,
+        "collisions": [
+            dict(group, tenant=m["tenant"]) for m in maps for group in m["collisions"]
+        ],
+        "fleet_collisions": collisions(entries, lambda e: e["tenant"]),
+        "latent_collisions": latent_collisions(unit_paths),
+        "schedule": schedule,
+        "makespan_without_locks": unconstrained["makespan"],
+    }
+
+
+def _unlocked(job: Job) -> Job:
+    """A copy of ``job`` with a lock of its own, for the lock-free baseline."""
+    copy = Job(job.id, job.tenant, job.unit, job.id, job.duration)
+    copy.deps = job.deps
+    return copy
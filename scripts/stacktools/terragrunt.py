@@ -0,0 +1,221 @@
+"""
+Lightweight reader for the parts of ``terragrunt.hcl`` files the tooling needs.
+
+This is not an HCL parser: it extracts ``include`` paths, ``dependency``
+blocks, ``dependencies.paths`` and ``terraform.source`` with regular
+expressions and brace matching, which is enough for the units and includes
+in this repo. Paths are resolved to repo-relative POSIX strings.
+"""
+
+import re
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+from stacktools import configs
+
+UNIT_FILE = "terragrunt.hcl"
+STACK_FILE = "terragrunt.stack.hcl"
+# Where "terragrunt stack" generates the units it runs
+STACK_DIR = ".terragrunt-stack"
+
+_BLOCK_RE = re.compile(
+    r'^[ \t]*(include|dependency)[ \t]+"([^"]+)"[ \t]*\{', re.MULTILINE
+)
+_UNIT_BLOCK_RE = re.compile(r'^[ \t]*unit[ \t]+"([^"]+)"[ \t]*\{', re.MULTILINE)
+_BARE_BLOCK_RE = re.compile(r"^[ \t]*(dependencies|terraform)[ \t]*\{", re.MULTILINE)
+_FIND_PARENT_RE = re.compile(r'find_in_parent_folders\(\s*"([^"]+)"\s*\)')
+_PATH_ATTR_RE = re.compile(r"^[ \t]*path[ \t]*=[ \t]*(.+)$", re.MULTILINE)
+_CONFIG_PATH_RE = re.compile(r'^[ \t]*config_path[ \t]*=[ \t]*"([^"]+)"', re.MULTILINE)
+_PATH_STRING_RE = re.compile(r'^[ \t]*path[ \t]*=[ \t]*"([^"]+)"', re.MULTILINE)
+_PATHS_RE = re.compile(r"^[ \t]*paths[ \t]*=[ \t]*\[(.*?)\]", re.MULTILINE | re.DOTALL)
+_SOURCE_RE = re.compile(r'^[ \t]*source[ \t]*=[ \t]*"([^"]+)"', re.MULTILINE)
+_STRING_RE = re.compile(r'"([^"]*)"')
+
+
+def strip_comments(text: str) -> str:
+    """Remove ``#``, ``//`` and ``/* */`` comments outside of strings."""
+    out = []
+    i, n = 0, len(text)
+    in_string = False
+    while i < n:
+        ch = text[i]
+        if in_string:
+            out.append(ch)
+            if ch == "\\" and i + 1 < n:
+                out.append(text[i + 1])
+                i += 2
+                continue
+            if ch == '"':
+                in_string = False
+            i += 1
+        elif ch == '"':
+            in_string = True
+            out.append(ch)
+            i += 1
+        elif ch == "#" or text.startswith("//", i):
+            end = text.find("\n", i)
+            i = n if end == -1 else end
+        elif text.startswith("/*", i):
+            end = text.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+        else:
+            out.append(ch)
+            i += 1
+    return "".join(out)
+
+
+def _block_body(text: str, open_brace: int) -> str:
+    """Return the text between the brace at ``open_brace`` and its match."""
+    depth = 0
+    for i in range(open_brace, len(text)):
+        if text[i] == "{":
+            depth += 1
+        elif text[i] == "}":
+            depth -= 1
+            if depth == 0:
+                return text[open_brace + 1 : i]
+    return text[open_brace + 1 :]
+
+
+def _relative(path: Path, repo_root: Path) -> str:
+    try:
+        return path.resolve().relative_to(repo_root.resolve()).as_posix()
+    except ValueError:
+        return path.resolve().as_posix()
+
+
+def find_in_parent_folders(start_dir: Path, name: str, repo_root: Path) -> Path:
+    """Mimic terragrunt's find_in_parent_folders, starting above start_dir."""
+    for parent in start_dir.resolve().parents:
+        candidate = parent / name
+        if candidate.exists():
+            return candidate
+        if parent == repo_root.resolve().parent:
+            break
+    return repo_root / name
+
+
+class HclFile:
+    """References extracted from one terragrunt-style HCL file."""
+
+    def __init__(self, path: Path, repo_root: Path = configs.REPO_ROOT):
+        self.path = Path(path)
+        self.repo_root = repo_root
+        self.rel_path = _relative(self.path, repo_root)
+        self.includes: Dict[str, str] = {}
+        self.dependency_blocks: Dict[str, str] = {}
+        self.dependencies: List[str] = []
+        self.terraform_source: Optional[str] = None
+        self._parse(strip_comments(self.path.read_text()))
+
+    def _resolve(self, value: str) -> str:
+        return _relative(self.path.parent / value, self.repo_root)
+
+    def _parse(self, text: str):
+        for match in _BLOCK_RE.finditer(text):
+            kind, name = match.group(1), match.group(2)
+            body = _block_body(text, match.end() - 1)
+            if kind == "include":
+                path_match = _PATH_ATTR_RE.search(body)
+                if not path_match:
+                    continue
+                expr = path_match.group(1)
+                find = _FIND_PARENT_RE.search(expr)
+                if find:
+                    target = find_in_parent_folders(
+                        self.path.parent, find.group(1), self.repo_root
+                    )
+                    self.includes[name] = _relative(target, self.repo_root)
+                else:
+                    literal = _STRING_RE.search(expr)
+                    if literal:
+                        self.includes[name] = self._resolve(literal.group(1))
+            else:
+                config_path = _CONFIG_PATH_RE.search(body)
+                if config_path:
+                    self.dependency_blocks[name] = self._resolve(config_path.group(1))
+
+        for match in _BARE_BLOCK_RE.finditer(text):
+            body = _block_body(text, match.end() - 1)
+            if match.group(1) == "dependencies":
+                paths = _PATHS_RE.search(body)
+                if paths:
+                    self.dependencies.extend(
+                        self._resolve(p) for p in _STRING_RE.findall(paths.group(1))
+                    )
+            else:
+                source = _SOURCE_RE.search(body)
+                if source:
+                    self.terraform_source = source.group(1)
+
+
+class UnitConfig(HclFile):
+    """A unit directory's ``terragrunt.hcl``; ``unit`` is the repo-relative dir."""
+
+    @property
+    def unit(self) -> str:
+        return self.rel_path.rsplit("/", 1)[0]
+
+
+def scan_units(repo_root: Path = configs.REPO_ROOT) -> Dict[str, UnitConfig]:
+    """Parse every ``units/**/terragrunt.hcl``, keyed by unit directory."""
+    units = {}
+    for path in sorted((repo_root / "units").rglob(UNIT_FILE)):
+        if ".terragrunt-cache" in path.parts:
+            continue
+        unit = UnitConfig(path, repo_root)
+        units[unit.unit] = unit
+    return units
+
+
+def include_closure(
+    start: List[str], repo_root: Path = configs.REPO_ROOT, _cache: Optional[Dict] = None
+) -> Set[str]:
+    """All files reachable through ``include`` blocks from the given files."""
+    cache = _cache if _cache is not None else {}
+    seen: Set[str] = set()
+    pending = list(start)
+    while pending:
+        rel = pending.pop()
+        if rel in seen:
+            continue
+        seen.add(rel)
+        if rel not in cache:
+            path = repo_root / rel
+            cache[rel] = HclFile(path, repo_root).includes if path.is_file() else {}
+        pending.extend(cache[rel].values())
+    return seen - set(start)
+
+
+def generated_unit_dirs(
+    stack_file: str, repo_root: Path = configs.REPO_ROOT
+) -> Dict[str, str]:
+    """Directory ``terragrunt stack`` runs each unit of a stack from, by unit path.
+
+    Units are generated into ``.terragrunt-stack/<path>``, with ``path`` from
+    the ``unit`` block whose ``source`` is the unit in the
+    ``terragrunt.stack.hcl`` beside the stack YAML (``stacks/aws/full/`` for
+    ``stacks/aws/full.stack.yaml``). Units it does not list, and stacks
+    without one, are keyed by the unit's basename.
+    """
+    stack_dir = repo_root / re.sub(r"\.stack\.ya?ml$", "", str(stack_file))
+    hcl = stack_dir / STACK_FILE
+    dirs: Dict[str, str] = {}
+    if hcl.is_file():
+        text = strip_comments(hcl.read_text())
+        for match in _UNIT_BLOCK_RE.finditer(text):
+            body = _block_body(text, match.end() - 1)
+            source, path = _SOURCE_RE.search(body), _PATH_STRING_RE.search(body)
+            if (
+                source
+                and path
+                and not re.match(r"^[a-z0-9+]+::|^[a-z]+://", source.group(1))
+            ):
+                dirs[_relative(hcl.parent / source.group(1), repo_root)] = path.group(1)
+    return dirs
+
+
+def generated_unit_dir(unit_path: str, dirs: Dict[str, str]) -> str:
+    """``.terragrunt-stack/<path>`` for a unit, from ``generated_unit_dirs``."""
+    name = dirs.get(unit_path) or unit_path.rstrip("/").rsplit("/", 1)[-1]
+    return f"{STACK_DIR}/{name}"
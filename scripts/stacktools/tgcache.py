@@ -0,0 +1,476 @@
+"""
+Content-addressed store for terraform providers and modules on a runner.
+
+Every unit's ``.terraform`` directory (under ``.terragrunt-cache`` or a stack's
+``.terragrunt-stack``) downloads the same provider binaries and module sources
+again, and every unit's ``.terragrunt-cache`` holds its own copy of the
+``terraform.source`` repository. Two things address this:
+
+- ``provider_cache_env`` turns on terragrunt's provider cache in the store, so
+  ``terraform init`` in every unit reuses provider binaries instead of
+  downloading them. Unlike ``TF_PLUGIN_CACHE_DIR`` it is safe with units
+  initialising in parallel.
+- ``dedupe`` hashes the files under each ``.terraform/providers`` and
+  ``.terraform/modules`` directory and in each ``terraform.source`` copy, and
+  replaces every copy with a link to one object in the store, so identical
+  files across units and tenants take disk space once.
+
+Links are reflinks where the filesystem supports them (XFS, btrfs): the copies
+share blocks but not inodes, so writing to one never changes another. On other
+filesystems they are hardlinks, and objects are made read-only so an in-place
+write fails instead of changing the store and every other unit. Root ignores
+file modes, so each run also re-hashes any object whose mtime moved since it
+was stored and drops it from the store if its content no longer matches.
+
+Objects are named by SHA-256 plus an ``x`` suffix for executables: hardlinks
+share a mode, so a provider binary and a non-executable file with the same
+bytes are kept apart. In a ``terraform.source`` copy (a directory holding
+``.terragrunt-source-version``) only files older than that version file are
+linked: terragrunt writes it right after downloading the source, then copies
+the unit's own files and writes generated files on every run, so those are
+always newer and are left alone.
+
+An SQLite index records each object's size and last use and the counters of
+every dedupe run (hits, misses, bytes saved). ``evict`` removes objects least
+recently used first, those no unit links to before those still in use,
+until the store fits a size cap. Removing an object never breaks a unit: the
+unit's link keeps the data.
+
+The store defaults to ``tg-store`` in the cache directory; ``STACK_SELECTOR_TG_STORE``
+moves it. It must be on the same filesystem as the runner's workspace for
+links to work; files on another filesystem are counted and left as is.
+"""
+
+import errno
+import fcntl
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import stat
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from stacktools.cache import default_cache_dir
+
+SCHEMA_VERSION = 2
+STORE_ENV = "STACK_SELECTOR_TG_STORE"
+CACHE_DIRS = (".terragrunt-cache", ".terragrunt-stack")
+LINKED_DIRS = ("providers", "modules")
+SOURCE_VERSION_FILE = ".terragrunt-source-version"
+PROVIDER_CACHE_DIR = "provider-cache"
+# ioctl cloning one file's blocks into another (linux/fs.h)
+FICLONE = 0x40049409
+DEFAULT_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    name TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    uses INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS objects_last_used ON objects(last_used);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    seconds REAL NOT NULL,
+    files INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    misses INTEGER NOT NULL,
+    already_linked INTEGER NOT NULL,
+    cross_device INTEGER NOT NULL,
+    corrupt INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    saved_bytes INTEGER NOT NULL
+);
+"""
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d+)?)\s*([KMGT]?)i?B?\s*$", re.IGNORECASE)
+
+
+def default_store_path() -> Path:
+    """Return the store location (``STACK_SELECTOR_TG_STORE`` overrides)."""
+    if os.environ.get(STORE_ENV):
+        return Path(os.environ[STORE_ENV])
+    return default_cache_dir() / "tg-store"
+
+
+def parse_size(value: str) -> int:
+    """Bytes in a size such as ``500M``, ``20G`` or ``1.5TiB``."""
+    match = _SIZE_RE.match(str(value))
+    if not match:
+        raise ValueError(f"invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * 1024 ** "_KMGT".index(unit.upper() or "_"))
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if abs(size) < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def provider_cache_env(store_root: Optional[Path] = None) -> Dict[str, str]:
+    """Environment turning on terragrunt's provider cache inside the store."""
+    path = Path(store_root or default_store_path()) / PROVIDER_CACHE_DIR
+    path.mkdir(parents=True, exist_ok=True)
+    return {"TG_PROVIDER_CACHE": "1", "TG_PROVIDER_CACHE_DIR": str(path)}
+
+
+def _inside(path: str, parent: str) -> bool:
+    return path == parent or path.startswith(parent + os.sep)
+
+
+def iter_linkable_files(roots: Iterable[str]) -> Iterator[Tuple[str, str]]:
+    """Yield (path, kind) for provider, module and source files under ``roots``.
+
+    ``kind`` is "provider", "module" or "source". Source files are those of a
+    ``terraform.source`` copy older than its ``.terragrunt-source-version``,
+    other than terragrunt's own dot files. Symlinks, empty files and ``.git``
+    directories are skipped.
+    """
+    for root in roots:
+        sources: List[Tuple[str, int]] = []
+        for dirpath, dirs, files in os.walk(root):
+            while sources and not _inside(dirpath, sources[-1][0]):
+                sources.pop()
+            if ".terraform" in dirs:
+                dirs.remove(".terraform")
+                for kind in LINKED_DIRS:
+                    base = os.path.join(dirpath, ".terraform", kind)
+                    for sub, sub_dirs, sub_files in os.walk(base):
+                        sub_dirs[:] = sorted(d for d in sub_dirs if d != ".git")
+                        for name in sorted(sub_files):
+                            path = os.path.join(sub, name)
+                            if not os.path.islink(path) and os.path.getsize(path) > 0:
+                                yield path, kind.rstrip("s")
+            dirs[:] = sorted(d for d in dirs if d != ".git")
+            if SOURCE_VERSION_FILE in files:
+                version = os.stat(os.path.join(dirpath, SOURCE_VERSION_FILE))
+                sources.append((dirpath, version.st_mtime_ns))
+            if not sources:
+                continue
+            for name in sorted(files):
+                if name.startswith(".terragrunt") or name == ".terraform.lock.hcl":
+                    continue
+                path = os.path.join(dirpath, name)
+                st = os.lstat(path)
+                if (
+                    stat.S_ISREG(st.st_mode)
+                    and st.st_size
+                    and st.st_mtime_ns < sources[-1][1]
+                ):
+                    yield path, "source"
+
+
+def reflink(src, dst):
+    """Create ``dst`` sharing ``src``'s blocks; raises OSError where unsupported."""
+    with open(src, "rb") as source, open(dst, "xb") as target:
+        try:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        except BaseException:
+            os.unlink(dst)
+            raise
+    shutil.copystat(src, dst)
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModuleStore:
+    """Content-addressed object store with an SQLite usage index."""
+
+    def __init__(self, root: Optional[Path] = None):
+        self.root = Path(root or default_store_path())
+        self.objects_dir = self.root / "objects"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.root / "index.sqlite"))
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self.conn:
+                self.conn.execute("DROP TABLE IF EXISTS objects")
+                self.conn.execute("DROP TABLE IF EXISTS runs")
+                self.conn.executescript(_SCHEMA)
+                self.conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self.link_mode = self._probe_link_mode()
+
+    def _probe_link_mode(self) -> str:
+        """Return "reflink" if the store's filesystem can clone files, else "hardlink"."""
+        probe = self.objects_dir / f".probe-{os.getpid()}"
+        probe.write_bytes(b"tg-store")
+        try:
+            reflink(probe, f"{probe}.clone")
+        except OSError:
+            return "hardlink"
+        else:
+            os.unlink(f"{probe}.clone")
+            return "reflink"
+        finally:
+            probe.unlink()
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def object_path(self, name: str) -> Path:
+        return self.objects_dir / name[:2] / name
+
+    def _link(self, src, dst):
+        if self.link_mode == "reflink":
+            reflink(src, dst)
+        else:
+            os.link(src, dst)
+
+    def _link_into_place(self, obj: Path, path: str):
+        """Atomically replace ``path`` with a link to ``obj``."""
+        tmp = f"{path}.tg-store-{os.getpid()}"
+        self._link(obj, tmp)
+        try:
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def _is_linked(self, st: os.stat_result, ost: os.stat_result) -> bool:
+        """Whether a file with the object's content already is a link to it.
+
+        Reflinks are separate inodes; a clone carries the object's mtime.
+        """
+        if self.link_mode == "reflink":
+            return (st.st_size, st.st_mtime_ns) == (ost.st_size, ost.st_mtime_ns)
+        return (ost.st_dev, ost.st_ino) == (st.st_dev, st.st_ino)
+
+    def _is_corrupt(self, obj: Path, name: str, ost: os.stat_result) -> bool:
+        """Re-hash an object whose mtime or size moved since it was indexed."""
+        row = self.conn.execute(
+            "SELECT mtime_ns, size FROM objects WHERE name = ?", (name,)
+        ).fetchone()
+        if row and (row["mtime_ns"], row["size"]) == (ost.st_mtime_ns, ost.st_size):
+            return False
+        return hash_file(str(obj)) != name.rstrip("x")
+
+    def add(self, path: str, kind: str, digest: str) -> str:
+        """Store or link one file.
+
+        Returns "hit", "miss", "linked", "corrupt" or "cross_device". "linked"
+        means the file already is a link to the store object; "corrupt" means
+        the stored object had been written to in place, so it was dropped and
+        this file stored instead.
+        """
+        st = os.lstat(path)
+        name = digest + ("x" if st.st_mode & 0o111 else "")
+        obj = self.object_path(name)
+        now = time.time()
+        outcome = "hit"
+        try:
+            ost = os.stat(obj)
+        except FileNotFoundError:
+            ost = None
+        if ost is not None and self._is_corrupt(obj, name, ost):
+            obj.unlink()
+            ost, outcome = None, "corrupt"
+        if ost is None:
+            obj.parent.mkdir(exist_ok=True)
+            try:
+                self._link(path, obj)
+                outcome = "miss" if outcome == "hit" else outcome
+            except FileExistsError:
+                ost = os.stat(obj)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                return "cross_device"
+        if ost is not None:
+            if self._is_linked(st, ost):
+                outcome = "linked"
+            elif ost.st_dev != st.st_dev:
+                return "cross_device"
+            else:
+                self._link_into_place(obj, path)
+        ost = os.stat(obj)
+        if ost.st_mode & 0o222:
+            os.chmod(obj, stat.S_IMODE(ost.st_mode) & ~0o222)
+        self.conn.execute(
+            "INSERT INTO objects (name, size, kind, mtime_ns, created, last_used, uses) "
+            "VALUES (?, ?, ?, ?, ?, ?, 1) ON CONFLICT(name) DO UPDATE SET "
+            "mtime_ns = excluded.mtime_ns, last_used = excluded.last_used, uses = uses + 1",
+            (name, st.st_size, kind, ost.st_mtime_ns, now, now),
+        )
+        return outcome
+
+    def dedupe(self, roots: Iterable[str], workers: int = DEFAULT_WORKERS) -> Dict:
+        """Link every provider, module and source file under ``roots`` to the store."""
+        started = time.time()
+        counts = {"hit": 0, "miss": 0, "linked": 0, "corrupt": 0, "cross_device": 0}
+        total_bytes = saved = 0
+        by_kind: Dict[str, Dict[str, int]] = {}
+        files = list(iter_linkable_files(roots))
+
+        def digest(item):
+            return item, hash_file(item[0])
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool, self.conn:
+            for (path, kind), file_digest in pool.map(digest, files):
+                size = os.lstat(path).st_size
+                outcome = self.add(path, kind, file_digest)
+                counts[outcome] += 1
+                total_bytes += size
+                kind_counts = by_kind.setdefault(
+                    kind, {"files": 0, "hits": 0, "bytes": 0}
+                )
+                kind_counts["files"] += 1
+                kind_counts["bytes"] += size
+                if outcome in ("hit", "linked"):
+                    kind_counts["hits"] += 1
+                if outcome == "hit":
+                    saved += size
+
+        report = {
+            "files": len(files),
+            "hits": counts["hit"] + counts["linked"],
+            "misses": counts["miss"] + counts["corrupt"],
+            "already_linked": counts["linked"],
+            "corrupt": counts["corrupt"],
+            "cross_device": counts["cross_device"],
+            "bytes": total_bytes,
+            "saved_bytes": saved,
+            "hit_rate": _rate(
+                counts["hit"] + counts["linked"], counts["miss"] + counts["corrupt"]
+            ),
+            "kinds": by_kind,
+            "link_mode": self.link_mode,
+            "seconds": round(time.time() - started, 3),
+        }
+        with self.conn:
+            self.conn.execute(
+                "INSERT INTO runs (started, seconds, files, hits, misses, already_linked, "
+                "cross_device, corrupt, bytes, saved_bytes) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    started,
+                    report["seconds"],
+                    report["files"],
+                    report["hits"],
+                    report["misses"],
+                    report["already_linked"],
+                    report["cross_device"],
+                    report["corrupt"],
+                    total_bytes,
+                    saved,
+                ),
+            )
+        return report
+
+    def _objects(self) -> List[Dict]:
+        """Index rows with each object's link count; rows whose file is gone are dropped."""
+        rows, gone = [], []
+        for row in self.conn.execute("SELECT name, size, kind, last_used FROM objects"):
+            try:
+                nlink = os.stat(self.object_path(row["name"])).st_nlink
+            except FileNotFoundError:
+                gone.append(row["name"])
+                continue
+            rows.append(dict(row, nlink=nlink))
+        if gone:
+            with self.conn:
+                self.conn.executemany(
+                    "DELETE FROM objects WHERE name = ?", [(n,) for n in gone]
+                )
+        return rows
+
+    def evict(self, max_bytes: int) -> Dict:
+        """Remove least recently used objects until the store holds ``max_bytes``.
+
+        Objects no unit links to go first; removing one still linked frees
+        no disk until its last unit copy goes away. Reflinked objects share
+        blocks rather than inodes, so the store cannot tell which units still
+        use them: eviction is plain LRU and ``freed_bytes`` an upper bound.
+        """
+        objects = self._objects()
+        total = sum(o["size"] for o in objects)
+        evicted, freed = [], 0
+        for obj in sorted(objects, key=lambda o: (o["nlink"] > 1, o["last_used"])):
+            if total <= max_bytes:
+                break
+            self.object_path(obj["name"]).unlink(missing_ok=True)
+            total -= obj["size"]
+            if obj["nlink"] <= 1:
+                freed += obj["size"]
+            evicted.append(obj["name"])
+        with self.conn:
+            self.conn.executemany(
+                "DELETE FROM objects WHERE name = ?", [(n,) for n in evicted]
+            )
+        return {"evicted": len(evicted), "freed_bytes": freed, "bytes": total}
+
+    def stats(self) -> Dict:
+        objects = self._objects()
+        totals = self.conn.execute(
+            "SELECT COUNT(*) AS runs, COALESCE(SUM(hits), 0) AS hits, "
+            "COALESCE(SUM(misses), 0) AS misses, COALESCE(SUM(saved_bytes), 0) AS saved "
+            "FROM runs"
+        ).fetchone()
+        last = self.conn.execute(
+            "SELECT * FROM runs ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+        kinds: Dict[str, Dict[str, int]] = {}
+        for obj in objects:
+            kind = kinds.setdefault(obj["kind"], {"objects": 0, "bytes": 0})
+            kind["objects"] += 1
+            kind["bytes"] += obj["size"]
+        hardlinks = self.link_mode == "hardlink"
+        provider_cache = self.root / PROVIDER_CACHE_DIR
+        return {
+            "path": str(self.root),
+            "link_mode": self.link_mode,
+            "objects": len(objects),
+            "bytes": sum(o["size"] for o in objects),
+            "unreferenced_bytes": (
+                sum(o["size"] for o in objects if o["nlink"] <= 1)
+                if hardlinks
+                else None
+            ),
+            "links": sum(o["nlink"] - 1 for o in objects) if hardlinks else None,
+            "kinds": kinds,
+            "provider_cache": {
+                "path": str(provider_cache),
+                "bytes": sum(
+                    os.lstat(os.path.join(d, f)).st_size
+                    for d, _, files in os.walk(provider_cache)
+                    for f in files
+                ),
+            },
+            "runs": totals["runs"],
+            "hit_rate": _rate(totals["hits"], totals["misses"]),
+            "saved_bytes": totals["saved"],
+            "last_run": (
+                dict(last, hit_rate=_rate(last["hits"], last["misses"]))
+                if last
+                else None
+            ),
+        }
+
+
+def _rate(hits: int, misses: int) -> float:
+    return round(hits / (hits + misses), 4) if hits + misses else 0.0
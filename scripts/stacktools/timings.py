@@ -0,0 +1,286 @@
+"""
+Phase timings and trace export for select-stack.py.
+
+Code marks its phases with ``timings.span("name")``. While no tracer is
+active a span is a shared no-op context manager, so instrumented code costs
+one global lookup per call. Three global options (or environment variables,
+for runs started by other tools) activate a tracer:
+
+  * ``--timings`` (``STACK_SELECTOR_TIMINGS=1``): per-phase totals on stderr
+  * ``--timings-json FILE`` (``STACK_SELECTOR_TIMINGS_JSON``): every span
+    plus the totals, as JSON
+  * ``--trace FILE`` (``STACK_SELECTOR_TRACE``): Chrome trace-event JSON,
+    which opens in Perfetto (ui.perfetto.dev) or chrome://tracing
+
+They are accepted anywhere on the command line and removed before any other
+parsing, so every mode (fast path, select, batch, fleet commands) can be
+profiled. Output is written when the process exits.
+
+Span times come from ``time.perf_counter``, which is system-wide on Linux:
+worker processes record spans against the parent's origin and send them
+back (see ``batch.resolve_fleet``), and each worker shows up as its own
+process in the trace.
+
+Only the standard library is imported, so the machine-output fast path can
+be traced without loading anything it would not load anyway.
+"""
+
+import _thread  # get_ident without importing threading on the fast path
+import atexit
+import functools
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, List, Optional, Sequence
+
+TIMINGS_ENV = "STACK_SELECTOR_TIMINGS"
+TIMINGS_JSON_ENV = "STACK_SELECTOR_TIMINGS_JSON"
+TRACE_ENV = "STACK_SELECTOR_TRACE"
+REPORT_VERSION = 1
+
+_NULL_SPAN = nullcontext()
+
+
+class Tracer:
+    """Collects spans (name, start, duration) relative to one origin."""
+
+    def __init__(self, origin: Optional[float] = None):
+        self.origin = time.perf_counter() if origin is None else origin
+        self.pid = os.getpid()
+        self.spans: List[Dict[str, Any]] = []
+
+    def add(
+        self,
+        name: str,
+        start: float,
+        end: float,
+        cat: str = "phase",
+        args: Optional[Dict[str, Any]] = None,
+        async_id: Optional[str] = None,
+    ):
+        """Record a span from two ``perf_counter`` readings.
+
+        Spans with an ``async_id`` may overlap others on the same thread
+        (asyncio jobs); the trace shows each on its own track.
+        """
+        span = {
+            "name": name,
+            "cat": cat,
+            "start": start - self.origin,
+            "duration": end - start,
+            "pid": self.pid,
+            "tid": _thread.get_ident(),
+        }
+        if args:
+            span["args"] = args
+        if async_id is not None:
+            span["id"] = async_id
+        self.spans.append(span)
+
+    @contextmanager
+    def span(self, name: str, cat: str = "phase", **args):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, start, time.perf_counter(), cat, args)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Return and forget the recorded spans (for shipping to a parent)."""
+        spans, self.spans = self.spans, []
+        return spans
+
+    def extend(self, spans: Sequence[Dict[str, Any]]):
+        """Add spans recorded by another process against the same origin."""
+        self.spans.extend(spans)
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """Count, total and max per span name, largest total first."""
+        phases: Dict[str, Dict[str, Any]] = {}
+        for span in self.spans:
+            phase = phases.setdefault(
+                span["name"],
+                {
+                    "name": span["name"],
+                    "cat": span["cat"],
+                    "count": 0,
+                    "total": 0.0,
+                    "max": 0.0,
+                },
+            )
+            phase["count"] += 1
+            phase["total"] += span["duration"]
+            phase["max"] = max(phase["max"], span["duration"])
+        return sorted(phases.values(), key=lambda p: p["total"], reverse=True)
+
+    def report(self) -> Dict[str, Any]:
+        """The JSON report: wall time, per-phase totals and every span, in ms."""
+        return {
+            "version": REPORT_VERSION,
+            "pid": self.pid,
+            "argv": sys.argv,
+            "wall_ms": _ms(time.perf_counter() - self.origin),
+            "phases": [
+                dict(phase, total=_ms(phase["total"]), max=_ms(phase["max"]))
+                for phase in self.summary()
+            ],
+            "spans": [
+                dict(span, start=_ms(span["start"]), duration=_ms(span["duration"]))
+                for span in self.spans
+            ],
+        }
+
+    def chrome_trace(self) -> Dict[str, Any]:
+        """Chrome trace-event format (JSON object form), timestamps in µs."""
+        events = []
+        for pid in sorted({span["pid"] for span in self.spans} | {self.pid}):
+            label = "select-stack.py" if pid == self.pid else f"worker {pid}"
+            events.append(
+                {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": label}}
+            )
+        for span in self.spans:
+            event = {
+                "name": span["name"],
+                "cat": span["cat"],
+                "pid": span["pid"],
+                "tid": span["tid"],
+                "ts": round(span["start"] * 1e6, 3),
+                "args": span.get("args", {}),
+            }
+            if "id" in span:
+                end = dict(
+                    event, ph="e", ts=round((span["start"] + span["duration"]) * 1e6, 3)
+                )
+                events.append(dict(event, ph="b", id=span["id"]))
+                events.append(dict(end, id=span["id"]))
+            else:
+                events.append(dict(event, ph="X", dur=round(span["duration"] * 1e6, 3)))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def format_summary(self) -> str:
+        lines = [f"{'phase':<40} {'count':>6} {'total ms':>10} {'max ms':>10}"]
+        for phase in self.summary():
+            lines.append(
+                f"{phase['name'][:40]:<40} {phase['count']:>6} "
+                f"{_ms(phase['total']):>10.3f} {_ms(phase['max']):>10.3f}"
+            )
+        lines.append(
+            f"{'wall':<40} {'':>6} {_ms(time.perf_counter() - self.origin):>10.3f}"
+        )
+        return "\n".join(lines)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+_tracer: Optional[Tracer] = None
+
+
+def active() -> Optional[Tracer]:
+    """The process's tracer, or None when timings are off."""
+    return _tracer
+
+
+def start(origin: Optional[float] = None) -> Tracer:
+    """Activate a fresh tracer (worker processes call this with the parent's origin)."""
+    global _tracer
+    _tracer = Tracer(origin)
+    return _tracer
+
+
+def span(name: str, cat: str = "phase", **args):
+    """Context manager timing one phase; a no-op while timings are off."""
+    tracer = _tracer
+    if tracer is None:
+        return _NULL_SPAN
+    return tracer.span(name, cat, **args)
+
+
+def record(
+    name: str, start: float, end: Optional[float] = None, cat: str = "phase", **args
+):
+    """Record a span measured by the caller; a no-op while timings are off."""
+    tracer = _tracer
+    if tracer is not None:
+        tracer.add(name, start, time.perf_counter() if end is None else end, cat, args)
+
+
+def timed(cat: str = "phase"):
+    """Decorator recording a span named after the function for each call."""
+
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(func.__qualname__, cat):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _take_option(argv: List[str], option: str, takes_value: bool):
+    """Remove ``option`` from argv; return its value, True, or None if absent."""
+    for i, arg in enumerate(argv):
+        if arg == "--":
+            return None
+        if arg == option:
+            if not takes_value:
+                del argv[i]
+                return True
+            if i + 1 >= len(argv):
+                raise SystemExit(f"Error: {option} requires a file argument")
+            value = argv[i + 1]
+            del argv[i : i + 2]
+            return value
+        if takes_value and arg.startswith(option + "="):
+            del argv[i]
+            return arg.split("=", 1)[1]
+    return None
+
+
+def configure(argv: List[str], origin: Optional[float] = None) -> List[str]:
+    """Strip the timing options from argv and activate a tracer if any was given.
+
+    Environment variables apply when the options are absent. The tracer's
+    outputs are written at interpreter exit. Returns the remaining argv.
+    """
+    argv = list(argv)
+    print_summary = _take_option(argv, "--timings", False) or bool(
+        os.environ.get(TIMINGS_ENV)
+    )
+    json_path = _take_option(argv, "--timings-json", True) or os.environ.get(
+        TIMINGS_JSON_ENV
+    )
+    trace_path = _take_option(argv, "--trace", True) or os.environ.get(TRACE_ENV)
+    if print_summary or json_path or trace_path:
+        tracer = start(origin)
+        atexit.register(_finish, tracer, print_summary, json_path, trace_path)
+    return argv
+
+
+def _finish(
+    tracer: Tracer,
+    print_summary: bool,
+    json_path: Optional[str],
+    trace_path: Optional[str],
+):
+    if os.getpid() != tracer.pid:
+        # A forked child inherited the atexit hook; only the parent writes
+        return
+    for path, document in (
+        (json_path, tracer.report),
+        (trace_path, tracer.chrome_trace),
+    ):
+        if not path:
+            continue
+        try:
+            with open(path, "w") as f:
+                json.dump(document(), f)
+        except OSError as e:
+            print(f"Warning: could not write {path}: {e}", file=sys.stderr)
+    if print_summary:
+        print(tracer.format_summary(), file=sys.stderr)
@@ -23,13 +23,13 @@ dependency "secrets_configs" {
   config_path = "../secrets_configs"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.secrets_configs, {
     database_password_secret_name = null
     ecr_repository_urls           = {}
     iam_role_arns                 = {}
-  }
+  })
 
-  skip_outputs = false
+  skip_outputs = can(include.root.locals.dependency_outputs.secrets_configs)
 }
 
 # State bucket for remote state lookup (cross-stack dependency)
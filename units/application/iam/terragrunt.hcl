@@ -19,11 +19,11 @@ dependency "s3" {
   config_path = "../s3"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.s3, {
     bucket_name = "${include.root.locals.org}-${include.root.locals.env}-${include.root.locals.sregion}-${include.root.locals.deployment}-store"
-  }
+  })
 
-  skip_outputs = false
+  skip_outputs = can(include.root.locals.dependency_outputs.s3)
 }
 
 # Cross-stack dependency on hosting/cluster
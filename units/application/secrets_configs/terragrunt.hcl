@@ -18,26 +18,26 @@ terraform {
 dependency "database" {
   config_path = "../database"
 
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.database, {
     db_address              = null
     db_port                 = null
     db_name                 = null
     db_username             = null
     db_password_secret_name = null
     db_password_secret_arn  = null
-  }
+  })
 
-  skip_outputs = false
+  skip_outputs = can(include.root.locals.dependency_outputs.database)
 }
 
 dependency "ecr" {
   config_path = "../ecr"
 
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.ecr, {
     repository_urls = {}
-  }
+  })
 
-  skip_outputs = false
+  skip_outputs = can(include.root.locals.dependency_outputs.ecr)
 }
 
 # IAM dependency (optional - if IAM unit is skipped)
@@ -45,7 +45,7 @@ dependency "iam" {
   config_path = "../iam"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.iam, {
     cp_writer_role_arn      = "arn:aws:iam::123456789012:role/mockCpWriter"
     cp_controller_role_arn  = "arn:aws:iam::123456789012:role/mockCpController"
     cp_backend_role_arn     = "arn:aws:iam::123456789012:role/mockCpBackend"
@@ -57,9 +57,9 @@ dependency "iam" {
     dp_backend_role_arn     = "arn:aws:iam::123456789012:role/mockDpBackend"
     dp_pythonmetric_role_arn = "arn:aws:iam::123456789012:role/mockDpPythonMetric"
     dp_llmproxy_role_arn    = "arn:aws:iam::123456789012:role/mockDpLlmProxy"
-  }
+  })
 
-  skip_outputs = false
+  skip_outputs = can(include.root.locals.dependency_outputs.iam)
 }
 
 inputs = {
@@ -17,14 +17,14 @@ dependency "cluster" {
   config_path = "../cluster"
 
   # Mock outputs for first deployment when cluster doesn't exist yet
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.cluster, {
     cluster_name      = "${include.root.locals.org}-${include.root.locals.env}-${include.root.locals.sregion}-${include.root.locals.deployment}"
     cluster_endpoint  = "https://${include.root.locals.org}-${include.root.locals.env}-${include.root.locals.sregion}-${include.root.locals.deployment}.gr7.${include.root.locals.region}.eks.amazonaws.com"
     oidc_provider_arn = "arn:aws:iam::${include.root.locals.account_id}:oidc-provider/oidc.eks.${include.root.locals.region}.amazonaws.com/id/00000000000000000000000000000000"
-  }
+  })
 
-  # Skip outputs during destroy to avoid dependency issues
-  skip_outputs = false
+  # Prefetched outputs (TG_DEPENDENCY_OUTPUTS) replace the state read
+  skip_outputs = can(include.root.locals.dependency_outputs.cluster)
 }
 
 terraform {
@@ -9,10 +9,12 @@ dependency "vpc" {
   config_path = "../vpc"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.vpc, {
     vpc_id         = "mock-vpc-id"
     vpc_cidr_block = "10.0.0.0/16"
-  }
+  })
+
+  skip_outputs = can(include.root.locals.dependency_outputs.vpc)
 }
 
 terraform {
@@ -9,20 +9,24 @@ dependency "vpc" {
   config_path = "../vpc"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.vpc, {
     vpc_id             = "mock-vpc-id"
     private_subnet_ids = ["mock-subnet-1", "mock-subnet-2"]
     vpc_cidr_block     = "10.0.0.0/16"
-  }
+  })
+
+  skip_outputs = can(include.root.locals.dependency_outputs.vpc)
 }
 
 dependency "dns" {
   config_path = "../dns"
 
   mock_outputs_allowed_terraform_commands = ["init", "validate", "plan"]
-  mock_outputs = {
+  mock_outputs = try(include.root.locals.dependency_outputs.dns, {
     zone_name = "mock.example.com"
-  }
+  })
+
+  skip_outputs = can(include.root.locals.dependency_outputs.dns)
 }
 
 terraform {